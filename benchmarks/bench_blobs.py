@@ -0,0 +1,100 @@
+"""Memory and latency benchmark: JSON-embedded documents vs. out-of-band blobs.
+
+Each mode runs in its own subprocess so that the peak RSS numbers do not leak
+between runs::
+
+    python benchmarks/bench_blobs.py --size-mb 10 --repeat 20
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEMPLATE = "<doc>{{.Document}}</doc>\n{{range .Messages}}{{.role}}: {{.content}}\n{{end}}"
+
+
+def make_document(size_mb: int) -> str:
+    # 带有需要转义的字符,模拟真实文档
+    line = 'Lorem ipsum "dolor" sit amet,\tconsectetur\\adipiscing elit. 你好世界\n'
+    return (line * (size_mb * 1024 * 1024 // len(line.encode("utf-8")) + 1))
+
+
+def run_mode(mode: str, size_mb: int, repeat: int) -> dict:
+    from cognihub_pygotemplate import Blob, GoTemplateEngine
+
+    engine = GoTemplateEngine(TEMPLATE)
+    document = make_document(size_mb)
+    messages = [{"role": "user", "content": "Summarize the document."}]
+
+    def build() -> dict:
+        doc = Blob(document) if mode == "blob" else document
+        return {"Document": doc, "Messages": messages}
+
+    engine.render(build())  # 预热
+
+    latencies = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        data = build()
+        start = time.perf_counter()
+        output = engine.render(data)
+        latencies.append(time.perf_counter() - start)
+        del output
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024
+    return {
+        "mode": mode,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "min_ms": min(latencies) * 1000,
+        "python_peak_mb": py_peak / 1024 / 1024,
+        "max_rss_mb": maxrss / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mode", choices=["json", "blob"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.size_mb, args.repeat)))
+        return
+
+    results = []
+    for mode in ("json", "blob"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode,
+             "--size-mb", str(args.size_mb), "--repeat", str(args.repeat)],
+            check=True, capture_output=True, text=True,
+        )
+        results.append(json.loads(out.stdout))
+
+    print(f"document size: {args.size_mb} MB, renders per mode: {args.repeat}")
+    header = f"{'mode':<6}{'mean ms':>10}{'p50 ms':>10}{'min ms':>10}{'py peak MB':>12}{'max RSS MB':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<6}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['min_ms']:>10.2f}"
+              f"{r['python_peak_mb']:>12.1f}{r['max_rss_mb']:>12.1f}")
+    json_r, blob_r = results
+    print(f"\nlatency speedup: {json_r['mean_ms'] / blob_r['mean_ms']:.2f}x, "
+          f"python peak saved: {json_r['python_peak_mb'] - blob_r['python_peak_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
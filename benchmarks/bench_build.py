@@ -0,0 +1,84 @@
+"""Throughput of the default build against PGO and tuned builds of the library.
+
+Each variant is built into its own copy of the package and measured with the
+bundled workload (``cognihub_pygotemplate.workload``) in a fresh process.
+Rounds alternate between variants so that machine noise hits them evenly. The
+PGO profile is recorded from the default build unless ``--profile`` is given::
+
+    python benchmarks/bench_build.py --rounds 5 --duration 5 --goamd64 v3
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GO_SRC = os.path.join(ROOT, "cognihub_pygotemplate")
+LIB_NAME = {"Windows": "renderer.dll", "Darwin": "librenderer.dylib"}.get(platform.system(), "librenderer.so")
+
+
+def build(workdir: str, name: str, flags: list, goamd64: str = "") -> str:
+    """Copies the Python package to workdir/name and builds the library into it."""
+    target = os.path.join(workdir, name)
+    package = os.path.join(target, "cognihub_pygotemplate")
+    shutil.copytree(GO_SRC, package, ignore=shutil.ignore_patterns(
+        "*.so", "*.dylib", "*.dll", "*.h", "renderd", "renderd.exe", "*.pgo", "__pycache__"))
+    env = dict(os.environ, GOAMD64=goamd64) if goamd64 else None
+    subprocess.run(["go", "build", "-buildmode=c-shared", *flags, "-o", os.path.join(package, LIB_NAME), "."],
+                   cwd=GO_SRC, env=env, check=True)
+    return target
+
+
+def workload(root: str, duration: float, profile: str = "") -> dict:
+    command = [sys.executable, "-m", "cognihub_pygotemplate.workload", "--duration", str(duration)]
+    if profile:
+        command += ["--profile", profile]
+    result = subprocess.run(command, cwd=root, env=dict(os.environ, PYTHONPATH=root),
+                            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per measurement")
+    parser.add_argument("--profile", help="existing PGO profile to use instead of recording one")
+    parser.add_argument("--profile-duration", type=float, default=20.0)
+    parser.add_argument("--goamd64", default="", help="GOAMD64 level for the tuned build, e.g. v3")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        variants = {"default": build(workdir, "default", ["-pgo=off"])}
+        profile = args.profile
+        if not profile:
+            profile = os.path.join(workdir, "default.pgo")
+            print(f"recording profile for {args.profile_duration}s ...", flush=True)
+            workload(variants["default"], args.profile_duration, profile)
+        profile = os.path.abspath(profile)
+        variants["tuned"] = build(workdir, "tuned", ["-pgo=off", "-trimpath", "-ldflags=-s -w"], args.goamd64)
+        variants["pgo"] = build(workdir, "pgo", [f"-pgo={profile}"])
+        variants["pgo+tuned"] = build(workdir, "pgo+tuned", [f"-pgo={profile}", "-trimpath", "-ldflags=-s -w"],
+                                      args.goamd64)
+
+        rates: dict = {name: [] for name in variants}
+        for i in range(args.rounds):
+            for name, root in variants.items():
+                rates[name].append(workload(root, args.duration)["renders_per_second"])
+            print(f"round {i + 1}/{args.rounds} done", flush=True)
+
+        baseline = statistics.median(rates["default"])
+        sizes = {name: os.path.getsize(os.path.join(root, "cognihub_pygotemplate", LIB_NAME))
+                 for name, root in variants.items()}
+        print(f"\n{'build':<10} {'renders/s':>10} {'speedup':>8} {'size MiB':>9}")
+        for name in variants:
+            rate = statistics.median(rates[name])
+            print(f"{name:<10} {rate:>10.0f} {rate / baseline:>7.3f}x {sizes[name] / 2**20:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Per-call overhead of the C extension fast path versus ctypes.
+
+For a trivial template and a small chat template, measures the bare FFI
+call (``RenderTemplate``, decoding and ``FreeString`` through ctypes, or one
+``_native.render`` call) and a full ``GoTemplateEngine.render`` through each
+path. Build the extension in place first::
+
+    python setup.py build_ext --inplace
+    python benchmarks/bench_native.py --iterations 200000
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cognihub_pygotemplate import GoTemplateEngine  # noqa: E402
+from cognihub_pygotemplate import engine as engine_module  # noqa: E402
+
+CASES = {
+    "trivial": ("x", {}),
+    "chat": ("{{range .Messages}}<|{{.role}}|>\n{{.content}}<|end|>\n{{end}}<|assistant|>\n",
+             {"Messages": [{"role": "system", "content": "You are a helpful assistant."},
+                           {"role": "user", "content": "What is the capital of France?"}]}),
+}
+
+
+def best_per_call(fns: Dict[str, Callable[[], object]], iterations: int, repeats: int) -> Dict[str, float]:
+    """Best-of-``repeats`` mean time of one call per function, in microseconds.
+
+    The functions are timed in turn within every repeat, so that drift in
+    machine load affects them alike.
+    """
+    best = {name: float("inf") for name in fns}
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            for name, fn in fns.items():
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    fn()
+                best[name] = min(best[name], (time.perf_counter() - start) / iterations * 1e6)
+    finally:
+        gc.enable()
+    return best
+
+
+def ctypes_call(lib: ctypes.CDLL, template: bytes, data: bytes) -> Callable[[], str]:
+    def call() -> str:
+        ptr = lib.RenderTemplate(template, data)
+        try:
+            return ctypes.string_at(ptr).decode("utf-8")
+        finally:
+            lib.FreeString(ptr)
+    return call
+
+
+def forced_render(engine: GoTemplateEngine, data: dict, native: Optional[Callable[[bytes, bytes], str]]
+                  ) -> Callable[[], str]:
+    """engine.render(data) with the fast path switched on or off for the call."""
+    def call() -> str:
+        GoTemplateEngine._native_render = native
+        return engine.render(data)
+    return call
+
+
+def measure(iterations: int, repeats: int) -> List[Dict[str, Any]]:
+    GoTemplateEngine.ensure_loaded()
+    lib = GoTemplateEngine._go_lib
+    native = GoTemplateEngine._native_render
+    rows = []
+    try:
+        for name, (source, data) in CASES.items():
+            engine = GoTemplateEngine(source)
+            template, payload = source.encode("utf-8"), json.dumps(data).encode("utf-8")
+            fns: Dict[str, Callable[[], object]] = {
+                "ctypes_call_us": ctypes_call(lib, template, payload),
+                "ctypes_render_us": forced_render(engine, data, None),
+            }
+            if native is not None:
+                fns["native_call_us"] = lambda: native(template, payload)
+                fns["native_render_us"] = forced_render(engine, data, native)
+            row: Dict[str, Any] = {"case": name}
+            row.update(best_per_call(fns, iterations, repeats))
+            rows.append(row)
+    finally:
+        GoTemplateEngine._native_render = native
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50_000, help="calls per timing run")
+    parser.add_argument("--repeats", type=int, default=5, help="timing runs, the best is reported")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    rows = measure(args.iterations, args.repeats)
+    native = engine_module._native is not None
+    if args.json:
+        json.dump({"native": native, "results": rows}, sys.stdout)
+        print()
+        return
+    if not native:
+        print("C extension not built; only the ctypes path was measured "
+              "(python setup.py build_ext --inplace)")
+    for row in rows:
+        print(f"{row['case']}:")
+        print(f"  bare call  ctypes {row['ctypes_call_us']:7.2f}us", end="")
+        if native:
+            print(f"  native {row['native_call_us']:7.2f}us  "
+                  f"{row['native_call_us'] - row['ctypes_call_us']:+.2f}us", end="")
+        print()
+        print(f"  render()   ctypes {row['ctypes_render_us']:7.2f}us", end="")
+        if native:
+            change = row["native_render_us"] - row["ctypes_render_us"]
+            print(f"  native {row['native_render_us']:7.2f}us  {change:+.2f}us "
+                  f"({change / row['ctypes_render_us']:+.0%})", end="")
+        print()
+    overheads = [r["ctypes_call_us"] - r["native_call_us"] for r in rows if native]
+    if overheads:
+        print(f"ctypes overhead per call: {statistics.mean(overheads):.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Throughput benchmark: RenderPool with 1..N workers on a CPU-bound template.
+
+ctypes releases the GIL while Go renders, so throughput should grow close to
+linearly with the worker count up to the number of cores::
+
+    python benchmarks/bench_pool.py --max-workers 8 --jobs 64
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cognihub_pygotemplate import GoTemplateEngine, RenderPool  # noqa: E402
+
+TEMPLATE = "{{range .L}}{{range $.L}}{{.}},{{end}}{{end}}"
+
+
+def measure(engine: GoTemplateEngine, data: dict, workers: int, jobs: int) -> tuple:
+    with RenderPool(workers=workers, max_queue=jobs) as pool:
+        start = time.perf_counter()
+        for future in [pool.submit(engine, data) for _ in range(jobs)]:
+            future.result()
+        elapsed = time.perf_counter() - start
+    return jobs / elapsed, pool.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--size", type=int, default=600, help="range length; work grows with size^2")
+    args = parser.parse_args()
+
+    engine = GoTemplateEngine(TEMPLATE)
+    data = {"L": list(range(args.size))}
+    engine.render(data)  # 预热
+
+    print(f"cpus={os.cpu_count()} jobs={args.jobs} size={args.size}")
+    print(f"{'workers':>7} {'renders/s':>10} {'speedup':>8} {'wait p95 ms':>12} {'service p50 ms':>15}")
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        rate, stats = measure(engine, data, workers, args.jobs)
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>10.1f} {rate / baseline:>7.2f}x "
+              f"{stats.queue_wait.p95 * 1000:>12.2f} {stats.service_time.p50 * 1000:>15.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Render throughput as the number of Python threads grows.
+
+Every thread renders the bundled workload (``cognihub_pygotemplate.workload``)
+for ``--duration`` seconds. With the GIL, only the Go side of each render runs
+in parallel, so scaling stops at the share of time spent in Python building the
+payload; on a free-threaded build (3.13t/3.14t, ``PYTHON_GIL=0``) both sides
+run in parallel::
+
+    python benchmarks/bench_threads.py --threads 1,2,4,8 --duration 5
+    PYTHON_GIL=0 python3.13t benchmarks/bench_threads.py --json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cognihub_pygotemplate import GoTemplateEngine  # noqa: E402
+from cognihub_pygotemplate.workload import build_calls  # noqa: E402
+
+
+def measure(threads: int, duration: float) -> dict:
+    # 每个线程有自己的调用列表, 避免共享数据结构上的竞争
+    calls = [build_calls(seed) for seed in range(threads)]
+    for engine, data, limits in calls[0]:
+        engine.render(data, limits)
+    counts = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(i: int) -> None:
+        own = calls[i]
+        barrier.wait()
+        n = 0
+        while not stop.is_set():
+            engine, data, limits = own[n % len(own)]
+            engine.render(data, limits)
+            n += 1
+        counts[i] = n
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return {"threads": threads, "renders": sum(counts), "renders_per_second": sum(counts) / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", default="1,2,4,8", help="comma-separated thread counts")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per measurement")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    GoTemplateEngine.ensure_loaded()
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    results = [measure(int(n), args.duration) for n in args.threads.split(",")]
+    if args.json:
+        json.dump({"gil_enabled": gil, "cpus": os.cpu_count(), "results": results}, sys.stdout)
+        print()
+        return
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} CPUs")
+    base = results[0]["renders_per_second"] / results[0]["threads"]
+    for row in results:
+        print(f"{row['threads']:>3} threads  {row['renders_per_second']:>10,.0f} renders/s  "
+              f"x{row['renders_per_second'] / base:5.2f} of one thread")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Soak test: drives renders through the real library and fails on memory growth.
+
+Threads and asyncio tasks render a mix of templates with varied data sizes,
+blobs, limits, caching and deliberate errors, while a sampler records process
+RSS, the Go heap and the Python heap. After a warmup the first samples form
+the baseline; the run fails (exit status 1) when the last samples exceed it by
+more than the allowed growth::
+
+    python benchmarks/soak.py --duration 3600 --threads 8 --tasks 32
+    python benchmarks/soak.py --renders 5000000 --report soak.json
+
+Leaks in the FFI string handoff grow RSS by the output size on every render
+and are caught within seconds; slower leaks need longer runs.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEMPLATES = {
+    "small": "Hello {{.Name}}!",
+    "chat": ("{{range $i, $m := .Messages}}{{if eq $m.role \"user\"}}User: {{$m.content}}\n"
+             "{{else}}Assistant: {{$m.content}}\n{{end}}{{end}}{{if .System}}System: {{.System}}{{end}}"),
+    "document": "<doc>{{.Document}}</doc>\n{{range .Messages}}{{.role}}: {{.content}}\n{{end}}",
+    "nested": "{{range .Rows}}{{range .}}{{.}},{{end}}\n{{end}}",
+    "broken": "{{range .Messages}}{{.content.missing.field}}{{end}}",
+}
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # 非Linux平台只能取峰值
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Workload:
+    """Builds random render calls; one instance per worker."""
+
+    def __init__(self, seed: int, max_items: int, max_text: int):
+        from cognihub_pygotemplate import Blob, GoTemplateEngine, RenderCache, RenderLimits
+
+        self.Blob = Blob
+        self.RenderLimits = RenderLimits
+        self.rng = random.Random(seed)
+        self.max_items = max_items
+        self.max_text = max_text
+        cache = RenderCache(max_entries=64)
+        self.engines = {name: GoTemplateEngine(source) for name, source in TEMPLATES.items()}
+        self.engines["cached"] = GoTemplateEngine(TEMPLATES["chat"], cache=cache)
+
+    def text(self) -> str:
+        n = self.rng.randint(0, self.max_text)
+        return ("多语言 text \"quoted\" " * (n // 20 + 1))[:n]
+
+    def call(self) -> Any:
+        """Returns ``(engine, data, limits)`` for the next render."""
+        rng = self.rng
+        name = rng.choice(list(self.engines))
+        messages = [{"role": rng.choice(["user", "assistant"]), "content": self.text()}
+                    for _ in range(rng.randint(0, self.max_items))]
+        data: Dict[str, Any] = {"Name": self.text(), "Messages": messages}
+        if name == "document":
+            data["Document"] = self.Blob(self.text() * 10) if rng.random() < 0.5 else self.text() * 10
+        elif name == "nested":
+            data["Rows"] = [list(range(rng.randint(0, 30))) for _ in range(rng.randint(0, 30))]
+        elif name == "cached":
+            # 少量不同的数据, 让缓存既有命中也有淘汰
+            data = {"Messages": [{"role": "user", "content": str(rng.randint(0, 100))}]}
+        limits = None
+        if rng.random() < 0.2:
+            limits = self.RenderLimits(max_output_bytes=rng.randint(10, 10_000), max_range_iterations=500)
+        return self.engines[name], data, limits
+
+
+class Counters:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.renders = 0
+        self.errors = 0
+        self.unexpected: List[str] = []
+
+    def add(self, renders: int, errors: int) -> None:
+        with self.lock:
+            self.renders += renders
+            self.errors += errors
+
+
+def render_one(engine: Any, data: Dict[str, Any], limits: Any) -> bool:
+    """Renders once; returns False for the expected render errors."""
+    try:
+        engine.render(data, limits)
+        return True
+    except ValueError:
+        return False
+
+
+def thread_worker(seed: int, args: argparse.Namespace, stop: threading.Event, counters: Counters) -> None:
+    workload = Workload(seed, args.max_items, args.max_text)
+    while not stop.is_set():
+        ok = errors = 0
+        for _ in range(100):
+            if render_one(*workload.call()):
+                ok += 1
+            else:
+                errors += 1
+        counters.add(ok + errors, errors)
+
+
+async def async_main(args: argparse.Namespace, stop: threading.Event, counters: Counters) -> None:
+    async def task(seed: int) -> None:
+        workload = Workload(seed, args.max_items, args.max_text)
+        while not stop.is_set():
+            engine, data, limits = workload.call()
+            try:
+                if workload.rng.random() < 0.05:
+                    # 取消进行中的渲染, 覆盖 render_async 的取消路径
+                    pending = asyncio.ensure_future(engine.render_async(data, limits or workload.RenderLimits(timeout=5)))
+                    await asyncio.sleep(0)
+                    pending.cancel()
+                    try:
+                        await pending
+                    except asyncio.CancelledError:
+                        pass
+                    counters.add(1, 0)
+                    continue
+                await engine.render_async(data, limits)
+                counters.add(1, 0)
+            except ValueError:
+                counters.add(1, 1)
+
+    await asyncio.gather(*(task(1000 + i) for i in range(args.tasks)))
+
+
+def sample(start: float, counters: Counters, use_tracemalloc: bool) -> Dict[str, Any]:
+    from cognihub_pygotemplate import GoTemplateEngine
+
+    go = GoTemplateEngine.memory_stats(collect=True)
+    return {
+        "elapsed": round(time.monotonic() - start, 3),
+        "renders": counters.renders,
+        "rss": rss_bytes(),
+        "go_heap": go["heap_alloc"],
+        "go_sys": go["sys"],
+        "outstanding_strings": go["outstanding_strings"],
+        "py_heap": tracemalloc.get_traced_memory()[0] if use_tracemalloc else None,
+        "py_blocks": sys.getallocatedblocks(),
+    }
+
+
+def growth(samples: List[Dict[str, Any]], key: str, window: int) -> Optional[float]:
+    """Median of the last ``window`` samples minus the median of the first ``window``."""
+    values = [s[key] for s in samples if s[key] is not None]
+    if len(values) < 2 * window:
+        return None
+    return statistics.median(values[-window:]) - statistics.median(values[:window])
+
+
+def describe(name: str, value: float) -> str:
+    """Formats a growth figure: a block count for py_blocks, MiB otherwise."""
+    if name == "py_blocks":
+        return f"{value:,.0f} blocks"
+    return f"{value / 2**20:.2f} MiB"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=None,
+                        help="seconds to run after warmup (default 60, unlimited with --renders)")
+    parser.add_argument("--renders", type=int, default=0, help="stop after this many renders instead")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds before the baseline is taken")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=8, help="asyncio tasks using render_async")
+    parser.add_argument("--max-items", type=int, default=40, help="maximum messages per render")
+    parser.add_argument("--max-text", type=int, default=2000, help="maximum characters per text field")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between memory samples")
+    parser.add_argument("--window", type=int, default=3, help="samples averaged at each end of the run")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64.0)
+    parser.add_argument("--max-go-heap-growth-mb", type=float, default=32.0)
+    parser.add_argument("--max-py-heap-growth-mb", type=float, default=32.0, help="with --tracemalloc")
+    parser.add_argument("--max-py-blocks-growth", type=int, default=500_000,
+                        help="allocated Python blocks, checked without --tracemalloc")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="measure the Python heap with tracemalloc (slower) instead of allocated blocks")
+    parser.add_argument("--report", help="write the samples and verdict as JSON to this path")
+    args = parser.parse_args(argv)
+
+    from cognihub_pygotemplate import GoTemplateEngine
+
+    GoTemplateEngine.ensure_loaded()
+    if args.tracemalloc:
+        tracemalloc.start()
+    counters = Counters()
+    stop = threading.Event()
+    workers = [threading.Thread(target=thread_worker, args=(i, args, stop, counters), daemon=True)
+               for i in range(args.threads)]
+    if args.tasks:
+        workers.append(threading.Thread(target=asyncio.run, args=(async_main(args, stop, counters),), daemon=True))
+    for worker in workers:
+        worker.start()
+
+    start = time.monotonic()
+    time.sleep(args.warmup)
+    samples = [sample(start, counters, args.tracemalloc)]
+    # 指定了渲染次数时由次数决定何时结束, 除非同时给出了时长
+    duration = args.duration if args.duration is not None else (math.inf if args.renders else 60.0)
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline and (not args.renders or counters.renders < args.renders):
+        time.sleep(args.interval)
+        samples.append(sample(start, counters, args.tracemalloc))
+        last = samples[-1]
+        print(f"{last['elapsed']:>9.1f}s {last['renders']:>12,} renders  rss {last['rss'] / 2**20:8.1f} MiB  "
+              f"go heap {last['go_heap'] / 2**20:8.1f} MiB  py blocks {last['py_blocks']:>10,}", flush=True)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    # 所有渲染结束后, 每个返回的字符串都应已释放
+    samples.append(sample(start, counters, args.tracemalloc))
+    window = max(1, min(args.window, len(samples) // 2))
+    checks = {
+        "rss": (growth(samples, "rss", window), args.max_rss_growth_mb * 2**20),
+        "go_heap": (growth(samples, "go_heap", window), args.max_go_heap_growth_mb * 2**20),
+    }
+    if args.tracemalloc:
+        checks["py_heap"] = (growth(samples, "py_heap", window), args.max_py_heap_growth_mb * 2**20)
+    else:
+        # 没有 tracemalloc 时以已分配的块数近似Python堆的大小
+        checks["py_blocks"] = (growth(samples, "py_blocks", window), args.max_py_blocks_growth)
+    failures = [f"{name} grew by {describe(name, value)} (limit {describe(name, limit)})"
+                for name, (value, limit) in checks.items() if value is not None and value > limit]
+    if samples[-1]["outstanding_strings"]:
+        failures.append(f"{samples[-1]['outstanding_strings']} result strings were never freed")
+
+    elapsed = samples[-1]["elapsed"]
+    print(f"{counters.renders:,} renders ({counters.errors:,} expected errors) in {elapsed:.1f}s, "
+          f"{counters.renders / max(elapsed, 1e-9):,.0f}/s")
+    for name, (value, limit) in checks.items():
+        if value is not None:
+            print(f"  {name:<9} growth {describe(name, value)} (limit {describe(name, limit)})")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"renders": counters.renders, "errors": counters.errors, "failures": failures,
+                       "samples": samples}, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,31 @@
-from .engine import GoTemplateEngine
+import time as _time
 
-__all__ = ["GoTemplateEngine"]
\ No newline at end of file
+_import_started = _time.perf_counter()
+
+from .analysis import CostEstimate, CostFinding, TemplateAnalysis
+from .cache import CacheStats, RenderCache
+from .fit import FitResult
+from .client import RemoteTemplateEngine, RenderClient
+from .engine import GoTemplateEngine, StaleLibraryError
+from .limits import CancelToken, RenderLimitError, RenderLimits
+from .metrics import (OpenTelemetryMetrics, PrometheusMetrics, TelemetrySink, disable_telemetry,
+                      enable_telemetry)
+from .profile import ProfileNode, ProfileReport
+from .pool import LatencySummary, PoolOverloadedError, PoolStats, RenderPool
+from .refs import Blob, Pinned
+from .spans import Span, SpanMap
+from .reload import FileTemplateEngine
+from . import startup as _startup
+from .startup import WarmupReport, preload, warmup
+
+__all__ = ["GoTemplateEngine", "StaleLibraryError", "Blob", "RenderCache", "CacheStats",
+           "RenderLimits", "RenderLimitError", "CancelToken", "RenderPool", "PoolStats", "LatencySummary",
+           "PoolOverloadedError", "RemoteTemplateEngine", "RenderClient", "ProfileReport", "ProfileNode",
+           "FileTemplateEngine", "enable_telemetry", "disable_telemetry", "TelemetrySink", "PrometheusMetrics",
+           "OpenTelemetryMetrics", "TemplateAnalysis", "CostEstimate", "CostFinding",
+           "warmup", "preload", "WarmupReport", "FitResult", "Pinned",
+           "Span", "SpanMap"]
+
+_startup.import_seconds = _time.perf_counter() - _import_started
+# COGNIHUB_PRELOAD=1 时在后台线程中加载库并预编译模板
+_startup.preload_from_environment()
@@ -0,0 +1,7 @@
+"""``python -m cognihub_pygotemplate``: render a template over JSON Lines records."""
+import sys
+
+from .batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
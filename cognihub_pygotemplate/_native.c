@@ -0,0 +1,133 @@
+/*
+ * 可选的CPython扩展: 渲染快速路径.
+ *
+ * Calls the RenderTemplate export of the Go library directly, without
+ * ctypes argument conversion: the arguments are read in place from str or
+ * bytes objects, the GIL is released for the duration of the Go call, and
+ * the result is decoded into a str and handed back to FreeString in the same
+ * call. The extension does not link against the library: the engine passes
+ * the addresses of the exports it already loaded with ctypes to bind().
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+
+typedef char *(*render_fn)(char *template_str, char *json_data);
+typedef void (*free_fn)(char *str);
+
+/* 整个进程只加载一份Go库, 所有子解释器共享这两个函数指针 */
+static render_fn go_render = NULL;
+static free_fn go_free = NULL;
+
+/* Returns a NUL-terminated UTF-8 view of a str or bytes object without copying. */
+static const char *
+as_utf8(PyObject *obj, const char *name)
+{
+    if (PyUnicode_Check(obj)) {
+        return PyUnicode_AsUTF8AndSize(obj, NULL);
+    }
+    if (PyBytes_Check(obj)) {
+        return PyBytes_AS_STRING(obj);
+    }
+    PyErr_Format(PyExc_TypeError, "%s must be str or bytes, not %.200s", name, Py_TYPE(obj)->tp_name);
+    return NULL;
+}
+
+PyDoc_STRVAR(bind_doc,
+"bind(render, free)\n--\n\n"
+"Binds the addresses of the RenderTemplate and FreeString exports.");
+
+static PyObject *
+native_bind(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (nargs != 2) {
+        PyErr_Format(PyExc_TypeError, "bind() takes 2 arguments (%zd given)", nargs);
+        return NULL;
+    }
+    void *render = PyLong_AsVoidPtr(args[0]);
+    if (render == NULL && PyErr_Occurred()) {
+        return NULL;
+    }
+    void *release = PyLong_AsVoidPtr(args[1]);
+    if (release == NULL && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (render == NULL || release == NULL) {
+        PyErr_SetString(PyExc_ValueError, "bind() needs non-NULL function addresses");
+        return NULL;
+    }
+    go_render = (render_fn)render;
+    go_free = (free_fn)release;
+    Py_RETURN_NONE;
+}
+
+PyDoc_STRVAR(render_doc,
+"render(template, data)\n--\n\n"
+"Renders template with the JSON data and returns the result string, which may\n"
+"be an error string from the Go side. Both arguments are str or bytes.");
+
+static PyObject *
+native_render(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (nargs != 2) {
+        PyErr_Format(PyExc_TypeError, "render() takes 2 arguments (%zd given)", nargs);
+        return NULL;
+    }
+    if (go_render == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "Go renderer library is not bound");
+        return NULL;
+    }
+    const char *template_str = as_utf8(args[0], "template");
+    if (template_str == NULL) {
+        return NULL;
+    }
+    const char *json_data = as_utf8(args[1], "data");
+    if (json_data == NULL) {
+        return NULL;
+    }
+
+    char *result;
+    /* 参数对象在调用期间由调用方持有, 释放GIL后仍可安全读取 */
+    Py_BEGIN_ALLOW_THREADS
+    result = go_render((char *)template_str, (char *)json_data);
+    Py_END_ALLOW_THREADS
+
+    if (result == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "Go renderer returned NULL");
+        return NULL;
+    }
+    PyObject *rendered = PyUnicode_DecodeUTF8(result, (Py_ssize_t)strlen(result), "strict");
+    go_free(result);
+    return rendered;
+}
+
+static PyMethodDef native_methods[] = {
+    {"bind", (PyCFunction)(void (*)(void))native_bind, METH_FASTCALL, bind_doc},
+    {"render", (PyCFunction)(void (*)(void))native_render, METH_FASTCALL, render_doc},
+    {NULL, NULL, 0, NULL},
+};
+
+static PyModuleDef_Slot native_slots[] = {
+#if PY_VERSION_HEX >= 0x030C0000
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#ifdef Py_GIL_DISABLED
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL},
+};
+
+static struct PyModuleDef native_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "cognihub_pygotemplate._native",
+    .m_doc = "Low-overhead binding of the Go renderer's plain render export.",
+    .m_size = 0,
+    .m_methods = native_methods,
+    .m_slots = native_slots,
+};
+
+PyMODINIT_FUNC
+PyInit__native(void)
+{
+    return PyModuleDef_Init(&native_module);
+}
@@ -0,0 +1,312 @@
+"""模板静态代价估算.
+
+:meth:`GoTemplateEngine.analyze` asks Go for the structure of a parsed
+template: per definition, the static text, the data paths it prints and the
+``range``/``if``/``with``/``template`` nodes nested in it, plus findings about
+constructs that multiply work or output with the size of the data.
+:meth:`TemplateAnalysis.estimate` combines that structure with cheap
+statistics of the actual data (list lengths, string sizes, sampled elements)
+into a :class:`CostEstimate` without rendering, so expensive renders can be
+routed or rejected before they take a worker.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .refs import Blob, Pinned
+
+# 与Go端 wildcardField 一致: 只有执行时才知道的键或下标
+_WILDCARD = "[]"
+# 打印非字符串值时的大致字节数
+_NONE_BYTES = len("<no value>")
+_BOOL_BYTES = 5
+# 估算容器打印大小时的最大递归深度
+_MAX_SIZE_DEPTH = 4
+
+
+@dataclass(frozen=True)
+class CostFinding:
+    """A construct that can multiply the work or output of a render."""
+    kind: str
+    template: str
+    line: int
+    detail: str
+
+    @property
+    def location(self) -> str:
+        return f"{self.template}:{self.line}"
+
+
+@dataclass(frozen=True)
+class CostEstimate:
+    """
+    Estimated cost of one render.
+
+    ``iterations`` counts ``range`` iterations, which is what
+    ``RenderLimits.max_range_iterations`` limits; ``output_bytes`` is the
+    approximate size of the output; ``actions`` the number of actions and
+    control nodes executed. Conditionals are assumed to take their more
+    expensive branch. ``unknown`` counts the ranges and outputs that could not
+    be sized from the data (function results, ranges over computed values);
+    ``truncated`` is set when template calls were nested too deep to follow.
+    """
+    output_bytes: int
+    iterations: int
+    actions: int
+    unknown: int = 0
+    truncated: bool = False
+
+    @property
+    def cost(self) -> int:
+        """A single figure for routing: executed nodes plus output bytes."""
+        return self.iterations + self.actions + self.output_bytes
+
+
+class _Cost:
+    """Mutable accumulator used while estimating."""
+    __slots__ = ("output", "iterations", "actions", "unknown")
+
+    def __init__(self) -> None:
+        self.output = 0.0
+        self.iterations = 0.0
+        self.actions = 0.0
+        self.unknown = 0
+
+    def add(self, other: "_Cost", times: float = 1.0) -> None:
+        self.output += other.output * times
+        self.iterations += other.iterations * times
+        self.actions += other.actions * times
+        self.unknown += other.unknown
+
+    def key(self) -> float:
+        return self.output + self.iterations + self.actions
+
+
+@dataclass(frozen=True)
+class TemplateAnalysis:
+    """
+    Static structure of a template, as returned by :meth:`GoTemplateEngine.analyze`.
+
+    ``ranges`` is the number of ``range`` nodes and ``max_range_depth`` their
+    deepest nesting; ``calls`` lists the templates invoked with ``template``.
+    """
+    main: str
+    ranges: int
+    max_range_depth: int
+    calls: List[str]
+    recursive: bool
+    findings: List[CostFinding]
+    templates: Dict[str, Dict[str, Any]] = field(repr=False)
+
+    @classmethod
+    def from_json(cls, document: Dict[str, Any]) -> "TemplateAnalysis":
+        return cls(
+            main=document["main"], ranges=document["ranges"], max_range_depth=document["max_range_depth"],
+            calls=document["calls"], recursive=document["recursive"],
+            findings=[CostFinding(**f) for f in document["findings"]], templates=document["templates"],
+        )
+
+    def estimate(self, data: Any, sample: int = 8, unknown_length: int = 16,
+                 max_call_depth: int = 32) -> CostEstimate:
+        """
+        Estimates the cost of rendering ``data``.
+
+        Range bodies are sized on up to ``sample`` randomly chosen elements and
+        scaled to the collection length, so the work does not grow with the
+        data. Ranges over values that cannot be located in the data are
+        assumed to have ``unknown_length`` elements.
+        """
+        if sample <= 0:
+            raise ValueError("sample must be positive")
+        estimator = _Estimator(self.templates, sample, unknown_length, max_call_depth)
+        cost = estimator.block(self.templates[self.main], [data], 0)
+        return CostEstimate(output_bytes=int(cost.output), iterations=int(cost.iterations),
+                            actions=int(cost.actions), unknown=cost.unknown, truncated=estimator.truncated)
+
+
+def _sample(items: Sequence[Any], k: int) -> List[Any]:
+    n = len(items)
+    if n <= k:
+        return list(items)
+    # 等距抽样会与周期性数据(如轮流出现的角色)混叠; 以长度为种子随机抽样, 结果可复现
+    return [items[i] for i in sorted(random.Random(n).sample(range(n), k))]
+
+
+def _elements(value: Any) -> Optional[Sequence[Any]]:
+    """The elements a ``range`` over value visits, or None if it is not iterable."""
+    if isinstance(value, (list, tuple)):
+        return value
+    if isinstance(value, dict):
+        # Go按键排序遍历map, 顺序不影响估算
+        return list(value.values())
+    return None
+
+
+def _unpinned(value: Any) -> Any:
+    """The value a pinned handle stands for; Go resolves it before executing."""
+    while isinstance(value, Pinned):
+        value = value.value
+    return value
+
+
+def _truthy(value: Any) -> bool:
+    """Go template truth: false, 0, nil and empty strings or collections are false."""
+    if isinstance(value, Blob):
+        return len(value) > 0
+    return bool(value)
+
+
+class _Estimator:
+
+    def __init__(self, templates: Dict[str, Dict[str, Any]], sample: int, unknown_length: int,
+                 max_call_depth: int):
+        self.templates = templates
+        self.sample = sample
+        self.unknown_length = unknown_length
+        self.max_call_depth = max_call_depth
+        self.truncated = False
+
+    def resolve(self, path: Dict[str, Any], scopes: List[Any]) -> Any:
+        scope = path["scope"]
+        if scope >= len(scopes):
+            return None
+        value = _unpinned(scopes[scope])
+        # 直接打印变量时Go端的字段列表为 null
+        for name in path["fields"] or ():
+            if name == _WILDCARD:
+                elements = _elements(value)
+                value = elements[len(elements) // 2] if elements else None
+            elif isinstance(value, dict):
+                value = value.get(name)
+            else:
+                return None
+            value = _unpinned(value)
+        return value
+
+    def size(self, value: Any, depth: int = 0) -> float:
+        """Approximate number of bytes Go prints for value."""
+        if isinstance(value, str):
+            # 纯ASCII字符串的判断是O(1)的, 其余按UTF-8编码计算字节数
+            return len(value) if value.isascii() else len(value.encode("utf-8", "surrogatepass"))
+        if isinstance(value, Blob):
+            return len(value)
+        if isinstance(value, Pinned):
+            return self.size(value.value, depth)
+        if value is None:
+            return _NONE_BYTES
+        if isinstance(value, bool):
+            return _BOOL_BYTES
+        if isinstance(value, (int, float)):
+            return len(str(value))
+        elements = _elements(value)
+        if elements is None:
+            return len(str(value))
+        if not elements:
+            return 2
+        if depth >= _MAX_SIZE_DEPTH:
+            return 2 * len(elements)
+        # "[a b]" 或 "map[k:v]": 元素之间的分隔符外加抽样元素的平均大小
+        picked = _sample(elements, self.sample)
+        average = sum(self.size(v, depth + 1) for v in picked) / len(picked)
+        if isinstance(value, dict):
+            average += sum(len(str(k)) + 1 for k in _sample(list(value), self.sample)) / len(picked)
+        return 2 + len(elements) * (average + 1)
+
+    def block(self, block: Dict[str, Any], scopes: List[Any], depth: int) -> _Cost:
+        cost = _Cost()
+        cost.output = block["text"] + block["const"]
+        cost.actions = block["actions"]
+        cost.unknown = block["dynamic"]
+        for path in block["prints"]:
+            cost.output += self.size(self.resolve(path, scopes))
+        for child in block["children"]:
+            cost.add(self.child(child, scopes, depth))
+        return cost
+
+    def child(self, child: Dict[str, Any], scopes: List[Any], depth: int) -> _Cost:
+        kind = child["kind"]
+        path = child["path"]
+        value = self.resolve(path, scopes) if path is not None else None
+        if kind == "if":
+            taken = self.decide(child, path, value, scopes)
+            if taken is None:
+                # 条件无法由数据判定时取代价较高的一支
+                return max((self.block(b, scopes, depth) for b in (child.get("body"), child.get("else")) if b),
+                           key=_Cost.key, default=_Cost())
+            branch = child.get("body") if taken else child.get("else")
+            return self.block(branch, scopes, depth) if branch else _Cost()
+        if kind == "with":
+            if value or path is None:
+                cost = self.block(child["body"], self.bind(scopes, child["scope"], value), depth)
+                if path is None:
+                    cost.unknown += 1
+                return cost
+            return self.block(child["else"], scopes, depth) if child.get("else") else _Cost()
+        if kind == "range":
+            return self.range(child, path, value, scopes, depth)
+        if kind == "template":
+            body = self.templates.get(child["name"])
+            if body is None:
+                return _Cost()
+            if depth >= self.max_call_depth:
+                self.truncated = True
+                return _Cost()
+            return self.block(body, [value], depth + 1)
+        return _Cost()
+
+    def decide(self, child: Dict[str, Any], path: Optional[Dict[str, Any]], value: Any,
+               scopes: List[Any]) -> Optional[bool]:
+        """Outcome of an if condition, or None when it depends on more than the data."""
+        if path is not None:
+            return _truthy(value)
+        test = child.get("test")
+        return self.evaluate(test, scopes) if test is not None else None
+
+    def evaluate(self, test: Dict[str, Any], scopes: List[Any]) -> bool:
+        op = test["op"]
+        if op == "not":
+            return not self.evaluate(test["tests"][0], scopes)
+        if op == "and":
+            return all(self.evaluate(t, scopes) for t in test["tests"])
+        if op == "or":
+            return any(self.evaluate(t, scopes) for t in test["tests"])
+        operand = self.resolve(test["path"], scopes)
+        if op == "truth":
+            return _truthy(operand)
+        if isinstance(operand, Blob):
+            operand = operand.value
+        # bool 是 int 的子类, 不能与数字相等
+        matched = any(operand is v if isinstance(v, bool) or isinstance(operand, bool) else operand == v
+                      for v in test["values"])
+        return matched if op == "eq" else not matched
+
+    def range(self, child: Dict[str, Any], path: Optional[Dict[str, Any]], value: Any,
+              scopes: List[Any], depth: int) -> _Cost:
+        cost = _Cost()
+        if path is None:
+            # 集合无法在数据中定位, 按假定长度估算
+            elements: Sequence[Any] = [None]
+            length = self.unknown_length
+            cost.unknown += 1
+        else:
+            elements = _elements(value) or []
+            length = len(elements)
+        if not length:
+            return self.block(child["else"], scopes, depth) if child.get("else") else cost
+        picked = _sample(elements, self.sample)
+        body = _Cost()
+        unknown = 0
+        for element in picked:
+            sampled = self.block(child["body"], self.bind(scopes, child["scope"], element), depth)
+            # 未知项按结构计数, 不随抽样次数累加
+            unknown = max(unknown, sampled.unknown)
+            body.add(sampled)
+        body.unknown = unknown
+        cost.add(body, length / len(picked))
+        cost.iterations += length
+        return cost
+
+    @staticmethod
+    def bind(scopes: List[Any], scope: int, value: Any) -> List[Any]:
+        """Scopes of a range or with body, whose dot is value."""
+        return scopes[:scope] + [value]
@@ -0,0 +1,562 @@
+package main
+
+import "C"
+import (
+	"encoding/json"
+	"fmt"
+	"sort"
+	"strconv"
+	"strings"
+	"text/template/parse"
+)
+
+// costPath locates a value in the render data. Scope is the index of the
+// scope the path starts from: 0 is the data the template was executed with,
+// k > 0 the element or value bound by the k-th nested range or with. Fields
+// are map keys; wildcardField stands for an element whose key or index is
+// only known at execution time.
+type costPath struct {
+	Scope  int      `json:"scope"`
+	Fields []string `json:"fields"`
+}
+
+const wildcardField = "[]"
+
+// indexValue is bound to range index variables: a number, not a data value.
+var indexValue = &costPath{Scope: -1}
+
+func (p *costPath) with(fields ...string) *costPath {
+	return &costPath{Scope: p.Scope, Fields: append(append([]string(nil), p.Fields...), fields...)}
+}
+
+func (p *costPath) String() string {
+	root := "$"
+	if p.Scope > 0 {
+		root = fmt.Sprintf("$%d", p.Scope)
+	}
+	if len(p.Fields) == 0 {
+		return root
+	}
+	return root + "." + strings.Join(p.Fields, ".")
+}
+
+// costBlock summarizes a list of nodes: the bytes it always emits, the values
+// it prints and the control structures nested in it.
+type costBlock struct {
+	Text     int          `json:"text"`
+	Const    int          `json:"const"`
+	Actions  int          `json:"actions"`
+	Prints   []*costPath  `json:"prints"`
+	Dynamic  int          `json:"dynamic"`
+	Children []*costChild `json:"children"`
+}
+
+// costChild is an if, range, with or template call. Range and with bodies
+// run in a new scope numbered Scope whose value is Path; Path is nil when the
+// value cannot be located statically.
+type costChild struct {
+	Kind  string     `json:"kind"`
+	Line  int        `json:"line"`
+	Path  *costPath  `json:"path"`
+	Test  *costTest  `json:"test,omitempty"`
+	Scope int        `json:"scope,omitempty"`
+	Name  string     `json:"name,omitempty"`
+	Body  *costBlock `json:"body,omitempty"`
+	Else  *costBlock `json:"else,omitempty"`
+}
+
+// costTest is an if condition that can be decided from the data. Op "truth"
+// tests the value at Path, "eq" and "ne" compare it with literal Values, and
+// "not", "and" and "or" combine Tests.
+type costTest struct {
+	Op     string        `json:"op"`
+	Path   *costPath     `json:"path,omitempty"`
+	Values []interface{} `json:"values,omitempty"`
+	Tests  []*costTest   `json:"tests,omitempty"`
+}
+
+// costFinding flags a construct that can multiply the work or output of a
+// render with the size of the data.
+type costFinding struct {
+	Kind     string `json:"kind"`
+	Template string `json:"template"`
+	Line     int    `json:"line"`
+	Detail   string `json:"detail"`
+}
+
+type templateAnalysis struct {
+	Main          string                `json:"main"`
+	Templates     map[string]*costBlock `json:"templates"`
+	Ranges        int                   `json:"ranges"`
+	MaxRangeDepth int                   `json:"max_range_depth"`
+	Calls         []string              `json:"calls"`
+	Recursive     bool                  `json:"recursive"`
+	Findings      []costFinding         `json:"findings"`
+}
+
+// 常见函数输出的大致字节数
+const (
+	boolOutputBytes    = 5
+	numberOutputBytes  = 4
+	unknownOutputBytes = 8
+)
+
+// analyzer walks the parse tree of one template definition.
+type analyzer struct {
+	tree   *parse.Tree
+	result *templateAnalysis
+	calls  map[string]bool
+	// vars maps variable names to the value they hold, nil for values that
+	// are not in the data (indexes, function results).
+	vars map[string]*costPath
+	// scope is the index of the current dot, which is always the innermost
+	// open scope; ranges holds the scopes and collections of the enclosing ranges.
+	scope  int
+	ranges []rangeFrame
+}
+
+type rangeFrame struct {
+	scope int
+	path  *costPath
+}
+
+func analyzeTemplate(src string) (*templateAnalysis, error) {
+	tmpl, err := getTemplate(src, variantPlain)
+	if err != nil {
+		return nil, err
+	}
+	result := &templateAnalysis{Main: tmpl.Name(), Templates: map[string]*costBlock{},
+		Calls: []string{}, Findings: []costFinding{}}
+	graph := map[string]map[string]bool{}
+	templates := tmpl.Templates()
+	sort.Slice(templates, func(i, j int) bool { return templates[i].Name() < templates[j].Name() })
+	for _, t := range templates {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		a := &analyzer{tree: t.Tree, result: result, calls: map[string]bool{},
+			vars: map[string]*costPath{"$": {Fields: []string{}}}}
+		result.Templates[t.Name()] = a.list(t.Tree.Root)
+		graph[t.Name()] = a.calls
+	}
+	called := map[string]bool{}
+	for _, calls := range graph {
+		for name := range calls {
+			called[name] = true
+		}
+	}
+	for name := range called {
+		result.Calls = append(result.Calls, name)
+	}
+	sort.Strings(result.Calls)
+	for _, name := range result.Calls {
+		if reaches(graph, name, name, map[string]bool{}) {
+			result.Recursive = true
+			result.Findings = append(result.Findings, costFinding{
+				Kind: "recursive_template", Template: name, Detail: fmt.Sprintf("template %q calls itself", name)})
+		}
+	}
+	return result, nil
+}
+
+// reaches reports whether template from calls target, directly or not.
+func reaches(graph map[string]map[string]bool, from, target string, seen map[string]bool) bool {
+	for name := range graph[from] {
+		if name == target {
+			return true
+		}
+		if !seen[name] {
+			seen[name] = true
+			if reaches(graph, name, target, seen) {
+				return true
+			}
+		}
+	}
+	return false
+}
+
+func (a *analyzer) line(n parse.Node) int {
+	// ErrorContext 返回 "名称:行:列"
+	location, _ := a.tree.ErrorContext(n)
+	parts := strings.Split(location, ":")
+	if len(parts) < 3 {
+		return 0
+	}
+	line, _ := strconv.Atoi(parts[len(parts)-2])
+	return line
+}
+
+func (a *analyzer) finding(kind string, n parse.Node, detail string) {
+	a.result.Findings = append(a.result.Findings, costFinding{
+		Kind: kind, Template: a.tree.Name, Line: a.line(n), Detail: detail})
+}
+
+func (a *analyzer) list(list *parse.ListNode) *costBlock {
+	block := &costBlock{Prints: []*costPath{}, Children: []*costChild{}}
+	if list == nil {
+		return block
+	}
+	for _, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.TextNode:
+			block.Text += len(node.Text)
+		case *parse.ActionNode:
+			block.Actions++
+			a.declare(node.Pipe, nil)
+			if len(node.Pipe.Decl) == 0 {
+				a.print(block, node, node.Pipe)
+			}
+		case *parse.IfNode:
+			block.Actions++
+			block.Children = append(block.Children, a.branch("if", node, &node.BranchNode, false))
+		case *parse.WithNode:
+			block.Actions++
+			block.Children = append(block.Children, a.branch("with", node, &node.BranchNode, true))
+		case *parse.RangeNode:
+			block.Actions++
+			block.Children = append(block.Children, a.rangeNode(node))
+		case *parse.TemplateNode:
+			block.Actions++
+			a.calls[node.Name] = true
+			if len(a.ranges) > 0 {
+				a.finding("template_in_range", node, fmt.Sprintf("template %q is executed once per iteration", node.Name))
+			}
+			block.Children = append(block.Children, &costChild{
+				Kind: "template", Line: a.line(node), Name: node.Name, Path: a.pipeValue(node.Pipe)})
+		}
+	}
+	return block
+}
+
+// print records what an action emits.
+func (a *analyzer) print(block *costBlock, node parse.Node, pipe *parse.PipeNode) {
+	paths, size, dynamic := a.pipeOutput(pipe.Cmds)
+	block.Const += size
+	block.Dynamic += dynamic
+	for _, p := range paths {
+		block.Prints = append(block.Prints, p)
+		if n := len(a.ranges); n > 0 && p.Scope < a.ranges[n-1].scope {
+			a.finding("outer_value_in_range", node,
+				fmt.Sprintf("%s is printed once per iteration of the enclosing range", p))
+		}
+	}
+}
+
+// branch analyzes if and with; with binds its value to a new scope.
+func (a *analyzer) branch(kind string, node parse.Node, b *parse.BranchNode, bindsDot bool) *costChild {
+	child := &costChild{Kind: kind, Line: a.line(node), Path: a.pipeValue(b.Pipe)}
+	if child.Path == nil && !bindsDot {
+		child.Test = a.condition(b.Pipe)
+	}
+	saved, savedScope := a.enter()
+	if bindsDot {
+		a.scope++
+		child.Scope = a.scope
+		a.declare(b.Pipe, &costPath{Scope: a.scope, Fields: []string{}})
+	} else {
+		a.declare(b.Pipe, nil)
+	}
+	child.Body = a.list(b.List)
+	a.vars, a.scope = saved, savedScope
+	if b.ElseList != nil {
+		saved, savedScope = a.enter()
+		child.Else = a.list(b.ElseList)
+		a.vars, a.scope = saved, savedScope
+	}
+	return child
+}
+
+func (a *analyzer) rangeNode(node *parse.RangeNode) *costChild {
+	child := &costChild{Kind: "range", Line: a.line(node), Path: a.pipeValue(node.Pipe)}
+	a.result.Ranges++
+	if depth := len(a.ranges) + 1; depth > a.result.MaxRangeDepth {
+		a.result.MaxRangeDepth = depth
+	}
+	if len(a.ranges) > 0 {
+		a.finding("nested_range", node, fmt.Sprintf("range nested %d deep", len(a.ranges)+1))
+	}
+	if child.Path != nil {
+		for _, outer := range a.ranges {
+			if outer.path != nil && samePath(outer.path, child.Path) {
+				a.finding("quadratic_range", node,
+					fmt.Sprintf("%s is iterated inside an iteration over itself", child.Path))
+			}
+		}
+	}
+	saved, savedScope := a.enter()
+	a.scope++
+	child.Scope = a.scope
+	// range $i, $e := ... 绑定索引和元素; 只有一个变量时绑定元素
+	element := &costPath{Scope: a.scope, Fields: []string{}}
+	switch len(node.Pipe.Decl) {
+	case 1:
+		a.vars[node.Pipe.Decl[0].Ident[0]] = element
+	case 2:
+		a.vars[node.Pipe.Decl[0].Ident[0]] = indexValue
+		a.vars[node.Pipe.Decl[1].Ident[0]] = element
+	}
+	a.ranges = append(a.ranges, rangeFrame{a.scope, child.Path})
+	child.Body = a.list(node.List)
+	a.ranges = a.ranges[:len(a.ranges)-1]
+	a.vars, a.scope = saved, savedScope
+	if node.ElseList != nil {
+		saved, savedScope = a.enter()
+		child.Else = a.list(node.ElseList)
+		a.vars, a.scope = saved, savedScope
+	}
+	return child
+}
+
+// enter saves the variables and dot; variables declared inside a control
+// structure go out of scope at its end.
+func (a *analyzer) enter() (map[string]*costPath, int) {
+	saved := a.vars
+	a.vars = make(map[string]*costPath, len(saved))
+	for k, v := range saved {
+		a.vars[k] = v
+	}
+	return saved, a.scope
+}
+
+// declare binds the variables declared by pipe to value, or to the value of
+// the pipeline itself when value is nil.
+func (a *analyzer) declare(pipe *parse.PipeNode, value *costPath) {
+	if pipe == nil || len(pipe.Decl) == 0 {
+		return
+	}
+	if value == nil {
+		value = a.pipeValue(pipe)
+	}
+	for _, v := range pipe.Decl {
+		a.vars[v.Ident[0]] = value
+	}
+}
+
+// condition recognizes conditions decidable from the data: the truth of a
+// data value, eq and ne against literals, and not, and and or over those.
+func (a *analyzer) condition(pipe *parse.PipeNode) *costTest {
+	if pipe == nil || len(pipe.Cmds) != 1 {
+		return nil
+	}
+	return a.conditionArgs(pipe.Cmds[0].Args)
+}
+
+func (a *analyzer) conditionArgs(args []parse.Node) *costTest {
+	if len(args) == 1 {
+		return a.conditionNode(args[0])
+	}
+	ident, ok := args[0].(*parse.IdentifierNode)
+	if !ok || len(args) < 2 {
+		return nil
+	}
+	switch ident.Ident {
+	case "not":
+		if inner := a.conditionNode(args[1]); inner != nil && len(args) == 2 {
+			return &costTest{Op: "not", Tests: []*costTest{inner}}
+		}
+	case "and", "or":
+		test := &costTest{Op: ident.Ident}
+		for _, arg := range args[1:] {
+			inner := a.conditionNode(arg)
+			if inner == nil {
+				return nil
+			}
+			test.Tests = append(test.Tests, inner)
+		}
+		return test
+	case "eq", "ne":
+		path := a.nodeValue(args[1])
+		if path == nil || len(args) < 3 || ident.Ident == "ne" && len(args) != 3 {
+			return nil
+		}
+		test := &costTest{Op: ident.Ident, Path: path}
+		for _, arg := range args[2:] {
+			switch lit := arg.(type) {
+			case *parse.StringNode:
+				test.Values = append(test.Values, lit.Text)
+			case *parse.BoolNode:
+				test.Values = append(test.Values, lit.True)
+			case *parse.NumberNode:
+				if !lit.IsFloat {
+					return nil
+				}
+				test.Values = append(test.Values, lit.Float64)
+			default:
+				return nil
+			}
+		}
+		return test
+	}
+	return nil
+}
+
+func (a *analyzer) conditionNode(n parse.Node) *costTest {
+	if pipe, ok := n.(*parse.PipeNode); ok {
+		return a.condition(pipe)
+	}
+	if path := a.nodeValue(n); path != nil {
+		return &costTest{Op: "truth", Path: path}
+	}
+	return nil
+}
+
+func samePath(x, y *costPath) bool {
+	return x.Scope == y.Scope && strings.Join(x.Fields, "\x00") == strings.Join(y.Fields, "\x00")
+}
+
+// pipeValue returns where the value of a pipeline lives in the data, or nil.
+func (a *analyzer) pipeValue(pipe *parse.PipeNode) *costPath {
+	if pipe == nil || len(pipe.Cmds) == 0 {
+		return nil
+	}
+	return a.cmdValue(pipe.Cmds[len(pipe.Cmds)-1], pipe.Cmds[:len(pipe.Cmds)-1])
+}
+
+// cmdValue returns the value of cmd; prev are the commands piped into it.
+func (a *analyzer) cmdValue(cmd *parse.CommandNode, prev []*parse.CommandNode) *costPath {
+	if len(cmd.Args) == 0 {
+		return nil
+	}
+	switch arg := cmd.Args[0].(type) {
+	case *parse.IdentifierNode:
+		args := cmd.Args[1:]
+		var piped *costPath
+		if len(prev) > 0 {
+			piped = a.cmdValue(prev[len(prev)-1], prev[:len(prev)-1])
+		}
+		switch arg.Ident {
+		case "index":
+			if len(args) == 0 {
+				return nil
+			}
+			base := a.nodeValue(args[0])
+			if base == nil {
+				return nil
+			}
+			for _, key := range args[1:] {
+				if s, ok := key.(*parse.StringNode); ok {
+					base = base.with(s.Text)
+				} else {
+					base = base.with(wildcardField)
+				}
+			}
+			return base
+		case "slice":
+			if len(args) > 0 {
+				return a.nodeValue(args[0])
+			}
+			return piped
+		}
+		return nil
+	default:
+		return a.nodeValue(arg)
+	}
+}
+
+// nodeValue returns where the value of a command argument lives, or nil.
+func (a *analyzer) nodeValue(n parse.Node) *costPath {
+	switch node := n.(type) {
+	case *parse.DotNode:
+		return &costPath{Scope: a.scope, Fields: []string{}}
+	case *parse.FieldNode:
+		return (&costPath{Scope: a.scope}).with(node.Ident...)
+	case *parse.VariableNode:
+		base, ok := a.vars[node.Ident[0]]
+		if !ok || base == nil || base == indexValue {
+			return nil
+		}
+		return base.with(node.Ident[1:]...)
+	case *parse.ChainNode:
+		var base *costPath
+		switch inner := node.Node.(type) {
+		case *parse.PipeNode:
+			base = a.pipeValue(inner)
+		default:
+			base = a.nodeValue(inner)
+		}
+		if base == nil {
+			return nil
+		}
+		return base.with(node.Field...)
+	case *parse.PipeNode:
+		return a.pipeValue(node)
+	}
+	return nil
+}
+
+// pipeOutput estimates what printing the pipeline emits: values from the
+// data whose size is added at estimation time, a constant byte count, and
+// the number of outputs that could not be estimated at all.
+func (a *analyzer) pipeOutput(cmds []*parse.CommandNode) ([]*costPath, int, int) {
+	if len(cmds) == 0 {
+		return nil, 0, 0
+	}
+	cmd, prev := cmds[len(cmds)-1], cmds[:len(cmds)-1]
+	if value := a.cmdValue(cmd, prev); value != nil {
+		return []*costPath{value}, 0, 0
+	}
+	if len(cmd.Args) == 0 {
+		return nil, 0, 0
+	}
+	switch arg := cmd.Args[0].(type) {
+	case *parse.StringNode:
+		return nil, len(arg.Text), 0
+	case *parse.NumberNode:
+		return nil, len(arg.Text), 0
+	case *parse.BoolNode:
+		return nil, boolOutputBytes, 0
+	case *parse.VariableNode:
+		if a.vars[arg.Ident[0]] == indexValue && len(arg.Ident) == 1 {
+			return nil, numberOutputBytes, 0
+		}
+	case *parse.PipeNode:
+		return a.pipeOutput(arg.Cmds)
+	case *parse.IdentifierNode:
+		switch arg.Ident {
+		case "print", "printf", "println", "html", "js", "urlquery":
+			var paths []*costPath
+			size := 0
+			dynamic := 0
+			for _, n := range cmd.Args[1:] {
+				if s, ok := n.(*parse.StringNode); ok {
+					size += len(s.Text)
+				} else if p := a.nodeValue(n); p != nil {
+					paths = append(paths, p)
+				} else if inner, ok := n.(*parse.PipeNode); ok {
+					ps, s, d := a.pipeOutput(inner.Cmds)
+					paths, size, dynamic = append(paths, ps...), size+s, dynamic+d
+				} else {
+					size += unknownOutputBytes
+				}
+			}
+			if len(prev) > 0 {
+				ps, s, d := a.pipeOutput(prev)
+				paths, size, dynamic = append(paths, ps...), size+s, dynamic+d
+			}
+			return paths, size, dynamic
+		case "len":
+			return nil, numberOutputBytes, 0
+		case "eq", "ne", "lt", "le", "gt", "ge", "and", "or", "not":
+			return nil, boolOutputBytes, 0
+		}
+	}
+	return nil, unknownOutputBytes, 1
+}
+
+// AnalyzeTemplate parses a template and returns a JSON description of its
+// structure for static cost estimation: per definition, the static text,
+// printed data paths and nested ranges, conditionals and template calls,
+// plus findings about constructs that amplify work or output.
+//
+//export AnalyzeTemplate
+func AnalyzeTemplate(templateStr *C.char) *C.char {
+	result, err := analyzeTemplate(C.GoString(templateStr))
+	if err != nil {
+		return storeString((&renderError{"TEMPLATE_PARSE_ERROR", err}).Error())
+	}
+	out, err := json.Marshal(result)
+	if err != nil {
+		return storeString("JSON_ERROR: " + err.Error())
+	}
+	return storeString(string(out))
+}
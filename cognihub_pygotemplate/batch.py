@@ -0,0 +1,329 @@
+"""JSONL批量渲染命令行工具.
+
+Renders one template over a stream of JSON Lines records, one render per
+record, and writes the outputs in input order::
+
+    python -m cognihub_pygotemplate -t chat.gotmpl records.jsonl > prompts.txt
+    cat records.jsonl | python -m cognihub_pygotemplate -t chat.gotmpl --format jsonl -o out.jsonl
+    python -m cognihub_pygotemplate -t chat.gotmpl -o 'out/part-{shard:05d}.txt' --shard-size 100000 a.jsonl b.jsonl
+    python -m cognihub_pygotemplate -t chat.gotmpl --bench records.jsonl
+
+Records are handed to Go as the raw JSON line, without decoding and
+re-encoding them in Python, in chunks rendered by a pool of threads; the GIL
+is released while Go renders. At most ``2 * workers`` chunks are in flight, so
+memory stays bounded however long the input is.
+"""
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, BinaryIO, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .engine import GoTemplateEngine
+from .limits import RenderLimits
+from .pool import LatencySummary
+
+ON_ERROR_FAIL = "fail"
+ON_ERROR_SKIP = "skip"
+
+
+class Record(NamedTuple):
+    """One input line: where it came from and its raw JSON bytes."""
+    source: str
+    line: int
+    payload: bytes
+
+
+class Rendered(NamedTuple):
+    """The outcome of rendering one record; exactly one of output and error is set."""
+    record: Record
+    output: Optional[str]
+    error: Optional[ValueError]
+    seconds: float
+
+
+class BatchStats(NamedTuple):
+    """Totals of a batch run."""
+    records: int
+    errors: int
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+    latency: LatencySummary
+
+    def to_dict(self) -> dict:
+        return {
+            "records": self.records, "errors": self.errors, "seconds": self.seconds,
+            "records_per_second": self.records / self.seconds if self.seconds else 0.0,
+            "input_mb_per_second": self.input_bytes / 2**20 / self.seconds if self.seconds else 0.0,
+            "output_mb_per_second": self.output_bytes / 2**20 / self.seconds if self.seconds else 0.0,
+            "input_bytes": self.input_bytes, "output_bytes": self.output_bytes,
+            "latency": self.latency._asdict(),
+        }
+
+
+class BatchRenderError(ValueError):
+    """Raised when a record fails to render and errors are not skipped."""
+
+    def __init__(self, record: Record, error: ValueError):
+        super().__init__(f"{record.source}:{record.line}: {error}")
+        self.record = record
+        self.error = error
+
+
+def read_records(sources: Iterable[Tuple[str, BinaryIO]]) -> Iterator[Record]:
+    """Yields the non-blank lines of every source, in order."""
+    for name, stream in sources:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield Record(name, number, line)
+
+
+def _chunks(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _render_chunk(engine: GoTemplateEngine, template_bytes: bytes, limits: Optional[RenderLimits],
+                  chunk: List[Record]) -> List[Rendered]:
+    results = []
+    clock = time.perf_counter
+    for record in chunk:
+        started = clock()
+        try:
+            # 输入行本身就是JSON, 直接交给Go解码
+            output: Optional[str] = engine._render_encoded(template_bytes, record.payload, None, limits)
+            error = None
+        except ValueError as e:
+            output, error = None, e
+        results.append(Rendered(record, output, error, clock() - started))
+    return results
+
+
+def render_records(engine: GoTemplateEngine, records: Iterable[Record], workers: int = 0, chunk_size: int = 256,
+                   limits: Optional[RenderLimits] = None) -> Iterator[Rendered]:
+    """
+    Renders every record with ``engine`` and yields the results in input order.
+
+    Rendering runs on ``workers`` threads (the CPU count by default) in chunks
+    of ``chunk_size`` records. Render errors are yielded, not raised. The
+    engine's cache and telemetry are bypassed.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    workers = workers or os.cpu_count() or 1
+    GoTemplateEngine.ensure_loaded()
+    template_bytes = engine.template_content.encode("utf-8")
+    limits = engine._effective_limits(limits)
+    chunks = _chunks(iter(records), chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from _render_chunk(engine, template_bytes, limits, chunk)
+        return
+
+    pending: Deque["Future[List[Rendered]]"] = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-render") as executor:
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_render_chunk, engine, template_bytes, limits, chunk))
+                # 限制在途分块数量, 输入再长内存也有界
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class ShardedWriter:
+    """
+    Writes outputs to stdout, one file or numbered shards of ``shard_size`` records.
+
+    ``pattern`` is formatted with ``shard`` (starting at 0) when sharding.
+    """
+
+    def __init__(self, pattern: Optional[str], shard_size: int = 0, stream: Optional[BinaryIO] = None):
+        if shard_size and not pattern:
+            raise ValueError("sharded output needs an output pattern")
+        if shard_size and pattern is not None:
+            try:
+                varies = pattern.format(shard=0) != pattern.format(shard=1)
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"invalid output pattern {pattern!r}: {e}") from None
+            if not varies:
+                raise ValueError("the output pattern must contain '{shard}' when sharding")
+        self.pattern = pattern
+        self.shard_size = shard_size
+        self.paths: List[str] = []
+        self._stream = stream
+        self._file: Optional[IO[bytes]] = None
+        self._count = 0
+
+    def write(self, data: bytes) -> None:
+        if self._file is None or (self.shard_size and self._count == self.shard_size):
+            self._open_next()
+        assert self._file is not None
+        self._file.write(data)
+        self._count += 1
+
+    def _open_next(self) -> None:
+        if self.pattern is None:
+            self._file = self._stream if self._stream is not None else sys.stdout.buffer
+            return
+        self._close_file()
+        path = self.pattern.format(shard=len(self.paths)) if self.shard_size else self.pattern
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        self.paths.append(path)
+        self._count = 0
+
+    def _close_file(self) -> None:
+        if self._file is not None and self.pattern is not None:
+            self._file.close()
+        self._file = None
+
+    def close(self) -> None:
+        if self._file is not None and self.pattern is None:
+            self._file.flush()
+        self._close_file()
+
+
+def run(engine: GoTemplateEngine, records: Iterable[Record], writer: Optional[ShardedWriter], *,
+        workers: int = 0, chunk_size: int = 256, limits: Optional[RenderLimits] = None,
+        output_format: str = "text", separator: str = "\n", on_error: str = ON_ERROR_FAIL,
+        errors: Optional[IO[str]] = None) -> BatchStats:
+    """
+    Renders ``records`` and writes each output followed by ``separator``.
+
+    With ``output_format="jsonl"`` every output is written as a JSON object
+    ``{"output": ...}`` on its own line. ``writer`` None discards the outputs.
+    A failing record raises :class:`BatchRenderError` after the outputs before
+    it are written, or with ``on_error="skip"`` is reported on ``errors`` and
+    left out.
+    """
+    if on_error not in (ON_ERROR_FAIL, ON_ERROR_SKIP):
+        raise ValueError(f"on_error must be '{ON_ERROR_FAIL}' or '{ON_ERROR_SKIP}'")
+    sep = separator.encode("utf-8")
+    latencies = array("d")
+    count = failed = input_bytes = output_bytes = 0
+    start = time.perf_counter()
+    for result in render_records(engine, records, workers, chunk_size, limits):
+        count += 1
+        input_bytes += len(result.record.payload)
+        latencies.append(result.seconds)
+        if result.error is not None:
+            failed += 1
+            if on_error == ON_ERROR_FAIL:
+                raise BatchRenderError(result.record, result.error)
+            print(f"{result.record.source}:{result.record.line}: {result.error}", file=errors or sys.stderr)
+            continue
+        assert result.output is not None
+        if output_format == "jsonl":
+            data = json.dumps({"output": result.output}, ensure_ascii=False).encode("utf-8") + b"\n"
+        else:
+            data = result.output.encode("utf-8") + sep
+        output_bytes += len(data)
+        if writer is not None:
+            writer.write(data)
+    return BatchStats(count, failed, input_bytes, output_bytes, time.perf_counter() - start,
+                      LatencySummary.of(latencies))
+
+
+def _open_inputs(paths: List[str], opened: List[BinaryIO]) -> Iterator[Tuple[str, BinaryIO]]:
+    for path in paths or ["-"]:
+        if path == "-":
+            yield "<stdin>", sys.stdin.buffer
+            continue
+        # 按需打开, 同一时刻只打开一个输入文件
+        stream = open(path, "rb")
+        opened.append(stream)
+        try:
+            yield path, stream
+        finally:
+            stream.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cognihub_pygotemplate", description="Render a template over JSON Lines records.")
+    parser.add_argument("inputs", nargs="*", help="JSONL files to render, '-' or none for stdin")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-t", "--template", help="path of the template file")
+    source.add_argument("-e", "--template-string", help="template source given inline")
+    parser.add_argument("-o", "--output", help="output file, or a pattern with '{shard}' when sharding; "
+                                               "stdout by default")
+    parser.add_argument("--shard-size", type=int, default=0, help="records per output file")
+    parser.add_argument("--format", dest="output_format", choices=("text", "jsonl"), default="text",
+                        help="'text' writes each output followed by the separator, "
+                             "'jsonl' one {\"output\": ...} object per line")
+    parser.add_argument("--separator", default="\\n", help="written after each text output, "
+                                                           "backslash escapes allowed (default: \\n)")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="render threads, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=256, help="records handed to a thread at a time")
+    parser.add_argument("--on-error", choices=(ON_ERROR_FAIL, ON_ERROR_SKIP), default=ON_ERROR_FAIL,
+                        help="stop at the first failing record (default) or report it and continue")
+    parser.add_argument("--timeout", type=float, help="per-record render deadline in seconds")
+    parser.add_argument("--max-output-bytes", type=int, help="per-record output size limit")
+    parser.add_argument("--no-optimize", action="store_true", help="disable the parse-tree optimizer")
+    parser.add_argument("--bench", action="store_true",
+                        help="print throughput and latency percentiles as JSON; outputs are discarded "
+                             "unless --output is given")
+    args = parser.parse_args(argv)
+    if args.workers < 0 or args.chunk_size <= 0 or args.shard_size < 0:
+        parser.error("--workers, --chunk-size and --shard-size must not be negative")
+
+    if args.template is not None:
+        with open(args.template, encoding="utf-8") as f:
+            template = f.read()
+    else:
+        template = args.template_string
+    try:
+        limits = (RenderLimits(timeout=args.timeout, max_output_bytes=args.max_output_bytes)
+                  if args.timeout is not None or args.max_output_bytes is not None else None)
+        writer = None if args.bench and not args.output else ShardedWriter(args.output, args.shard_size)
+    except ValueError as e:
+        parser.error(str(e))
+    engine = GoTemplateEngine(template, optimize=not args.no_optimize)
+
+    opened: List[BinaryIO] = []
+    try:
+        stats = run(engine, read_records(_open_inputs(args.inputs, opened)), writer,
+                    workers=args.workers, chunk_size=args.chunk_size, limits=limits,
+                    output_format=args.output_format, separator=codecs.decode(args.separator, "unicode_escape"),
+                    on_error=args.on_error)
+    except BatchRenderError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # 下游(如 head)提前关闭了管道, 让退出时的刷新写到 /dev/null
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        for stream in opened:
+            stream.close()
+        if writer is not None:
+            writer.close()
+
+    if args.bench:
+        json.dump(stats.to_dict(), sys.stdout)
+        print()
+    elif stats.errors:
+        print(f"{stats.errors} of {stats.records} records failed", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""渲染结果缓存.
+
+An optional LRU cache for rendered output, keyed by the template source and a
+fingerprint of the serialized render data. Fingerprints are a single
+incremental BLAKE2b pass over bytes that have to be produced for the FFI call
+anyway, so a hit skips the Go round-trip at a fraction of the render cost.
+"""
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+
+class CacheStats(NamedTuple):
+    """Point-in-time counters of a :class:`RenderCache`."""
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RenderCache:
+    """
+    Thread-safe LRU cache of rendered strings.
+
+    Entries are evicted least-recently-used first once ``max_entries`` or
+    ``max_bytes`` (measured as the in-memory size of the cached strings) is
+    exceeded. With ``ttl`` set, entries older than ``ttl`` seconds are treated
+    as misses. One cache may be shared by several engines; the key covers the
+    template source, so different templates never collide.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (rendered, size, expires_at)
+        self._entries: "OrderedDict[bytes, Tuple[str, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def fingerprint(template_bytes: bytes, payload: bytes, extra: Iterable[memoryview] = ()) -> bytes:
+        """
+        Computes the cache key for a render.
+
+        ``payload`` must be serialized deterministically (``sort_keys=True``);
+        ``extra`` holds out-of-band buffers that are hashed in place.
+        """
+        h = hashlib.blake2b(template_bytes, digest_size=16)
+        h.update(b"\x00")
+        h.update(payload)
+        for view in extra:
+            h.update(len(view).to_bytes(8, "little"))
+            h.update(view)
+        return h.digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Returns the cached output for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if self.ttl is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: bytes, rendered: str) -> None:
+        """Stores ``rendered`` under ``key``, evicting old entries as needed."""
+        size = sys.getsizeof(rendered)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (rendered, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        """Drops all entries; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, self._expirations,
+                              len(self._entries), self._bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,332 @@
+"""渲染服务客户端.
+
+Renders through a shared ``renderd`` process (built from the Go sources with
+the ``renderd`` tag) over a Unix domain socket instead of loading the Go
+library into every worker process. One server holds a single template cache
+and heap for all the workers on a host, and a runaway render can only exhaust
+the server's limits, never a worker.
+
+Connections are pooled, and requests on a connection are pipelined: many
+threads, tasks and batch items share a socket, and the server answers each
+request as soon as its render completes.
+"""
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .engine import _render_error
+from .limits import RenderLimits
+from .refs import Blob, Pinned
+
+DEFAULT_SOCKET = os.environ.get("COGNIHUB_RENDERD_SOCKET") or os.path.join(
+    tempfile.gettempdir(), "cognihub-renderd.sock")
+RENDERD_NAME = "renderd.exe" if platform.system() == "Windows" else "renderd"
+
+# 帧格式见 renderd.go: u32 长度 | u64 请求id | u8 操作码或状态
+_HEADER = struct.Struct(">IQB")
+_LENGTH = struct.Struct(">I")
+_OP_RENDER = 1
+_OP_CANCEL = 2
+_STATUS_OK = 0
+
+
+def _inline_blob(obj: Any) -> Any:
+    # 跨进程无法共享内存, Blob 按普通字符串发送
+    if isinstance(obj, Blob):
+        value = obj.value
+        return value if isinstance(value, str) else bytes(value).decode("utf-8")
+    if isinstance(obj, Pinned):
+        raise TypeError("Pinned values live in the local process and cannot be sent to a render server")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _encode_data(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, default=_inline_blob).encode("utf-8")
+
+
+def _settle(future: "Future[str]", result: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+    # 等待方可能已经取消了 future
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)  # type: ignore[arg-type]
+    except InvalidStateError:
+        pass
+
+
+class _Connection:
+    """One socket to the server with a reader thread resolving pipelined requests."""
+
+    def __init__(self, path: str, connect_timeout: Optional[float]):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.settimeout(connect_timeout)
+            self.sock.connect(path)
+            self.sock.settimeout(None)
+        except BaseException:
+            self.sock.close()
+            raise
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, "Future[str]"] = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name="renderd-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, requests: Sequence[Tuple[bytes, bytes, bytes]]) -> List[Tuple[int, "Future[str]"]]:
+        """Sends ``(template, options, payload)`` requests in one write."""
+        submitted = []
+        frames = []
+        with self._lock:
+            if self.closed:
+                raise ConnectionError("connection to the render server is closed")
+            for template_bytes, options, payload in requests:
+                req_id = next(self._ids)
+                future: "Future[str]" = Future()
+                self._pending[req_id] = future
+                submitted.append((req_id, future))
+                size = _HEADER.size - _LENGTH.size + 8 + len(template_bytes) + len(options) + len(payload)
+                frames += [_HEADER.pack(size, req_id, _OP_RENDER), _LENGTH.pack(len(template_bytes)),
+                           template_bytes, _LENGTH.pack(len(options)), options, payload]
+        try:
+            with self._send_lock:
+                self.sock.sendall(b"".join(frames))
+        except OSError as e:
+            self._fail(ConnectionError(f"failed to send to the render server: {e}"))
+            raise
+        return submitted
+
+    def cancel(self, req_id: int) -> None:
+        try:
+            with self._send_lock:
+                self.sock.sendall(_HEADER.pack(_HEADER.size - _LENGTH.size, req_id, _OP_CANCEL))
+        except OSError:
+            pass
+
+    def _read_loop(self) -> None:
+        reader: BinaryIO = self.sock.makefile("rb")
+        try:
+            while True:
+                header = reader.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                size, req_id, status = _HEADER.unpack(header)
+                body = reader.read(size - (_HEADER.size - _LENGTH.size))
+                with self._lock:
+                    future = self._pending.pop(req_id, None)
+                if future is None:
+                    continue
+                text = body.decode("utf-8")
+                if status == _STATUS_OK:
+                    _settle(future, text)
+                else:
+                    _settle(future, error=_render_error(text))
+        except (OSError, ValueError):
+            pass
+        finally:
+            reader.close()
+            self._fail(ConnectionError("render server closed the connection"))
+
+    def _fail(self, error: Exception) -> None:
+        with self._lock:
+            self.closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            _settle(future, error=error)
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RenderClient:
+    """
+    Pool of pipelined connections to a ``renderd`` server.
+
+    Connections are opened lazily, spread round-robin over up to
+    ``max_connections`` sockets and replaced when they break. The pool is
+    fork-aware: a forked child opens its own connections.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, max_connections: int = 4,
+                 connect_timeout: Optional[float] = 5.0):
+        if max_connections <= 0:
+            raise ValueError("max_connections must be positive")
+        self.socket_path = socket_path or DEFAULT_SOCKET
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self._connections: List[_Connection] = []
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connection(self) -> _Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # 继承自父进程的socket属于父进程的连接, 只关闭子进程中的描述符
+                for conn in self._connections:
+                    conn.sock.close()
+                self._connections = []
+                self._pid = os.getpid()
+            self._connections = [conn for conn in self._connections if not conn.closed]
+            if len(self._connections) < self.max_connections:
+                conn = _Connection(self.socket_path, self.connect_timeout)
+                self._connections.append(conn)
+                return conn
+            return self._connections[next(self._next) % len(self._connections)]
+
+    def submit(self, template_bytes: bytes, options: bytes,
+               payloads: Sequence[bytes]) -> Tuple[_Connection, List[Tuple[int, "Future[str]"]]]:
+        """Pipelines one request per payload on a single pooled connection."""
+        requests = [(template_bytes, options, payload) for payload in payloads]
+        conn = self._connection()
+        try:
+            return conn, conn.submit(requests)
+        except OSError:
+            # 服务重启后池中的旧连接会在首次发送时失败; 渲染没有副作用, 换新连接重试一次
+            conn = self._connection()
+            return conn, conn.submit(requests)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    def __enter__(self) -> "RenderClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+_default_client: Optional[RenderClient] = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> RenderClient:
+    """Returns the process-wide client for :data:`DEFAULT_SOCKET`."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = RenderClient()
+        return _default_client
+
+
+class RemoteTemplateEngine:
+    """
+    Drop-in counterpart of :class:`~cognihub_pygotemplate.engine.GoTemplateEngine`
+    that renders on a ``renderd`` server.
+
+    Errors are raised exactly as by the local engine. :class:`Blob` values are
+    sent inline, since memory cannot be shared across processes.
+    """
+
+    def __init__(self, template_content: str, client: Optional[RenderClient] = None,
+                 limits: Optional[RenderLimits] = None):
+        """
+        :param template_content: Go ``text/template`` source.
+        :param client: connection pool to use; defaults to :func:`default_client`.
+        :param limits: default limits for every render; the server may impose
+            lower ceilings of its own.
+        """
+        self.template_content = template_content
+        self._template_bytes = template_content.encode("utf-8")
+        self._client = client
+        self._limits = limits
+
+    @property
+    def client(self) -> RenderClient:
+        return self._client or default_client()
+
+    def _options(self, limits: Optional[RenderLimits], cancellable: bool = False) -> bytes:
+        if limits is not None and self._limits is not None:
+            limits = self._limits.merged(limits)
+        elif limits is None:
+            limits = self._limits
+        options: Dict[str, Any] = limits.to_options() if limits is not None else {}
+        if cancellable:
+            options["cancellable"] = True
+        return json.dumps(options).encode("utf-8") if options else b""
+
+    def render(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None) -> str:
+        """Renders the template with the given data on the server."""
+        _, [(_, future)] = self.client.submit(self._template_bytes, self._options(limits), [_encode_data(data)])
+        return future.result()
+
+    def render_batch(self, items: Iterable[Dict[str, Any]], limits: Optional[RenderLimits] = None) -> List[str]:
+        """
+        Renders the template once per data item, pipelined on one connection.
+
+        The outputs are returned in input order; the first failing item's
+        error is raised after all renders have finished.
+        """
+        payloads = [_encode_data(data) for data in items]
+        if not payloads:
+            return []
+        _, submitted = self.client.submit(self._template_bytes, self._options(limits), payloads)
+        errors = [future.exception() for _, future in submitted]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for _, future in submitted]
+
+    async def render_async(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None) -> str:
+        """
+        Asynchronously renders the template on the server.
+
+        The event loop is never blocked on the render, and cancelling the
+        awaiting task also cancels the render on the server.
+        """
+        conn, [(req_id, future)] = self.client.submit(
+            self._template_bytes, self._options(limits, cancellable=True), [_encode_data(data)])
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            conn.cancel(req_id)
+            raise
+
+
+def server_binary() -> str:
+    """Returns the path of the ``renderd`` executable shipped with the package."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), RENDERD_NAME)
+
+
+def start_server(socket_path: Optional[str] = None, *args: str, wait: float = 5.0) -> "subprocess.Popen[bytes]":
+    """
+    Starts the bundled ``renderd`` and waits until it accepts connections.
+
+    Extra ``args`` are passed to the server, e.g. ``"-timeout-ms", "2000"``.
+    Stop it with ``terminate()``.
+    """
+    path = socket_path or DEFAULT_SOCKET
+    process = subprocess.Popen([server_binary(), "-socket", path, *args], stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + wait
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"renderd exited with code {process.returncode}")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(path)
+            return process
+        except OSError:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise TimeoutError(f"renderd did not start listening on {path}")
+            time.sleep(0.01)
@@ -1,10 +1,62 @@
 """go包的包装器."""
 import ctypes
+import functools
+import importlib
 import json
 import os
 import platform
 import asyncio
-from typing import Dict, Any
+import threading
+import weakref
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple, Union
+
+from .analysis import CostEstimate, TemplateAnalysis
+from .cache import RenderCache
+from .fit import FitResult, Length, LengthCallback
+from .limits import CancelToken, RenderLimitError, RenderLimits
+from .profile import ProfileReport
+from .refs import Pinned, RefCollector, pinned_default
+from .spans import SpanMap
+
+# 可以作为 render_to 输出目标的类型: 文件描述符、路径或带有 fileno() 的文件对象
+OutputTarget = Union[int, str, bytes, "os.PathLike[str]", Any]
+
+# 可选的C扩展快速路径; 未编译或设置 COGNIHUB_NATIVE=0 时全部调用经由ctypes
+_native: Optional[Any]
+if os.environ.get("COGNIHUB_NATIVE") == "0":
+    _native = None
+else:
+    try:
+        _native = importlib.import_module("._native", __package__)
+    except ImportError:
+        _native = None
+
+# 测试会替换 ctypes.CDLL, 保留真实的类以识别替换后的库对象
+_CDLL = ctypes.CDLL
+
+# json.dumps 带参数时每次都会新建编码器, 复用模块级实例
+_PAYLOAD_ENCODER = json.JSONEncoder(default=pinned_default)
+_SORTED_PAYLOAD_ENCODER = json.JSONEncoder(default=pinned_default, sort_keys=True)
+
+_RENDER_ERROR_PREFIXES = ("JSON_ERROR:", "TEMPLATE_PARSE_ERROR:", "TEMPLATE_EXECUTE_ERROR:", "RENDER_LIMIT_ERROR:")
+_LIMIT_ERROR_PREFIX = "RENDER_LIMIT_ERROR: "
+
+
+def _render_error(message: str) -> ValueError:
+    """Builds the exception for an error string returned by the Go side."""
+    if message.startswith(_LIMIT_ERROR_PREFIX):
+        kind = message[len(_LIMIT_ERROR_PREFIX):].split(":", 1)[0]
+        return RenderLimitError(kind, f"Error from Go renderer: {message}")
+    return ValueError(f"Error from Go renderer: {message}")
+
+
+class StaleLibraryError(RuntimeError):
+    """
+    Raised when the Go library is used in a process forked after it was loaded.
+
+    The Go runtime does not survive ``fork()``: its threads exist only in the
+    parent, so any call from the child would deadlock.
+    """
 
 
 class GoTemplateEngine:
@@ -12,19 +64,152 @@ class GoTemplateEngine:
     A Python interface to Go's text/template engine.
     It relies on a pre-compiled shared library managed by the package installation process.
     """
-    _go_lib = None
-    _free_func = None
+    _go_lib: Optional[ctypes.CDLL] = None
+    _free_func: Optional[Callable[[Any], None]] = None
+    _cache: Optional[RenderCache] = None
+    _limits: Optional[RenderLimits] = None
+    _lazy = False
+    _optimize = True
+    # 并行执行range的goroutine数: 0 顺序执行, -1 每个CPU一个
+    _parallel = 0
+    # (模板源码, 分析结果), 源码变化(如 FileTemplateEngine 重新加载)后重新分析
+    _analysis: Optional[Tuple[str, TemplateAnalysis]] = None
+    # 由 metrics.enable_telemetry 设置; 为 None 时 render 的额外开销只有一次判断
+    _telemetry: Optional[Any] = None
+    # 加载库的进程号; fork 后子进程记录父进程号, 用于给出明确的错误
+    _loaded_pid: Optional[int] = None
+    _stale_parent_pid: Optional[int] = None
+    # 延迟加载的引擎, 库首次加载时批量预编译它们的模板
+    _lazy_engines: "weakref.WeakSet[GoTemplateEngine]" = weakref.WeakSet()
+    # 保护库的一次性加载和 _lazy_engines; 没有GIL时检查后设置不是原子的
+    _load_lock = threading.Lock()
+    # 绑定到已加载库的C扩展渲染函数, 没有C扩展时为 None
+    _native_render: Optional[Callable[[bytes, bytes], str]] = None
 
-    def __init__(self, template_content: str):
-        self._load_library()
+    def __init__(self, template_content: str, cache: Optional[RenderCache] = None, lazy: bool = False,
+                 limits: Optional[RenderLimits] = None, optimize: bool = True, parallel: Union[bool, int] = False):
+        """
+        :param template_content: Go ``text/template`` source.
+        :param cache: optional :class:`~cognihub_pygotemplate.cache.RenderCache`
+            consulted before each render; it may be shared between engines.
+        :param lazy: defer loading the Go library until the first render. Use
+            this for engines built in a preforking server's master process: the
+            template is kept as source and parsed in bulk, together with every
+            other lazy engine, when a worker first loads the library.
+        :param limits: default :class:`~cognihub_pygotemplate.limits.RenderLimits`
+            for every render; per-call limits override them field by field.
+        :param optimize: render through the parse-tree optimizer, which folds
+            constants, merges text and hoists loop-invariant ``$.Field``
+            lookups. The output is identical either way; pass False to execute
+            the template exactly as parsed, e.g. to rule the optimizer out.
+        :param parallel: execute long ``range`` loops whose iterations cannot
+            affect each other in concurrent chunks inside Go: True for one
+            goroutine per CPU, or a number of goroutines. The output is
+            identical to sequential execution; it only pays off for loops
+            over hundreds of items or more.
+        """
+        if parallel is not True and (parallel < 0 or parallel == 1):
+            raise ValueError("parallel must be True, False or a number of goroutines of at least 2")
         self.template_content = template_content
+        self._cache = cache
+        self._limits = limits
+        self._optimize = optimize
+        self._parallel = -1 if parallel is True else int(parallel)
+        if lazy:
+            self._lazy = True
+            with self._load_lock:
+                self._lazy_engines.add(self)
+        else:
+            self._load_library()
+
+    @classmethod
+    def ensure_loaded(cls) -> None:
+        """
+        Loads the library in the current process if it is not loaded yet.
+
+        Lazy engines make this happen on their first render; calling it from a
+        worker's post-fork hook moves the cost to worker startup instead.
+        """
+        cls._load_library()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        # fork 时其他线程可能正持有锁, 子进程中它永远不会被释放
+        GoTemplateEngine._load_lock = threading.Lock()
+        if GoTemplateEngine._go_lib is not None:
+            GoTemplateEngine._stale_parent_pid = GoTemplateEngine._loaded_pid
+            GoTemplateEngine._go_lib = None
+            GoTemplateEngine._free_func = None
+            GoTemplateEngine._native_render = None
+
+    def _require_library(self) -> None:
+        """Called on render when no library is loaded: loads it or explains why not."""
+        if self._stale_parent_pid is not None:
+            self._load_library()  # raises StaleLibraryError
+        if not self._lazy:
+            raise RuntimeError("Go renderer library is not loaded.")
+        self._load_library()
+
+    @classmethod
+    def _lib(cls) -> ctypes.CDLL:
+        """Returns the loaded library; callers load it first."""
+        lib = cls._go_lib
+        if lib is None:
+            raise RuntimeError("Go renderer library is not loaded.")
+        return lib
 
     @classmethod
     def _load_library(cls) -> None:
-        """Loads the pre-compiled Go shared library."""
+        """
+        Loads the pre-compiled Go shared library, once per interpreter.
+
+        Safe to call from many threads at once, also without a GIL: the first
+        caller loads and configures the library under a lock and publishes it
+        last, so other threads either wait or see it fully configured.
+        """
         if cls._go_lib:
             return
+        with cls._load_lock:
+            if cls._go_lib:
+                return
+            if cls._stale_parent_pid is not None:
+                raise StaleLibraryError(
+                    f"The Go renderer library was loaded in process {cls._stale_parent_pid} before it "
+                    f"forked; the Go runtime cannot be used in the child process {os.getpid()}. "
+                    "Create engines with lazy=True in the parent so each worker loads the library itself."
+                )
+            lib = cls._open_library()
+            # 设置在基类上而不是 cls: 子类共享同一个库, fork 钩子也只清除基类的属性
+            GoTemplateEngine._native_render = cls._bind_native(lib)
+            GoTemplateEngine._free_func = lib.FreeString
+            GoTemplateEngine._loaded_pid = os.getpid()
+            GoTemplateEngine._go_lib = lib
+            sources = list({engine.template_content for engine in list(cls._lazy_engines)})
+        if sources:
+            cls.precompile(sources)
+
+    @staticmethod
+    def _bind_native(lib: ctypes.CDLL) -> Optional[Callable[[bytes, bytes], str]]:
+        """Points the C extension at the exports of ``lib``; None when it is not available."""
+        if _native is None:
+            return None
+        # 测试中替换的库对象没有真实的函数地址
+        if not isinstance(lib, _CDLL):
+            return None
+        exports = (lib.RenderTemplate, lib.FreeString)
+        _native.bind(*(ctypes.cast(f, ctypes.c_void_p).value for f in exports))
+        render_native: Callable[[bytes, bytes], str] = _native.render
+        return render_native
+
+    @classmethod
+    def native_available(cls) -> bool:
+        """Whether plain renders take the C extension fast path instead of ctypes."""
+        cls._load_library()
+        return cls._native_render is not None
 
+    @staticmethod
+    def _open_library() -> ctypes.CDLL:
+        """Opens the shared library and declares the signatures of its exports."""
         lib_name = "librenderer.so"
         if platform.system() == "Windows":
             lib_name = "renderer.dll"
@@ -41,25 +226,369 @@ class GoTemplateEngine:
                 "Try reinstalling with 'pip install .'"
             )
 
-        cls._go_lib = ctypes.CDLL(lib_path)
+        lib = ctypes.CDLL(lib_path)
+
+        lib.RenderTemplate.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+        lib.RenderTemplate.restype = ctypes.c_void_p
+
+        lib.RenderTemplateBlobs.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+        ]
+        lib.RenderTemplateBlobs.restype = ctypes.c_void_p
+
+        lib.RenderTemplateOptions.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        lib.RenderTemplateOptions.restype = ctypes.c_void_p
+
+        lib.RenderTemplateTo.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_longlong),
+        ]
+        lib.RenderTemplateTo.restype = ctypes.c_void_p
+
+        lib.RenderTemplateProfile.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        lib.RenderTemplateProfile.restype = ctypes.c_void_p
+
+        lib.RenderTemplateSpans.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        lib.RenderTemplateSpans.restype = ctypes.c_void_p
+
+        lib.RenderTemplateFit.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t), ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int), ctypes.c_void_p,
+        ]
+        lib.RenderTemplateFit.restype = ctypes.c_void_p
+
+        lib.PinValue.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+        lib.PinValue.restype = ctypes.c_void_p
+        lib.ReleasePinned.argtypes = [ctypes.c_longlong]
+        lib.ReleasePinned.restype = ctypes.c_longlong
+        lib.SetPinnedLimit.argtypes = [ctypes.c_longlong]
+        lib.SetPinnedLimit.restype = None
+        lib.PinnedStats.argtypes = []
+        lib.PinnedStats.restype = ctypes.c_void_p
+
+        lib.PrecompileTemplates.argtypes = [ctypes.c_char_p]
+        lib.PrecompileTemplates.restype = ctypes.c_void_p
 
-        cls._go_lib.RenderTemplate.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
-        cls._go_lib.RenderTemplate.restype = ctypes.c_char_p
+        lib.GoMemoryStats.argtypes = [ctypes.c_int]
+        lib.GoMemoryStats.restype = ctypes.c_void_p
 
-        cls._go_lib.FreeString.argtypes = [ctypes.c_char_p]
-        cls._go_lib.FreeString.restype = None
+        lib.AnalyzeTemplate.argtypes = [ctypes.c_char_p]
+        lib.AnalyzeTemplate.restype = ctypes.c_void_p
 
-        cls._free_func = cls._go_lib.FreeString
+        lib.StartCPUProfile.argtypes = [ctypes.c_char_p]
+        lib.StartCPUProfile.restype = ctypes.c_void_p
+        lib.StopCPUProfile.argtypes = []
+        lib.StopCPUProfile.restype = ctypes.c_void_p
 
-    def render(self, data: Dict[str, Any]) -> str:
-        """Renders the template with the given data."""
+        # 返回值必须保持为原始指针: c_char_p 会复制成 bytes, FreeString 收到的就不是Go分配的内存
+        lib.FreeString.argtypes = [ctypes.c_void_p]
+        lib.FreeString.restype = None
+        return lib
+
+    @classmethod
+    def precompile(cls, templates: List[str]) -> List[Optional[str]]:
+        """
+        Parses templates into the Go-side template cache in a single call.
+
+        Returns one entry per template: None if it parsed, else the parse error.
+        """
+        cls._load_library()
+        result_ptr = cls._lib().PrecompileTemplates(json.dumps(templates).encode('utf-8'))
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if cls._free_func and result_ptr:
+                cls._free_func(result_ptr)
+        if result.startswith("JSON_ERROR:"):
+            raise ValueError(f"Error from Go renderer: {result}")
+        return [error or None for error in json.loads(result)]
+
+    @classmethod
+    def warmup(cls, templates: Iterable[Union[str, "GoTemplateEngine"]] = (),
+               data: Optional[Dict[str, Any]] = None, renders: int = 1) -> Any:
+        """
+        Loads the library, pre-parses ``templates`` and runs dummy renders.
+
+        Returns a :class:`~cognihub_pygotemplate.startup.WarmupReport` with the
+        time spent in each cold-start step; see
+        :func:`cognihub_pygotemplate.startup.warmup`.
+        """
+        from .startup import warmup
+        return warmup(templates, data, renders)
+
+    @classmethod
+    def memory_stats(cls, collect: bool = True) -> Dict[str, int]:
+        """
+        Returns a snapshot of the Go runtime's memory usage.
+
+        Keys: ``heap_alloc``, ``heap_inuse``, ``heap_objects``, ``sys`` (bytes
+        obtained from the OS), ``num_gc``, ``goroutines``,
+        ``outstanding_strings`` (results not yet freed, 0 between renders) and
+        ``cached_templates``. With ``collect`` a Go garbage collection runs
+        first so the heap figures only count live objects.
+        """
+        cls._load_library()
+        result_ptr = cls._lib().GoMemoryStats(1 if collect else 0)
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if cls._free_func and result_ptr:
+                cls._free_func(result_ptr)
+        stats: Dict[str, int] = json.loads(result)
+        return stats
+
+    @classmethod
+    def pin(cls, value: Any, key: Optional[str] = None) -> Pinned:
+        """
+        Decodes ``value`` once into Go and returns a handle that stands for it.
+
+        Renders resolve the handle to the stored value without serializing
+        or decoding it again, which suits large constants shared by many
+        requests such as tool schemas, few-shot examples and policy text.
+        With a ``key``, a value already pinned under the key is shared
+        instead and ``value`` is not serialized; the value is freed once
+        every handle was released. Pinned values are local to the process.
+        Raises ``MemoryError`` when the value would push the total size of
+        pinned values, measured as JSON, over :meth:`set_pinned_limit`.
+        """
+        cls._load_library()
+        key_bytes = key.encode('utf-8') if key else None
+        if key_bytes is not None:
+            result = cls._pin_call(key_bytes, None)
+            if result:
+                return cls._pinned_handle(result, key, value)
+        try:
+            payload = json.dumps(value, default=pinned_default).encode('utf-8')
+        except TypeError as e:
+            raise TypeError(f"Pinned values must be JSON serializable without Blob values: {e}") from None
+        return cls._pinned_handle(cls._pin_call(key_bytes, payload), key, value)
+
+    @classmethod
+    def _pin_call(cls, key: Optional[bytes], payload: Optional[bytes]) -> str:
+        result_ptr = cls._lib().PinValue(key, payload)
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if cls._free_func and result_ptr:
+                cls._free_func(result_ptr)
+        if result.startswith("PIN_LIMIT_ERROR:"):
+            raise MemoryError(f"Error from Go renderer: {result}")
+        if result.startswith("JSON_ERROR:"):
+            raise ValueError(f"Error from Go renderer: {result}")
+        return result
+
+    @classmethod
+    def _pinned_handle(cls, result: str, key: Optional[str], value: Any) -> Pinned:
+        document = json.loads(result)
+        return Pinned(document["id"], document["bytes"], key, functools.partial(cls._unpin, os.getpid()), value)
+
+    @classmethod
+    def _unpin(cls, pid: int, pinned_id: int) -> None:
+        # fork 之后子进程中的Go运行时不可用, 父进程的常驻值随之失效
+        if os.getpid() == pid and cls._go_lib is not None:
+            cls._go_lib.ReleasePinned(pinned_id)
+
+    @classmethod
+    def set_pinned_limit(cls, max_bytes: int) -> None:
+        """
+        Limits the total size of pinned values, measured as JSON (256 MiB by default).
+
+        Values pinned before keep their memory even if they exceed the new limit.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        cls._load_library()
+        cls._lib().SetPinnedLimit(max_bytes)
+
+    @classmethod
+    def pinned_stats(cls) -> Dict[str, int]:
+        """
+        Returns the state of the pinned value store.
+
+        Keys: ``values`` (pinned values), ``bytes`` (their JSON size),
+        ``max_bytes`` (the limit) and ``refs`` (live handles).
+        """
+        cls._load_library()
+        result_ptr = cls._lib().PinnedStats()
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if cls._free_func and result_ptr:
+                cls._free_func(result_ptr)
+        stats: Dict[str, int] = json.loads(result)
+        return stats
+
+    @classmethod
+    def start_cpu_profile(cls, path: Union[str, "os.PathLike[str]"]) -> None:
+        """
+        Starts recording a pprof CPU profile of the Go library to ``path``.
+
+        The profile covers all renders in the process until
+        :meth:`stop_cpu_profile`, and can be inspected with ``go tool pprof``
+        or passed to a PGO build (``python setup.py build_py --pgo=<path>``).
+        """
+        cls._load_library()
+        cls._check_profile_result(cls._lib().StartCPUProfile(os.fsencode(path)))
+
+    @classmethod
+    def stop_cpu_profile(cls) -> None:
+        """Stops the CPU profile started by :meth:`start_cpu_profile` and closes its file."""
+        cls._load_library()
+        cls._check_profile_result(cls._lib().StopCPUProfile())
+
+    @classmethod
+    def _check_profile_result(cls, result_ptr: Optional[int]) -> None:
+        if not result_ptr:
+            return
+        try:
+            error = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if cls._free_func:
+                cls._free_func(result_ptr)
+        raise RuntimeError(f"Error from Go renderer: {error}")
+
+    @staticmethod
+    def _encode_data(data: Dict[str, Any], sort_keys: bool = False) -> Tuple[bytes, Optional[RefCollector]]:
+        """
+        Serializes the render data.
+
+        Plain data takes the stock ``json.dumps`` path, where
+        :class:`~cognihub_pygotemplate.refs.Pinned` handles become references.
+        Only when the data holds :class:`~cognihub_pygotemplate.refs.Blob`
+        values is it serialized again with a collector, which the caller must
+        release after the FFI call.
+        """
+        try:
+            encoder = _SORTED_PAYLOAD_ENCODER if sort_keys else _PAYLOAD_ENCODER
+            return encoder.encode(data).encode('utf-8'), None
+        except TypeError:
+            refs = RefCollector()
+            try:
+                payload = json.dumps(data, sort_keys=sort_keys, default=refs.default).encode('utf-8')
+            except BaseException:
+                refs.release()
+                raise
+            if not refs:
+                refs.release()
+                return payload, None
+            return payload, refs
+
+    def render(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+               cancel: Optional[CancelToken] = None) -> str:
+        """
+        Renders the template with the given data.
+
+        String values wrapped in :class:`~cognihub_pygotemplate.refs.Blob` are
+        passed to Go by reference instead of being embedded in the JSON payload.
+        When the engine has a cache, identical renders are served from it.
+        ``limits`` overrides the engine's limits for this call and ``cancel``
+        allows aborting the render from another thread; exceeding a limit or
+        cancelling raises :class:`~cognihub_pygotemplate.limits.RenderLimitError`.
+        """
+        if self._telemetry is not None:
+            rendered: str = self._telemetry.render(self, data, limits, cancel)
+            return rendered
+        return self._render(data, limits, cancel)
+
+    def _render(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                cancel: Optional[CancelToken] = None, sample: Any = None) -> str:
+        """Implements :meth:`render`; records the payload size on ``sample`` when given."""
         if not self._go_lib:
-            raise RuntimeError("Go renderer library is not loaded.")
+            self._require_library()
+        limits = self._effective_limits(limits)
+        if self._cache is not None:
+            return self._render_cached(self._cache, data, limits, cancel, sample)
+        return self._render_uncached(data, limits, cancel, sample)
 
+    def _render_uncached(self, data: Dict[str, Any], limits: Optional[RenderLimits],
+                         cancel: Optional[CancelToken], sample: Any = None) -> str:
+        """Serializes ``data`` and renders it without consulting the cache."""
         template_bytes = self.template_content.encode('utf-8')
-        json_data_bytes = json.dumps(data).encode('utf-8')
+        json_data_bytes, refs = self._encode_data(data)
+        if sample is not None:
+            sample.input_bytes = len(json_data_bytes) + (refs.nbytes if refs is not None else 0)
+        return self._render_encoded(template_bytes, json_data_bytes, refs, limits, cancel)
 
-        result_ptr = self._go_lib.RenderTemplate(template_bytes, json_data_bytes)
+    def _effective_limits(self, limits: Optional[RenderLimits]) -> Optional[RenderLimits]:
+        if limits is not None and self._limits is not None:
+            return self._limits.merged(limits)
+        return limits if limits is not None else self._limits
+
+    def _render_cached(self, cache: RenderCache, data: Dict[str, Any],
+                       limits: Optional[RenderLimits], cancel: Optional[CancelToken], sample: Any = None) -> str:
+        """Looks the render up in ``cache`` and only calls into Go on a miss."""
+        template_bytes = self.template_content.encode('utf-8')
+        # 缓存键需要稳定的序列化结果, 因此按键排序; Go端的输出与键顺序无关
+        try:
+            json_data_bytes, refs = self._encode_data(data, sort_keys=True)
+        except TypeError:
+            # 键类型混合的dict无法排序, 这类数据不经缓存渲染
+            return self._render_uncached(data, limits, cancel, sample)
+        if sample is not None:
+            sample.input_bytes = len(json_data_bytes) + (refs.nbytes if refs is not None else 0)
+        try:
+            key = cache.fingerprint(template_bytes, json_data_bytes, refs.views() if refs is not None else ())
+        except BaseException:
+            if refs is not None:
+                refs.release()
+            raise
+        cached = cache.get(key)
+        if cached is not None:
+            if refs is not None:
+                refs.release()
+            max_output = limits.max_output_bytes if limits is not None else None
+            # 缓存的结果可能是在没有限制或限制更宽时渲染的
+            if max_output is not None and len(cached.encode('utf-8')) > max_output:
+                raise _render_error(f"{_LIMIT_ERROR_PREFIX}output: render output exceeded {max_output} bytes")
+            return cached
+        rendered = self._render_encoded(template_bytes, json_data_bytes, refs, limits, cancel)
+        cache.put(key, rendered)
+        return rendered
+
+    def _render_encoded(self, template_bytes: bytes, json_data_bytes: bytes, refs: Optional[RefCollector],
+                        limits: Optional[RenderLimits] = None, cancel: Optional[CancelToken] = None) -> str:
+        """Calls into Go with an already serialized payload; releases ``refs``."""
+        if limits is None and cancel is None and self._optimize and not self._parallel:
+            if refs is None:
+                native = self._native_render
+                if native is not None:
+                    # C扩展在一次调用中完成渲染、解码和释放
+                    rendered = native(template_bytes, json_data_bytes)
+                    if rendered.startswith(_RENDER_ERROR_PREFIXES):
+                        raise _render_error(rendered)
+                    return rendered
+                result_ptr = self._lib().RenderTemplate(template_bytes, json_data_bytes)
+            else:
+                try:
+                    blob_ptrs, blob_lens = refs.arrays()
+                    result_ptr = self._lib().RenderTemplateBlobs(
+                        template_bytes, json_data_bytes, blob_ptrs, blob_lens, len(refs))
+                finally:
+                    refs.release()
+        else:
+            options = json.dumps(self._options(limits)).encode('utf-8')
+            try:
+                blob_ptrs, blob_lens, n_blobs = self._blob_arrays(refs)
+                result_ptr = self._lib().RenderTemplateOptions(
+                    template_bytes, json_data_bytes, options, blob_ptrs, blob_lens, n_blobs, cancel)
+            finally:
+                if refs is not None:
+                    refs.release()
 
         try:
             rendered_string = ctypes.string_at(result_ptr).decode('utf-8')
@@ -67,11 +596,295 @@ class GoTemplateEngine:
             if self._free_func and result_ptr:
                 self._free_func(result_ptr)
 
-        if rendered_string.startswith(("JSON_ERROR:", "TEMPLATE_PARSE_ERROR:", "TEMPLATE_EXECUTE_ERROR:")):
-            raise ValueError(f"Error from Go renderer: {rendered_string}")
+        if rendered_string.startswith(_RENDER_ERROR_PREFIXES):
+            raise _render_error(rendered_string)
 
         return rendered_string
 
-    async def render_async(self, data: Dict[str, Any]) -> str:
-        """Asynchronously renders the template with the given data."""
-        return await asyncio.to_thread(self.render, data)
+    def _options(self, limits: Optional[RenderLimits]) -> Dict[str, Any]:
+        """Builds the options object passed to the Go exports that take one."""
+        options: Dict[str, Any] = limits.to_options() if limits is not None else {}
+        if not self._optimize:
+            options["optimize"] = False
+        if self._parallel:
+            options["parallel"] = self._parallel
+        return options
+
+    def profile(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                cancel: Optional[CancelToken] = None) -> ProfileReport:
+        """
+        Renders the template with per-node profiling and returns the report.
+
+        Errors raised while the template executes, including exceeded limits,
+        do not raise: they are stored in ``report.error`` next to the partial
+        profile. Data and parse errors raise as in :meth:`render`. The cache is
+        bypassed.
+        """
+        if not self._go_lib:
+            self._require_library()
+        limits = self._effective_limits(limits)
+        options = json.dumps(limits.to_options() if limits is not None else {}).encode('utf-8')
+        json_data_bytes, refs = self._encode_data(data)
+        try:
+            blob_ptrs, blob_lens, n_blobs = self._blob_arrays(refs)
+            result_ptr = self._lib().RenderTemplateProfile(
+                self.template_content.encode('utf-8'), json_data_bytes, options,
+                blob_ptrs, blob_lens, n_blobs, cancel)
+        finally:
+            if refs is not None:
+                refs.release()
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if self._free_func and result_ptr:
+                self._free_func(result_ptr)
+        if result.startswith(_RENDER_ERROR_PREFIXES):
+            raise _render_error(result)
+        return ProfileReport.from_json(json.loads(result))
+
+    def render_spans(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                     cancel: Optional[CancelToken] = None) -> SpanMap:
+        """
+        Renders the template and maps regions of the output to the data.
+
+        Returns a :class:`~cognihub_pygotemplate.spans.SpanMap` holding the
+        output and a span per ``range``, per range iteration and per action
+        printing data, e.g. the region of every item of ``.Messages``. Spans
+        are recorded while Go executes the template, so repeated content is
+        told apart. Errors raise as in :meth:`render`; the cache and the
+        parse-tree optimizer are bypassed.
+        """
+        if not self._go_lib:
+            self._require_library()
+        options = json.dumps(self._options(self._effective_limits(limits))).encode('utf-8')
+        json_data_bytes, refs = self._encode_data(data)
+        try:
+            blob_ptrs, blob_lens, n_blobs = self._blob_arrays(refs)
+            result_ptr = self._lib().RenderTemplateSpans(
+                self.template_content.encode('utf-8'), json_data_bytes, options,
+                blob_ptrs, blob_lens, n_blobs, cancel)
+        finally:
+            if refs is not None:
+                refs.release()
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if self._free_func and result_ptr:
+                self._free_func(result_ptr)
+        if result.startswith(_RENDER_ERROR_PREFIXES):
+            raise _render_error(result)
+        return SpanMap.from_json(json.loads(result))
+
+    def render_fit(self, data: Dict[str, Any], budget: int, field: str = "Messages", *,
+                   keep_first: int = 0, keep_last: int = 1, length: Length = None, overhead: int = 0,
+                   limits: Optional[RenderLimits] = None, cancel: Optional[CancelToken] = None) -> FitResult:
+        """
+        Renders the longest output that fits ``budget`` by dropping list items.
+
+        Items of the list at ``field`` (a dotted path such as ``"Messages"``)
+        are dropped oldest first, except for the first ``keep_first`` and the
+        last ``keep_last`` items. Go finds the fewest dropped items whose
+        output fits by binary search, which assumes dropping items never
+        makes the output longer. ``length`` measures the output: ``None``
+        counts UTF-8 bytes, a callable is given each candidate output (e.g.
+        a tokenizer's count), and a sequence gives a precomputed length per
+        item, the output then measuring ``overhead`` plus the lengths of the
+        kept items. Raises :class:`~cognihub_pygotemplate.limits.RenderLimitError`
+        with kind ``"budget"`` when no candidate fits. ``limits`` apply to
+        every candidate render; the cache is bypassed.
+        """
+        if budget < 0:
+            raise ValueError("budget must not be negative")
+        if keep_first < 0 or keep_last < 0:
+            raise ValueError("keep_first and keep_last must not be negative")
+        if not self._go_lib:
+            self._require_library()
+        options = self._options(self._effective_limits(limits))
+        options.update(field=field.split("."), budget=budget, keep_first=keep_first, keep_last=keep_last)
+        callback = None
+        if callable(length):
+            callback = LengthCallback(length)
+        elif length is not None:
+            options.update(weights=[int(n) for n in length], overhead=overhead)
+
+        json_data_bytes, refs = self._encode_data(data)
+        try:
+            blob_ptrs, blob_lens, n_blobs = self._blob_arrays(refs)
+            result_ptr = self._lib().RenderTemplateFit(
+                self.template_content.encode('utf-8'), json_data_bytes, json.dumps(options).encode('utf-8'),
+                blob_ptrs, blob_lens, n_blobs, cancel, callback)
+        finally:
+            if refs is not None:
+                refs.release()
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if self._free_func and result_ptr:
+                self._free_func(result_ptr)
+        if callback is not None:
+            callback.reraise()
+        if result.startswith(_RENDER_ERROR_PREFIXES):
+            raise _render_error(result)
+        return FitResult(**json.loads(result))
+
+    def analyze(self) -> TemplateAnalysis:
+        """
+        Returns the static structure of the template for cost estimation.
+
+        The analysis lists the nesting of ``range`` nodes, the collections they
+        iterate, template calls and findings about constructs that amplify
+        work or output. It is computed once per template source.
+        """
+        content = self.template_content
+        cached = self._analysis
+        if cached is not None and cached[0] == content:
+            return cached[1]
+        if not self._go_lib:
+            self._require_library()
+        result_ptr = self._lib().AnalyzeTemplate(content.encode('utf-8'))
+        try:
+            result = ctypes.string_at(result_ptr).decode('utf-8')
+        finally:
+            if self._free_func and result_ptr:
+                self._free_func(result_ptr)
+        if result.startswith(_RENDER_ERROR_PREFIXES):
+            raise _render_error(result)
+        analysis = TemplateAnalysis.from_json(json.loads(result))
+        self._analysis = (content, analysis)
+        return analysis
+
+    def estimate_cost(self, data: Dict[str, Any], sample: int = 8) -> CostEstimate:
+        """
+        Estimates the cost of rendering ``data`` without rendering it.
+
+        Combines :meth:`analyze` with list lengths and string sizes of the
+        data, sampling at most ``sample`` elements per ``range``, so the
+        estimate costs far less than the render it predicts.
+        """
+        return self.analyze().estimate(data, sample=sample)
+
+    def check_cost(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                   sample: int = 8) -> CostEstimate:
+        """
+        Rejects a render up front when its estimate exceeds the limits.
+
+        Compares :meth:`estimate_cost` with ``max_range_iterations`` and
+        ``max_output_bytes`` of the effective limits and raises
+        :class:`~cognihub_pygotemplate.limits.RenderLimitError` (kind
+        ``"range"`` or ``"output"``) before any Go work is done; otherwise
+        returns the estimate.
+        """
+        estimate = self.estimate_cost(data, sample=sample)
+        limits = self._effective_limits(limits)
+        if limits is not None:
+            if limits.max_range_iterations is not None and estimate.iterations > limits.max_range_iterations:
+                raise RenderLimitError("range", f"Estimated render cost exceeds limits: about {estimate.iterations} "
+                                                f"range iterations (limit {limits.max_range_iterations})")
+            if limits.max_output_bytes is not None and estimate.output_bytes > limits.max_output_bytes:
+                raise RenderLimitError("output", f"Estimated render cost exceeds limits: about "
+                                                 f"{estimate.output_bytes} output bytes "
+                                                 f"(limit {limits.max_output_bytes})")
+        return estimate
+
+    def render_batch(self, items: Iterable[Dict[str, Any]], limits: Optional[RenderLimits] = None) -> List[str]:
+        """Renders the template once per data item and returns the outputs in order."""
+        return [self.render(data, limits) for data in items]
+
+    @staticmethod
+    def _blob_arrays(refs: Optional[RefCollector]) -> Tuple[Any, Any, int]:
+        if refs is None:
+            return None, None, 0
+        blob_ptrs, blob_lens = refs.arrays()
+        return blob_ptrs, blob_lens, len(refs)
+
+    def render_to(self, target: OutputTarget, data: Dict[str, Any], *,
+                  append: bool = False, jsonl_key: Optional[str] = None,
+                  limits: Optional[RenderLimits] = None, cancel: Optional[CancelToken] = None) -> int:
+        """
+        Renders the template and lets Go write the output directly to ``target``.
+
+        The rendered text never becomes a Python object. ``target`` may be an OS
+        file descriptor, a path (opened, written and closed by Go) or a file
+        object exposing ``fileno()``, which is flushed first. Paths are
+        truncated unless ``append`` is true. With ``jsonl_key`` each call writes
+        one JSON Lines record ``{"<jsonl_key>": "<output>"}`` escaped on the Go
+        side. Output is fully rendered before anything is written, so a failed
+        render leaves the target untouched. ``limits`` and ``cancel`` behave as
+        in :meth:`render`.
+
+        Returns the number of bytes written.
+        """
+        if not self._go_lib:
+            self._require_library()
+
+        limits = self._limits.merged(limits) if self._limits is not None else limits
+        options = self._options(limits)
+        options.update(fd=-1, append=append)
+        if jsonl_key:
+            options["jsonl_key"] = jsonl_key
+        if isinstance(target, int):
+            options["fd"] = self._os_handle(target)
+        elif hasattr(target, "fileno"):
+            if hasattr(target, "flush"):
+                target.flush()
+            options["fd"] = self._os_handle(target.fileno())
+        else:
+            options["path"] = os.fsdecode(target)
+
+        template_bytes = self.template_content.encode('utf-8')
+        json_data_bytes, refs = self._encode_data(data)
+        written = ctypes.c_longlong(0)
+        try:
+            blob_ptrs, blob_lens, n_blobs = self._blob_arrays(refs)
+            result_ptr = self._lib().RenderTemplateTo(
+                template_bytes, json_data_bytes, json.dumps(options).encode('utf-8'),
+                blob_ptrs, blob_lens, n_blobs, cancel, ctypes.byref(written))
+        finally:
+            if refs is not None:
+                refs.release()
+
+        if result_ptr:
+            try:
+                error = ctypes.string_at(result_ptr).decode('utf-8')
+            finally:
+                if self._free_func:
+                    self._free_func(result_ptr)
+            if error.startswith("OUTPUT_ERROR:"):
+                raise OSError(f"Error from Go renderer: {error}")
+            raise _render_error(error)
+        return written.value
+
+    @staticmethod
+    def _os_handle(fd: int) -> int:
+        """Maps a C runtime file descriptor to the OS-level handle Go writes to."""
+        if platform.system() == "Windows":
+            import msvcrt
+            return int(msvcrt.get_osfhandle(fd))  # type: ignore[attr-defined]
+        return fd
+
+    async def render_async(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                           cancel: Optional[CancelToken] = None) -> str:
+        """
+        Asynchronously renders the template with the given data.
+
+        When limits apply to the render, cancelling the awaiting task also
+        aborts the render inside Go instead of leaving it running in the
+        worker thread.
+        """
+        if cancel is None and (limits is not None or self._limits is not None):
+            cancel = CancelToken()
+        if cancel is None:
+            return await asyncio.to_thread(self.render, data)
+        try:
+            return await asyncio.to_thread(self.render, data, limits, cancel)
+        except asyncio.CancelledError:
+            cancel.cancel()
+            raise
+
+
+if hasattr(os, "register_at_fork"):
+    try:
+        os.register_at_fork(after_in_child=GoTemplateEngine._after_fork_in_child)
+    except RuntimeError:
+        # 部分子解释器不允许注册 fork 钩子, 它们本身也不能 fork
+        pass
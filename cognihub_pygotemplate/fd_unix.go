@@ -0,0 +1,21 @@
+//go:build !windows
+
+package main
+
+import "syscall"
+
+// writeFD writes all of p to a descriptor owned by the caller. The descriptor
+// is never wrapped in an *os.File, whose finalizer would close it.
+func writeFD(fd uintptr, p []byte) error {
+	for len(p) > 0 {
+		n, err := syscall.Write(int(fd), p)
+		if err == syscall.EINTR {
+			continue
+		}
+		if err != nil {
+			return err
+		}
+		p = p[n:]
+	}
+	return nil
+}
@@ -0,0 +1,18 @@
+//go:build windows
+
+package main
+
+import "syscall"
+
+// writeFD writes all of p to a HANDLE owned by the caller. The handle is never
+// wrapped in an *os.File, whose finalizer would close it.
+func writeFD(fd uintptr, p []byte) error {
+	for len(p) > 0 {
+		n, err := syscall.Write(syscall.Handle(fd), p)
+		if err != nil {
+			return err
+		}
+		p = p[n:]
+	}
+	return nil
+}
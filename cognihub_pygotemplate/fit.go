@@ -0,0 +1,304 @@
+package main
+
+/*
+#include <stddef.h>
+
+typedef long long (*fit_length_fn)(const char *s, size_t n);
+
+static long long call_fit_length(fit_length_fn fn, const char *s, size_t n) {
+	return fn(s, n);
+}
+*/
+import "C"
+import (
+	"bytes"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"unsafe"
+)
+
+// fitOptions are the JSON options of RenderTemplateFit.
+type fitOptions struct {
+	renderOptions
+	// Field is the path of the list to trim, e.g. ["Messages"].
+	Field []string `json:"field"`
+	// Budget is the maximum length of the output.
+	Budget int64 `json:"budget"`
+	// KeepFirst and KeepLast items of the list are never dropped.
+	KeepFirst int `json:"keep_first"`
+	KeepLast  int `json:"keep_last"`
+	// Weights, when set, measure the output as Overhead plus the weights of
+	// the kept items instead of rendering every candidate.
+	Weights  []int64 `json:"weights"`
+	Overhead int64   `json:"overhead"`
+}
+
+// fitResult is the JSON document returned by RenderTemplateFit.
+type fitResult struct {
+	Output  string `json:"output"`
+	Kept    int    `json:"kept"`
+	Dropped int    `json:"dropped"`
+	Length  int64  `json:"length"`
+	Renders int    `json:"renders"`
+}
+
+var (
+	errOverBudget     = errors.New("output exceeds the budget")
+	errLengthCallback = errors.New("length function failed")
+)
+
+// budgetWriter stops a byte-measured candidate as soon as it is too long.
+type budgetWriter struct {
+	buf   *bytes.Buffer
+	limit int64
+}
+
+func (b *budgetWriter) Write(p []byte) (int, error) {
+	if int64(b.buf.Len()+len(p)) > b.limit {
+		return 0, errOverBudget
+	}
+	return b.buf.Write(p)
+}
+
+// fitter renders candidates of the data with a growing number of the
+// trimmable items dropped.
+type fitter struct {
+	req     *renderRequest
+	opts    *fitOptions
+	data    interface{}
+	parent  map[string]interface{}
+	key     string
+	items   []interface{}
+	length  C.fit_length_fn
+	renders int
+	// rendered is the number of dropped items of the complete output in
+	// buf, -1 when buf holds none.
+	rendered int
+}
+
+// lenAt measures the candidate that drops `dropped` items; the output is
+// left in buf. fits is false when the candidate exceeds the budget.
+func (f *fitter) lenAt(buf *bytes.Buffer, dropped int) (n int64, fits bool, err *renderError) {
+	keepFirst := f.opts.KeepFirst
+	if f.items != nil {
+		candidate := make([]interface{}, 0, len(f.items)-dropped)
+		candidate = append(candidate, f.items[:keepFirst]...)
+		f.parent[f.key] = append(candidate, f.items[keepFirst+dropped:]...)
+	}
+	if f.opts.Weights != nil {
+		// 按预先计算的权重度量, 不需要渲染
+		n = f.opts.Overhead
+		for i, w := range f.opts.Weights {
+			if i < keepFirst || i >= keepFirst+dropped {
+				n += w
+			}
+		}
+		return n, n <= f.opts.Budget, nil
+	}
+
+	buf.Reset()
+	f.renders++
+	f.rendered = -1
+	if f.length == nil {
+		// 按字节度量时, 超出预算的候选在写出时立即中止
+		err = executeData(&budgetWriter{buf: buf, limit: f.opts.Budget}, f.req, f.data)
+		if err != nil && errors.Is(err.err, errOverBudget) {
+			return f.opts.Budget + 1, false, nil
+		}
+		if err != nil {
+			return 0, false, err
+		}
+		f.rendered = dropped
+		return int64(buf.Len()), true, nil
+	}
+	if err = executeData(buf, f.req, f.data); err != nil {
+		return 0, false, err
+	}
+	f.rendered = dropped
+	var ptr *C.char
+	if buf.Len() > 0 {
+		ptr = (*C.char)(unsafe.Pointer(&buf.Bytes()[0]))
+	}
+	n = int64(C.call_fit_length(f.length, ptr, C.size_t(buf.Len())))
+	if n < 0 {
+		return 0, false, &renderError{"TEMPLATE_EXECUTE_ERROR", errLengthCallback}
+	}
+	return n, n <= f.opts.Budget, nil
+}
+
+// fit binary-searches the smallest number of dropped items whose output
+// fits the budget, assuming the length does not grow as items are dropped.
+func (f *fitter) fit(buf *bytes.Buffer) (*fitResult, *renderError) {
+	droppable := 0
+	if f.items != nil {
+		droppable = len(f.items) - f.opts.KeepFirst - f.opts.KeepLast
+		if droppable < 0 {
+			droppable = 0
+		}
+	}
+	n, fits, err := f.lenAt(buf, 0)
+	if err != nil {
+		return nil, err
+	}
+	best := 0
+	if !fits {
+		if droppable == 0 {
+			return nil, f.overBudget(buf, n)
+		}
+		// lo 不满足预算, hi 满足预算
+		lo, hi := 0, droppable
+		if n, fits, err = f.lenAt(buf, hi); err != nil {
+			return nil, err
+		}
+		if !fits {
+			return nil, f.overBudget(buf, n)
+		}
+		for hi-lo > 1 {
+			mid := lo + (hi-lo)/2
+			midLen, fits, err := f.lenAt(buf, mid)
+			if err != nil {
+				return nil, err
+			}
+			if fits {
+				hi, n = mid, midLen
+			} else {
+				lo = mid
+			}
+		}
+		best = hi
+	}
+	// 最后一次度量的候选可能不是结果, 需要重新度量
+	if f.rendered != best {
+		if n, _, err = f.lenAt(buf, best); err != nil {
+			return nil, err
+		}
+	}
+	if f.opts.Weights != nil {
+		buf.Reset()
+		f.renders++
+		if err = executeData(buf, f.req, f.data); err != nil {
+			return nil, err
+		}
+	}
+	kept := len(f.items) - best
+	return &fitResult{Output: buf.String(), Kept: kept, Dropped: best, Length: n, Renders: f.renders}, nil
+}
+
+// overBudget reports that the candidate measured last, the one with every
+// droppable item removed, does not fit. Measured in bytes, that render was
+// stopped at the budget, so it is rendered in full for the error message.
+func (f *fitter) overBudget(buf *bytes.Buffer, n int64) *renderError {
+	if f.length == nil && f.opts.Weights == nil {
+		buf.Reset()
+		if err := executeData(buf, f.req, f.data); err != nil {
+			return err
+		}
+		n = int64(buf.Len())
+	}
+	return &renderError{"RENDER_LIMIT_ERROR", &limitError{"budget",
+		fmt.Sprintf("output length %d exceeds the budget of %d even with all droppable items removed", n, f.opts.Budget)}}
+}
+
+// locateItems finds the list to trim; a missing field is an empty list.
+func (f *fitter) locateItems() error {
+	if len(f.opts.Field) == 0 {
+		return errors.New("fit field must not be empty")
+	}
+	// 复制路径上的对象再修改, 避免改动共享的常驻值
+	node, ok := f.data.(map[string]interface{})
+	if !ok {
+		return f.checkWeights(0)
+	}
+	node = copyMap(node)
+	f.data = node
+	for _, name := range f.opts.Field[:len(f.opts.Field)-1] {
+		child, ok := node[name].(map[string]interface{})
+		if !ok {
+			return f.checkWeights(0)
+		}
+		child = copyMap(child)
+		node[name] = child
+		node = child
+	}
+	f.parent, f.key = node, f.opts.Field[len(f.opts.Field)-1]
+	value, present := node[f.key]
+	if !present || value == nil {
+		return f.checkWeights(0)
+	}
+	items, ok := value.([]interface{})
+	if !ok {
+		return fmt.Errorf("fit field %v is not a list", f.opts.Field)
+	}
+	f.items = items
+	return f.checkWeights(len(items))
+}
+
+func copyMap(m map[string]interface{}) map[string]interface{} {
+	out := make(map[string]interface{}, len(m))
+	for k, v := range m {
+		out[k] = v
+	}
+	return out
+}
+
+func (f *fitter) checkWeights(items int) error {
+	if f.opts.Weights != nil && len(f.opts.Weights) != items {
+		return fmt.Errorf("got %d weights for %d items", len(f.opts.Weights), items)
+	}
+	return nil
+}
+
+// RenderTemplateFit renders the longest variant of the data that fits a
+// length budget, dropping items from the list at options.field: the first
+// keep_first and last keep_last items are always kept and the oldest of the
+// others are dropped first. The number of dropped items is found by binary
+// search, so only O(log n) candidates are rendered. Lengths are UTF-8 bytes,
+// the result of lengthFn when it is not NULL, or overhead plus the weights
+// of the kept items when options.weights is set. Returns a JSON document
+// {"output", "kept", "dropped", "length", "renders"}; a budget that cannot
+// be met is a RENDER_LIMIT_ERROR of kind "budget".
+//
+//export RenderTemplateFit
+func RenderTemplateFit(templateStr *C.char, jsonData *C.char, optionsJSON *C.char,
+	blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int, cancelFlag *C.int, lengthFn C.fit_length_fn) *C.char {
+	var opts fitOptions
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &opts); err != nil {
+		return storeString("JSON_ERROR: invalid options: " + err.Error())
+	}
+	if opts.KeepFirst < 0 || opts.KeepLast < 0 {
+		return storeString("JSON_ERROR: invalid options: keep_first and keep_last must not be negative")
+	}
+	req := &renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+		cancel:   (*int32)(unsafe.Pointer(cancelFlag)),
+	}
+	opts.apply(req)
+
+	data, renderErr := decodeData(req)
+	if renderErr != nil {
+		return storeString(renderErr.Error())
+	}
+	f := &fitter{req: req, opts: &opts, data: data, length: lengthFn, rendered: -1}
+	if err := f.locateItems(); err != nil {
+		return storeString("JSON_ERROR: " + err.Error())
+	}
+	// keep_first 与 keep_last 超过列表长度时全部保留
+	if f.items != nil && opts.KeepFirst > len(f.items) {
+		opts.KeepFirst = len(f.items)
+	}
+
+	buf := bufferPool.Get().(*bytes.Buffer)
+	defer releaseBuffer(buf)
+	result, err := f.fit(buf)
+	if err != nil {
+		return storeString(err.Error())
+	}
+	out, jsonErr := json.Marshal(result)
+	if jsonErr != nil {
+		return storeString("JSON_ERROR: " + jsonErr.Error())
+	}
+	return storeString(string(out))
+}
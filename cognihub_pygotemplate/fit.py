@@ -0,0 +1,70 @@
+"""按长度预算渲染.
+
+:meth:`GoTemplateEngine.render_fit` renders the longest prompt that fits a
+budget. Go decodes the data once, drops the oldest items of one list field
+(keeping a fixed number of leading and trailing items) and binary-searches
+the number of dropped items, so a request costs O(log n) renders inside Go
+instead of O(n) round trips from Python.
+"""
+import ctypes
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence, Union
+
+# 长度函数的C签名: long long (*)(const char *s, size_t n)
+LENGTH_FUNC = ctypes.CFUNCTYPE(ctypes.c_longlong, ctypes.c_void_p, ctypes.c_size_t)
+
+# 长度度量: None 按UTF-8字节, 可调用对象按渲染结果计算, 序列为每个列表项的预计算长度
+Length = Union[None, Callable[[str], int], Sequence[int]]
+
+
+@dataclass(frozen=True)
+class FitResult:
+    """
+    Outcome of :meth:`GoTemplateEngine.render_fit`.
+
+    ``kept`` and ``dropped`` count the items of the trimmed list; ``length``
+    is the measured length of ``output``; ``renders`` is the number of
+    candidate renders Go needed.
+    """
+    output: str
+    kept: int
+    dropped: int
+    length: int
+    renders: int
+
+
+class LengthCallback:
+    """
+    Wraps a Python length function for Go.
+
+    Exceptions cannot cross the C boundary: the first one is stored, Go is
+    told to stop, and :meth:`reraise` raises it after the call returns.
+    """
+
+    def __init__(self, func: Callable[[str], int]):
+        self._func = func
+        self.error: Optional[BaseException] = None
+        # 保持回调对象存活, 直到Go调用结束
+        self.pointer = LENGTH_FUNC(self._call)
+
+    def _call(self, ptr: Optional[int], size: int) -> int:
+        try:
+            text = ctypes.string_at(ptr, size).decode('utf-8') if size and ptr is not None else ""
+            length = int(self._func(text))
+            if length < 0:
+                raise ValueError(f"length function returned a negative length: {length}")
+            return length
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            return -1
+
+    @property
+    def _as_parameter_(self) -> Any:
+        # 以 void* 传参, 不使用长度函数时可传 None
+        return ctypes.cast(self.pointer, ctypes.c_void_p)
+
+    def reraise(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
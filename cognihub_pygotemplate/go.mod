@@ -0,0 +1,3 @@
+module cognihub_pygotemplate
+
+go 1.21
@@ -0,0 +1,152 @@
+package main
+
+import (
+	"sync"
+	"text/template"
+	"text/template/parse"
+)
+
+// templateVariant selects the tree transformations applied after parsing.
+// Every variant of a source is parsed and cached separately, so instrumented
+// trees never leak into plain renders.
+type templateVariant uint32
+
+const (
+	// variantLimits inserts probes that enforce render limits.
+	variantLimits templateVariant = 1 << iota
+	// variantProfile wraps nodes in probes that record execution profiles.
+	variantProfile
+	// variantOptimized rewrites the tree into a cheaper equivalent one.
+	variantOptimized
+	// variantSpans wraps ranges and printing actions in probes that record
+	// which output regions they produced.
+	variantSpans
+	// variantParallel lets ranges with independent iterations execute their
+	// items in concurrent chunks.
+	variantParallel
+)
+
+const variantPlain templateVariant = 0
+
+type templateKey struct {
+	src     string
+	variant templateVariant
+}
+
+// maxCachedTemplates bounds the parsed template cache; it is reset when full.
+const maxCachedTemplates = 1024
+
+// cachedTemplate is a parsed and transformed template together with the
+// metadata its transformations produced.
+type cachedTemplate struct {
+	tmpl *template.Template
+	// profile describes the profiled nodes of variantProfile templates.
+	profile []profileNode
+	// spans describes the instrumented nodes of variantSpans templates.
+	spans []spanNode
+	// parallel describes the rewritten ranges of variantParallel templates.
+	parallel []parallelRange
+}
+
+var (
+	templateCache   = make(map[templateKey]*cachedTemplate)
+	templateCacheMu sync.RWMutex
+)
+
+// getTemplate returns the parsed template for src, parsing and transforming
+// it on first use. Parsed templates are safe for concurrent execution and are
+// shared by all callers rendering the same source and variant.
+func getTemplate(src string, variant templateVariant) (*template.Template, error) {
+	entry, err := loadTemplate(src, variant)
+	if err != nil {
+		return nil, err
+	}
+	return entry.tmpl, nil
+}
+
+func loadTemplate(src string, variant templateVariant) (*cachedTemplate, error) {
+	key := templateKey{src, variant}
+	templateCacheMu.RLock()
+	entry, ok := templateCache[key]
+	templateCacheMu.RUnlock()
+	if ok {
+		return entry, nil
+	}
+
+	tmpl, err := template.New("ollama").Parse(src)
+	if err != nil {
+		return nil, err
+	}
+	entry = &cachedTemplate{tmpl: tmpl}
+	if variant&variantOptimized != 0 {
+		optimizeTemplate(tmpl)
+	}
+	if variant&variantParallel != 0 {
+		entry.parallel = instrumentParallel(tmpl)
+	}
+	// 先插入性能探针, 限制探针不应被计入节点
+	if variant&variantProfile != 0 {
+		entry.profile = instrumentProfile(tmpl)
+	}
+	if variant&variantSpans != 0 {
+		entry.spans = instrumentSpans(tmpl)
+	}
+	if variant&variantLimits != 0 {
+		instrumentLimits(tmpl)
+	}
+	templateCacheMu.Lock()
+	if len(templateCache) >= maxCachedTemplates {
+		templateCache = make(map[templateKey]*cachedTemplate)
+	}
+	templateCache[key] = entry
+	templateCacheMu.Unlock()
+	return entry, nil
+}
+
+// probeVar receives probe results so that probes print nothing.
+const probeVar = "$__probe"
+
+// newProbe builds {{$__probe := name args...}} positioned at pos. The
+// probe function is resolved at execution time, which lets every render bind
+// its own closures on a clone of the cached template.
+func newProbe(name string, pos parse.Pos, args ...parse.Node) *parse.ActionNode {
+	cmd := &parse.CommandNode{NodeType: parse.NodeCommand, Pos: pos}
+	cmd.Args = append([]parse.Node{parse.NewIdentifier(name).SetPos(pos)}, args...)
+	return &parse.ActionNode{
+		NodeType: parse.NodeAction,
+		Pos:      pos,
+		Pipe: &parse.PipeNode{
+			NodeType: parse.NodePipe,
+			Pos:      pos,
+			Decl:     []*parse.VariableNode{{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{probeVar}}},
+			Cmds:     []*parse.CommandNode{cmd},
+		},
+	}
+}
+
+// prepend inserts nodes at the start of list.
+func prepend(list *parse.ListNode, nodes ...parse.Node) {
+	list.Nodes = append(nodes, list.Nodes...)
+}
+
+// walkList calls fn for every node reachable from list, parents before
+// their children. Nodes inserted by fn into a list are not visited.
+func walkList(list *parse.ListNode, fn func(parse.Node)) {
+	if list == nil {
+		return
+	}
+	for _, n := range list.Nodes {
+		fn(n)
+		switch node := n.(type) {
+		case *parse.IfNode:
+			walkList(node.List, fn)
+			walkList(node.ElseList, fn)
+		case *parse.RangeNode:
+			walkList(node.List, fn)
+			walkList(node.ElseList, fn)
+		case *parse.WithNode:
+			walkList(node.List, fn)
+			walkList(node.ElseList, fn)
+		}
+	}
+}
@@ -0,0 +1,190 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"context"
+	"encoding/json"
+	"fmt"
+	"io"
+	"sync/atomic"
+	"text/template"
+	"text/template/parse"
+	"time"
+	"unsafe"
+)
+
+// renderLimits bounds the resources a single render may use. Zero disables a limit.
+type renderLimits struct {
+	TimeoutMs          int64 `json:"timeout_ms"`
+	MaxOutputBytes     int64 `json:"max_output_bytes"`
+	MaxRangeIterations int64 `json:"max_range_iterations"`
+}
+
+func (l *renderLimits) active() bool {
+	return l != nil && (l.TimeoutMs > 0 || l.MaxOutputBytes > 0 || l.MaxRangeIterations > 0)
+}
+
+// limitError reports which limit stopped a render.
+type limitError struct {
+	kind string
+	msg  string
+}
+
+func (e *limitError) Error() string {
+	return e.kind + ": " + e.msg
+}
+
+const (
+	rangeTickFunc = "__limit_range"
+	callTickFunc  = "__limit_call"
+)
+
+// instrumentLimits inserts a probe at the start of every range body and of
+// every template, the only places where execution time is not bounded by
+// the size of the template.
+func instrumentLimits(tmpl *template.Template) {
+	for _, t := range tmpl.Templates() {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		walkList(t.Tree.Root, func(n parse.Node) {
+			if r, ok := n.(*parse.RangeNode); ok {
+				prepend(r.List, newProbe(rangeTickFunc, r.Position()))
+			}
+		})
+		prepend(t.Tree.Root, newProbe(callTickFunc, t.Tree.Root.Position()))
+	}
+	noop := func() (string, error) { return "", nil }
+	tmpl.Funcs(template.FuncMap{rangeTickFunc: noop, callTickFunc: noop})
+}
+
+// limitState is the per-render state shared by the probes and the writer.
+type limitState struct {
+	limits     renderLimits
+	ctx        context.Context
+	cancel     *int32
+	iterations int64
+	written    int64
+	err        atomic.Pointer[limitError]
+}
+
+func (s *limitState) fail(kind, msg string) error {
+	e := &limitError{kind, msg}
+	s.err.CompareAndSwap(nil, e)
+	return s.err.Load()
+}
+
+// check reports cancellation and deadline expiry.
+func (s *limitState) check() error {
+	if s.cancel != nil && atomic.LoadInt32(s.cancel) != 0 {
+		return s.fail("cancelled", "render was cancelled")
+	}
+	if s.ctx.Err() != nil {
+		return s.fail("deadline", fmt.Sprintf("render exceeded the %dms deadline", s.limits.TimeoutMs))
+	}
+	return nil
+}
+
+func (s *limitState) rangeTick() (string, error) {
+	if max := s.limits.MaxRangeIterations; max > 0 && atomic.AddInt64(&s.iterations, 1) > max {
+		return "", s.fail("range", fmt.Sprintf("render exceeded %d range iterations", max))
+	}
+	return "", s.check()
+}
+
+func (s *limitState) callTick() (string, error) {
+	return "", s.check()
+}
+
+// limitWriter enforces the output cap and stops writing once the render was
+// cancelled or timed out.
+type limitWriter struct {
+	w     io.Writer
+	state *limitState
+}
+
+func (l *limitWriter) Write(p []byte) (int, error) {
+	if err := l.state.check(); err != nil {
+		return 0, err
+	}
+	if max := l.state.limits.MaxOutputBytes; max > 0 && atomic.AddInt64(&l.state.written, int64(len(p))) > max {
+		return 0, l.state.fail("output", fmt.Sprintf("render output exceeded %d bytes", max))
+	}
+	return l.w.Write(p)
+}
+
+// newLimitState prepares the limit state of req. The returned function
+// releases the deadline timer and must be called once the render is done.
+func newLimitState(req *renderRequest) (*limitState, context.CancelFunc) {
+	state := &limitState{cancel: req.cancel, ctx: context.Background()}
+	if req.limits != nil {
+		state.limits = *req.limits
+	}
+	release := context.CancelFunc(func() {})
+	if state.limits.TimeoutMs > 0 {
+		state.ctx, release = context.WithTimeout(state.ctx, time.Duration(state.limits.TimeoutMs)*time.Millisecond)
+	}
+	return state, release
+}
+
+// funcs binds the limit probes of a variantLimits template to this render.
+func (s *limitState) funcs() template.FuncMap {
+	return template.FuncMap{rangeTickFunc: s.rangeTick, callTickFunc: s.callTick}
+}
+
+// result maps the outcome of a limited execution to a render error; a limit
+// violation takes precedence over the execution error it caused.
+func (s *limitState) result(execErr error) *renderError {
+	if limitErr := s.err.Load(); limitErr != nil {
+		return &renderError{"RENDER_LIMIT_ERROR", limitErr}
+	}
+	if execErr != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", execErr}
+	}
+	return nil
+}
+
+// executeLimited runs the limit-instrumented variant of the template with
+// per-render probe closures bound on a clone.
+func executeLimited(w io.Writer, req *renderRequest, data interface{}) *renderError {
+	tmpl, err := getTemplate(req.template, req.baseVariant(data)|variantLimits)
+	if err != nil {
+		return &renderError{"TEMPLATE_PARSE_ERROR", err}
+	}
+
+	state, release := newLimitState(req)
+	defer release()
+
+	clone, err := tmpl.Clone()
+	if err != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", err}
+	}
+	clone.Funcs(state.funcs())
+
+	return state.result(clone.Execute(&limitWriter{w: w, state: state}, data))
+}
+
+// RenderTemplateOptions renders with resource limits given as a JSON object
+// ({"timeout_ms", "max_output_bytes", "max_range_iterations"}). cancelFlag may
+// point at an int the caller sets to non-zero to abort the render; it is
+// polled at every range iteration, template call and output write.
+//
+//export RenderTemplateOptions
+func RenderTemplateOptions(templateStr *C.char, jsonData *C.char, optionsJSON *C.char,
+	blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int, cancelFlag *C.int) *C.char {
+	var opts renderOptions
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &opts); err != nil {
+		return storeString("JSON_ERROR: invalid options: " + err.Error())
+	}
+	req := &renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+		cancel:   (*int32)(unsafe.Pointer(cancelFlag)),
+	}
+	opts.apply(req)
+	return render(req)
+}
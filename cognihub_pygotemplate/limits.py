@@ -0,0 +1,90 @@
+"""渲染资源限制与取消.
+
+Limits are enforced inside Go: a probe inserted at every range iteration and
+template call counts iterations and polls the deadline and cancellation flag,
+and a limiting writer caps the output size. A render that hits a limit stops
+immediately and raises :class:`RenderLimitError`.
+"""
+import ctypes
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional
+
+
+class RenderLimitError(ValueError):
+    """
+    Raised when a render exceeds one of its limits or is cancelled.
+
+    ``kind`` is one of ``"deadline"``, ``"output"``, ``"range"`` or ``"cancelled"``,
+    or ``"budget"`` when :meth:`GoTemplateEngine.render_fit` cannot meet its budget.
+    """
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+@dataclass(frozen=True)
+class RenderLimits:
+    """
+    Resource limits for a render; ``None`` leaves a limit disabled.
+
+    :param timeout: wall-clock deadline in seconds.
+    :param max_output_bytes: maximum size of the rendered output in bytes.
+    :param max_range_iterations: maximum number of ``range`` iterations,
+        summed over all ranges of the render.
+    """
+    timeout: Optional[float] = None
+    max_output_bytes: Optional[int] = None
+    max_range_iterations: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is not None and value <= 0:
+                raise ValueError(f"{f.name} must be positive")
+
+    def merged(self, override: Optional["RenderLimits"]) -> "RenderLimits":
+        """Returns these limits with every limit set in ``override`` replaced."""
+        if override is None:
+            return self
+        return RenderLimits(**{
+            f.name: getattr(override, f.name) if getattr(override, f.name) is not None else getattr(self, f.name)
+            for f in fields(self)
+        })
+
+    def to_options(self) -> Dict[str, Any]:
+        """Serializes the limits for the Go side."""
+        options: Dict[str, Any] = {}
+        if self.timeout is not None:
+            # Go端以毫秒计, 不足1ms的超时向上取整
+            options["timeout_ms"] = max(1, int(self.timeout * 1000 + 0.999))
+        if self.max_output_bytes is not None:
+            options["max_output_bytes"] = int(self.max_output_bytes)
+        if self.max_range_iterations is not None:
+            options["max_range_iterations"] = int(self.max_range_iterations)
+        return options
+
+
+class CancelToken:
+    """
+    Cancels in-flight renders from another thread.
+
+    Go polls the token's flag directly, so :meth:`cancel` takes effect at the
+    next range iteration, template call or output write of every render using
+    the token. A cancelled token stays cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._flag = ctypes.c_int(0)
+
+    def cancel(self) -> None:
+        self._flag.value = 1
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self._flag.value)
+
+    @property
+    def _as_parameter_(self) -> Any:
+        # ctypes 传参协议: 以指向标志位的指针传给Go
+        return ctypes.byref(self._flag)
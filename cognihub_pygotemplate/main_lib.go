@@ -0,0 +1,6 @@
+//go:build !renderd
+
+package main
+
+// c-shared 构建需要一个空的 main 函数; renderd 构建使用 renderd.go 中的 main
+func main() {}
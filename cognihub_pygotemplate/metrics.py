@@ -0,0 +1,347 @@
+"""渲染遥测.
+
+Publishes :meth:`GoTemplateEngine.render` telemetry without wrapping call
+sites: render counts and latency histograms by template, error counts by
+category, in-flight renders, and input and output bytes.
+
+Two sinks are provided and may be combined:
+
+* :class:`PrometheusMetrics` keeps the metrics in process and renders them in
+  the Prometheus text exposition format. It needs no third-party package; when
+  ``prometheus_client`` is installed it can also be registered as a collector.
+* :class:`OpenTelemetryMetrics` records OpenTelemetry metrics and one span per
+  render through ``opentelemetry-api``, which is imported only when it is built.
+
+Telemetry is process-wide and off by default. While it is off the only cost on
+the render path is one ``is not None`` check::
+
+    metrics = PrometheusMetrics()
+    enable_telemetry(metrics)
+    ...
+    body = metrics.exposition()
+"""
+import bisect
+import hashlib
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .engine import GoTemplateEngine
+from .limits import CancelToken, RenderLimits
+
+# 延迟直方图的默认桶(秒), 覆盖从几十微秒的小模板到秒级的大渲染
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Go端错误前缀到错误类别
+_ERROR_CATEGORIES = (
+    ("JSON_ERROR:", "json"),
+    ("TEMPLATE_PARSE_ERROR:", "parse"),
+    ("TEMPLATE_EXECUTE_ERROR:", "execute"),
+    ("RENDER_LIMIT_ERROR:", "limit"),
+)
+
+
+def error_category(error: BaseException) -> str:
+    """Classifies a render exception as json, parse, execute, limit or other."""
+    if isinstance(error, TypeError):
+        # json.dumps 无法序列化数据
+        return "json"
+    message = str(error)
+    for prefix, category in _ERROR_CATEGORIES:
+        if prefix in message:
+            return category
+    return "other"
+
+
+def default_label(engine: GoTemplateEngine) -> str:
+    """
+    Names the template of ``engine`` in telemetry.
+
+    File-backed engines are named by their path; other templates by a short
+    digest of their source, so the label is stable across processes.
+    """
+    path = getattr(engine, "path", None)
+    if path is not None:
+        return str(path)
+    return "sha1:" + hashlib.sha1(engine.template_content.encode("utf-8")).hexdigest()[:12]
+
+
+class RenderSample:
+    """Measurements of one render, passed to :meth:`TelemetrySink.finish`."""
+    __slots__ = ("template", "input_bytes", "output_bytes", "duration", "error")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+
+class TelemetrySink:
+    """Receives render telemetry; subclasses override :meth:`start` and :meth:`finish`."""
+
+    def start(self, sample: RenderSample) -> Any:
+        """Called before the render; the return value is passed to :meth:`finish`."""
+        return None
+
+    def finish(self, sample: RenderSample, token: Any) -> None:
+        """Called after the render, whether it succeeded or not."""
+
+
+class _Telemetry:
+    """The object installed as ``GoTemplateEngine._telemetry``."""
+
+    def __init__(self, sinks: Sequence[TelemetrySink], label: Callable[[GoTemplateEngine], str]):
+        self.sinks = tuple(sinks)
+        self.label = label
+        # 每个引擎缓存一次标签, 模板内容变化(热更新)时重新计算
+        self._labels: "weakref.WeakKeyDictionary[GoTemplateEngine, Tuple[str, str]]" = weakref.WeakKeyDictionary()
+
+    def _label(self, engine: GoTemplateEngine) -> str:
+        content = engine.template_content
+        cached = self._labels.get(engine)
+        if cached is not None and cached[0] is content:
+            return cached[1]
+        label = self.label(engine)
+        self._labels[engine] = (content, label)
+        return label
+
+    def render(self, engine: GoTemplateEngine, data: Dict[str, Any], limits: Optional[RenderLimits],
+               cancel: Optional[CancelToken]) -> str:
+        sample = RenderSample(self._label(engine))
+        tokens = [sink.start(sample) for sink in self.sinks]
+        start = time.perf_counter()
+        try:
+            output = engine._render(data, limits, cancel, sample)
+        except BaseException as e:
+            sample.error = error_category(e)
+            raise
+        else:
+            sample.output_bytes = len(output) if output.isascii() else len(output.encode("utf-8"))
+            return output
+        finally:
+            sample.duration = time.perf_counter() - start
+            for sink, token in zip(self.sinks, tokens):
+                sink.finish(sample, token)
+
+
+def enable_telemetry(*sinks: TelemetrySink, label: Callable[[GoTemplateEngine], str] = default_label) -> None:
+    """
+    Sends the telemetry of every :meth:`GoTemplateEngine.render` call in the
+    process to ``sinks``, replacing any sinks enabled before. ``label`` names
+    the template of an engine; see :func:`default_label`.
+    """
+    if not sinks:
+        raise ValueError("at least one sink is required")
+    GoTemplateEngine._telemetry = _Telemetry(sinks, label)
+
+
+def disable_telemetry() -> None:
+    """Stops collecting telemetry."""
+    GoTemplateEngine._telemetry = None
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+
+
+class _TemplateMetrics:
+    __slots__ = ("renders", "errors", "in_flight", "input_bytes", "output_bytes", "latency")
+
+    def __init__(self, buckets: int):
+        self.renders = 0
+        self.errors: Dict[str, int] = {}
+        self.in_flight = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.latency = _Histogram(buckets)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class PrometheusMetrics(TelemetrySink):
+    """
+    In-process render metrics in the Prometheus data model.
+
+    Exposes, with a ``template`` label on every series:
+
+    * ``<prefix>_renders_total`` counter;
+    * ``<prefix>_render_errors_total`` counter, also labelled by ``category``;
+    * ``<prefix>_render_duration_seconds`` histogram;
+    * ``<prefix>_renders_in_flight`` gauge;
+    * ``<prefix>_render_input_bytes_total`` and
+      ``<prefix>_render_output_bytes_total`` counters.
+
+    Input bytes are the serialized render data including blobs; output bytes
+    are the UTF-8 size of the rendered text.
+    """
+
+    def __init__(self, prefix: str = "cognihub_template", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        if list(buckets) != sorted(buckets) or not buckets:
+            raise ValueError("buckets must be a non-empty increasing sequence")
+        self.prefix = prefix
+        self.buckets = tuple(float(b) for b in buckets)
+        self._templates: Dict[str, _TemplateMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _metrics(self, template: str) -> _TemplateMetrics:
+        metrics = self._templates.get(template)
+        if metrics is None:
+            metrics = self._templates.setdefault(template, _TemplateMetrics(len(self.buckets)))
+        return metrics
+
+    def start(self, sample: RenderSample) -> Any:
+        with self._lock:
+            self._metrics(sample.template).in_flight += 1
+        return None
+
+    def finish(self, sample: RenderSample, token: Any) -> None:
+        index = bisect.bisect_left(self.buckets, sample.duration)
+        with self._lock:
+            metrics = self._metrics(sample.template)
+            metrics.in_flight -= 1
+            metrics.renders += 1
+            if sample.error is not None:
+                metrics.errors[sample.error] = metrics.errors.get(sample.error, 0) + 1
+            metrics.input_bytes += sample.input_bytes
+            metrics.output_bytes += sample.output_bytes
+            metrics.latency.counts[index] += 1
+            metrics.latency.sum += sample.duration
+
+    def _snapshot(self) -> Dict[str, _TemplateMetrics]:
+        with self._lock:
+            snapshot = {}
+            for template, metrics in self._templates.items():
+                copy = _TemplateMetrics(len(self.buckets))
+                copy.renders, copy.in_flight = metrics.renders, metrics.in_flight
+                copy.errors = dict(metrics.errors)
+                copy.input_bytes, copy.output_bytes = metrics.input_bytes, metrics.output_bytes
+                copy.latency.counts = list(metrics.latency.counts)
+                copy.latency.sum = metrics.latency.sum
+                snapshot[template] = copy
+            return snapshot
+
+    def _families(self) -> Iterator[Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]]:
+        """Yields ``(name, type, help, samples)`` with samples as ``(name, labels, value)``."""
+        p = self.prefix
+        snapshot = sorted(self._snapshot().items())
+        yield (f"{p}_renders", "counter", "Template renders.",
+               [(f"{p}_renders_total", {"template": t}, m.renders) for t, m in snapshot])
+        yield (f"{p}_render_errors", "counter", "Failed template renders by error category.",
+               [(f"{p}_render_errors_total", {"template": t, "category": c}, n)
+                for t, m in snapshot for c, n in sorted(m.errors.items())])
+        histogram: List[Tuple[str, Dict[str, str], float]] = []
+        for t, m in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), m.latency.counts):
+                cumulative += count
+                histogram.append((f"{p}_render_duration_seconds_bucket",
+                                  {"template": t, "le": _format_float(bound)}, cumulative))
+            histogram.append((f"{p}_render_duration_seconds_count", {"template": t}, cumulative))
+            histogram.append((f"{p}_render_duration_seconds_sum", {"template": t}, m.latency.sum))
+        yield (f"{p}_render_duration_seconds", "histogram", "Template render latency in seconds.", histogram)
+        yield (f"{p}_renders_in_flight", "gauge", "Template renders in progress.",
+               [(f"{p}_renders_in_flight", {"template": t}, m.in_flight) for t, m in snapshot])
+        yield (f"{p}_render_input_bytes", "counter", "Bytes of serialized render data.",
+               [(f"{p}_render_input_bytes_total", {"template": t}, m.input_bytes) for t, m in snapshot])
+        yield (f"{p}_render_output_bytes", "counter", "Bytes of rendered output.",
+               [(f"{p}_render_output_bytes_total", {"template": t}, m.output_bytes) for t, m in snapshot])
+
+    def exposition(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, kind, help_text, samples in self._families():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{sample_name}{{{rendered}}} {_format_float(value)}")
+        return "\n".join(lines) + "\n"
+
+    def collect(self) -> Iterator[Any]:
+        """
+        ``prometheus_client`` collector protocol, so the metrics can be served
+        by an existing exporter::
+
+            prometheus_client.REGISTRY.register(metrics)
+        """
+        from prometheus_client.core import Metric
+
+        for name, kind, help_text, samples in self._families():
+            metric = Metric(name, help_text, kind)
+            for sample_name, labels, value in samples:
+                metric.add_sample(sample_name, labels, value)
+            yield metric
+
+
+class OpenTelemetryMetrics(TelemetrySink):
+    """
+    Records render telemetry with the OpenTelemetry API.
+
+    Instruments, all with a ``template`` attribute: ``<prefix>.renders`` and
+    ``<prefix>.render.errors`` (plus ``category``) counters, the
+    ``<prefix>.render.duration`` histogram in seconds, the
+    ``<prefix>.renders.in_flight`` up-down counter, and the
+    ``<prefix>.render.input_bytes`` and ``<prefix>.render.output_bytes``
+    counters. With ``spans`` each render also becomes a ``template.render``
+    span carrying the same measurements. The global providers are used unless
+    ``meter_provider`` or ``tracer_provider`` is given.
+    """
+
+    def __init__(self, prefix: str = "cognihub.template", meter_provider: Any = None,
+                 tracer_provider: Any = None, spans: bool = True):
+        try:
+            from opentelemetry import metrics, trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryMetrics requires the 'opentelemetry-api' package") from e
+        self._trace = trace
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        self._tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider) if spans else None
+        self._renders = meter.create_counter(f"{prefix}.renders", unit="1", description="Template renders.")
+        self._errors = meter.create_counter(f"{prefix}.render.errors", unit="1",
+                                            description="Failed template renders by error category.")
+        self._duration = meter.create_histogram(f"{prefix}.render.duration", unit="s",
+                                                description="Template render latency.")
+        self._in_flight = meter.create_up_down_counter(f"{prefix}.renders.in_flight", unit="1",
+                                                       description="Template renders in progress.")
+        self._input = meter.create_counter(f"{prefix}.render.input_bytes", unit="By",
+                                           description="Bytes of serialized render data.")
+        self._output = meter.create_counter(f"{prefix}.render.output_bytes", unit="By",
+                                            description="Bytes of rendered output.")
+
+    def start(self, sample: RenderSample) -> Any:
+        self._in_flight.add(1, {"template": sample.template})
+        if self._tracer is None:
+            return None
+        return self._tracer.start_span("template.render", attributes={"template": sample.template})
+
+    def finish(self, sample: RenderSample, token: Any) -> None:
+        attributes = {"template": sample.template}
+        self._in_flight.add(-1, attributes)
+        self._renders.add(1, attributes)
+        self._duration.record(sample.duration, attributes)
+        self._input.add(sample.input_bytes, attributes)
+        self._output.add(sample.output_bytes, attributes)
+        if sample.error is not None:
+            self._errors.add(1, {"template": sample.template, "category": sample.error})
+        if token is not None:
+            token.set_attribute("input_bytes", sample.input_bytes)
+            token.set_attribute("output_bytes", sample.output_bytes)
+            if sample.error is not None:
+                token.set_attribute("error.type", sample.error)
+                token.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+            token.end()
@@ -0,0 +1,362 @@
+package main
+
+import (
+	"bytes"
+	"errors"
+	"strconv"
+	"text/template"
+	"text/template/parse"
+)
+
+// pureBuiltins are the builtin functions whose result depends only on their
+// arguments; pipelines built from them and literals are constant.
+var pureBuiltins = map[string]bool{
+	"and": true, "or": true, "not": true, "len": true, "index": true, "slice": true,
+	"print": true, "printf": true, "println": true, "html": true, "js": true, "urlquery": true,
+	"eq": true, "ne": true, "lt": true, "le": true, "gt": true, "ge": true,
+}
+
+// maxFoldedBytes bounds the text a folded constant may produce.
+const maxFoldedBytes = 64 << 10
+
+// hoistVarPrefix names the variables that hold lookups hoisted out of ranges.
+const hoistVarPrefix = "$__hoist"
+
+// optimizeTemplate rewrites the parse trees of tmpl into trees that produce
+// byte-identical output with fewer nodes to execute:
+//
+//   - actions whose pipeline is constant become text;
+//   - if nodes over constant pipelines are replaced by the taken branch;
+//   - adjacent text nodes are merged and empty ones dropped;
+//   - root-level $.Field values printed or tested inside range bodies of
+//     the main template are evaluated once before the range.
+//
+// Constant values are computed by executing the node with stock
+// text/template, and nodes whose evaluation fails are left untouched so that
+// the error still happens at the same point of the render. Hoisting assumes
+// that the data is a map, which execute checks before choosing this variant.
+func optimizeTemplate(tmpl *template.Template) {
+	for _, t := range tmpl.Templates() {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		foldList(t.Tree.Root)
+		// 只有主模板中的 $ 一定是根数据, 子模板的 $ 是调用参数
+		if t.Name() == tmpl.Name() && !assignsDollar(t.Tree.Root) {
+			hoistList(t.Tree.Root, &hoistNamer{used: declaredVariables(t.Tree.Root)})
+		}
+	}
+}
+
+func foldList(list *parse.ListNode) {
+	if list == nil {
+		return
+	}
+	out := make([]parse.Node, 0, len(list.Nodes))
+	for _, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			if text, ok := constantAction(node); ok {
+				out = appendMerged(out, &parse.TextNode{NodeType: parse.NodeText, Pos: node.Pos, Text: []byte(text)})
+				continue
+			}
+		case *parse.IfNode:
+			foldList(node.List)
+			foldList(node.ElseList)
+			if branch, ok := constantBranch(node); ok {
+				if branch != nil {
+					for _, inner := range branch.Nodes {
+						out = appendMerged(out, inner)
+					}
+				}
+				continue
+			}
+		case *parse.RangeNode:
+			foldList(node.List)
+			foldList(node.ElseList)
+		case *parse.WithNode:
+			foldList(node.List)
+			foldList(node.ElseList)
+		}
+		out = appendMerged(out, n)
+	}
+	list.Nodes = out
+}
+
+// appendMerged appends n, merging it into a preceding text node.
+func appendMerged(out []parse.Node, n parse.Node) []parse.Node {
+	text, ok := n.(*parse.TextNode)
+	if !ok {
+		return append(out, n)
+	}
+	if len(text.Text) == 0 {
+		return out
+	}
+	if len(out) > 0 {
+		if prev, ok := out[len(out)-1].(*parse.TextNode); ok {
+			merged := make([]byte, 0, len(prev.Text)+len(text.Text))
+			merged = append(append(merged, prev.Text...), text.Text...)
+			out[len(out)-1] = &parse.TextNode{NodeType: parse.NodeText, Pos: prev.Pos, Text: merged}
+			return out
+		}
+	}
+	return append(out, n)
+}
+
+func constantAction(node *parse.ActionNode) (string, bool) {
+	if len(node.Pipe.Decl) > 0 || !constantPipe(node.Pipe) {
+		return "", false
+	}
+	return evalConstant(node.Copy())
+}
+
+// constantBranch returns the branch an if node over a constant pipeline
+// always takes. Branches declaring variables are not inlined, since their
+// variables would then outlive the if.
+func constantBranch(node *parse.IfNode) (*parse.ListNode, bool) {
+	if len(node.Pipe.Decl) > 0 || !constantPipe(node.Pipe) {
+		return nil, false
+	}
+	probe := &parse.IfNode{BranchNode: parse.BranchNode{
+		NodeType: parse.NodeIf, Pos: node.Pos, Line: node.Line,
+		Pipe: node.Pipe.CopyPipe(),
+		List: &parse.ListNode{NodeType: parse.NodeList, Nodes: []parse.Node{&parse.TextNode{NodeType: parse.NodeText, Text: []byte("1")}}},
+	}}
+	taken, ok := evalConstant(probe)
+	if !ok {
+		return nil, false
+	}
+	branch := node.ElseList
+	if taken == "1" {
+		branch = node.List
+	}
+	if declaresVariables(branch) {
+		return nil, false
+	}
+	return branch, true
+}
+
+func constantPipe(pipe *parse.PipeNode) bool {
+	if pipe == nil || len(pipe.Cmds) == 0 {
+		return false
+	}
+	for _, cmd := range pipe.Cmds {
+		for i, arg := range cmd.Args {
+			switch a := arg.(type) {
+			case *parse.IdentifierNode:
+				if i != 0 || !pureBuiltins[a.Ident] {
+					return false
+				}
+			case *parse.StringNode, *parse.NumberNode, *parse.BoolNode:
+			case *parse.PipeNode:
+				if len(a.Decl) > 0 || !constantPipe(a) {
+					return false
+				}
+			default:
+				return false
+			}
+		}
+	}
+	return true
+}
+
+// evalConstant executes a single constant node with stock text/template.
+func evalConstant(node parse.Node) (string, bool) {
+	tree := &parse.Tree{Name: "const", Root: &parse.ListNode{NodeType: parse.NodeList, Nodes: []parse.Node{node}}}
+	tmpl, err := template.New("const").AddParseTree("const", tree)
+	if err != nil {
+		return "", false
+	}
+	var buf bytes.Buffer
+	if err := tmpl.Execute(&cappedWriter{&buf}, nil); err != nil {
+		return "", false
+	}
+	return buf.String(), true
+}
+
+type cappedWriter struct {
+	buf *bytes.Buffer
+}
+
+func (c *cappedWriter) Write(p []byte) (int, error) {
+	if c.buf.Len()+len(p) > maxFoldedBytes {
+		return 0, errFoldTooLarge
+	}
+	return c.buf.Write(p)
+}
+
+var errFoldTooLarge = errors.New("folded constant too large")
+
+// declaresVariables reports whether list declares a variable at any depth,
+// including parenthesized pipelines such as {{print ($y := 2)}}. Inlining
+// such a branch would leak the declaration out of the if's scope.
+func declaresVariables(list *parse.ListNode) bool {
+	found := false
+	walkPipes(list, func(pipe *parse.PipeNode) {
+		if len(pipe.Decl) > 0 && !pipe.IsAssign {
+			found = true
+		}
+	})
+	return found
+}
+
+// assignsDollar reports whether the tree assigns to $, which would make $
+// lookups variant.
+func assignsDollar(list *parse.ListNode) bool {
+	found := false
+	walkPipes(list, func(pipe *parse.PipeNode) {
+		for _, v := range pipe.Decl {
+			if v.Ident[0] == "$" {
+				found = true
+			}
+		}
+	})
+	return found
+}
+
+// hoistList evaluates every $.Field used inside a range body once, in a
+// variable declared right before the outermost range that uses it.
+func hoistList(list *parse.ListNode, names *hoistNamer) {
+	if list == nil {
+		return
+	}
+	out := make([]parse.Node, 0, len(list.Nodes))
+	for _, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.RangeNode:
+			hoisted := make(map[string]string)
+			var decls []parse.Node
+			rewriteRootFields(node.List, func(field string) string {
+				name, ok := hoisted[field]
+				if !ok {
+					name = names.name()
+					hoisted[field] = name
+					decls = append(decls, hoistDecl(name, field, node.Pos))
+				}
+				return name
+			})
+			out = append(out, decls...)
+			hoistList(node.ElseList, names)
+		case *parse.IfNode:
+			hoistList(node.List, names)
+			hoistList(node.ElseList, names)
+		case *parse.WithNode:
+			hoistList(node.List, names)
+			hoistList(node.ElseList, names)
+		}
+		out = append(out, n)
+	}
+	list.Nodes = out
+}
+
+// hoistNamer hands out names for hoisted variables that the template does
+// not declare itself.
+type hoistNamer struct {
+	next int
+	used map[string]bool
+}
+
+func (h *hoistNamer) name() string {
+	for {
+		name := hoistVarPrefix + strconv.Itoa(h.next)
+		h.next++
+		if !h.used[name] {
+			return name
+		}
+	}
+}
+
+// declaredVariables returns the names of the variables declared in list;
+// the parser rejects references to undeclared ones.
+func declaredVariables(list *parse.ListNode) map[string]bool {
+	names := make(map[string]bool)
+	walkPipes(list, func(pipe *parse.PipeNode) {
+		for _, v := range pipe.Decl {
+			names[v.Ident[0]] = true
+		}
+	})
+	return names
+}
+
+// hoistDecl builds {{name := $.field}}.
+func hoistDecl(name, field string, pos parse.Pos) *parse.ActionNode {
+	cmd := &parse.CommandNode{NodeType: parse.NodeCommand, Pos: pos, Args: []parse.Node{
+		&parse.VariableNode{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{"$", field}},
+	}}
+	return &parse.ActionNode{
+		NodeType: parse.NodeAction,
+		Pos:      pos,
+		Pipe: &parse.PipeNode{
+			NodeType: parse.NodePipe,
+			Pos:      pos,
+			Decl:     []*parse.VariableNode{{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{name}}},
+			Cmds:     []*parse.CommandNode{cmd},
+		},
+	}
+}
+
+// rewriteRootFields replaces $.field with the variable returned by name
+// where it cannot appear in an error message: as a command of its own in the
+// pipeline of an action, if or with. As a function argument, in a range
+// pipeline, a chain or a parenthesized pipeline, the stock error names the
+// node ("at <len $.Missing>"), so those uses are kept.
+func rewriteRootFields(list *parse.ListNode, name func(field string) string) {
+	rewrite := func(pipe *parse.PipeNode) {
+		for _, cmd := range pipe.Cmds {
+			if len(cmd.Args) != 1 {
+				continue
+			}
+			if v, ok := cmd.Args[0].(*parse.VariableNode); ok && len(v.Ident) == 2 && v.Ident[0] == "$" {
+				cmd.Args[0] = &parse.VariableNode{NodeType: parse.NodeVariable, Pos: v.Pos, Ident: []string{name(v.Ident[1])}}
+			}
+		}
+	}
+	walkList(list, func(n parse.Node) {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			rewrite(node.Pipe)
+		case *parse.IfNode:
+			rewrite(node.Pipe)
+		case *parse.WithNode:
+			rewrite(node.Pipe)
+		}
+	})
+}
+
+// walkPipes calls fn for every pipeline in list, including parenthesized
+// pipelines nested in arguments.
+func walkPipes(list *parse.ListNode, fn func(*parse.PipeNode)) {
+	var pipe func(*parse.PipeNode)
+	pipe = func(p *parse.PipeNode) {
+		if p == nil {
+			return
+		}
+		fn(p)
+		for _, cmd := range p.Cmds {
+			for _, arg := range cmd.Args {
+				switch a := arg.(type) {
+				case *parse.PipeNode:
+					pipe(a)
+				case *parse.ChainNode:
+					if inner, ok := a.Node.(*parse.PipeNode); ok {
+						pipe(inner)
+					}
+				}
+			}
+		}
+	}
+	walkList(list, func(n parse.Node) {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			pipe(node.Pipe)
+		case *parse.IfNode:
+			pipe(node.Pipe)
+		case *parse.RangeNode:
+			pipe(node.Pipe)
+		case *parse.WithNode:
+			pipe(node.Pipe)
+		case *parse.TemplateNode:
+			pipe(node.Pipe)
+		}
+	})
+}
@@ -0,0 +1,115 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"bytes"
+	"encoding/json"
+	"errors"
+	"os"
+	"unsafe"
+)
+
+// outputOptions describes where RenderTemplateTo writes the rendered text.
+type outputOptions struct {
+	renderOptions
+	// FD is an OS file descriptor (a HANDLE on Windows), used when Path is empty.
+	FD int64 `json:"fd"`
+	// Path is opened, written and closed by Go within the call.
+	Path string `json:"path"`
+	// Append opens Path with O_APPEND instead of truncating it.
+	Append bool `json:"append"`
+	// JSONLKey, when set, writes {"<key>": "<output>"}\n instead of the raw text.
+	JSONLKey string `json:"jsonl_key"`
+}
+
+// RenderTemplateTo renders the template and writes the result straight to a
+// file descriptor or path, so the output never crosses back into Python.
+// It returns NULL on success and stores the number of bytes written.
+//
+//export RenderTemplateTo
+func RenderTemplateTo(templateStr *C.char, jsonData *C.char, optionsJSON *C.char,
+	blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int, cancelFlag *C.int, written *C.longlong) *C.char {
+	var opts outputOptions
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &opts); err != nil {
+		return storeString("OUTPUT_ERROR: invalid options: " + err.Error())
+	}
+
+	buf := bufferPool.Get().(*bytes.Buffer)
+	defer releaseBuffer(buf)
+	req := &renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+		cancel:   (*int32)(unsafe.Pointer(cancelFlag)),
+	}
+	opts.apply(req)
+	// 先完整渲染到缓冲区, 执行出错时不会写出半截内容
+	if err := execute(buf, req); err != nil {
+		return storeString(err.Error())
+	}
+
+	payload := buf.Bytes()
+	if opts.JSONLKey != "" {
+		line := bufferPool.Get().(*bytes.Buffer)
+		defer releaseBuffer(line)
+		if err := encodeJSONLine(line, opts.JSONLKey, buf.String()); err != nil {
+			return storeString("OUTPUT_ERROR: " + err.Error())
+		}
+		payload = line.Bytes()
+	}
+
+	if err := writeOutput(&opts, payload); err != nil {
+		return storeString("OUTPUT_ERROR: " + err.Error())
+	}
+	if written != nil {
+		*written = C.longlong(len(payload))
+	}
+	return nil
+}
+
+// encodeJSONLine writes {"key": "value"}\n without HTML escaping.
+func encodeJSONLine(line *bytes.Buffer, key string, value string) error {
+	enc := json.NewEncoder(line)
+	enc.SetEscapeHTML(false)
+	line.WriteByte('{')
+	if err := enc.Encode(key); err != nil {
+		return err
+	}
+	// Encoder.Encode 会追加换行符, 需要去掉
+	line.Truncate(line.Len() - 1)
+	line.WriteByte(':')
+	if err := enc.Encode(value); err != nil {
+		return err
+	}
+	line.Truncate(line.Len() - 1)
+	line.WriteString("}\n")
+	return nil
+}
+
+func writeOutput(opts *outputOptions, payload []byte) error {
+	if opts.Path == "" {
+		if opts.FD < 0 {
+			return errors.New("either a file descriptor or a path is required")
+		}
+		return writeFD(uintptr(opts.FD), payload)
+	}
+
+	flags := os.O_WRONLY | os.O_CREATE
+	if opts.Append {
+		flags |= os.O_APPEND
+	} else {
+		flags |= os.O_TRUNC
+	}
+	f, err := os.OpenFile(opts.Path, flags, 0o644)
+	if err != nil {
+		return err
+	}
+	if _, err := f.Write(payload); err != nil {
+		f.Close()
+		return err
+	}
+	return f.Close()
+}
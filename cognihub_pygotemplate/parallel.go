@@ -0,0 +1,431 @@
+package main
+
+import (
+	"bytes"
+	"errors"
+	"fmt"
+	"io"
+	"runtime"
+	"sort"
+	"strings"
+	"sync"
+	"text/template"
+	"text/template/parse"
+)
+
+const (
+	parOKFunc    = "__par_ok"
+	parExecFunc  = "__par_exec"
+	parItemsFunc = "__par_items"
+	parArgFunc   = "__par_arg"
+
+	// parTemplatePrefix names the templates that execute one chunk of items.
+	parTemplatePrefix = "__par_range"
+
+	// minChunkItems is the fewest items worth a goroutine of their own.
+	minChunkItems = 32
+)
+
+// parallelRange is a range whose body is executed in chunks by the template
+// named name, which redeclares the outer variables vars before ranging over
+// the chunk.
+type parallelRange struct {
+	name string
+	// caller is the template the range belongs to.
+	caller string
+	vars   []string
+	// indexed ranges declare an index variable; their chunks keep the
+	// original indexes.
+	indexed bool
+}
+
+// instrumentParallel rewrites every range whose iterations cannot affect each
+// other into
+//
+//	{{if __par_ok ID PIPE}}{{__par_exec ID PIPE $ $outer...}}{{else}}RANGE{{end}}
+//
+// and adds a template per range that executes the body over one chunk of the
+// items. A range qualifies when it iterates a data value, its body assigns no
+// variable with "=" and has no break of its own; the body's outer variables
+// are passed to the chunks by value. The original range stays in place for
+// short lists and for renders without parallel execution.
+func instrumentParallel(tmpl *template.Template) []parallelRange {
+	noop := func(...interface{}) (interface{}, error) { return nil, nil }
+	tmpl.Funcs(template.FuncMap{parItemsFunc: func() interface{} { return nil }, parArgFunc: func(int) interface{} { return nil },
+		parOKFunc: func(int, interface{}) bool { return false }, parExecFunc: noop})
+	templates := tmpl.Templates()
+	sort.Slice(templates, func(i, j int) bool { return templates[i].Name() < templates[j].Name() })
+	p := &parallelizer{tmpl: tmpl}
+	for _, t := range templates {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		p.caller = t.Name()
+		p.list(t.Tree.Root, map[string]bool{})
+	}
+	return p.ranges
+}
+
+type parallelizer struct {
+	tmpl   *template.Template
+	caller string
+	ranges []parallelRange
+}
+
+// list rewrites the qualifying ranges in list; scope holds the variables
+// declared at this point, which list extends with its own declarations.
+func (p *parallelizer) list(list *parse.ListNode, scope map[string]bool) {
+	if list == nil {
+		return
+	}
+	for i, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			declareNames(scope, node.Pipe)
+		case *parse.IfNode:
+			p.branch(&node.BranchNode, scope)
+		case *parse.WithNode:
+			p.branch(&node.BranchNode, scope)
+		case *parse.RangeNode:
+			if replacement := p.rangeNode(node, scope); replacement != nil {
+				list.Nodes[i] = replacement
+			}
+			p.branch(&node.BranchNode, scope)
+		}
+	}
+}
+
+func (p *parallelizer) branch(b *parse.BranchNode, scope map[string]bool) {
+	inner := copyScope(scope)
+	declareNames(inner, b.Pipe)
+	p.list(b.List, inner)
+	p.list(b.ElseList, copyScope(scope))
+}
+
+func copyScope(scope map[string]bool) map[string]bool {
+	out := make(map[string]bool, len(scope))
+	for k := range scope {
+		out[k] = true
+	}
+	return out
+}
+
+func declareNames(scope map[string]bool, pipe *parse.PipeNode) {
+	if pipe != nil && !pipe.IsAssign {
+		for _, v := range pipe.Decl {
+			scope[v.Ident[0]] = true
+		}
+	}
+}
+
+// rangeNode returns the replacement of a qualifying range, or nil. It must
+// run before the body is rewritten, so that chunks execute plain ranges.
+func (p *parallelizer) rangeNode(node *parse.RangeNode, scope map[string]bool) parse.Node {
+	pipe := node.Pipe
+	if pipe.IsAssign || len(pipe.Cmds) != 1 || len(pipe.Cmds[0].Args) != 1 {
+		return nil
+	}
+	switch pipe.Cmds[0].Args[0].(type) {
+	case *parse.DotNode, *parse.FieldNode, *parse.VariableNode, *parse.ChainNode:
+	default:
+		return nil
+	}
+	if !independentBody(node.List) {
+		return nil
+	}
+
+	// 循环体引用的外层变量按值传给分块模板
+	own := map[string]bool{}
+	declareNames(own, pipe)
+	var vars []string
+	seen := map[string]bool{}
+	walkVariables(node.List, func(name string) {
+		if name != "$" && scope[name] && !own[name] && !seen[name] {
+			seen[name] = true
+			vars = append(vars, name)
+		}
+	})
+	sort.Strings(vars)
+
+	id := len(p.ranges)
+	name := fmt.Sprintf("%s%d", parTemplatePrefix, id)
+	var src strings.Builder
+	for i, v := range vars {
+		fmt.Fprintf(&src, "{{%s := %s %d}}", v, parArgFunc, i)
+	}
+	decl := make([]string, len(pipe.Decl))
+	for i, v := range pipe.Decl {
+		decl[i] = v.Ident[0]
+	}
+	if len(decl) > 0 {
+		fmt.Fprintf(&src, "{{range %s := %s}}{{end}}", strings.Join(decl, ", "), parItemsFunc)
+	} else {
+		fmt.Fprintf(&src, "{{range %s}}{{end}}", parItemsFunc)
+	}
+	chunk, err := p.tmpl.New(name).Parse(src.String())
+	if err != nil {
+		return nil
+	}
+	root := chunk.Tree.Root.Nodes
+	root[len(root)-1].(*parse.RangeNode).List = node.List.CopyList()
+	p.ranges = append(p.ranges, parallelRange{name: name, caller: p.caller, vars: vars, indexed: len(decl) == 2})
+
+	pos := node.Position()
+	value := pipe.Cmds[0].Args[0]
+	exec := []parse.Node{probeID(id, pos), value.Copy(), &parse.VariableNode{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{"$"}}}
+	for _, v := range vars {
+		exec = append(exec, &parse.VariableNode{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{v}})
+	}
+	test := &parse.PipeNode{NodeType: parse.NodePipe, Pos: pos, Cmds: []*parse.CommandNode{{
+		NodeType: parse.NodeCommand, Pos: pos,
+		Args: []parse.Node{parse.NewIdentifier(parOKFunc).SetPos(pos), probeID(id, pos), value.Copy()},
+	}}}
+	return &parse.IfNode{BranchNode: parse.BranchNode{
+		NodeType: parse.NodeIf, Pos: pos, Line: node.Line, Pipe: test,
+		List: &parse.ListNode{NodeType: parse.NodeList, Pos: pos, Nodes: []parse.Node{&parse.ActionNode{
+			NodeType: parse.NodeAction, Pos: pos, Line: node.Line,
+			Pipe: &parse.PipeNode{NodeType: parse.NodePipe, Pos: pos, Cmds: []*parse.CommandNode{{
+				NodeType: parse.NodeCommand, Pos: pos,
+				Args: append([]parse.Node{parse.NewIdentifier(parExecFunc).SetPos(pos)}, exec...),
+			}}},
+		}}},
+		ElseList: &parse.ListNode{NodeType: parse.NodeList, Pos: pos, Nodes: []parse.Node{node}},
+	}}
+}
+
+// independentBody reports whether iterations of a range with this body
+// cannot influence each other: no variable is assigned with "=", even in a
+// parenthesized pipeline, and no break ends the range early.
+func independentBody(list *parse.ListNode) bool {
+	assigns := false
+	walkPipes(list, func(pipe *parse.PipeNode) {
+		if pipe.IsAssign {
+			assigns = true
+		}
+	})
+	return !assigns && !breaksRange(list)
+}
+
+// breaksRange reports whether list contains a break that ends the enclosing
+// range. A break in a nested range's body belongs to that range; one in its
+// else branch belongs to the enclosing range.
+func breaksRange(list *parse.ListNode) bool {
+	if list == nil {
+		return false
+	}
+	for _, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.BreakNode:
+			return true
+		case *parse.IfNode:
+			if breaksRange(node.List) || breaksRange(node.ElseList) {
+				return true
+			}
+		case *parse.WithNode:
+			if breaksRange(node.List) || breaksRange(node.ElseList) {
+				return true
+			}
+		case *parse.RangeNode:
+			if breaksRange(node.ElseList) {
+				return true
+			}
+		}
+	}
+	return false
+}
+
+// walkVariables calls fn with the name of every variable referenced in list.
+func walkVariables(list *parse.ListNode, fn func(string)) {
+	var visit func(parse.Node)
+	visit = func(n parse.Node) {
+		switch node := n.(type) {
+		case *parse.VariableNode:
+			fn(node.Ident[0])
+		case *parse.PipeNode:
+			if node == nil {
+				return
+			}
+			for _, cmd := range node.Cmds {
+				for _, arg := range cmd.Args {
+					visit(arg)
+				}
+			}
+		case *parse.ChainNode:
+			visit(node.Node)
+		}
+	}
+	walkList(list, func(n parse.Node) {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			visit(node.Pipe)
+		case *parse.IfNode:
+			visit(node.Pipe)
+		case *parse.WithNode:
+			visit(node.Pipe)
+		case *parse.RangeNode:
+			visit(node.Pipe)
+		case *parse.TemplateNode:
+			visit(node.Pipe)
+		}
+	})
+}
+
+// parallelState executes the qualifying ranges of one render in chunks.
+type parallelState struct {
+	tmpl   *template.Template
+	ranges []parallelRange
+	// out receives the chunk outputs in order; wrap applies the render's
+	// limits to the writer of every chunk.
+	out     io.Writer
+	wrap    func(io.Writer) io.Writer
+	workers int
+	// err is the error of the first failed chunk, reported unwrapped.
+	err error
+}
+
+func (s *parallelState) funcs() template.FuncMap {
+	return template.FuncMap{parOKFunc: s.ok, parExecFunc: s.exec}
+}
+
+// chunks returns how many chunks n items are split into.
+func (s *parallelState) chunks(n int) int {
+	chunks := n / minChunkItems
+	if chunks > s.workers {
+		chunks = s.workers
+	}
+	return chunks
+}
+
+func (s *parallelState) ok(id int, list interface{}) bool {
+	switch items := list.(type) {
+	case []interface{}:
+		return s.chunks(len(items)) > 1
+	case map[string]interface{}:
+		return s.chunks(len(items)) > 1
+	}
+	return false
+}
+
+// exec renders the chunks of list concurrently and writes their outputs in
+// order. It writes to the render's writer directly: text/template has
+// written everything before the action, and the action itself prints "".
+func (s *parallelState) exec(id int, list interface{}, root interface{}, args ...interface{}) (string, error) {
+	r := s.ranges[id]
+	var parts []interface{}
+	switch items := list.(type) {
+	case []interface{}:
+		n := s.chunks(len(items))
+		for c := 0; c < n; c++ {
+			lo, hi := c*len(items)/n, (c+1)*len(items)/n
+			if !r.indexed {
+				parts = append(parts, items[lo:hi])
+				continue
+			}
+			// 以原下标为键的map按键排序迭代, 保持 $i 不变
+			part := make(map[int]interface{}, hi-lo)
+			for i := lo; i < hi; i++ {
+				part[i] = items[i]
+			}
+			parts = append(parts, part)
+		}
+	case map[string]interface{}:
+		keys := make([]string, 0, len(items))
+		for k := range items {
+			keys = append(keys, k)
+		}
+		sort.Strings(keys)
+		n := s.chunks(len(keys))
+		for c := 0; c < n; c++ {
+			part := make(map[string]interface{})
+			for _, k := range keys[c*len(keys)/n : (c+1)*len(keys)/n] {
+				part[k] = items[k]
+			}
+			parts = append(parts, part)
+		}
+	}
+
+	bufs := make([]bytes.Buffer, len(parts))
+	errs := make([]error, len(parts))
+	var wg sync.WaitGroup
+	for c := range parts {
+		chunk, err := s.tmpl.Clone()
+		if err != nil {
+			return "", err
+		}
+		part := parts[c]
+		// 分块内不再并行, 避免goroutine数随嵌套层数相乘
+		chunk.Funcs(template.FuncMap{
+			parItemsFunc: func() interface{} { return part },
+			parArgFunc:   func(i int) interface{} { return args[i] },
+			parOKFunc:    func(int, interface{}) bool { return false },
+		})
+		wg.Add(1)
+		go func(c int) {
+			defer wg.Done()
+			errs[c] = chunk.ExecuteTemplate(s.wrap(&bufs[c]), r.name, root)
+		}(c)
+	}
+	wg.Wait()
+	for c := range parts {
+		if errs[c] != nil {
+			// 错误信息与顺序执行时一致, 不暴露分块模板名
+			s.err = errors.New(strings.Replace(errs[c].Error(),
+				fmt.Sprintf("executing %q", r.name), fmt.Sprintf("executing %q", r.caller), 1))
+			return "", s.err
+		}
+		if _, err := s.out.Write(bufs[c].Bytes()); err != nil {
+			return "", err
+		}
+	}
+	return "", nil
+}
+
+// executeParallel renders the parallel variant of the template, combined with
+// the limit probes when the request has limits.
+func executeParallel(w io.Writer, req *renderRequest, data interface{}) *renderError {
+	limited := req.limits.active() || req.cancel != nil
+	variant := req.baseVariant(data) | variantParallel
+	if limited {
+		variant |= variantLimits
+	}
+	entry, err := loadTemplate(req.template, variant)
+	if err != nil {
+		return &renderError{"TEMPLATE_PARSE_ERROR", err}
+	}
+	clone, err := entry.tmpl.Clone()
+	if err != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", err}
+	}
+
+	state := &parallelState{tmpl: clone, ranges: entry.parallel, out: w, workers: req.parallel,
+		wrap: func(w io.Writer) io.Writer { return w }}
+	if state.workers < 0 {
+		state.workers = runtime.GOMAXPROCS(0)
+	}
+	funcs := state.funcs()
+	var limits *limitState
+	if limited {
+		var release func()
+		limits, release = newLimitState(req)
+		defer release()
+		for name, fn := range limits.funcs() {
+			funcs[name] = fn
+		}
+		// 分块输出在写入时已计入限制, 合并时直接写入下层
+		state.wrap = func(w io.Writer) io.Writer { return &limitWriter{w: w, state: limits} }
+		w = state.wrap(w)
+	}
+	clone.Funcs(funcs)
+
+	execErr := clone.Execute(w, data)
+	if execErr != nil && state.err != nil {
+		execErr = state.err
+	}
+	if limits != nil {
+		return limits.result(execErr)
+	}
+	if execErr != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", execErr}
+	}
+	return nil
+}
@@ -0,0 +1,58 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"os"
+	"runtime/pprof"
+	"sync"
+)
+
+var (
+	cpuProfileMu   sync.Mutex
+	cpuProfileFile *os.File
+)
+
+// StartCPUProfile starts writing a pprof CPU profile of the library to path,
+// for use as a profile-guided optimization input (go build -pgo=path). It
+// returns NULL on success or an error string.
+//
+//export StartCPUProfile
+func StartCPUProfile(path *C.char) *C.char {
+	cpuProfileMu.Lock()
+	defer cpuProfileMu.Unlock()
+	if cpuProfileFile != nil {
+		return storeString("PROFILE_ERROR: a CPU profile is already being recorded")
+	}
+	f, err := os.Create(C.GoString(path))
+	if err != nil {
+		return storeString("PROFILE_ERROR: " + err.Error())
+	}
+	if err := pprof.StartCPUProfile(f); err != nil {
+		f.Close()
+		return storeString("PROFILE_ERROR: " + err.Error())
+	}
+	cpuProfileFile = f
+	return nil
+}
+
+// StopCPUProfile stops the profile started by StartCPUProfile and closes its
+// file. It returns NULL on success or an error string.
+//
+//export StopCPUProfile
+func StopCPUProfile() *C.char {
+	cpuProfileMu.Lock()
+	defer cpuProfileMu.Unlock()
+	if cpuProfileFile == nil {
+		return storeString("PROFILE_ERROR: no CPU profile is being recorded")
+	}
+	pprof.StopCPUProfile()
+	err := cpuProfileFile.Close()
+	cpuProfileFile = nil
+	if err != nil {
+		return storeString("PROFILE_ERROR: " + err.Error())
+	}
+	return nil
+}
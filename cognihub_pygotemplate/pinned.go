@@ -0,0 +1,194 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"encoding/json"
+	"fmt"
+	"strings"
+	"sync"
+)
+
+// pinKey 标记对常驻值的引用, 与Python端 refs.PIN_KEY 保持一致
+const pinKey = "\x00pin"
+
+// pinMarker is how pinKey appears in JSON produced by Python's json.dumps;
+// data without it cannot hold references and skips the resolve pass.
+const pinMarker = `"\u0000pin"`
+
+// defaultPinnedLimit bounds the total size of pinned values unless changed
+// with SetPinnedLimit.
+const defaultPinnedLimit = 256 << 20
+
+// pinnedEntry is a decoded value shared by every render that references it.
+// Templates never modify their data, so the value is shared without copying.
+type pinnedEntry struct {
+	value interface{}
+	// size is the length of the JSON the value was decoded from.
+	size int64
+	refs int64
+	key  string
+}
+
+var pinned = struct {
+	sync.RWMutex
+	entries  map[int64]*pinnedEntry
+	keys     map[string]int64
+	next     int64
+	bytes    int64
+	maxBytes int64
+}{entries: make(map[int64]*pinnedEntry), keys: make(map[string]int64), maxBytes: defaultPinnedLimit}
+
+// pinResult is the JSON document returned by PinValue.
+type pinResult struct {
+	ID    int64 `json:"id"`
+	Bytes int64 `json:"bytes"`
+	Refs  int64 `json:"refs"`
+}
+
+// lookupPinned returns the value pinned under id.
+func lookupPinned(id int64) (interface{}, bool) {
+	pinned.RLock()
+	entry, ok := pinned.entries[id]
+	pinned.RUnlock()
+	if !ok {
+		return nil, false
+	}
+	return entry.value, true
+}
+
+// needsResolve reports whether decoded data may hold blob or pin references.
+func (req *renderRequest) needsResolve() bool {
+	return req.blobs != nil || strings.Contains(req.data, pinMarker)
+}
+
+func marshalPin(id int64, entry *pinnedEntry) *C.char {
+	out, _ := json.Marshal(pinResult{ID: id, Bytes: entry.size, Refs: entry.refs})
+	return storeString(string(out))
+}
+
+// PinValue decodes jsonData once and keeps it for renders that reference it
+// as {"\x00pin": id}. With a non-empty key, a value already pinned under the
+// key gains a reference instead; jsonData may then be NULL, and an empty
+// string is returned when nothing is pinned under the key. Returns a JSON
+// document {"id", "bytes", "refs"} or a JSON_ERROR / PIN_LIMIT_ERROR string
+// when the value would exceed the limit on the total size of pinned values.
+//
+//export PinValue
+func PinValue(key *C.char, jsonData *C.char) *C.char {
+	var name string
+	if key != nil {
+		name = C.GoString(key)
+	}
+	if name != "" {
+		pinned.Lock()
+		id, ok := pinned.keys[name]
+		if ok {
+			entry := pinned.entries[id]
+			entry.refs++
+			pinned.Unlock()
+			return marshalPin(id, entry)
+		}
+		pinned.Unlock()
+	}
+	if jsonData == nil {
+		return storeString("")
+	}
+
+	src := C.GoString(jsonData)
+	size := int64(len(src))
+	var value interface{}
+	if err := json.Unmarshal([]byte(src), &value); err != nil {
+		return storeString("JSON_ERROR: " + err.Error())
+	}
+	if strings.Contains(src, pinMarker) {
+		// 常驻值可以引用其他常驻值, 固定时解析一次
+		resolved, err := resolveRefs(value, nil)
+		if err != nil {
+			return storeString("JSON_ERROR: " + err.Error())
+		}
+		value = resolved
+	}
+
+	pinned.Lock()
+	defer pinned.Unlock()
+	if name != "" {
+		// 解码期间其他线程可能已用同一个键固定了值
+		if id, ok := pinned.keys[name]; ok {
+			entry := pinned.entries[id]
+			entry.refs++
+			return marshalPin(id, entry)
+		}
+	}
+	if pinned.bytes+size > pinned.maxBytes {
+		return storeString(fmt.Sprintf("PIN_LIMIT_ERROR: pinning %d bytes would exceed the limit of %d bytes (%d in use)",
+			size, pinned.maxBytes, pinned.bytes))
+	}
+	pinned.next++
+	id := pinned.next
+	entry := &pinnedEntry{value: value, size: size, refs: 1, key: name}
+	pinned.entries[id] = entry
+	pinned.bytes += size
+	if name != "" {
+		pinned.keys[name] = id
+	}
+	return marshalPin(id, entry)
+}
+
+// ReleasePinned drops one reference to a pinned value and frees it with the
+// last one. Renders already using the value are not affected. Returns the
+// remaining references, or -1 for an unknown id.
+//
+//export ReleasePinned
+func ReleasePinned(id C.longlong) C.longlong {
+	pinned.Lock()
+	defer pinned.Unlock()
+	entry, ok := pinned.entries[int64(id)]
+	if !ok {
+		return -1
+	}
+	entry.refs--
+	if entry.refs > 0 {
+		return C.longlong(entry.refs)
+	}
+	delete(pinned.entries, int64(id))
+	if entry.key != "" {
+		delete(pinned.keys, entry.key)
+	}
+	pinned.bytes -= entry.size
+	return 0
+}
+
+// SetPinnedLimit sets the limit on the total size of pinned values; values
+// already pinned stay pinned even if they exceed it.
+//
+//export SetPinnedLimit
+func SetPinnedLimit(maxBytes C.longlong) {
+	pinned.Lock()
+	pinned.maxBytes = int64(maxBytes)
+	pinned.Unlock()
+}
+
+// pinnedStats is the JSON document returned by PinnedStats.
+type pinnedStats struct {
+	Values   int   `json:"values"`
+	Bytes    int64 `json:"bytes"`
+	MaxBytes int64 `json:"max_bytes"`
+	Refs     int64 `json:"refs"`
+}
+
+// PinnedStats returns a JSON snapshot of the pinned value store.
+//
+//export PinnedStats
+func PinnedStats() *C.char {
+	pinned.RLock()
+	stats := pinnedStats{Values: len(pinned.entries), Bytes: pinned.bytes, MaxBytes: pinned.maxBytes}
+	for _, entry := range pinned.entries {
+		stats.Refs += entry.refs
+	}
+	pinned.RUnlock()
+	out, _ := json.Marshal(stats)
+	return storeString(string(out))
+}
@@ -0,0 +1,254 @@
+"""有界渲染线程池.
+
+``RenderTemplate`` is called through ``ctypes.CDLL``, which releases the GIL for
+the duration of the call, so renders on separate threads run in parallel in
+Go. :class:`RenderPool` runs them on a fixed set of threads behind a bounded,
+prioritized queue so that overload turns into rejections or backpressure
+instead of an ever-growing backlog.
+"""
+import asyncio
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .engine import GoTemplateEngine
+from .limits import RenderLimits
+
+POLICY_BLOCK = "block"
+POLICY_REJECT = "reject"
+
+
+class PoolOverloadedError(RuntimeError):
+    """Raised when a render cannot be queued because the pool is full."""
+
+
+class LatencySummary(NamedTuple):
+    """Summary of recent latency samples, in seconds."""
+    samples: int
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @classmethod
+    def of(cls, samples: Iterable[float]) -> "LatencySummary":
+        ordered = sorted(samples)
+        n = len(ordered)
+        if not n:
+            return cls(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+        def pct(p: float) -> float:
+            return ordered[min(n - 1, int(math.ceil(p * n)) - 1)]
+
+        return cls(n, sum(ordered) / n, pct(0.50), pct(0.95), pct(0.99), ordered[-1])
+
+
+class PoolStats(NamedTuple):
+    """Counters and latency summaries of a :class:`RenderPool`."""
+    submitted: int
+    completed: int
+    failed: int
+    rejected: int
+    queued: int
+    in_flight: int
+    queue_wait: LatencySummary
+    service_time: LatencySummary
+
+
+class _Task(NamedTuple):
+    engine: GoTemplateEngine
+    data: Dict[str, Any]
+    limits: Optional[RenderLimits]
+    future: "Future[str]"
+    enqueued_at: float
+
+
+# 关闭线程池时放入的哨兵优先级, 排在所有真实任务之后
+_SENTINEL_PRIORITY = math.inf
+
+
+class RenderPool:
+    """
+    Fixed-size thread pool for :meth:`GoTemplateEngine.render` calls.
+
+    :param workers: number of render threads, defaults to the CPU count.
+    :param max_queue: maximum number of renders waiting for a worker.
+    :param policy: ``"block"`` waits for queue space (up to ``block_timeout``
+        seconds, forever when None); ``"reject"`` raises
+        :class:`PoolOverloadedError` immediately when the queue is full.
+    :param priorities: number of priority lanes; lane 0 is served first and
+        renders within a lane run in submission order.
+    :param sample_size: number of recent samples kept for latency summaries.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: int = 1024, policy: str = POLICY_BLOCK,
+                 priorities: int = 3, block_timeout: Optional[float] = None, sample_size: int = 10000,
+                 name: str = "render-pool"):
+        if policy not in (POLICY_BLOCK, POLICY_REJECT):
+            raise ValueError(f"policy must be '{POLICY_BLOCK}' or '{POLICY_REJECT}'")
+        if max_queue <= 0:
+            raise ValueError("max_queue must be positive")
+        if priorities <= 0:
+            raise ValueError("priorities must be positive")
+        if workers is not None and workers <= 0:
+            raise ValueError("workers must be positive")
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.policy = policy
+        self.priorities = priorities
+        self.block_timeout = block_timeout
+
+        self._queue: "queue.PriorityQueue[Tuple[float, int, Optional[_Task]]]" = queue.PriorityQueue()
+        # 用信号量限制排队数量, 哨兵不占用名额
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._in_flight = 0
+        self._queue_wait: Deque[float] = deque(maxlen=sample_size)
+        self._service_time: Deque[float] = deque(maxlen=sample_size)
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, engine: GoTemplateEngine, data: Dict[str, Any], priority: int = 0,
+               limits: Optional[RenderLimits] = None) -> "Future[str]":
+        """Queues a render and returns a future for its output."""
+        if not 0 <= priority < self.priorities:
+            raise ValueError(f"priority must be in [0, {self.priorities})")
+        self._check_open()
+        blocking = self.policy == POLICY_BLOCK
+        if not self._slots.acquire(blocking, self.block_timeout if blocking else None):
+            with self._lock:
+                self._rejected += 1
+            raise PoolOverloadedError(f"render queue is full ({self.max_queue} pending)")
+        return self._enqueue(engine, data, priority, limits)
+
+    def _enqueue(self, engine: GoTemplateEngine, data: Dict[str, Any], priority: int,
+                 limits: Optional[RenderLimits]) -> "Future[str]":
+        future: "Future[str]" = Future()
+        with self._lock:
+            # 等待名额期间线程池可能已关闭, 此时不再有线程取走任务
+            if self._shutdown:
+                self._slots.release()
+                raise RuntimeError("cannot submit to a RenderPool after shutdown")
+            self._submitted += 1
+            self._queue.put((priority, next(self._seq), _Task(engine, data, limits, future, time.perf_counter())))
+        return future
+
+    def _check_open(self) -> None:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a RenderPool after shutdown")
+
+    def render(self, engine: GoTemplateEngine, data: Dict[str, Any], priority: int = 0,
+               limits: Optional[RenderLimits] = None) -> str:
+        """Renders through the pool and waits for the result."""
+        return self.submit(engine, data, priority, limits).result()
+
+    async def render_async(self, engine: GoTemplateEngine, data: Dict[str, Any], priority: int = 0,
+                           limits: Optional[RenderLimits] = None) -> str:
+        """
+        Renders through the pool without blocking the event loop.
+
+        With the block policy, waiting for queue space happens in a helper
+        thread only when the queue is actually full.
+        """
+        if not 0 <= priority < self.priorities:
+            raise ValueError(f"priority must be in [0, {self.priorities})")
+        self._check_open()
+        if self._slots.acquire(blocking=False):
+            future = self._enqueue(engine, data, priority, limits)
+        elif self.policy == POLICY_REJECT:
+            with self._lock:
+                self._rejected += 1
+            raise PoolOverloadedError(f"render queue is full ({self.max_queue} pending)")
+        else:
+            future = await asyncio.to_thread(self.submit, engine, data, priority, limits)
+        return await asyncio.wrap_future(future)
+
+    def _worker(self) -> None:
+        while True:
+            _, _, task = self._queue.get()
+            if task is None:
+                return
+            self._slots.release()
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            with self._lock:
+                self._in_flight += 1
+                self._queue_wait.append(started - task.enqueued_at)
+            try:
+                result = task.engine.render(task.data, task.limits)
+            except BaseException as e:
+                failed = True
+                task.future.set_exception(e)
+            else:
+                failed = False
+                task.future.set_result(result)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._service_time.append(time.perf_counter() - started)
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                submitted=self._submitted,
+                completed=self._completed,
+                failed=self._failed,
+                rejected=self._rejected,
+                queued=self._queue.qsize(),
+                in_flight=self._in_flight,
+                queue_wait=LatencySummary.of(self._queue_wait),
+                service_time=LatencySummary.of(self._service_time),
+            )
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """
+        Stops the workers once the queued renders are done.
+
+        With ``cancel_pending`` the queued renders are cancelled instead.
+        """
+        with self._lock:
+            self._shutdown = True
+        if cancel_pending:
+            while True:
+                try:
+                    _, _, task = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is not None:
+                    self._slots.release()
+                    task.future.cancel()
+        for _ in self._threads:
+            self._queue.put((_SENTINEL_PRIORITY, next(self._seq), None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self) -> "RenderPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
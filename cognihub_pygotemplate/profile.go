@@ -0,0 +1,366 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"bytes"
+	"encoding/json"
+	"io"
+	"sort"
+	"strconv"
+	"strings"
+	"text/template"
+	"text/template/parse"
+	"time"
+	"unsafe"
+)
+
+const (
+	profEnterFunc = "__prof_enter"
+	profExitFunc  = "__prof_exit"
+	profIterFunc  = "__prof_iter"
+
+	// maxSourceLen bounds the node source snippets in reports.
+	maxSourceLen = 80
+)
+
+// profileNode describes one profiled node of a template.
+type profileNode struct {
+	ID int `json:"id"`
+	// Parent is the id of the enclosing profiled node in the same template, -1 at the top level.
+	Parent   int    `json:"parent"`
+	Kind     string `json:"kind"`
+	Template string `json:"template"`
+	Line     int    `json:"line"`
+	Col      int    `json:"col"`
+	Source   string `json:"source"`
+}
+
+// instrumentProfile wraps every action, if, range, with and template call in
+// enter/exit probes and starts every range body with an iteration probe. It
+// returns the description of the wrapped nodes, indexed by probe id.
+func instrumentProfile(tmpl *template.Template) []profileNode {
+	templates := tmpl.Templates()
+	// 按名称排序, 保证同一模板每次解析得到相同的节点编号
+	sort.Slice(templates, func(i, j int) bool { return templates[i].Name() < templates[j].Name() })
+	var nodes []profileNode
+	for _, t := range templates {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		profileList(t.Tree, t.Tree.Root, -1, &nodes)
+	}
+	noop := func(int) string { return "" }
+	tmpl.Funcs(template.FuncMap{profEnterFunc: noop, profExitFunc: noop, profIterFunc: noop})
+	return nodes
+}
+
+func profileList(tree *parse.Tree, list *parse.ListNode, parent int, nodes *[]profileNode) {
+	if list == nil {
+		return
+	}
+	out := make([]parse.Node, 0, len(list.Nodes))
+	for _, n := range list.Nodes {
+		kind, header := profileKind(n)
+		if kind == "" {
+			out = append(out, n)
+			continue
+		}
+		id := len(*nodes)
+		*nodes = append(*nodes, describeNode(tree, n, id, parent, kind, header))
+		switch node := n.(type) {
+		case *parse.IfNode:
+			profileList(tree, node.List, id, nodes)
+			profileList(tree, node.ElseList, id, nodes)
+		case *parse.RangeNode:
+			profileList(tree, node.List, id, nodes)
+			prepend(node.List, newProbe(profIterFunc, node.Position(), probeID(id, node.Position())))
+			profileList(tree, node.ElseList, id, nodes)
+		case *parse.WithNode:
+			profileList(tree, node.List, id, nodes)
+			profileList(tree, node.ElseList, id, nodes)
+		}
+		pos := n.Position()
+		out = append(out, newProbe(profEnterFunc, pos, probeID(id, pos)), n, newProbe(profExitFunc, pos, probeID(id, pos)))
+	}
+	list.Nodes = out
+}
+
+// profileKind classifies the nodes worth profiling; text, comments, break
+// and continue are attributed to their enclosing node.
+func profileKind(n parse.Node) (string, string) {
+	switch node := n.(type) {
+	case *parse.ActionNode:
+		return "action", node.String()
+	case *parse.IfNode:
+		return "if", "{{if " + node.Pipe.String() + "}}"
+	case *parse.RangeNode:
+		return "range", "{{range " + node.Pipe.String() + "}}"
+	case *parse.WithNode:
+		return "with", "{{with " + node.Pipe.String() + "}}"
+	case *parse.TemplateNode:
+		return "template", node.String()
+	}
+	return "", ""
+}
+
+func describeNode(tree *parse.Tree, n parse.Node, id, parent int, kind, source string) profileNode {
+	node := profileNode{ID: id, Parent: parent, Kind: kind, Template: tree.Name, Source: source}
+	if len(node.Source) > maxSourceLen {
+		node.Source = node.Source[:maxSourceLen-3] + "..."
+	}
+	// ErrorContext 返回 "名称:行:列"
+	location, _ := tree.ErrorContext(n)
+	parts := strings.Split(location, ":")
+	if len(parts) >= 3 {
+		node.Line, _ = strconv.Atoi(parts[len(parts)-2])
+		node.Col, _ = strconv.Atoi(parts[len(parts)-1])
+	}
+	return node
+}
+
+func probeID(id int, pos parse.Pos) *parse.NumberNode {
+	return &parse.NumberNode{
+		NodeType: parse.NodeNumber, Pos: pos,
+		IsInt: true, IsUint: true, IsFloat: true,
+		Int64: int64(id), Uint64: uint64(id), Float64: float64(id),
+		Text: strconv.Itoa(id),
+	}
+}
+
+// nodeStats accumulates the measurements of one node over a render.
+type nodeStats struct {
+	Count      int64 `json:"count"`
+	Iterations int64 `json:"iterations"`
+	TotalNs    int64 `json:"total_ns"`
+	SelfNs     int64 `json:"self_ns"`
+	Bytes      int64 `json:"bytes"`
+	// active counts open frames of the node, so that recursive calls are
+	// only counted once in the inclusive totals.
+	active int
+}
+
+type profFrame struct {
+	id      int
+	start   time.Time
+	written int64
+	childNs int64
+}
+
+// profileState records one profiled render. Template execution is
+// sequential, so the probes need no synchronization.
+type profileState struct {
+	stats   []nodeStats
+	stack   []profFrame
+	written int64
+	// stacks maps a ";"-joined path of node ids to the self time spent there.
+	stacks  map[string]int64
+	keyBuf  []byte
+	rootNs  int64
+	started time.Time
+}
+
+func newProfileState(nodes []profileNode) *profileState {
+	return &profileState{stats: make([]nodeStats, len(nodes)), stacks: make(map[string]int64)}
+}
+
+func (s *profileState) funcs() template.FuncMap {
+	return template.FuncMap{profEnterFunc: s.enter, profExitFunc: s.exit, profIterFunc: s.iter}
+}
+
+func (s *profileState) enter(id int) string {
+	s.stats[id].Count++
+	s.stats[id].active++
+	s.stack = append(s.stack, profFrame{id: id, start: time.Now(), written: s.written})
+	return ""
+}
+
+// exit closes the frame of id together with any frames above it that were
+// left open by break or continue.
+func (s *profileState) exit(id int) string {
+	now := time.Now()
+	for len(s.stack) > 0 {
+		top := s.stack[len(s.stack)-1].id
+		s.pop(now)
+		if top == id {
+			break
+		}
+	}
+	return ""
+}
+
+func (s *profileState) iter(id int) string {
+	s.stats[id].Iterations++
+	now := time.Now()
+	for len(s.stack) > 0 && s.stack[len(s.stack)-1].id != id {
+		s.pop(now)
+	}
+	return ""
+}
+
+func (s *profileState) pop(now time.Time) {
+	frame := s.stack[len(s.stack)-1]
+	elapsed := now.Sub(frame.start).Nanoseconds()
+	stats := &s.stats[frame.id]
+	stats.active--
+	if stats.active == 0 {
+		stats.TotalNs += elapsed
+		stats.Bytes += s.written - frame.written
+	}
+	self := elapsed - frame.childNs
+	stats.SelfNs += self
+
+	s.keyBuf = s.keyBuf[:0]
+	for i, f := range s.stack {
+		if i > 0 {
+			s.keyBuf = append(s.keyBuf, ';')
+		}
+		s.keyBuf = strconv.AppendInt(s.keyBuf, int64(f.id), 10)
+	}
+	s.stacks[string(s.keyBuf)] += self
+
+	s.stack = s.stack[:len(s.stack)-1]
+	if len(s.stack) > 0 {
+		s.stack[len(s.stack)-1].childNs += elapsed
+	} else {
+		s.rootNs += elapsed
+	}
+}
+
+// finish closes the frames left open by an execution error.
+func (s *profileState) finish() time.Duration {
+	now := time.Now()
+	for len(s.stack) > 0 {
+		s.pop(now)
+	}
+	total := now.Sub(s.started)
+	// 顶层文本等不属于任何节点的时间记在空路径下
+	if self := total.Nanoseconds() - s.rootNs; self > 0 {
+		s.stacks[""] += self
+	}
+	return total
+}
+
+// countingWriter tracks the bytes written so far for the probes.
+type countingWriter struct {
+	w     io.Writer
+	state *profileState
+}
+
+func (c *countingWriter) Write(p []byte) (int, error) {
+	n, err := c.w.Write(p)
+	c.state.written += int64(n)
+	return n, err
+}
+
+// profileReport is the JSON document returned by RenderTemplateProfile.
+type profileReport struct {
+	Output  string           `json:"output"`
+	Error   string           `json:"error,omitempty"`
+	TotalNs int64            `json:"total_ns"`
+	Bytes   int64            `json:"bytes"`
+	Nodes   []profileEntry   `json:"nodes"`
+	Stacks  map[string]int64 `json:"stacks"`
+
+	executed bool
+}
+
+type profileEntry struct {
+	profileNode
+	nodeStats
+}
+
+// executeProfiled runs the profile-instrumented variant of the template,
+// combined with the limit probes when the request has limits, and fills
+// req.profile even when the execution fails.
+func executeProfiled(out io.Writer, req *renderRequest, data interface{}) *renderError {
+	limited := req.limits.active() || req.cancel != nil
+	variant := variantProfile
+	if limited {
+		variant |= variantLimits
+	}
+	entry, err := loadTemplate(req.template, variant)
+	if err != nil {
+		return &renderError{"TEMPLATE_PARSE_ERROR", err}
+	}
+	clone, err := entry.tmpl.Clone()
+	if err != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", err}
+	}
+
+	state := newProfileState(entry.profile)
+	funcs := state.funcs()
+	w := out
+	var limits *limitState
+	if limited {
+		var release func()
+		limits, release = newLimitState(req)
+		defer release()
+		for name, fn := range limits.funcs() {
+			funcs[name] = fn
+		}
+		w = &limitWriter{w: out, state: limits}
+	}
+	clone.Funcs(funcs)
+
+	state.started = time.Now()
+	execErr := clone.Execute(&countingWriter{w: w, state: state}, data)
+	total := state.finish()
+
+	report := req.profile
+	report.executed = true
+	report.TotalNs = total.Nanoseconds()
+	report.Bytes = state.written
+	report.Stacks = state.stacks
+	report.Nodes = make([]profileEntry, len(entry.profile))
+	for i, node := range entry.profile {
+		report.Nodes[i] = profileEntry{node, state.stats[i]}
+	}
+
+	if limits != nil {
+		return limits.result(execErr)
+	}
+	if execErr != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", execErr}
+	}
+	return nil
+}
+
+// RenderTemplateProfile renders like RenderTemplateOptions and returns a JSON
+// profile report holding the output and per-node timings, iteration counts
+// and emitted bytes. Errors raised while executing are reported in the
+// "error" field together with the partial profile; errors that prevent
+// execution are returned as plain error strings.
+//
+//export RenderTemplateProfile
+func RenderTemplateProfile(templateStr *C.char, jsonData *C.char, optionsJSON *C.char,
+	blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int, cancelFlag *C.int) *C.char {
+	var limits renderLimits
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &limits); err != nil {
+		return storeString("JSON_ERROR: invalid options: " + err.Error())
+	}
+	req := &renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+		limits:   &limits,
+		cancel:   (*int32)(unsafe.Pointer(cancelFlag)),
+		profile:  &profileReport{},
+	}
+	buf := bufferPool.Get().(*bytes.Buffer)
+	defer releaseBuffer(buf)
+	if err := execute(buf, req); err != nil {
+		if !req.profile.executed {
+			return storeString(err.Error())
+		}
+		req.profile.Error = err.Error()
+	}
+	req.profile.Output = buf.String()
+	out, err := json.Marshal(req.profile)
+	if err != nil {
+		return storeString("JSON_ERROR: " + err.Error())
+	}
+	return storeString(string(out))
+}
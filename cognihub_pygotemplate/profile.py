@@ -0,0 +1,135 @@
+"""模板执行性能分析报告.
+
+:meth:`GoTemplateEngine.profile` renders a variant of the template in which
+every action, ``if``, ``range``, ``with`` and template call is wrapped in
+probes. Go records per-node wall time, execution and iteration counts and
+emitted bytes, and :class:`ProfileReport` maps them back to template lines and
+columns.
+"""
+import io
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+@dataclass(frozen=True)
+class ProfileNode:
+    """
+    Measurements of one template node.
+
+    ``total_time`` is inclusive of nested nodes (recursive calls are counted
+    once); ``self_time`` excludes them. Times are in seconds. ``count`` is the
+    number of times the node was executed; ``iterations`` is the number of
+    loop iterations for ``range`` nodes and 0 otherwise.
+    """
+    id: int
+    parent: Optional[int]
+    kind: str
+    template: str
+    line: int
+    col: int
+    source: str
+    count: int
+    iterations: int
+    total_time: float
+    self_time: float
+    bytes: int
+
+    @property
+    def location(self) -> str:
+        return f"{self.template}:{self.line}:{self.col}"
+
+    @property
+    def label(self) -> str:
+        """Frame name used in flame graphs."""
+        # folded格式以分号分隔栈帧, 以空格分隔计数
+        source = " ".join(self.source.split()).replace(";", ",")
+        return f"{source} ({self.location})"
+
+
+@dataclass(frozen=True)
+class ProfileReport:
+    """
+    Result of a profiled render.
+
+    ``error`` holds the render error, if any; the measurements then cover the
+    part of the template that ran before it, which is what makes a timed-out
+    render diagnosable.
+    """
+    output: str
+    error: Optional[str]
+    total_time: float
+    bytes: int
+    nodes: List[ProfileNode]
+    # 以节点id路径为键的自身耗时(纳秒), 空路径表示不属于任何节点的时间
+    stacks: Dict[Tuple[int, ...], int]
+
+    @classmethod
+    def from_json(cls, document: Dict[str, Any]) -> "ProfileReport":
+        nodes = [
+            ProfileNode(
+                id=n["id"], parent=n["parent"] if n["parent"] >= 0 else None, kind=n["kind"],
+                template=n["template"], line=n["line"], col=n["col"], source=n["source"],
+                count=n["count"], iterations=n["iterations"], total_time=n["total_ns"] / 1e9,
+                self_time=n["self_ns"] / 1e9, bytes=n["bytes"],
+            )
+            for n in document["nodes"]
+        ]
+        stacks = {
+            tuple(int(i) for i in path.split(";")) if path else (): ns
+            for path, ns in document["stacks"].items()
+        }
+        return cls(output=document["output"], error=document.get("error") or None,
+                   total_time=document["total_ns"] / 1e9, bytes=document["bytes"],
+                   nodes=nodes, stacks=stacks)
+
+    def hottest(self, n: int = 10, by: str = "self_time") -> List[ProfileNode]:
+        """Returns the ``n`` executed nodes with the largest ``by`` attribute."""
+        executed = [node for node in self.nodes if node.count]
+        return sorted(executed, key=lambda node: getattr(node, by), reverse=True)[:n]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the report as JSON-serializable data, without the output."""
+        return {
+            "error": self.error,
+            "total_time": self.total_time,
+            "bytes": self.bytes,
+            "nodes": [dict(asdict(node), location=node.location) for node in self.nodes],
+        }
+
+    def folded(self, root: str = "render") -> str:
+        """
+        Exports the profile as folded stacks (``frame;frame;frame value``).
+
+        Values are self times in nanoseconds. The output can be fed to
+        ``flamegraph.pl``, speedscope or inferno.
+        """
+        labels = {node.id: node.label for node in self.nodes}
+        lines = []
+        for path, ns in sorted(self.stacks.items()):
+            if ns <= 0:
+                continue
+            frames = [root] + [labels[i] for i in path]
+            lines.append(f"{';'.join(frames)} {ns}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_folded(self, target: Union[str, "os.PathLike[str]", io.TextIOBase], root: str = "render") -> None:
+        """Writes :meth:`folded` to a path or text file object."""
+        if isinstance(target, io.TextIOBase):
+            target.write(self.folded(root))
+            return
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(self.folded(root))
+
+    def format(self, n: int = 20) -> str:
+        """Renders a table of the ``n`` nodes with the most self time."""
+        rows = [f"total {self.total_time * 1000:.3f} ms, {self.bytes} bytes"
+                + (f", error: {self.error}" if self.error else "")]
+        rows.append(f"{'self ms':>10} {'total ms':>10} {'count':>8} {'iters':>8} {'bytes':>10}  location  source")
+        for node in self.hottest(n):
+            rows.append(f"{node.self_time * 1000:>10.3f} {node.total_time * 1000:>10.3f} {node.count:>8} "
+                        f"{node.iterations:>8} {node.bytes:>10}  {node.location}  {node.source}")
+        return "\n".join(rows)
+
+    def __str__(self) -> str:
+        return self.format()
@@ -0,0 +1,194 @@
+"""渲染数据中的带外引用(out-of-band references).
+
+Large string values can be wrapped in :class:`Blob` so that they are handed to
+the Go side as raw pointers into Python memory instead of being escaped into
+the JSON payload. Go reads them in place for the duration of a single render
+call, which removes the ``json.dumps`` -> ``encode`` -> ``C.GoString`` ->
+``json.Unmarshal`` copy chain for multi-megabyte documents.
+
+Values shared by many renders can instead be pinned once with
+:meth:`GoTemplateEngine.pin`: Go keeps the decoded value and the render data
+carries only a small :class:`Pinned` reference to it.
+"""
+import ctypes
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+BlobSource = Union[str, bytes, bytearray, memoryview]
+
+# JSON对象中用于标记带外引用的键,以NUL开头避免与用户数据冲突
+BLOB_KEY = "\u0000blob"
+PIN_KEY = "\u0000pin"
+
+_PyBUF_SIMPLE = 0
+
+
+class _PyBuffer(ctypes.Structure):
+    """ctypes mirror of CPython's ``Py_buffer`` struct."""
+    _fields_ = [
+        ("buf", ctypes.c_void_p),
+        ("obj", ctypes.c_void_p),
+        ("len", ctypes.c_ssize_t),
+        ("itemsize", ctypes.c_ssize_t),
+        ("readonly", ctypes.c_int),
+        ("ndim", ctypes.c_int),
+        ("format", ctypes.c_char_p),
+        ("shape", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("strides", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("suboffsets", ctypes.POINTER(ctypes.c_ssize_t)),
+        ("internal", ctypes.c_void_p),
+    ]
+
+
+_get_buffer = ctypes.pythonapi.PyObject_GetBuffer
+_get_buffer.argtypes = [ctypes.py_object, ctypes.POINTER(_PyBuffer), ctypes.c_int]
+_get_buffer.restype = ctypes.c_int
+
+_release_buffer = ctypes.pythonapi.PyBuffer_Release
+_release_buffer.argtypes = [ctypes.POINTER(_PyBuffer)]
+_release_buffer.restype = None
+
+_str_as_utf8 = ctypes.pythonapi.PyUnicode_AsUTF8AndSize
+_str_as_utf8.argtypes = [ctypes.py_object, ctypes.POINTER(ctypes.c_ssize_t)]
+_str_as_utf8.restype = ctypes.c_void_p
+
+
+class Blob:
+    """
+    Marks a large ``str``/``bytes``/``memoryview`` value as an out-of-band blob.
+
+    Inside the template the blob behaves exactly like a string field. The
+    underlying memory must not be mutated while a render using it is running;
+    ``bytes``-like values must hold UTF-8 text and be C-contiguous.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: BlobSource):
+        if not isinstance(value, (str, bytes, bytearray, memoryview)):
+            raise TypeError(f"Blob value must be str, bytes, bytearray or memoryview, not {type(value).__name__}")
+        self.value = value
+
+    def __len__(self) -> int:
+        if isinstance(self.value, memoryview):
+            return self.value.nbytes
+        return len(self.value)
+
+    def __repr__(self) -> str:
+        return f"Blob({type(self.value).__name__}, {len(self)})"
+
+
+class Pinned:
+    """
+    Handle to a value pinned in the Go library by :meth:`GoTemplateEngine.pin`.
+
+    Use the handle in render data wherever the value would go; it is sent as
+    a reference of a few bytes. Every handle holds one reference to the Go
+    value, dropped by :meth:`release` or when the handle is garbage
+    collected; the value is freed with its last reference. ``value`` is the
+    Python value that was pinned, kept so that cost estimates can see into it.
+    """
+    __slots__ = ("id", "nbytes", "key", "value", "_finalizer", "__weakref__")
+
+    def __init__(self, id: int, nbytes: int, key: Optional[str], release: Callable[[int], None],
+                 value: Any = None):
+        self.id = id
+        self.nbytes = nbytes
+        self.key = key
+        self.value = value
+        self._finalizer = weakref.finalize(self, release, id)
+        # 解释器退出时不再调用Go
+        self._finalizer.atexit = False
+
+    def release(self) -> None:
+        """Drops this handle's reference; further renders using it fail."""
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def reference(self) -> Dict[str, int]:
+        """The placeholder that stands for the value in the JSON payload."""
+        if not self._finalizer.alive:
+            raise ValueError(f"pinned value {self.id} was released")
+        return {PIN_KEY: self.id}
+
+    def __repr__(self) -> str:
+        state = ", released" if self.released else ""
+        key = f", key={self.key!r}" if self.key is not None else ""
+        return f"Pinned({self.id}, {self.nbytes} bytes{key}{state})"
+
+
+def pinned_default(obj: Any) -> Any:
+    """``json.dumps`` hook for payloads that hold :class:`Pinned` handles but no blobs."""
+    if isinstance(obj, Pinned):
+        return obj.reference()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RefCollector:
+    """
+    Collects out-of-band references while the render payload is serialized.
+
+    Use :meth:`default` as the ``default`` hook of ``json.dumps``. The collected
+    pointers stay valid until :meth:`release` is called, so the collector must
+    outlive the FFI call that consumes them.
+    """
+
+    def __init__(self) -> None:
+        self._pointers: List[int] = []
+        self._lengths: List[int] = []
+        # 保持源对象和buffer视图的引用,保证调用期间内存有效
+        self._keepalive: List[Any] = []
+        self._buffers: List[_PyBuffer] = []
+
+    def __len__(self) -> int:
+        return len(self._pointers)
+
+    def default(self, obj: Any) -> Any:
+        if isinstance(obj, Blob):
+            return {BLOB_KEY: self._add(obj.value)}
+        if isinstance(obj, Pinned):
+            return obj.reference()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def _add(self, value: BlobSource) -> int:
+        if isinstance(value, str):
+            size = ctypes.c_ssize_t()
+            # ASCII字符串直接返回内部存储,其他字符串的UTF-8表示会缓存在对象上
+            ptr = _str_as_utf8(value, ctypes.byref(size))
+            self._keepalive.append(value)
+            self._pointers.append(ptr or 0)
+            self._lengths.append(size.value)
+        else:
+            view = _PyBuffer()
+            if _get_buffer(value, ctypes.byref(view), _PyBUF_SIMPLE) != 0:
+                raise BufferError("Blob buffers must be C-contiguous")
+            self._buffers.append(view)
+            self._pointers.append(view.buf or 0)
+            self._lengths.append(view.len)
+        return len(self._pointers) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the collected buffers."""
+        return sum(self._lengths)
+
+    def arrays(self) -> Tuple[Any, Any]:
+        """Returns the ``(pointers, lengths)`` C arrays for the Go call."""
+        n = len(self._pointers)
+        return (ctypes.c_void_p * n)(*self._pointers), (ctypes.c_size_t * n)(*self._lengths)
+
+    def views(self) -> List[memoryview]:
+        """Returns read-only views over the collected buffers, without copying."""
+        return [
+            memoryview((ctypes.c_char * n).from_address(ptr)).cast("B") if n else memoryview(b"")
+            for ptr, n in zip(self._pointers, self._lengths)
+        ]
+
+    def release(self) -> None:
+        """Releases the buffer views acquired during serialization."""
+        for view in self._buffers:
+            _release_buffer(ctypes.byref(view))
+        self._buffers.clear()
+        self._keepalive.clear()
@@ -0,0 +1,310 @@
+"""从文件加载并热更新模板.
+
+:class:`FileTemplateEngine` reads its template from a file and watches it for
+changes, with inotify on Linux and by polling the file's metadata elsewhere.
+A changed file is re-parsed in a background thread and the new source is
+swapped in with a single attribute assignment once it has parsed, so renders
+never wait for a reload and each render uses either the old or the new
+version in full. A file that fails to read or parse leaves the last good
+version in place and is reported through :attr:`FileTemplateEngine.last_error`
+and the ``on_error`` callback.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import platform
+import select
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from .cache import RenderCache
+from .engine import GoTemplateEngine, OutputTarget
+from .fit import FitResult
+from .limits import CancelToken, RenderLimits
+from .profile import ProfileReport
+from .spans import SpanMap
+
+logger = logging.getLogger(__name__)
+
+# 监听所在目录, 以便捕获编辑器和部署工具常用的"写临时文件再改名"方式
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+# 新内容在这段时间内不再变化才会被采用, 避免读到写了一半的文件
+_SETTLE_DELAY = 0.02
+
+_Signature = Tuple[int, int, int, int]
+
+
+def _signature(path: str) -> _Signature:
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class _Inotify:
+    """Minimal inotify binding watching one directory."""
+
+    def __init__(self, directory: str):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno), directory)
+        self.fd = fd
+        # 用于在 close 时唤醒阻塞在 select 上的监听线程
+        self._wake_r, self._wake_w = os.pipe()
+
+    def wait(self, timeout: float) -> None:
+        """Waits up to ``timeout`` seconds for events or :meth:`interrupt`."""
+        readable, _, _ = select.select([self.fd, self._wake_r], [], [], timeout)
+        if self.fd in readable:
+            # 内容由 _signature 判断, 事件本身只用于唤醒
+            while True:
+                try:
+                    if not os.read(self.fd, 64 << 10):
+                        break
+                except BlockingIOError:
+                    break
+
+    def interrupt(self) -> None:
+        os.write(self._wake_w, b"x")
+
+    def close(self) -> None:
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            os.close(fd)
+
+
+def _watch(ref: "weakref.ReferenceType[FileTemplateEngine]", stop: threading.Event,
+           inotify: Optional[_Inotify], interval: float) -> None:
+    """Watcher thread body; holds the engine only weakly so it can be collected."""
+    settling = False
+    try:
+        while not stop.is_set():
+            if settling:
+                stop.wait(_SETTLE_DELAY)
+            elif inotify is not None:
+                inotify.wait(interval)
+            else:
+                stop.wait(interval)
+            engine = ref()
+            if engine is None or stop.is_set():
+                break
+            settling = engine._reload(_SETTLE_DELAY) is None
+            del engine
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+
+class FileTemplateEngine(GoTemplateEngine):
+    """
+    A :class:`GoTemplateEngine` whose template lives in a file and is reloaded
+    when the file changes.
+    """
+
+    def __init__(self, path: "str | os.PathLike[str]", *, watch: bool = True, poll_interval: float = 1.0,
+                 use_inotify: bool = True, encoding: str = "utf-8",
+                 on_reload: Optional[Callable[["FileTemplateEngine"], Any]] = None,
+                 on_error: Optional[Callable[["FileTemplateEngine", Exception], Any]] = None,
+                 cache: Optional[RenderCache] = None, lazy: bool = False,
+                 limits: Optional[RenderLimits] = None, optimize: bool = True, parallel: Union[bool, int] = False):
+        """
+        :param path: template file.
+        :param watch: watch the file and reload it in the background. Without
+            it the template only changes when :meth:`reload` is called.
+        :param poll_interval: seconds between metadata checks when polling;
+            with inotify it is only a safety net for missed events.
+        :param use_inotify: use inotify where available instead of polling.
+        :param encoding: encoding of the template file.
+        :param on_reload: called with the engine after a new version is swapped in.
+        :param on_error: called with the engine and the exception when the
+            file cannot be read or parsed; the last good version stays active.
+            Errors are logged when it is not given.
+
+        The remaining parameters are those of :class:`GoTemplateEngine`. The
+        file must exist and, unless ``lazy``, parse. Lazy engines start
+        watching in the process that first renders with them, so a preforking
+        master never parses or watches anything.
+        """
+        if poll_interval <= 0:
+            raise ValueError("poll_interval must be positive")
+        self.path = os.fspath(path)
+        self.encoding = encoding
+        self.version = 1
+        self.last_error: Optional[Exception] = None
+        self._watch = watch
+        self._poll_interval = poll_interval
+        self._use_inotify = use_inotify
+        self._on_reload = on_reload
+        self._on_error = on_error
+        self._reload_lock = threading.Lock()
+        self._stop: Optional[threading.Event] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_pid: Optional[int] = None
+        self._inotify: Optional[_Inotify] = None
+        self.watch_mode: Optional[str] = None
+
+        self._file_signature = _signature(self.path)
+        with open(self.path, encoding=encoding) as f:
+            source = f.read()
+        super().__init__(source, cache=cache, lazy=lazy, limits=limits, optimize=optimize, parallel=parallel)
+        if not lazy:
+            self._check_parses(source)
+            self._ensure_watching()
+
+    def _check_parses(self, source: str) -> None:
+        error = self.precompile([source])[0]
+        if error is not None:
+            raise ValueError(f"Error from Go renderer: TEMPLATE_PARSE_ERROR: {error}")
+
+    def reload(self) -> bool:
+        """
+        Checks the file and swaps in its new content if it changed and parses.
+
+        Returns True when a new version was swapped in. Read and parse errors
+        are recorded in :attr:`last_error` and reported, not raised.
+        """
+        return bool(self._reload(0))
+
+    def _reload(self, settle: float) -> Optional[bool]:
+        """
+        Implements :meth:`reload`. With ``settle`` the new content is only
+        used if the file is unchanged ``settle`` seconds after reading it;
+        None is returned while it keeps changing.
+        """
+        failure: Optional[Exception] = None
+        with self._reload_lock:
+            try:
+                signature = _signature(self.path)
+                if signature == self._file_signature:
+                    return False
+                with open(self.path, encoding=self.encoding) as f:
+                    source = f.read()
+                if settle:
+                    time.sleep(settle)
+                    if _signature(self.path) != signature:
+                        return None
+                if source == self.template_content:
+                    # 例如坏版本被改回了当前版本
+                    self._file_signature = signature
+                    self.last_error = None
+                    return False
+                # 在后台线程中完成解析, 新版本进入Go端缓存后才替换
+                self._check_parses(source)
+            except OSError as e:
+                failure = e
+            except ValueError as e:
+                # 文件不再变化就不必反复解析同一个坏版本
+                self._file_signature = signature
+                failure = e
+            else:
+                self._file_signature = signature
+                self.template_content = source
+                self.version += 1
+                self.last_error = None
+        # 回调在锁外执行, 以便其中可以再调用 reload
+        if failure is not None:
+            self._report(failure)
+            return False
+        if self._on_reload is not None:
+            self._on_reload(self)
+        return True
+
+    def _report(self, error: Exception) -> None:
+        # 同一个错误版本只报告一次
+        if self.last_error is not None and str(self.last_error) == str(error):
+            return
+        self.last_error = error
+        if self._on_error is not None:
+            self._on_error(self, error)
+        else:
+            logger.error("Failed to reload template %s, keeping version %d: %s", self.path, self.version, error)
+
+    def _ensure_watching(self) -> None:
+        """Starts the watcher thread in this process if it is not running."""
+        if not self._watch or self._watcher_pid == os.getpid():
+            return
+        with self._reload_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            inotify = None
+            if self._use_inotify and platform.system() == "Linux":
+                try:
+                    inotify = _Inotify(os.path.dirname(os.path.abspath(self.path)))
+                except (OSError, AttributeError):
+                    inotify = None
+            self.watch_mode = "inotify" if inotify is not None else "poll"
+            self._stop = threading.Event()
+            self._inotify = inotify
+            self._watcher = threading.Thread(
+                target=_watch, args=(weakref.ref(self), self._stop, inotify, self._poll_interval),
+                name=f"template-watch:{os.path.basename(self.path)}", daemon=True)
+            self._watcher.start()
+            self._watcher_pid = os.getpid()
+        # 启动监听前文件可能已被修改, 例如 fork 之后
+        self.reload()
+
+    def close(self) -> None:
+        """Stops watching the file. The engine keeps rendering its current version."""
+        self._watch = False
+        if self._stop is not None and self._watcher_pid == os.getpid():
+            # 先唤醒再通知退出: 线程退出时会关闭管道
+            if self._inotify is not None:
+                self._inotify.interrupt()
+            self._stop.set()
+            if self._watcher is not None and self._watcher is not threading.current_thread():
+                self._watcher.join()
+        self._watcher = None
+        self._watcher_pid = None
+        self._inotify = None
+        self.watch_mode = None
+
+    def __enter__(self) -> "FileTemplateEngine":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def render(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+               cancel: Optional[CancelToken] = None) -> str:
+        if self._watcher_pid != os.getpid():
+            self._ensure_watching()
+        return super().render(data, limits, cancel)
+
+    def render_to(self, target: OutputTarget, data: Dict[str, Any], **kwargs: Any) -> int:
+        if self._watcher_pid != os.getpid():
+            self._ensure_watching()
+        return super().render_to(target, data, **kwargs)
+
+    def profile(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                cancel: Optional[CancelToken] = None) -> ProfileReport:
+        if self._watcher_pid != os.getpid():
+            self._ensure_watching()
+        return super().profile(data, limits, cancel)
+
+    def render_spans(self, data: Dict[str, Any], limits: Optional[RenderLimits] = None,
+                     cancel: Optional[CancelToken] = None) -> SpanMap:
+        if self._watcher_pid != os.getpid():
+            self._ensure_watching()
+        return super().render_spans(data, limits, cancel)
+
+    def render_fit(self, data: Dict[str, Any], budget: int, field: str = "Messages", **kwargs: Any) -> FitResult:
+        if self._watcher_pid != os.getpid():
+            self._ensure_watching()
+        return super().render_fit(data, budget, field, **kwargs)
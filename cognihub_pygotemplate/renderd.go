@@ -0,0 +1,330 @@
+//go:build renderd
+
+// renderd serves renders over a Unix domain socket so that many Python
+// processes on a host can share one Go runtime and one template cache.
+//
+//	go build -tags renderd -o renderd .
+//	./renderd -socket /tmp/cognihub-renderd.sock -timeout-ms 2000
+//
+// Wire protocol, all integers big-endian:
+//
+//	frame    = u32 length | body                 (length counts the body only)
+//	request  = u64 id | u8 op | payload
+//	render   = u32 template length | template | u32 options length | options JSON | data JSON
+//	cancel   = empty; cancels the in-flight render with the same id
+//	response = u64 id | u8 status | output or error message
+//
+// Requests on one connection may be pipelined. Responses are written as the
+// renders complete and may arrive out of order; the id ties them together.
+// The server reads the header of every frame before its payload: cancel
+// frames are handled right away, while a render request is only read once
+// fewer than 2 x -workers renders are executing or queued, so pipelined
+// requests cannot pile up in memory. A render never fans out to more
+// goroutines than -workers.
+// Error messages carry the same category prefixes as the library exports.
+package main
+
+import (
+	"bufio"
+	"bytes"
+	"encoding/binary"
+	"encoding/json"
+	"errors"
+	"flag"
+	"fmt"
+	"io"
+	"log"
+	"net"
+	"os"
+	"os/signal"
+	"path/filepath"
+	"runtime"
+	"strconv"
+	"sync"
+	"sync/atomic"
+	"syscall"
+)
+
+const (
+	opRender byte = 1
+	opCancel byte = 2
+
+	statusOK    byte = 0
+	statusError byte = 1
+
+	requestHeaderSize = 9
+)
+
+// requestOptions extends the render limits with server-only settings.
+type requestOptions struct {
+	renderOptions
+	// Cancellable renders can be stopped by a cancel frame or by closing the
+	// connection, at the cost of running the instrumented template variant.
+	Cancellable bool `json:"cancellable"`
+}
+
+// capped returns the limits of l, each tightened to the corresponding
+// non-zero ceiling in max.
+func (l renderLimits) capped(max renderLimits) renderLimits {
+	capField := func(v, ceiling int64) int64 {
+		if ceiling > 0 && (v <= 0 || v > ceiling) {
+			return ceiling
+		}
+		return v
+	}
+	return renderLimits{
+		TimeoutMs:          capField(l.TimeoutMs, max.TimeoutMs),
+		MaxOutputBytes:     capField(l.MaxOutputBytes, max.MaxOutputBytes),
+		MaxRangeIterations: capField(l.MaxRangeIterations, max.MaxRangeIterations),
+	}
+}
+
+type renderServer struct {
+	// ceilings applies to every render regardless of the requested limits.
+	ceilings renderLimits
+	maxFrame uint32
+	// slots bounds the number of renders executing at once.
+	slots chan struct{}
+	// pending bounds the render requests read but not finished, executing or
+	// waiting for a slot. A connection takes a token before it reads the
+	// payload of a render request.
+	pending chan struct{}
+	// workers caps the goroutines a single render may fan out to.
+	workers int
+}
+
+type serverConn struct {
+	server  *renderServer
+	conn    net.Conn
+	writeMu sync.Mutex
+	w       *bufio.Writer
+
+	mu       sync.Mutex
+	inflight map[uint64]*int32
+	wg       sync.WaitGroup
+}
+
+func (s *renderServer) serve(ln net.Listener) error {
+	for {
+		conn, err := ln.Accept()
+		if err != nil {
+			if errors.Is(err, net.ErrClosed) {
+				return nil
+			}
+			return err
+		}
+		c := &serverConn{server: s, conn: conn, w: bufio.NewWriter(conn), inflight: make(map[uint64]*int32)}
+		go c.run()
+	}
+}
+
+func (c *serverConn) run() {
+	defer c.conn.Close()
+	r := bufio.NewReaderSize(c.conn, 64<<10)
+	var header [4 + requestHeaderSize]byte
+loop:
+	for {
+		if _, err := io.ReadFull(r, header[:]); err != nil {
+			break
+		}
+		size := binary.BigEndian.Uint32(header[:])
+		if size < requestHeaderSize || size > c.server.maxFrame {
+			log.Printf("renderd: closing connection: invalid frame size %d", size)
+			break
+		}
+		id := binary.BigEndian.Uint64(header[4:])
+		payload := int64(size - requestHeaderSize)
+		switch op := header[12]; op {
+		case opRender:
+			// 先取得排队名额再分配缓冲区; 取消请求不受名额限制, 繁忙时也能读到
+			c.server.pending <- struct{}{}
+			body := make([]byte, payload)
+			if _, err := io.ReadFull(r, body); err != nil {
+				<-c.server.pending
+				break loop
+			}
+			// 在读取后续帧之前登记, 紧随其后的取消请求不会落空
+			cancel := new(int32)
+			c.mu.Lock()
+			c.inflight[id] = cancel
+			c.mu.Unlock()
+			c.wg.Add(1)
+			go c.render(id, body, cancel)
+			continue
+		case opCancel:
+			c.mu.Lock()
+			if flag := c.inflight[id]; flag != nil {
+				atomic.StoreInt32(flag, 1)
+			}
+			c.mu.Unlock()
+		default:
+			c.respond(id, statusError, []byte(fmt.Sprintf("PROTOCOL_ERROR: unknown op %d", op)))
+		}
+		if _, err := io.CopyN(io.Discard, r, payload); err != nil {
+			break loop
+		}
+	}
+	// 连接断开后不再有人等待结果, 取消其上所有可取消的渲染
+	c.mu.Lock()
+	for _, flag := range c.inflight {
+		atomic.StoreInt32(flag, 1)
+	}
+	c.mu.Unlock()
+	c.wg.Wait()
+}
+
+// render executes a render request admitted by the read loop. cancel is the
+// flag registered for id; it only stops the render if the request is
+// cancellable.
+func (c *serverConn) render(id uint64, payload []byte, cancel *int32) {
+	defer c.wg.Done()
+	defer func() { <-c.server.pending }()
+	defer func() {
+		c.mu.Lock()
+		delete(c.inflight, id)
+		c.mu.Unlock()
+	}()
+	req, opts, err := decodeRenderPayload(payload)
+	if err != nil {
+		c.respond(id, statusError, []byte("PROTOCOL_ERROR: "+err.Error()))
+		return
+	}
+	opts.apply(req)
+	// 单个请求的并行度不超过 -workers
+	if req.parallel < 0 || req.parallel > c.server.workers {
+		req.parallel = c.server.workers
+	}
+	if req.parallel == 1 {
+		req.parallel = 0
+	}
+	limits := opts.renderLimits.capped(c.server.ceilings)
+	req.limits = &limits
+	if opts.Cancellable {
+		req.cancel = cancel
+	}
+
+	c.server.slots <- struct{}{}
+	buf := bufferPool.Get().(*bytes.Buffer)
+	renderErr := execute(buf, req)
+	<-c.server.slots
+	if renderErr != nil {
+		c.respond(id, statusError, []byte(renderErr.Error()))
+	} else {
+		c.respond(id, statusOK, buf.Bytes())
+	}
+	releaseBuffer(buf)
+}
+
+func decodeRenderPayload(p []byte) (*renderRequest, requestOptions, error) {
+	var opts requestOptions
+	field := func() ([]byte, error) {
+		if len(p) < 4 {
+			return nil, errors.New("truncated render request")
+		}
+		n := binary.BigEndian.Uint32(p)
+		if uint64(len(p)-4) < uint64(n) {
+			return nil, errors.New("truncated render request")
+		}
+		f := p[4 : 4+n]
+		p = p[4+n:]
+		return f, nil
+	}
+	tmpl, err := field()
+	if err != nil {
+		return nil, opts, err
+	}
+	rawOpts, err := field()
+	if err != nil {
+		return nil, opts, err
+	}
+	if len(rawOpts) > 0 {
+		if err := json.Unmarshal(rawOpts, &opts); err != nil {
+			return nil, opts, fmt.Errorf("invalid options: %w", err)
+		}
+	}
+	return &renderRequest{template: string(tmpl), data: string(p)}, opts, nil
+}
+
+func (c *serverConn) respond(id uint64, status byte, payload []byte) {
+	var header [13]byte
+	binary.BigEndian.PutUint32(header[:4], uint32(requestHeaderSize+len(payload)))
+	binary.BigEndian.PutUint64(header[4:12], id)
+	header[12] = status
+	c.writeMu.Lock()
+	defer c.writeMu.Unlock()
+	// 写失败说明客户端已断开, 读循环会随之退出
+	if _, err := c.w.Write(header[:]); err != nil {
+		return
+	}
+	if _, err := c.w.Write(payload); err != nil {
+		return
+	}
+	c.w.Flush()
+}
+
+// listenUnix listens on path, replacing a stale socket file left behind by a
+// crashed server but refusing to take over a live one.
+func listenUnix(path string, mode os.FileMode) (net.Listener, error) {
+	if _, err := os.Stat(path); err == nil {
+		if probe, err := net.Dial("unix", path); err == nil {
+			probe.Close()
+			return nil, fmt.Errorf("a server is already listening on %s", path)
+		}
+		if err := os.Remove(path); err != nil {
+			return nil, err
+		}
+	}
+	ln, err := net.Listen("unix", path)
+	if err != nil {
+		return nil, err
+	}
+	if err := os.Chmod(path, mode); err != nil {
+		ln.Close()
+		return nil, err
+	}
+	return ln, nil
+}
+
+func main() {
+	socketPath := flag.String("socket", filepath.Join(os.TempDir(), "cognihub-renderd.sock"), "Unix socket path to listen on")
+	socketMode := flag.String("socket-mode", "0600", "permissions of the socket file (octal)")
+	workers := flag.Int("workers", runtime.GOMAXPROCS(0), "maximum number of renders executing at once")
+	maxFrame := flag.Uint("max-request-bytes", 64<<20, "maximum size of a single request")
+	timeoutMs := flag.Int64("timeout-ms", 0, "deadline ceiling for every render (0 disables)")
+	maxOutput := flag.Int64("max-output-bytes", 0, "output size ceiling for every render (0 disables)")
+	maxRange := flag.Int64("max-range-iterations", 0, "range iteration ceiling for every render (0 disables)")
+	flag.Parse()
+
+	mode, err := strconv.ParseUint(*socketMode, 8, 32)
+	if err != nil {
+		log.Fatalf("renderd: invalid -socket-mode %q", *socketMode)
+	}
+	if *workers <= 0 {
+		log.Fatal("renderd: -workers must be positive")
+	}
+	ln, err := listenUnix(*socketPath, os.FileMode(mode))
+	if err != nil {
+		log.Fatalf("renderd: %v", err)
+	}
+
+	server := &renderServer{
+		ceilings: renderLimits{TimeoutMs: *timeoutMs, MaxOutputBytes: *maxOutput, MaxRangeIterations: *maxRange},
+		maxFrame: uint32(*maxFrame),
+		slots:    make(chan struct{}, *workers),
+		pending:  make(chan struct{}, *workers*2),
+		workers:  *workers,
+	}
+
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGINT, syscall.SIGTERM)
+	go func() {
+		<-signals
+		// 关闭监听器时会删除socket文件
+		ln.Close()
+	}()
+
+	log.Printf("renderd: listening on %s with %d workers", *socketPath, *workers)
+	if err := server.serve(ln); err != nil {
+		log.Fatalf("renderd: %v", err)
+	}
+}
@@ -1,15 +1,24 @@
 // filepath: /Users/mac/WORKSPACE/cognihub_pygotemplate/cognihub_pygotemplate/renderer.go
 package main
 
+/*
+#include <stddef.h>
+#include <stdlib.h>
+*/
 import "C"
 import (
 	"bytes"
 	"encoding/json"
+	"fmt"
+	"io"
+	"runtime"
 	"sync"
-	"text/template"
 	"unsafe"
 )
 
+// blobKey 标记数据中的带外引用, 与Python端 refs.BLOB_KEY 保持一致
+const blobKey = "\x00blob"
+
 var (
 	stringPool = make(map[uintptr]*C.char)
 	poolMutex  sync.Mutex
@@ -17,25 +26,231 @@ var (
 
 //export RenderTemplate
 func RenderTemplate(templateStr *C.char, jsonData *C.char) *C.char {
-	goTemplateStr := C.GoString(templateStr)
-	goJsonData := C.GoString(jsonData)
+	return render(&renderRequest{template: C.GoString(templateStr), data: C.GoString(jsonData)})
+}
+
+// RenderTemplateBlobs renders like RenderTemplate, resolving blob placeholders
+// in the data to strings that alias the caller's memory without copying it.
+// The buffers only have to stay valid for the duration of the call.
+//
+//export RenderTemplateBlobs
+func RenderTemplateBlobs(templateStr *C.char, jsonData *C.char, blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int) *C.char {
+	return render(&renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+	})
+}
+
+// renderError carries one of the error categories understood by the Python side.
+type renderError struct {
+	category string
+	err      error
+}
+
+func (e *renderError) Error() string {
+	return e.category + ": " + e.err.Error()
+}
+
+var bufferPool = sync.Pool{New: func() interface{} { return new(bytes.Buffer) }}
+
+// renderRequest bundles everything a single render needs.
+type renderRequest struct {
+	template string
+	data     string
+	blobs    []string
+	// limits is nil for unrestricted renders.
+	limits *renderLimits
+	// cancel points at a flag owned by the caller; non-zero cancels the render.
+	cancel *int32
+	// profile receives the execution profile when the render is profiled.
+	profile *profileReport
+	// spans receives the output span map when the render records one.
+	spans *spanReport
+	// unoptimized executes the template exactly as parsed.
+	unoptimized bool
+	// parallel is the number of goroutines independent range iterations may
+	// be spread over, -1 for one per CPU, 0 to execute sequentially.
+	parallel int
+}
+
+// renderOptions are the JSON options accepted by the exports that take them.
+type renderOptions struct {
+	renderLimits
+	// Optimize set to false disables the parse-tree optimizer.
+	Optimize *bool `json:"optimize"`
+	// Parallel enables parallel execution of ranges: the number of
+	// goroutines, or -1 for one per CPU.
+	Parallel int `json:"parallel"`
+}
+
+// apply copies the options into req.
+func (o *renderOptions) apply(req *renderRequest) {
+	req.limits = &o.renderLimits
+	req.unoptimized = o.Optimize != nil && !*o.Optimize
+	req.parallel = o.Parallel
+}
 
+// baseVariant returns the template variant used to render req with data.
+func (req *renderRequest) baseVariant(data interface{}) templateVariant {
+	if req.unoptimized {
+		return variantPlain
+	}
+	// 提升 $.Field 的前提是根数据为对象, 此时查找不会出错
+	if _, ok := data.(map[string]interface{}); !ok {
+		return variantPlain
+	}
+	return variantOptimized
+}
+
+func render(req *renderRequest) *C.char {
+	buf := bufferPool.Get().(*bytes.Buffer)
+	defer releaseBuffer(buf)
+	if err := execute(buf, req); err != nil {
+		return storeString(err.Error())
+	}
+	return storeString(buf.String())
+}
+
+// execute decodes the data and renders the template into buf.
+func execute(buf *bytes.Buffer, req *renderRequest) *renderError {
+	data, err := decodeData(req)
+	if err != nil {
+		return err
+	}
+	return executeData(buf, req, data)
+}
+
+// decodeData decodes the JSON data of req and resolves its blob and pinned
+// value references.
+func decodeData(req *renderRequest) (interface{}, *renderError) {
 	var data interface{}
-	if err := json.Unmarshal([]byte(goJsonData), &data); err != nil {
-		return storeString("JSON_ERROR: " + err.Error())
+	if err := json.Unmarshal([]byte(req.data), &data); err != nil {
+		return nil, &renderError{"JSON_ERROR", err}
+	}
+	if req.needsResolve() {
+		resolved, err := resolveRefs(data, req.blobs)
+		if err != nil {
+			return nil, &renderError{"JSON_ERROR", err}
+		}
+		data = resolved
 	}
+	return data, nil
+}
 
-	tmpl, err := template.New("ollama").Parse(goTemplateStr)
+// executeData renders the template with already decoded data into w.
+func executeData(w io.Writer, req *renderRequest, data interface{}) *renderError {
+	if req.profile != nil {
+		return executeProfiled(w, req, data)
+	}
+	if req.spans != nil {
+		return executeSpans(w, req, data)
+	}
+	if req.parallel != 0 {
+		return executeParallel(w, req, data)
+	}
+	if req.limits.active() || req.cancel != nil {
+		return executeLimited(w, req, data)
+	}
+
+	tmpl, err := getTemplate(req.template, req.baseVariant(data))
 	if err != nil {
-		return storeString("TEMPLATE_PARSE_ERROR: " + err.Error())
+		return &renderError{"TEMPLATE_PARSE_ERROR", err}
+	}
+
+	if err := tmpl.Execute(w, data); err != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", err}
+	}
+	return nil
+}
+
+// PrecompileTemplates parses a JSON array of template sources into the cache
+// in one call. It returns a JSON array with one parse error message per
+// template, empty for templates that parsed successfully.
+//
+//export PrecompileTemplates
+func PrecompileTemplates(templatesJSON *C.char) *C.char {
+	var sources []string
+	if err := json.Unmarshal([]byte(C.GoString(templatesJSON)), &sources); err != nil {
+		return storeString("JSON_ERROR: " + err.Error())
+	}
+	errs := make([]string, len(sources))
+	for i, src := range sources {
+		if _, err := getTemplate(src, variantOptimized); err != nil {
+			errs[i] = err.Error()
+		}
+	}
+	out, _ := json.Marshal(errs)
+	return storeString(string(out))
+}
+
+func releaseBuffer(buf *bytes.Buffer) {
+	// 不回收过大的缓冲区, 避免单次大渲染长期占用内存
+	if buf.Cap() > 1<<20 {
+		return
 	}
+	buf.Reset()
+	bufferPool.Put(buf)
+}
 
-	var renderedBytes bytes.Buffer
-	if err := tmpl.Execute(&renderedBytes, data); err != nil {
-		return storeString("TEMPLATE_EXECUTE_ERROR: " + err.Error())
+func cgoBlobs(blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int) []string {
+	if nBlobs <= 0 {
+		return nil
+	}
+	ptrs := unsafe.Slice(blobPtrs, int(nBlobs))
+	lens := unsafe.Slice(blobLens, int(nBlobs))
+	blobs := make([]string, int(nBlobs))
+	for i := range blobs {
+		if lens[i] > 0 {
+			blobs[i] = unsafe.String((*byte)(unsafe.Pointer(ptrs[i])), int(lens[i]))
+		}
 	}
+	return blobs
+}
 
-	return storeString(renderedBytes.String())
+// resolveRefs replaces every {blobKey: index} placeholder with its blob and
+// every {pinKey: id} placeholder with the pinned value. Pinned values are
+// shared, so they are not walked.
+func resolveRefs(v interface{}, blobs []string) (interface{}, error) {
+	switch val := v.(type) {
+	case map[string]interface{}:
+		if len(val) == 1 {
+			if ref, ok := val[blobKey]; ok {
+				idx, ok := ref.(float64)
+				if !ok || idx < 0 || int(idx) >= len(blobs) || float64(int(idx)) != idx {
+					return nil, fmt.Errorf("invalid blob reference %v", ref)
+				}
+				return blobs[int(idx)], nil
+			}
+			if ref, ok := val[pinKey]; ok {
+				id, ok := ref.(float64)
+				if !ok {
+					return nil, fmt.Errorf("invalid pinned value reference %v", ref)
+				}
+				value, ok := lookupPinned(int64(id))
+				if !ok {
+					return nil, fmt.Errorf("pinned value %v was released or never pinned", ref)
+				}
+				return value, nil
+			}
+		}
+		for k, item := range val {
+			resolved, err := resolveRefs(item, blobs)
+			if err != nil {
+				return nil, err
+			}
+			val[k] = resolved
+		}
+	case []interface{}:
+		for i, item := range val {
+			resolved, err := resolveRefs(item, blobs)
+			if err != nil {
+				return nil, err
+			}
+			val[i] = resolved
+		}
+	}
+	return v, nil
 }
 
 func storeString(s string) *C.char {
@@ -46,6 +261,9 @@ func storeString(s string) *C.char {
 	return cstr
 }
 
+// FreeString releases a string returned by one of the exports. Pointers that
+// were not returned by an export, or were already freed, are ignored.
+//
 //export FreeString
 func FreeString(str *C.char) {
 	if str == nil {
@@ -54,10 +272,55 @@ func FreeString(str *C.char) {
 
 	ptr := uintptr(unsafe.Pointer(str))
 	poolMutex.Lock()
-	if _, exists := stringPool[ptr]; exists {
+	_, exists := stringPool[ptr]
+	if exists {
 		delete(stringPool, ptr)
 	}
 	poolMutex.Unlock()
+	if exists {
+		C.free(unsafe.Pointer(str))
+	}
 }
 
-func main() {}
+// memoryStats is the JSON document returned by GoMemoryStats.
+type memoryStats struct {
+	HeapAlloc   uint64 `json:"heap_alloc"`
+	HeapInuse   uint64 `json:"heap_inuse"`
+	HeapObjects uint64 `json:"heap_objects"`
+	Sys         uint64 `json:"sys"`
+	NumGC       uint32 `json:"num_gc"`
+	Goroutines  int    `json:"goroutines"`
+	// OutstandingStrings counts strings returned to the caller and not yet
+	// passed to FreeString; it only grows if the caller leaks them.
+	OutstandingStrings int `json:"outstanding_strings"`
+	CachedTemplates    int `json:"cached_templates"`
+}
+
+// GoMemoryStats returns a JSON snapshot of the Go runtime's memory usage. With
+// a non-zero collect it runs a garbage collection first, so that the heap
+// figures only count live objects.
+//
+//export GoMemoryStats
+func GoMemoryStats(collect C.int) *C.char {
+	if collect != 0 {
+		runtime.GC()
+	}
+	var ms runtime.MemStats
+	runtime.ReadMemStats(&ms)
+	stats := memoryStats{
+		HeapAlloc:   ms.HeapAlloc,
+		HeapInuse:   ms.HeapInuse,
+		HeapObjects: ms.HeapObjects,
+		Sys:         ms.Sys,
+		NumGC:       ms.NumGC,
+		Goroutines:  runtime.NumGoroutine(),
+	}
+	poolMutex.Lock()
+	stats.OutstandingStrings = len(stringPool)
+	poolMutex.Unlock()
+	templateCacheMu.RLock()
+	stats.CachedTemplates = len(templateCache)
+	templateCacheMu.RUnlock()
+	out, _ := json.Marshal(stats)
+	return storeString(string(out))
+}
@@ -0,0 +1,663 @@
+package main
+
+/*
+#include <stddef.h>
+*/
+import "C"
+import (
+	"bytes"
+	"encoding/json"
+	"io"
+	"sort"
+	"strconv"
+	"text/template"
+	"text/template/parse"
+	"unicode/utf8"
+	"unsafe"
+)
+
+const (
+	spanOpenFunc  = "__span_open"
+	spanCloseFunc = "__span_close"
+	spanItemFunc  = "__span_item"
+	spanNextFunc  = "__span_next"
+	spanFieldFunc = "__span_field"
+
+	// spanKeyVar is declared on ranges over data values to pass the key or
+	// index of every iteration to the item probe.
+	spanKeyVar = "$__span_key"
+	spanValVar = "$__span_val"
+)
+
+// spanPath locates a value in the render data. Range is spanRoot for the
+// data the template was executed with, the node id of a range for its
+// current element, or spanUnknown when the value cannot be located.
+type spanPath struct {
+	Range  int
+	Fields []string
+}
+
+const (
+	spanRoot    = -1
+	spanUnknown = -2
+)
+
+func (p spanPath) with(fields ...string) spanPath {
+	if p.Range == spanUnknown {
+		return p
+	}
+	return spanPath{Range: p.Range, Fields: append(append([]string(nil), p.Fields...), fields...)}
+}
+
+// spanNode is an instrumented range or action: its location in the template
+// and, statically, where the value it iterates or prints lives in the data.
+type spanNode struct {
+	profileNode
+	path spanPath
+	// fields is path.Fields encoded as comma-separated JSON strings.
+	fields []byte
+}
+
+// spanner instruments one template definition. It reuses the variable and
+// scope tracking of the cost analyzer; scopes map to the value they bind.
+type spanner struct {
+	*analyzer
+	nodes *[]spanNode
+	// scopes holds, per scope index, where the current dot lives.
+	scopes []spanPath
+	// assigned lists variables assigned with "=", whose value depends on the
+	// order of execution and is therefore never located.
+	assigned map[string]bool
+	parent   int
+}
+
+// instrumentSpans wraps ranges in open and close probes, starts every range
+// body with an item probe and precedes every action that prints data with a
+// field probe. It returns the description of the instrumented nodes, indexed
+// by probe id.
+func instrumentSpans(tmpl *template.Template) []spanNode {
+	templates := tmpl.Templates()
+	sort.Slice(templates, func(i, j int) bool { return templates[i].Name() < templates[j].Name() })
+	var nodes []spanNode
+	for _, t := range templates {
+		if t.Tree == nil || t.Tree.Root == nil {
+			continue
+		}
+		// 只有主模板的 $ 是渲染数据本身; 其他模板的数据由调用方传入, 位置未知
+		root := spanPath{Range: spanUnknown}
+		if t.Name() == tmpl.Name() {
+			root = spanPath{Range: spanRoot}
+		}
+		s := &spanner{
+			analyzer: &analyzer{tree: t.Tree, result: &templateAnalysis{}, calls: map[string]bool{},
+				vars: map[string]*costPath{"$": {Fields: []string{}}}},
+			nodes:    &nodes,
+			scopes:   []spanPath{root},
+			assigned: assignedVars(t.Tree.Root),
+			parent:   -1,
+		}
+		s.list(t.Tree.Root)
+	}
+	noop := func(int) string { return "" }
+	tmpl.Funcs(template.FuncMap{spanOpenFunc: noop, spanCloseFunc: noop, spanNextFunc: noop, spanFieldFunc: noop,
+		spanItemFunc: func(int, interface{}) string { return "" }})
+	return nodes
+}
+
+func assignedVars(root *parse.ListNode) map[string]bool {
+	assigned := map[string]bool{}
+	mark := func(pipe *parse.PipeNode) {
+		if pipe != nil && pipe.IsAssign {
+			for _, v := range pipe.Decl {
+				assigned[v.Ident[0]] = true
+			}
+		}
+	}
+	walkList(root, func(n parse.Node) {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			mark(node.Pipe)
+		case *parse.IfNode:
+			mark(node.Pipe)
+		case *parse.RangeNode:
+			mark(node.Pipe)
+		case *parse.WithNode:
+			mark(node.Pipe)
+		}
+	})
+	return assigned
+}
+
+func (s *spanner) list(list *parse.ListNode) {
+	if list == nil {
+		return
+	}
+	out := make([]parse.Node, 0, len(list.Nodes))
+	for _, n := range list.Nodes {
+		switch node := n.(type) {
+		case *parse.ActionNode:
+			if len(node.Pipe.Decl) > 0 {
+				s.declare(node.Pipe, s.value(node.Pipe))
+				break
+			}
+			path, refs := s.printed(node.Pipe)
+			if refs == 0 {
+				break
+			}
+			// 打印动作恰好写出一次, 由写入器记录其区间
+			id := s.add(n, "field", node.String(), path)
+			out = append(out, newProbe(spanFieldFunc, n.Position(), probeID(id, n.Position())), n)
+			continue
+		case *parse.IfNode:
+			s.branch(&node.BranchNode, false)
+		case *parse.WithNode:
+			s.branch(&node.BranchNode, true)
+		case *parse.RangeNode:
+			id := s.rangeNode(node)
+			pos := n.Position()
+			out = append(out, newProbe(spanOpenFunc, pos, probeID(id, pos)), n, newProbe(spanCloseFunc, pos, probeID(id, pos)))
+			continue
+		}
+		out = append(out, n)
+	}
+	list.Nodes = out
+}
+
+func (s *spanner) add(n parse.Node, kind, source string, path spanPath) int {
+	id := len(*s.nodes)
+	node := spanNode{profileNode: describeNode(s.tree, n, id, s.parent, kind, source), path: path}
+	for i, field := range path.Fields {
+		if i > 0 {
+			node.fields = append(node.fields, ',')
+		}
+		node.fields = appendJSONString(node.fields, field)
+	}
+	*s.nodes = append(*s.nodes, node)
+	return id
+}
+
+func (s *spanner) branch(b *parse.BranchNode, bindsDot bool) {
+	saved, savedScope := s.enter()
+	if bindsDot {
+		value := s.locate(s.value(b.Pipe))
+		s.scope++
+		s.scopes = append(s.scopes[:s.scope], value)
+		s.declare(b.Pipe, &costPath{Scope: s.scope, Fields: []string{}})
+	} else {
+		s.declare(b.Pipe, s.value(b.Pipe))
+	}
+	s.list(b.List)
+	s.vars, s.scope = saved, savedScope
+	if b.ElseList != nil {
+		saved, savedScope = s.enter()
+		s.list(b.ElseList)
+		s.vars, s.scope = saved, savedScope
+	}
+}
+
+func (s *spanner) rangeNode(node *parse.RangeNode) int {
+	value := s.value(node.Pipe)
+	id := s.add(node, "range", "{{range "+node.Pipe.String()+"}}", s.locate(value))
+
+	saved, savedScope := s.enter()
+	s.scope++
+	s.scopes = append(s.scopes[:s.scope], spanPath{Range: id})
+	element := &costPath{Scope: s.scope, Fields: []string{}}
+	decl := node.Pipe.Decl
+	switch len(decl) {
+	case 1:
+		s.bind(decl[0], element)
+	case 2:
+		s.bind(decl[0], indexValue)
+		s.bind(decl[1], element)
+	}
+	// 对数据值的range声明键变量, 把每次迭代的键或下标传给探针
+	probe := newProbe(spanNextFunc, node.Position(), probeID(id, node.Position()))
+	if value != nil && !node.Pipe.IsAssign {
+		pos := node.Position()
+		switch len(decl) {
+		case 0:
+			node.Pipe.Decl = []*parse.VariableNode{spanVariable(spanKeyVar, pos), spanVariable(spanValVar, pos)}
+		case 1:
+			node.Pipe.Decl = []*parse.VariableNode{spanVariable(spanKeyVar, pos), decl[0]}
+		}
+		probe = newProbe(spanItemFunc, pos, probeID(id, pos), spanVariable(node.Pipe.Decl[0].Ident[0], pos))
+	}
+
+	parent := s.parent
+	s.parent = id
+	s.list(node.List)
+	s.parent = parent
+	prepend(node.List, probe)
+	s.vars, s.scope = saved, savedScope
+	if node.ElseList != nil {
+		saved, savedScope = s.enter()
+		s.list(node.ElseList)
+		s.vars, s.scope = saved, savedScope
+	}
+	return id
+}
+
+func spanVariable(name string, pos parse.Pos) *parse.VariableNode {
+	return &parse.VariableNode{NodeType: parse.NodeVariable, Pos: pos, Ident: []string{name}}
+}
+
+func (s *spanner) bind(v *parse.VariableNode, value *costPath) {
+	if s.assigned[v.Ident[0]] {
+		value = nil
+	}
+	s.vars[v.Ident[0]] = value
+}
+
+func (s *spanner) declare(pipe *parse.PipeNode, value *costPath) {
+	if pipe == nil || pipe.IsAssign {
+		return
+	}
+	for _, v := range pipe.Decl {
+		s.bind(v, value)
+	}
+}
+
+// value returns where a pipeline's value lives when the pipeline is just a
+// reference to data. Unlike the cost analyzer it does not look through
+// slice or index, which would change the keys of the elements.
+func (s *spanner) value(pipe *parse.PipeNode) *costPath {
+	if pipe == nil || len(pipe.Cmds) != 1 || len(pipe.Cmds[0].Args) != 1 {
+		return nil
+	}
+	switch pipe.Cmds[0].Args[0].(type) {
+	case *parse.DotNode, *parse.FieldNode, *parse.VariableNode, *parse.ChainNode:
+		return s.nodeValue(pipe.Cmds[0].Args[0])
+	}
+	return nil
+}
+
+// printed returns the number of data references an action prints and, when
+// there is exactly one, where it lives. Values selected by index or slice
+// are not located.
+func (s *spanner) printed(pipe *parse.PipeNode) (spanPath, int) {
+	refs := 0
+	path := spanPath{Range: spanUnknown}
+	selects := false
+	var visit func(args []parse.Node)
+	visit = func(args []parse.Node) {
+		for _, arg := range args {
+			switch node := arg.(type) {
+			case *parse.IdentifierNode:
+				selects = selects || node.Ident == "index" || node.Ident == "slice"
+			case *parse.PipeNode:
+				for _, cmd := range node.Cmds {
+					visit(cmd.Args)
+				}
+			case *parse.VariableNode:
+				if v, ok := s.vars[node.Ident[0]]; ok && v == indexValue {
+					continue
+				}
+				refs++
+				path = s.locate(s.nodeValue(node))
+			case *parse.DotNode, *parse.FieldNode, *parse.ChainNode:
+				refs++
+				path = s.locate(s.nodeValue(node))
+			}
+		}
+	}
+	for _, cmd := range pipe.Cmds {
+		visit(cmd.Args)
+	}
+	if refs != 1 || selects {
+		path = spanPath{Range: spanUnknown}
+	}
+	return path, refs
+}
+
+// locate resolves a path relative to a scope into one relative to the data
+// root or to the element of a range.
+func (s *spanner) locate(p *costPath) spanPath {
+	if p == nil || p == indexValue || p.Scope < 0 || p.Scope >= len(s.scopes) {
+		return spanPath{Range: spanUnknown}
+	}
+	for _, field := range p.Fields {
+		if field == wildcardField {
+			return spanPath{Range: spanUnknown}
+		}
+	}
+	return s.scopes[p.Scope].with(p.Fields...)
+}
+
+// spanRecord is one span of the output: byte offsets, offsets in Unicode
+// code points and the path and key of its value as JSON fragments, the path
+// nil when unknown.
+type spanRecord struct {
+	kind      string
+	node      int
+	parent    int
+	start     int64
+	end       int64
+	startChar int64
+	endChar   int64
+	key       []byte
+	path      []byte
+}
+
+type spanFrame struct {
+	node int
+	span int
+	item bool
+	// path is the frame's path as comma-separated JSON values, nil when unknown.
+	path  []byte
+	items int
+}
+
+// spanState records the spans of one render. Template execution is
+// sequential, so the probes need no synchronization.
+type spanState struct {
+	nodes []spanNode
+	spans []spanRecord
+	stack []spanFrame
+	// field is the node whose action performs the next write, -1 if none.
+	field int
+	bytes int64
+	chars int64
+}
+
+func newSpanState(nodes []spanNode) *spanState {
+	return &spanState{nodes: nodes, field: -1}
+}
+
+func (s *spanState) funcs() template.FuncMap {
+	return template.FuncMap{spanOpenFunc: s.open, spanCloseFunc: s.close, spanItemFunc: s.item,
+		spanNextFunc: s.next, spanFieldFunc: s.fieldProbe}
+}
+
+func (s *spanState) parentSpan() int {
+	if len(s.stack) == 0 {
+		return -1
+	}
+	return s.stack[len(s.stack)-1].span
+}
+
+func (s *spanState) push(node int, kind string, path, key []byte) {
+	s.spans = append(s.spans, spanRecord{kind: kind, node: node, parent: s.parentSpan(), path: path, key: key,
+		start: s.bytes, startChar: s.chars})
+	s.stack = append(s.stack, spanFrame{node: node, span: len(s.spans) - 1, item: kind == "item", path: path})
+}
+
+func (s *spanState) pop() {
+	frame := s.stack[len(s.stack)-1]
+	s.spans[frame.span].end, s.spans[frame.span].endChar = s.bytes, s.chars
+	s.stack = s.stack[:len(s.stack)-1]
+}
+
+// resolve locates the value of node using the keys of the iterations in
+// progress.
+func (s *spanState) resolve(node *spanNode) []byte {
+	var base []byte
+	switch node.path.Range {
+	case spanUnknown:
+		return nil
+	case spanRoot:
+		base = []byte{}
+	default:
+		for i := len(s.stack) - 1; ; i-- {
+			if i < 0 {
+				return nil
+			}
+			if frame := s.stack[i]; frame.item && frame.node == node.path.Range {
+				if frame.path == nil {
+					return nil
+				}
+				base = frame.path
+				break
+			}
+		}
+	}
+	if len(node.fields) == 0 {
+		return base
+	}
+	path := make([]byte, 0, len(base)+len(node.fields)+1)
+	path = append(path, base...)
+	if len(base) > 0 {
+		path = append(path, ',')
+	}
+	return append(path, node.fields...)
+}
+
+func (s *spanState) open(id int) string {
+	s.push(id, "range", s.resolve(&s.nodes[id]), nil)
+	return ""
+}
+
+// close ends the span of range id together with the iteration span left
+// open by the last iteration or by break.
+func (s *spanState) close(id int) string {
+	for len(s.stack) > 0 {
+		frame := s.stack[len(s.stack)-1]
+		s.pop()
+		if frame.node == id && !frame.item {
+			break
+		}
+	}
+	return ""
+}
+
+// item ends the previous iteration of range id and starts the next one with
+// the range key or index.
+func (s *spanState) item(id int, key interface{}) string {
+	var encoded []byte
+	switch k := key.(type) {
+	case int:
+		encoded = strconv.AppendInt(nil, int64(k), 10)
+	case string:
+		encoded = appendJSONString(nil, k)
+	default:
+		encoded, _ = json.Marshal(k)
+	}
+	s.iteration(id, encoded)
+	return ""
+}
+
+// next is the item probe of ranges without a usable key; the key is the
+// ordinal of the iteration.
+func (s *spanState) next(id int) string {
+	s.iteration(id, nil)
+	return ""
+}
+
+func (s *spanState) iteration(id int, key []byte) {
+	for len(s.stack) > 0 {
+		if top := s.stack[len(s.stack)-1]; top.node == id && !top.item {
+			break
+		}
+		s.pop()
+	}
+	if len(s.stack) == 0 {
+		return
+	}
+	frame := &s.stack[len(s.stack)-1]
+	if key == nil {
+		key = strconv.AppendInt(nil, int64(frame.items), 10)
+	}
+	frame.items++
+	var path []byte
+	if frame.path != nil {
+		path = make([]byte, 0, len(frame.path)+len(key)+1)
+		path = append(path, frame.path...)
+		if len(frame.path) > 0 {
+			path = append(path, ',')
+		}
+		path = append(path, key...)
+	}
+	s.push(id, "item", path, key)
+}
+
+func (s *spanState) fieldProbe(id int) string {
+	s.field = id
+	return ""
+}
+
+// write records the span of the field action performing this write.
+func (s *spanState) write(p []byte) {
+	start, startChar := s.bytes, s.chars
+	s.bytes += int64(len(p))
+	s.chars += int64(utf8.RuneCount(p))
+	if s.field < 0 {
+		return
+	}
+	s.spans = append(s.spans, spanRecord{kind: "field", node: s.field, parent: s.parentSpan(),
+		path: s.resolve(&s.nodes[s.field]), start: start, end: s.bytes, startChar: startChar, endChar: s.chars})
+	s.field = -1
+}
+
+// finish closes the spans left open by an execution error.
+func (s *spanState) finish() {
+	for len(s.stack) > 0 {
+		s.pop()
+	}
+}
+
+// spanWriter tracks the bytes and code points written so far for the probes.
+type spanWriter struct {
+	w     io.Writer
+	state *spanState
+}
+
+func (c *spanWriter) Write(p []byte) (int, error) {
+	n, err := c.w.Write(p)
+	c.state.write(p[:n])
+	return n, err
+}
+
+// appendJSON encodes the spans as rows
+// [kind, node, parent, start, end, start_char, end_char, key, path].
+func (s *spanState) appendJSON(b []byte) []byte {
+	b = append(b, '[')
+	for i := range s.spans {
+		r := &s.spans[i]
+		if i > 0 {
+			b = append(b, ',')
+		}
+		b = append(b, `["`...)
+		b = append(b, r.kind...)
+		b = append(b, `",`...)
+		for _, n := range []int64{int64(r.node), int64(r.parent), r.start, r.end, r.startChar, r.endChar} {
+			b = strconv.AppendInt(b, n, 10)
+			b = append(b, ',')
+		}
+		if r.key == nil {
+			b = append(b, "null"...)
+		} else {
+			b = append(b, r.key...)
+		}
+		if r.path == nil {
+			b = append(b, ",null]"...)
+		} else {
+			b = append(b, ",["...)
+			b = append(b, r.path...)
+			b = append(b, "]]"...)
+		}
+	}
+	return append(b, ']')
+}
+
+func appendJSONString(b []byte, s string) []byte {
+	encoded, _ := json.Marshal(s)
+	return append(b, encoded...)
+}
+
+// executeSpans runs the span-instrumented variant of the template, combined
+// with the limit probes when the request has limits, and records the spans
+// in req.spans.
+func executeSpans(out io.Writer, req *renderRequest, data interface{}) *renderError {
+	limited := req.limits.active() || req.cancel != nil
+	variant := variantSpans
+	if limited {
+		variant |= variantLimits
+	}
+	entry, err := loadTemplate(req.template, variant)
+	if err != nil {
+		return &renderError{"TEMPLATE_PARSE_ERROR", err}
+	}
+	clone, err := entry.tmpl.Clone()
+	if err != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", err}
+	}
+
+	state := newSpanState(entry.spans)
+	funcs := state.funcs()
+	w := out
+	var limits *limitState
+	if limited {
+		var release func()
+		limits, release = newLimitState(req)
+		defer release()
+		for name, fn := range limits.funcs() {
+			funcs[name] = fn
+		}
+		w = &limitWriter{w: out, state: limits}
+	}
+	clone.Funcs(funcs)
+
+	execErr := clone.Execute(&spanWriter{w: w, state: state}, data)
+	state.finish()
+	req.spans.state = state
+
+	if limits != nil {
+		return limits.result(execErr)
+	}
+	if execErr != nil {
+		return &renderError{"TEMPLATE_EXECUTE_ERROR", execErr}
+	}
+	return nil
+}
+
+// spanReport receives the recorded spans of a render.
+type spanReport struct {
+	state *spanState
+}
+
+// RenderTemplateSpans renders like RenderTemplateOptions and returns a JSON
+// document {"output", "spans", "nodes"} mapping regions of the output to the
+// data that produced them: a span per range, per range iteration and per
+// action printing data, each with its byte and code point offsets and, when
+// it can be located, the path of its value in the data. Spans are rows
+// [kind, node, parent, start, end, start_char, end_char, key, path] in start
+// order; nodes describe the instrumented template nodes. The parse-tree
+// optimizer is not applied.
+//
+//export RenderTemplateSpans
+func RenderTemplateSpans(templateStr *C.char, jsonData *C.char, optionsJSON *C.char,
+	blobPtrs **C.char, blobLens *C.size_t, nBlobs C.int, cancelFlag *C.int) *C.char {
+	var opts renderOptions
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &opts); err != nil {
+		return storeString("JSON_ERROR: invalid options: " + err.Error())
+	}
+	req := &renderRequest{
+		template: C.GoString(templateStr),
+		data:     C.GoString(jsonData),
+		blobs:    cgoBlobs(blobPtrs, blobLens, nBlobs),
+		cancel:   (*int32)(unsafe.Pointer(cancelFlag)),
+		spans:    &spanReport{},
+	}
+	opts.apply(req)
+	buf := bufferPool.Get().(*bytes.Buffer)
+	defer releaseBuffer(buf)
+	if err := execute(buf, req); err != nil {
+		return storeString(err.Error())
+	}
+
+	state := req.spans.state
+	nodes := make([]profileNode, len(state.nodes))
+	for i := range state.nodes {
+		nodes[i] = state.nodes[i].profileNode
+	}
+	encodedNodes, _ := json.Marshal(nodes)
+	out := make([]byte, 0, 2*buf.Len()+64*len(state.spans)+len(encodedNodes)+64)
+	out = append(out, `{"output":`...)
+	out = appendJSONString(out, buf.String())
+	out = append(out, `,"spans":`...)
+	out = state.appendJSON(out)
+	out = append(out, `,"nodes":`...)
+	out = append(out, encodedNodes...)
+	out = append(out, '}')
+	return storeString(string(out))
+}
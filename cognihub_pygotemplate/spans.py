@@ -0,0 +1,87 @@
+"""渲染输出的区间映射.
+
+:meth:`GoTemplateEngine.render_spans` renders a variant of the template in
+which every ``range``, every range iteration and every action that prints data
+is wrapped in probes. Go records the byte and character offsets of the output
+each of them produced and, where the template refers to the data directly,
+the path of the value, so that callers can locate a message in the prompt
+without searching the output for its text.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# 数据路径: 字段名和列表下标组成的元组, 如 ("Messages", 3, "content")
+DataPath = Tuple[Union[str, int], ...]
+
+
+class Span(NamedTuple):
+    """
+    A region of the rendered output.
+
+    ``kind`` is ``"range"`` for a whole loop, ``"item"`` for one iteration
+    and ``"field"`` for an action printing data. ``start``/``end`` are UTF-8
+    byte offsets and ``start_char``/``end_char`` offsets into the output
+    string. ``path`` is where the value lives in the render data, ``None``
+    when the template does not reach it through fields and range variables
+    (for example inside ``{{define}}`` templates or after ``slice``).
+    ``key`` is the index or map key of an iteration. ``parent`` is the index
+    of the enclosing span in :attr:`SpanMap.spans`.
+    """
+    kind: str
+    path: Optional[DataPath]
+    key: Union[str, int, None]
+    start: int
+    end: int
+    start_char: int
+    end_char: int
+    parent: Optional[int]
+    source: str
+    location: str
+
+
+@dataclass(frozen=True)
+class SpanMap:
+    """Output of :meth:`GoTemplateEngine.render_spans`, spans in start order."""
+    output: str
+    spans: List[Span]
+
+    @classmethod
+    def from_json(cls, document: Dict[str, Any]) -> "SpanMap":
+        nodes = [(n["source"], f"{n['template']}:{n['line']}:{n['col']}") for n in document["nodes"]]
+        # Go按行返回: [kind, node, parent, start, end, start_char, end_char, key, path]
+        spans = [
+            Span(kind, tuple(path) if path is not None else None, key, start, end, start_char, end_char,
+                 parent if parent >= 0 else None, *nodes[node])
+            for kind, node, parent, start, end, start_char, end_char, key, path in document["spans"]
+        ]
+        return cls(output=document["output"], spans=spans)
+
+    def text(self, span: Span) -> str:
+        """Returns the part of the output ``span`` covers."""
+        return self.output[span.start_char:span.end_char]
+
+    def find(self, path: Union[str, Sequence[Union[str, int]]], kind: Optional[str] = None) -> List[Span]:
+        """
+        Returns the spans of the value at ``path``, optionally of one kind.
+
+        ``path`` is a tuple such as ``("Messages", 2, "content")`` or a dotted
+        string of field names.
+        """
+        target = _as_path(path)
+        return [s for s in self.spans if s.path == target and (kind is None or s.kind == kind)]
+
+    def items(self, path: Union[str, Sequence[Union[str, int]]]) -> List[Span]:
+        """Returns the iteration spans of the list at ``path``, e.g. ``"Messages"``."""
+        target = _as_path(path)
+        return [s for s in self.spans if s.kind == "item" and s.path is not None and s.path[:-1] == target]
+
+    def children(self, span: Span) -> List[Span]:
+        """Returns the spans directly nested in ``span``."""
+        index = next(i for i, s in enumerate(self.spans) if s is span)
+        return [s for s in self.spans if s.parent == index]
+
+
+def _as_path(path: Union[str, Sequence[Union[str, int]]]) -> DataPath:
+    if isinstance(path, str):
+        return tuple(path.split(".")) if path else ()
+    return tuple(path)
@@ -0,0 +1,197 @@
+"""启动预热与后台预加载.
+
+The first render in a fresh process pays for loading the shared library,
+starting the Go runtime, first-use setup inside Go (JSON decoding, the
+template packages) and parsing the template. :func:`warmup` moves all of that
+to startup and reports where the time went::
+
+    report = warmup(templates=[chat_source, rag_source])
+    print(report)
+
+With ``COGNIHUB_PRELOAD=1`` in the environment, importing the package starts
+the same warm-up on a background thread; ``COGNIHUB_PRELOAD_TEMPLATES`` lists
+template files or directories (separated by ``os.pathsep``) to pre-parse.
+Renders issued meanwhile simply wait for the library load to finish.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from .engine import GoTemplateEngine
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ENV = "COGNIHUB_PRELOAD"
+PRELOAD_TEMPLATES_ENV = "COGNIHUB_PRELOAD_TEMPLATES"
+
+# 包导入耗时, 由 __init__ 记录
+import_seconds: Optional[float] = None
+
+_preload_future: "Optional[Future[WarmupReport]]" = None
+_preload_lock = threading.Lock()
+
+TemplateSource = Union[str, GoTemplateEngine]
+
+
+@dataclass
+class WarmupReport:
+    """
+    Timings of a warm-up, in seconds, in the order the steps ran.
+
+    Steps: ``import`` (importing the package, when known), ``load_library``
+    (``dlopen`` and Go runtime start), ``runtime_ready`` (first call into Go),
+    ``first_render`` (first-use setup of JSON decoding and templates),
+    ``precompile`` (parsing the supplied templates) and ``renders`` (dummy
+    renders through the full Python path). ``already_loaded`` is set when the
+    library was loaded before the warm-up, so the cold-start steps are absent.
+    """
+    steps: Dict[str, float] = field(default_factory=dict)
+    already_loaded: bool = False
+    templates: int = 0
+    parse_errors: List[Optional[str]] = field(default_factory=list)
+    renders: int = 0
+    render_errors: int = 0
+
+    @property
+    def total(self) -> float:
+        return sum(self.steps.values())
+
+    def __str__(self) -> str:
+        total = self.total or 1e-12
+        lines = [f"cognihub_pygotemplate warm-up: {self.total * 1000:.2f} ms"
+                 + (" (library already loaded)" if self.already_loaded else "")]
+        for name, seconds in self.steps.items():
+            lines.append(f"  {name:<14} {seconds * 1000:9.3f} ms  {seconds / total:6.1%}")
+        failed = sum(1 for e in self.parse_errors if e)
+        lines.append(f"  {self.templates} templates ({failed} failed to parse), "
+                     f"{self.renders} renders ({self.render_errors} failed)")
+        return "\n".join(lines)
+
+
+def _timed(report: WarmupReport, step: str, fn: Any, *args: Any) -> Any:
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        report.steps[step] = report.steps.get(step, 0.0) + time.perf_counter() - start
+
+
+def warmup(templates: Iterable[TemplateSource] = (), data: Optional[Dict[str, Any]] = None,
+           renders: int = 1) -> WarmupReport:
+    """
+    Loads the library, pre-parses ``templates`` and runs dummy renders.
+
+    ``templates`` holds template sources or engines; engines are rendered
+    with their own limits and options. Each is rendered ``renders`` times with
+    ``data`` (an empty mapping by default). Render errors from data that does
+    not fit a template are counted, not raised; parse errors are listed in
+    ``parse_errors``.
+    """
+    report = WarmupReport()
+    if import_seconds is not None:
+        report.steps["import"] = import_seconds
+    report.already_loaded = bool(GoTemplateEngine._go_lib)
+    if not report.already_loaded:
+        _timed(report, "load_library", GoTemplateEngine.ensure_loaded)
+        _timed(report, "runtime_ready", GoTemplateEngine.memory_stats, False)
+        _timed(report, "first_render", GoTemplateEngine("{{range .L}}{{.}}{{end}}").render, {"L": [1]})
+
+    engines = [t if isinstance(t, GoTemplateEngine) else GoTemplateEngine(t) for t in templates]
+    report.templates = len(engines)
+    if engines:
+        report.parse_errors = _timed(report, "precompile", GoTemplateEngine.precompile,
+                                     [e.template_content for e in engines])
+    payload = data if data is not None else {}
+    start = time.perf_counter()
+    for engine, error in zip(engines, report.parse_errors):
+        if error:
+            continue
+        for _ in range(renders):
+            report.renders += 1
+            try:
+                engine.render(payload)
+            except ValueError:
+                report.render_errors += 1
+    if report.renders:
+        report.steps["renders"] = time.perf_counter() - start
+    return report
+
+
+def preload(templates: Iterable[TemplateSource] = (), data: Optional[Dict[str, Any]] = None,
+            renders: int = 1) -> "Future[WarmupReport]":
+    """
+    Runs :func:`warmup` on a daemon thread and returns a future for its report.
+
+    Do not call this in the master process of a preforking server: the Go
+    runtime does not survive ``fork()``; preload in each worker instead.
+    """
+    templates = list(templates)
+    future: "Future[WarmupReport]" = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(warmup(templates, data, renders))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="cognihub-preload", daemon=True).start()
+    return future
+
+
+def preload_report(timeout: Optional[float] = None) -> Optional[WarmupReport]:
+    """Waits for the preload started from the environment and returns its report, or None."""
+    future = _preload_future
+    return future.result(timeout) if future is not None else None
+
+
+def _template_files(spec: str) -> List[str]:
+    paths: List[str] = []
+    for entry in filter(None, spec.split(os.pathsep)):
+        if os.path.isdir(entry):
+            paths.extend(os.path.join(entry, name) for name in sorted(os.listdir(entry))
+                         if os.path.isfile(os.path.join(entry, name)))
+        else:
+            paths.append(entry)
+    return paths
+
+
+def _read_templates(paths: Sequence[str]) -> List[str]:
+    sources = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            sources.append(f.read())
+    return sources
+
+
+def preload_from_environment(environ: Optional[Dict[str, str]] = None) -> "Optional[Future[WarmupReport]]":
+    """Starts the background preload if ``COGNIHUB_PRELOAD`` is set; called on import."""
+    global _preload_future
+    env = os.environ if environ is None else environ
+    if env.get(PRELOAD_ENV, "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _preload_lock:
+        if _preload_future is not None:
+            return _preload_future
+        try:
+            templates = _read_templates(_template_files(env.get(PRELOAD_TEMPLATES_ENV, "")))
+        except OSError as e:
+            # 预加载只是优化, 模板读取失败不应让导入失败
+            logger.error("Cannot read templates listed in %s: %s", PRELOAD_TEMPLATES_ENV, e)
+            templates = []
+        _preload_future = preload(templates)
+        _preload_future.add_done_callback(_log_preload)
+        return _preload_future
+
+
+def _log_preload(future: "Future[WarmupReport]") -> None:
+    error = future.exception()
+    if error is not None:
+        logger.error("Background preload failed: %s", error)
+    else:
+        logger.info("%s", future.result())
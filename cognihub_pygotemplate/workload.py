@@ -0,0 +1,163 @@
+"""代表性渲染负载.
+
+A fixed mix of chat-style renders used to collect the CPU profile for
+profile-guided builds and to compare builds against each other. Most of the
+time goes where production renders spend it: decoding the JSON payload and
+executing ``range``/``if``-heavy chat templates::
+
+    python -m cognihub_pygotemplate.workload --duration 30 --profile default.pgo
+    python setup.py build_py --pgo=default.pgo
+
+The run prints one JSON object with the render count and rate.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .engine import GoTemplateEngine
+from .limits import RenderLimits
+from .refs import Blob
+
+CHATML = """{{- if .System }}<|im_start|>system
+{{ .System }}
+{{- if .Tools }}
+
+# Tools
+<tools>
+{{- range .Tools }}
+{"type": "function", "function": {"name": "{{ .function.name }}", "description": "{{ .function.description }}"}}
+{{- end }}
+</tools>
+{{- end }}<|im_end|>
+{{ end }}
+{{- range $i, $m := .Messages }}
+{{- $last := eq (len (slice $.Messages $i)) 1 -}}
+{{- if eq $m.role "user" }}<|im_start|>user
+{{ $m.content }}<|im_end|>
+{{ else if eq $m.role "assistant" }}<|im_start|>assistant
+{{ if $m.content }}{{ $m.content }}{{ else if $m.tool_calls }}<tool_call>
+{{ range $m.tool_calls }}{"name": "{{ .function.name }}", "arguments": {{ printf "%v" .function.arguments }}}
+{{ end }}</tool_call>{{ end }}{{ if not $last }}<|im_end|>
+{{ end }}
+{{- else if eq $m.role "tool" }}<|im_start|>user
+<tool_response>
+{{ $m.content }}
+</tool_response><|im_end|>
+{{ end }}
+{{- if and (ne $m.role "assistant") $last }}<|im_start|>assistant
+{{ end }}
+{{- end }}"""
+
+LLAMA = """{{- if .System }}<|start_header_id|>system<|end_header_id|>
+
+{{ .System }}<|eot_id|>
+{{- end }}
+{{- range .Messages }}<|start_header_id|>{{ .role }}<|end_header_id|>
+
+{{ .content }}<|eot_id|>
+{{- end }}<|start_header_id|>assistant<|end_header_id|>
+
+"""
+
+RAG = """Answer using only the documents below.
+{{ range $i, $d := .Documents }}
+[{{ $i }}] {{ $d.title }} ({{ $d.source }}, score {{ printf "%.3f" $d.score }})
+{{ $d.text }}
+{{ end }}
+{{- with .Question }}Question: {{ . }}{{ end }}"""
+
+TABLE = """| id | name | tags |
+|----|------|------|
+{{ range .Rows }}| {{ .id }} | {{ .name | html }} | {{ range $j, $t := .tags }}{{ if $j }}, {{ end }}{{ $t }}{{ end }} |
+{{ end }}"""
+
+WORDS = ("the model should answer briefly and cite the retrieved context when it is relevant "
+         "多语言 文本 with \"quotes\" and <tags> & entities").split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_calls(seed: int = 0, count: int = 64) -> List[Tuple[GoTemplateEngine, Dict[str, Any], Optional[RenderLimits]]]:
+    """Builds ``count`` render calls with a fixed, seeded mix of templates and data."""
+    rng = random.Random(seed)
+    engines = {name: GoTemplateEngine(source) for name, source in
+               (("chatml", CHATML), ("llama", LLAMA), ("rag", RAG), ("table", TABLE))}
+    tools = [{"type": "function", "function": {"name": f"tool_{i}", "description": _text(rng, 12)}}
+             for i in range(6)]
+    calls = []
+    for i in range(count):
+        kind = rng.choices(["chatml", "llama", "rag", "table"], weights=[5, 3, 2, 1])[0]
+        data: Dict[str, Any]
+        if kind in ("chatml", "llama"):
+            messages = []
+            for j in range(rng.randint(2, 60)):
+                role = rng.choice(["user", "assistant", "assistant", "tool"]) if j else "user"
+                message: Dict[str, Any] = {"role": role, "content": _text(rng, rng.randint(5, 120))}
+                if role == "assistant" and rng.random() < 0.2:
+                    message["content"] = ""
+                    message["tool_calls"] = [{"function": {"name": "tool_1", "arguments": {"q": _text(rng, 3)}}}]
+                messages.append(message)
+            data = {"System": _text(rng, 40), "Messages": messages}
+            if rng.random() < 0.5:
+                data["Tools"] = tools
+        elif kind == "rag":
+            data = {
+                "Question": _text(rng, 15),
+                "Documents": [{"title": _text(rng, 4), "source": f"doc-{k}.md", "score": rng.random(),
+                               # 长文档一半以 Blob 传递, 覆盖两条数据通路
+                               "text": Blob(_text(rng, 400)) if rng.random() < 0.5 else _text(rng, 400)}
+                              for k in range(rng.randint(3, 12))],
+            }
+        else:
+            data = {"Rows": [{"id": k, "name": _text(rng, 3), "tags": [_text(rng, 1) for _ in range(rng.randint(0, 5))]}
+                             for k in range(rng.randint(10, 200))]}
+        limits = RenderLimits(timeout=5.0, max_output_bytes=1 << 20) if i % 4 == 0 else None
+        calls.append((engines[kind], data, limits))
+    return calls
+
+
+def run(duration: float = 10.0, renders: int = 0, seed: int = 0) -> Dict[str, Any]:
+    """Renders the workload for ``duration`` seconds or ``renders`` renders."""
+    calls = build_calls(seed)
+    for engine, data, limits in calls:
+        engine.render(data, limits)  # 预热并解析模板
+    count = 0
+    output_bytes = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while (count < renders) if renders else (time.perf_counter() < deadline):
+        engine, data, limits = calls[count % len(calls)]
+        output_bytes += len(engine.render(data, limits))
+        count += 1
+    elapsed = time.perf_counter() - start
+    return {"renders": count, "seconds": elapsed, "renders_per_second": count / elapsed,
+            "output_chars": output_bytes}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to render")
+    parser.add_argument("--renders", type=int, default=0, help="render this many times instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", help="record a Go CPU profile of the run to this path")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        GoTemplateEngine.start_cpu_profile(args.profile)
+    try:
+        result = run(args.duration, args.renders, args.seed)
+    finally:
+        if args.profile:
+            GoTemplateEngine.stop_cpu_profile()
+    json.dump(result, sys.stdout)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
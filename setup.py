@@ -1,9 +1,10 @@
 import os
 import platform
+import sys
 import subprocess
 import shutil
 import glob
-from setuptools import setup
+from setuptools import Extension, setup
 from setuptools.command.build_py import build_py
 from distutils.command.clean import clean
 from distutils.cmd import Command
@@ -35,6 +36,15 @@ if platform.system() == "Windows":
 elif platform.system() == "Darwin":  # macOS
     LIB_NAME = "librenderer.dylib"  # macOS 惯例使用 .dylib
 
+# 独立渲染服务的可执行文件名
+RENDERD_NAME = "renderd.exe" if platform.system() == "Windows" else "renderd"
+
+# 可选的C扩展快速路径: 编译失败时不影响安装, 运行时回退到ctypes;
+# 设置 COGNIHUB_NATIVE=0 可跳过编译
+NATIVE_EXTENSIONS = [] if os.environ.get("COGNIHUB_NATIVE") == "0" else [
+    Extension("cognihub_pygotemplate._native", ["cognihub_pygotemplate/_native.c"], optional=True),
+]
+
 
 class CustomClean(clean):
     """自定义清理命令,清理所有构建产物包括Go编译的文件"""
@@ -50,8 +60,13 @@ class CustomClean(clean):
             "cognihub_pygotemplate/librenderer.dylib",  # macOS
             "cognihub_pygotemplate/librenderer.so",     # Linux  
             "cognihub_pygotemplate/renderer.dll",       # Windows
-            "cognihub_pygotemplate/librenderer.h"       # Header file
+            "cognihub_pygotemplate/librenderer.h",      # Header file
+            "cognihub_pygotemplate/renderd",            # Render server
+            "cognihub_pygotemplate/renderd.exe",
+            "cognihub_pygotemplate/default.pgo",        # PGO profile
         ]
+        # 原地编译的C扩展
+        go_files += glob.glob("cognihub_pygotemplate/_native*.so") + glob.glob("cognihub_pygotemplate/_native*.pyd")
         
         for file_path in go_files:
             if os.path.exists(file_path):
@@ -283,39 +298,115 @@ class CustomBuildWheel(bdist_wheel):
 
 
 class CustomBuild(build_py):
-    """自定义构建类,在构建Python包之前先编译Go代码。"""
+    """自定义构建类,在构建Python包之前先编译Go代码。
+
+    PGO和调优选项也可以通过环境变量设置, 便于 pip 构建时使用:
+    COGNIHUB_GO_PGO, COGNIHUB_GO_TUNED=1, COGNIHUB_GOAMD64。
+    """
+
+    user_options = build_py.user_options + [
+        ('pgo=', None, "CPU profile for profile-guided optimization: a path, 'auto' to use "
+                       "default.pgo in the Go source directory when present, or 'off' (default)"),
+        ('pgo-collect', None, 'record default.pgo by running the bundled render workload, then build with it'),
+        ('tuned', None, 'build with -trimpath and without symbol tables and DWARF (-ldflags=-s -w)'),
+        ('goamd64=', None, 'GOAMD64 microarchitecture level for amd64 builds (v1, v2, v3 or v4)'),
+    ]
+    boolean_options = build_py.boolean_options + ['pgo-collect', 'tuned']
+
+    # 采集PGO profile时运行负载的秒数
+    PGO_COLLECT_SECONDS = 20
+
+    def initialize_options(self) -> None:
+        super().initialize_options()
+        self.pgo: str | None = None
+        self.pgo_collect = False
+        self.tuned = False
+        self.goamd64: str | None = None
+
+    def finalize_options(self) -> None:
+        super().finalize_options()
+        if self.pgo is None:
+            self.pgo = os.environ.get("COGNIHUB_GO_PGO", "off")
+        if not self.tuned:
+            self.tuned = os.environ.get("COGNIHUB_GO_TUNED", "") not in ("", "0")
+        if self.goamd64 is None:
+            self.goamd64 = os.environ.get("COGNIHUB_GOAMD64") or None
+        if self.goamd64 is not None and self.goamd64 not in ("v1", "v2", "v3", "v4"):
+            raise ValueError(f"--goamd64 must be one of v1, v2, v3, v4, not {self.goamd64!r}")
 
     def run(self) -> None:
         print("--- Running custom Go build command ---")
 
-        # 定义Go源文件和目标库文件的路径
-        go_src_path = os.path.join(os.path.dirname(__file__), "cognihub_pygotemplate", "renderer.go")
-        lib_output_path = os.path.join(os.path.dirname(__file__), "cognihub_pygotemplate", LIB_NAME)
-
-        if not os.path.exists(go_src_path):
-            raise FileNotFoundError(f"Go source file not found at: {go_src_path}")
-
-        # 构建 go build 命令
-        command = [
-            "go",
-            "build",
-            "-buildmode=c-shared",
-            "-o",
-            lib_output_path,
-            go_src_path,
-        ]
+        # 定义Go源码目录和目标库文件的路径
+        go_src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cognihub_pygotemplate")
+        lib_output_path = os.path.join(go_src_dir, LIB_NAME)
+
+        if not os.path.exists(os.path.join(go_src_dir, "go.mod")):
+            raise FileNotFoundError(f"Go module not found in: {go_src_dir}")
+
+        pgo = self.pgo
+        if self.pgo_collect:
+            pgo = self.collect_profile(go_src_dir, lib_output_path)
+        flags, env = self.tuning_flags(pgo, self.tuned, self.goamd64)
+
+        # 编译整个Go包(按构建约束选择平台相关的源文件)
+        self.go_build(go_src_dir, ["-buildmode=c-shared", *flags], lib_output_path, env)
+        # 同一份源码加上 renderd 构建标签得到独立的渲染服务
+        self.go_build(go_src_dir, ["-tags", "renderd", *flags], os.path.join(go_src_dir, RENDERD_NAME), env)
+
+        # 执行原始的 build_py 命令，继续Python部分的构建
+        super().run()
+
+    @staticmethod
+    def tuning_flags(pgo: str, tuned: bool, goamd64: str | None) -> tuple[list[str], dict[str, str] | None]:
+        """Returns the extra go build flags and environment for the chosen options."""
+        flags = []
+        if pgo in ("off", "auto"):
+            # 默认关闭PGO, 避免目录中残留的 default.pgo 悄悄改变普通构建
+            flags.append(f"-pgo={pgo}")
+        else:
+            if not os.path.exists(pgo):
+                raise FileNotFoundError(f"PGO profile not found: {pgo}")
+            flags.append(f"-pgo={os.path.abspath(pgo)}")
+        if tuned:
+            flags += ["-trimpath", "-ldflags=-s -w"]
+        env = None
+        if goamd64 is not None:
+            env = dict(os.environ, GOAMD64=goamd64)
+        return flags, env
+
+    def collect_profile(self, go_src_dir: str, lib_output_path: str) -> str:
+        """Builds the library without PGO and records default.pgo from the bundled workload."""
+        profile = os.path.join(go_src_dir, "default.pgo")
+        print(f"Collecting PGO profile for {self.PGO_COLLECT_SECONDS}s into {profile}")
+        self.go_build(go_src_dir, ["-buildmode=c-shared", "-pgo=off"], lib_output_path)
+        root = os.path.dirname(go_src_dir)
+        subprocess.run(
+            [sys.executable, "-m", "cognihub_pygotemplate.workload",
+             "--duration", str(self.PGO_COLLECT_SECONDS), "--profile", profile],
+            cwd=root,
+            env=dict(os.environ, PYTHONPATH=root),
+            check=True,
+        )
+        return profile
+
+    @staticmethod
+    def go_build(go_src_dir: str, flags: list[str], output_path: str, env: dict[str, str] | None = None) -> None:
+        command = ["go", "build", *flags, "-o", output_path, "."]
 
         try:
             # 执行编译命令
             print(f"Executing command: {' '.join(command)}")
             subprocess.run(
                 command,
+                cwd=go_src_dir,
+                env=env,
                 check=True,
                 capture_output=True,
                 text=True,
                 encoding='utf-8'
             )
-            print(f"Successfully compiled Go code to {lib_output_path}")
+            print(f"Successfully compiled Go code to {output_path}")
         except FileNotFoundError:
             raise RuntimeError(
                 "Go compiler not found. Please make sure Go is installed and in your system's PATH."
@@ -330,9 +421,6 @@ class CustomBuild(build_py):
             )
             raise RuntimeError(error_message) from e
 
-        # 执行原始的 build_py 命令，继续Python部分的构建
-        super().run()
-
 
 # 使用 setup() 函数来配置项目
 cmdclass_dict = {
@@ -349,12 +437,15 @@ if bdist_wheel is not None:
 setup(
     # cmdclass 参数告诉 setuptools 使用我们的自定义类来执行命令
     cmdclass=cmdclass_dict,
+    ext_modules=NATIVE_EXTENSIONS,
     # 将编译好的共享库包含在包数据中，这样它才会被一起安装
     package_data={
         "cognihub_pygotemplate": [
             "librenderer.so",      # Linux
             "librenderer.dylib",   # macOS  
             "renderer.dll",        # Windows
+            "renderd",             # 渲染服务 (Linux/macOS)
+            "renderd.exe",         # 渲染服务 (Windows)
         ],
     },
     # 明确指出这不是纯Python包
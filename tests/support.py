@@ -0,0 +1,27 @@
+"""Shared helpers for tests that need the real compiled Go library."""
+import os
+import unittest
+
+from cognihub_pygotemplate import GoTemplateEngine
+
+LIB_NAMES = ["librenderer.dylib", "librenderer.so", "renderer.dll"]
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cognihub_pygotemplate")
+
+
+def library_available() -> bool:
+    """Returns True when a compiled Go library exists in the package directory."""
+    return any(os.path.exists(os.path.join(PACKAGE_DIR, name)) for name in LIB_NAMES)
+
+
+class RealLibraryTestCase(unittest.TestCase):
+    """Base class for tests against the real library; skipped when it is missing."""
+
+    def setUp(self) -> None:
+        if not library_available():
+            self.skipTest("Compiled Go library not found - run 'python setup.py build_py' first")
+        GoTemplateEngine._go_lib = None
+        GoTemplateEngine._free_func = None
+
+    def tearDown(self) -> None:
+        GoTemplateEngine._go_lib = None
+        GoTemplateEngine._free_func = None
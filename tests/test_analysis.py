@@ -0,0 +1,122 @@
+"""Tests for static template analysis, cost estimation and admission checks."""
+import glob
+import os
+import random
+import time
+
+from cognihub_pygotemplate import CostEstimate, GoTemplateEngine, RenderLimitError, RenderLimits
+from tests.support import RealLibraryTestCase
+from tests.test_optimize import CORPUS_DIR, random_conversation
+
+
+class TestAnalyze(RealLibraryTestCase):
+
+    def test_structure(self) -> None:
+        analysis = GoTemplateEngine(
+            '{{define "row"}}{{range .}}{{.}}{{end}}{{end}}'
+            "{{range .Rows}}{{template \"row\" .}}{{end}}{{range .Tags}}{{end}}").analyze()
+        self.assertEqual(analysis.ranges, 3)
+        self.assertEqual(analysis.max_range_depth, 1)
+        self.assertEqual(analysis.calls, ["row"])
+        self.assertFalse(analysis.recursive)
+        self.assertEqual([(f.kind, f.line) for f in analysis.findings], [("template_in_range", 1)])
+
+    def test_findings(self) -> None:
+        analysis = GoTemplateEngine(
+            "{{range $i, $m := .Messages}}\n"
+            "{{$.System}}{{$i}}{{range $.Messages}}{{.content}}{{end}}\n"
+            "{{end}}").analyze()
+        kinds = {(f.kind, f.line) for f in analysis.findings}
+        self.assertEqual(kinds, {("outer_value_in_range", 2), ("nested_range", 2), ("quadratic_range", 2)})
+        self.assertEqual(analysis.max_range_depth, 2)
+
+    def test_recursive_template(self) -> None:
+        analysis = GoTemplateEngine('{{define "t"}}{{range .c}}{{template "t" .}}{{end}}{{end}}'
+                                    '{{template "t" .}}').analyze()
+        self.assertTrue(analysis.recursive)
+        self.assertIn("recursive_template", {f.kind for f in analysis.findings})
+
+    def test_parse_error(self) -> None:
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            GoTemplateEngine("{{range .x}}").analyze()
+
+    def test_cached_per_source(self) -> None:
+        engine = GoTemplateEngine("{{range .a}}{{end}}")
+        self.assertIs(engine.analyze(), engine.analyze())
+        engine.template_content = "{{.a}}"
+        self.assertEqual(engine.analyze().ranges, 0)
+
+
+class TestEstimate(RealLibraryTestCase):
+
+    def test_iterations_follow_the_data(self) -> None:
+        engine = GoTemplateEngine("{{range .Rows}}{{range .cells}}{{.}},{{end}}\n{{end}}")
+        data = {"Rows": [{"cells": ["ab"] * n} for n in (1, 2, 3, 4)]}
+        estimate = engine.estimate_cost(data)
+        self.assertEqual(estimate.iterations, 4 + 10)
+        self.assertEqual(estimate.output_bytes, len(engine.render(data)))
+        self.assertEqual(estimate.unknown, 0)
+
+    def test_variables_with_and_else(self) -> None:
+        engine = GoTemplateEngine("{{$docs := .Docs}}{{with .User}}{{.name}}{{end}}"
+                                  "{{range $d := $docs}}[{{$d.text}}]{{else}}none{{end}}")
+        self.assertEqual(engine.estimate_cost({"User": {"name": "abc"}, "Docs": [{"text": "x" * 10}] * 5}),
+                         CostEstimate(output_bytes=3 + 5 * 12, iterations=5, actions=4 + 5 * 1))
+        self.assertEqual(engine.estimate_cost({"Docs": []}).output_bytes, len("none"))
+        engine = GoTemplateEngine("{{range $k, $v := .M}}{{$k}}{{$v}}{{end}}")
+        self.assertEqual(engine.estimate_cost({"M": {"a": "xx", "b": "yy"}}).iterations, 2)
+
+    def test_unknown_ranges_are_counted(self) -> None:
+        engine = GoTemplateEngine('{{range (slice .x 1)}}{{.}}{{end}}{{range (or .y .x)}}{{.}}{{end}}')
+        self.assertEqual(engine.estimate_cost({"x": "a"}).unknown, 1)
+
+    def test_recursion_is_bounded(self) -> None:
+        engine = GoTemplateEngine('{{define "t"}}x{{template "t" .}}{{end}}{{template "t" .}}')
+        estimate = engine.analyze().estimate({}, max_call_depth=10)
+        self.assertTrue(estimate.truncated)
+        self.assertEqual(estimate.output_bytes, 10)
+
+    def test_close_to_actual_on_corpus(self) -> None:
+        rng = random.Random(41)
+        paths = sorted(glob.glob(os.path.join(CORPUS_DIR, "*.gotmpl")))
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                engine = GoTemplateEngine(f.read())
+            for _ in range(20):
+                data = random_conversation(rng)
+                data["Messages"] = data["Messages"] * rng.randint(1, 20)
+                actual = len(engine.render(data).encode("utf-8"))
+                estimate = engine.estimate_cost(data)
+                # 抽样可能略为低估; 无法判定的条件取较贵分支, 可能明显高估
+                self.assertLessEqual(actual, 1.5 * estimate.output_bytes + 64, path)
+                self.assertLessEqual(estimate.output_bytes, 8 * actual + 256, path)
+
+    def test_cheaper_than_rendering(self) -> None:
+        engine = GoTemplateEngine("{{range .Rows}}{{.a}} {{.b}}\n{{end}}")
+        data = {"Rows": [{"a": "x" * 20, "b": i} for i in range(200_000)]}
+        start = time.perf_counter()
+        estimate = engine.estimate_cost(data)
+        estimated_in = time.perf_counter() - start
+        start = time.perf_counter()
+        output = engine.render(data)
+        rendered_in = time.perf_counter() - start
+        self.assertEqual(estimate.iterations, 200_000)
+        self.assertLess(abs(estimate.output_bytes - len(output)) / len(output), 0.05)
+        self.assertLess(estimated_in * 10, rendered_in)
+
+
+class TestCheckCost(RealLibraryTestCase):
+
+    def test_rejects_before_rendering(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{.}}{{end}}", limits=RenderLimits(max_range_iterations=100))
+        self.assertEqual(engine.check_cost({"L": list(range(100))}).iterations, 100)
+        with self.assertRaises(RenderLimitError) as cm:
+            engine.check_cost({"L": list(range(101))})
+        self.assertEqual(cm.exception.kind, "range")
+        with self.assertRaises(RenderLimitError) as cm:
+            engine.check_cost({"L": ["x" * 100] * 3}, limits=RenderLimits(max_output_bytes=200))
+        self.assertEqual(cm.exception.kind, "output")
+
+    def test_without_limits_returns_the_estimate(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{.}}{{end}}")
+        self.assertEqual(engine.check_cost({"L": [1, 2]}).iterations, 2)
@@ -0,0 +1,137 @@
+"""Tests for the JSONL batch renderer behind ``python -m cognihub_pygotemplate``."""
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+from cognihub_pygotemplate import GoTemplateEngine, RenderLimits
+from cognihub_pygotemplate import batch
+from tests.support import RealLibraryTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def records(lines: list) -> list:
+    return [batch.Record("mem", i, line.encode("utf-8")) for i, line in enumerate(lines, 1)]
+
+
+class TestRenderRecords(RealLibraryTestCase):
+
+    def test_keeps_input_order_across_workers(self) -> None:
+        engine = GoTemplateEngine("{{.i}}:{{range .L}}{{.}}{{end}}")
+        lines = [json.dumps({"i": i, "L": list(range(i % 13))}) for i in range(500)]
+        for workers, chunk_size in ((1, 7), (4, 3), (3, 1000)):
+            outputs = [r.output for r in batch.render_records(engine, records(lines), workers, chunk_size)]
+            self.assertEqual(outputs, [f"{i}:" + "".join(map(str, range(i % 13))) for i in range(500)])
+
+    def test_errors_are_yielded_in_place(self) -> None:
+        engine = GoTemplateEngine("{{.a.b}}")
+        results = list(batch.render_records(engine, records(['{"a": {"b": 1}}', "nope", '{"a": 2}', '{"a": {"b": 3}}']),
+                                            workers=2, chunk_size=1))
+        self.assertEqual([r.output for r in results], ["1", None, None, "3"])
+        self.assertIn("JSON_ERROR", str(results[1].error))
+        self.assertIn("TEMPLATE_EXECUTE_ERROR", str(results[2].error))
+
+    def test_limits_apply_per_record(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}x{{end}}")
+        results = list(batch.render_records(engine, records(['{"L": [1, 2]}', '{"L": [1, 2, 3, 4, 5, 6]}']),
+                                            limits=RenderLimits(max_output_bytes=4)))
+        self.assertEqual(results[0].output, "xx")
+        self.assertEqual(results[1].error.kind, "output")
+
+
+class TestRun(RealLibraryTestCase):
+
+    def test_text_and_jsonl_formats(self) -> None:
+        engine = GoTemplateEngine("{{.s}}")
+        out = io.BytesIO()
+        batch.run(engine, records(['{"s": "a\\nb"}', '{"s": "é"}']), batch.ShardedWriter(None, stream=out),
+                  separator="\0")
+        self.assertEqual(out.getvalue(), "a\nb\0é\0".encode("utf-8"))
+        out = io.BytesIO()
+        stats = batch.run(engine, records(['{"s": "a\\nb"}']), batch.ShardedWriter(None, stream=out),
+                          output_format="jsonl")
+        self.assertEqual(out.getvalue(), b'{"output": "a\\nb"}\n')
+        self.assertEqual((stats.records, stats.errors, stats.latency.samples), (1, 0, 1))
+
+    def test_fail_stops_after_writing_earlier_outputs(self) -> None:
+        out = io.BytesIO()
+        with self.assertRaisesRegex(batch.BatchRenderError, "^mem:2: "):
+            batch.run(GoTemplateEngine("{{.s}}"), records(['{"s": 1}', "{", '{"s": 3}']),
+                      batch.ShardedWriter(None, stream=out), chunk_size=1)
+        self.assertEqual(out.getvalue(), b"1\n")
+
+    def test_skip_reports_and_continues(self) -> None:
+        out, errors = io.BytesIO(), io.StringIO()
+        stats = batch.run(GoTemplateEngine("{{.s}}"), records(['{"s": 1}', "{", '{"s": 3}']),
+                          batch.ShardedWriter(None, stream=out), on_error="skip", errors=errors)
+        self.assertEqual(out.getvalue(), b"1\n3\n")
+        self.assertEqual(stats.errors, 1)
+        self.assertTrue(errors.getvalue().startswith("mem:2: "))
+
+
+class TestCommandLine(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.template = os.path.join(self.tmp, "t.gotmpl")
+        with open(self.template, "w", encoding="utf-8") as f:
+            f.write("{{.n}}")
+        self.inputs = []
+        for name, numbers in (("a.jsonl", range(0, 5)), ("b.jsonl", range(5, 10))):
+            path = os.path.join(self.tmp, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"n": n}) + "\n" + ("\n" if n == 2 else "") for n in numbers))
+            self.inputs.append(path)
+
+    def main(self, *argv: str) -> tuple:
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            code = batch.main(list(argv))
+        return code, out.getvalue(), err.getvalue()
+
+    def test_sharded_output_keeps_order(self) -> None:
+        pattern = os.path.join(self.tmp, "out", "part-{shard:02d}.txt")
+        code, _, _ = self.main("-t", self.template, "-o", pattern, "--shard-size", "4", "-j", "2",
+                               "--chunk-size", "3", *self.inputs)
+        self.assertEqual(code, 0)
+        shards = sorted(os.listdir(os.path.join(self.tmp, "out")))
+        self.assertEqual(shards, ["part-00.txt", "part-01.txt", "part-02.txt"])
+        contents = []
+        for shard in shards:
+            with open(os.path.join(self.tmp, "out", shard)) as f:
+                contents.append(f.read())
+        self.assertEqual(contents, ["0\n1\n2\n3\n", "4\n5\n6\n7\n", "8\n9\n"])
+
+    def test_shard_pattern_must_vary(self) -> None:
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            batch.main(["-e", "x", "-o", os.path.join(self.tmp, "out.txt"), "--shard-size", "2"])
+
+    def test_bench_reports_throughput_and_percentiles(self) -> None:
+        code, out, _ = self.main("-e", "{{.n}}", "--bench", *self.inputs)
+        self.assertEqual(code, 0)
+        report = json.loads(out)
+        self.assertEqual(report["records"], 10)
+        self.assertGreater(report["records_per_second"], 0)
+        self.assertEqual(set(report["latency"]), {"samples", "mean", "p50", "p95", "p99", "max"})
+
+    def test_failure_exit_status(self) -> None:
+        bad = os.path.join(self.tmp, "bad.jsonl")
+        with open(bad, "w") as f:
+            f.write('{"n": 1}\n{"n": \n')
+        code, _, err = self.main("-e", "{{.n}}", "-o", os.path.join(self.tmp, "o.txt"), bad)
+        self.assertEqual(code, 1)
+        self.assertIn(f"{bad}:2: ", err)
+
+    def test_module_entry_point_reads_stdin(self) -> None:
+        result = subprocess.run([sys.executable, "-m", "cognihub_pygotemplate", "-e", "<{{.n}}>"],
+                                input=b'{"n": 1}\n{"n": "\xc3\xa9"}\n', cwd=ROOT,
+                                env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout, "<1>\n<é>\n".encode("utf-8"))
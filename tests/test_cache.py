@@ -0,0 +1,147 @@
+"""Tests for the rendered-output cache."""
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from cognihub_pygotemplate import Blob, GoTemplateEngine, RenderCache, RenderLimitError, RenderLimits
+from tests.support import RealLibraryTestCase
+
+
+class TestRenderCache(unittest.TestCase):
+    """Cache bookkeeping that does not need the Go library."""
+
+    def test_lru_eviction_by_entries(self) -> None:
+        cache = RenderCache(max_entries=2)
+        cache.put(b"a", "A")
+        cache.put(b"b", "B")
+        self.assertEqual(cache.get(b"a"), "A")  # a 变为最近使用
+        cache.put(b"c", "C")
+        self.assertIsNone(cache.get(b"b"))
+        self.assertEqual(cache.get(b"a"), "A")
+        self.assertEqual(cache.get(b"c"), "C")
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_eviction_by_bytes(self) -> None:
+        cache = RenderCache(max_entries=100, max_bytes=400)
+        cache.put(b"a", "x" * 200)
+        cache.put(b"b", "y" * 200)
+        stats = cache.stats()
+        self.assertEqual(stats.entries, 1)
+        self.assertLessEqual(stats.bytes, 400)
+        self.assertIsNone(cache.get(b"a"))
+
+    def test_oversized_value_not_cached(self) -> None:
+        cache = RenderCache(max_bytes=100)
+        cache.put(b"a", "x" * 1000)
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl_expiry(self) -> None:
+        cache = RenderCache(ttl=10)
+        with patch("time.monotonic", return_value=100.0):
+            cache.put(b"a", "A")
+        with patch("time.monotonic", return_value=105.0):
+            self.assertEqual(cache.get(b"a"), "A")
+        with patch("time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get(b"a"))
+        stats = cache.stats()
+        self.assertEqual(stats.expirations, 1)
+        self.assertEqual(stats.entries, 0)
+
+    def test_hit_rate(self) -> None:
+        cache = RenderCache()
+        self.assertEqual(cache.stats().hit_rate, 0.0)
+        cache.put(b"a", "A")
+        cache.get(b"a")
+        cache.get(b"a")
+        cache.get(b"missing")
+        self.assertAlmostEqual(cache.stats().hit_rate, 2 / 3)
+
+    def test_fingerprint_covers_template_payload_and_buffers(self) -> None:
+        base = RenderCache.fingerprint(b"t", b"{}")
+        self.assertEqual(base, RenderCache.fingerprint(b"t", b"{}"))
+        self.assertNotEqual(base, RenderCache.fingerprint(b"u", b"{}"))
+        self.assertNotEqual(base, RenderCache.fingerprint(b"t", b"{ }"))
+        self.assertNotEqual(RenderCache.fingerprint(b"t", b"{}", [memoryview(b"ab")]),
+                            RenderCache.fingerprint(b"t", b"{}", [memoryview(b"ac")]))
+
+    def test_invalid_limits(self) -> None:
+        with self.assertRaises(ValueError):
+            RenderCache(max_entries=0)
+        with self.assertRaises(ValueError):
+            RenderCache(ttl=0)
+
+    @patch('os.path.exists', return_value=True)
+    @patch('ctypes.CDLL')
+    def test_engine_skips_ffi_on_hit(self, mock_cdll: Mock, _exists: Mock) -> None:
+        GoTemplateEngine._go_lib = None
+        self.addCleanup(setattr, GoTemplateEngine, "_go_lib", None)
+        mock_lib = Mock()
+        mock_cdll.return_value = mock_lib
+        mock_lib.RenderTemplate.return_value = b"Hello"
+        with patch('ctypes.string_at', return_value=b"Hello"):
+            engine = GoTemplateEngine("{{.Name}}", cache=RenderCache())
+            self.assertEqual(engine.render({"Name": "a", "Id": 1}), "Hello")
+            self.assertEqual(engine.render({"Id": 1, "Name": "a"}), "Hello")
+        self.assertEqual(mock_lib.RenderTemplate.call_count, 1)
+
+
+class TestRealRenderCache(RealLibraryTestCase):
+    """Cached rendering against the real library."""
+
+    def test_cached_output_matches_uncached(self) -> None:
+        cache = RenderCache()
+        data = {"Name": "World", "Items": [1, 2, 3]}
+        plain = GoTemplateEngine("Hi {{.Name}} {{range .Items}}{{.}}{{end}}")
+        cached = GoTemplateEngine(plain.template_content, cache=cache)
+        self.assertEqual(cached.render(data), plain.render(data))
+        self.assertEqual(cached.render(data), plain.render(data))
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    def test_shared_cache_separates_templates(self) -> None:
+        cache = RenderCache()
+        first = GoTemplateEngine("A{{.X}}", cache=cache)
+        second = GoTemplateEngine("B{{.X}}", cache=cache)
+        self.assertEqual(first.render({"X": 1}), "A1")
+        self.assertEqual(second.render({"X": 1}), "B1")
+
+    def test_blob_contents_are_part_of_the_key(self) -> None:
+        engine = GoTemplateEngine("{{.Doc}}", cache=RenderCache())
+        self.assertEqual(engine.render({"Doc": Blob("first")}), "first")
+        self.assertEqual(engine.render({"Doc": Blob(b"second")}), "second")
+        self.assertEqual(engine.render({"Doc": Blob("first")}), "first")
+        self.assertEqual(engine._cache.stats().hits, 1)  # type: ignore[union-attr]
+
+    def test_errors_are_not_cached(self) -> None:
+        cache = RenderCache()
+        engine = GoTemplateEngine("{{.X.Y}}", cache=cache)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                engine.render({"X": "string"})
+        self.assertEqual(len(cache), 0)
+
+    def test_hits_respect_the_output_limit(self) -> None:
+        engine = GoTemplateEngine("{{.X}}", cache=RenderCache())
+        self.assertEqual(engine.render({"X": "abcdefghij"}), "abcdefghij")
+        with self.assertRaises(RenderLimitError) as caught:
+            engine.render({"X": "abcdefghij"}, limits=RenderLimits(max_output_bytes=3))
+        self.assertEqual(caught.exception.kind, "output")
+        self.assertEqual(engine.render({"X": "abcdefghij"}, limits=RenderLimits(max_output_bytes=10)), "abcdefghij")
+
+    def test_unsortable_keys_render_uncached(self) -> None:
+        cache = RenderCache()
+        engine = GoTemplateEngine("{{range $k, $v := .M}}{{$k}}={{$v}};{{end}}", cache=cache)
+        self.assertEqual(engine.render({"M": {1: "a", "b": 2}}), "1=a;b=2;")
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl_expired_entries_are_rendered_again(self) -> None:
+        cache = RenderCache(ttl=0.05)
+        engine = GoTemplateEngine("{{.X}}", cache=cache)
+        engine.render({"X": 1})
+        time.sleep(0.06)
+        engine.render({"X": 1})
+        self.assertEqual(cache.stats().expirations, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+"""Tests for the renderd server and the pooled, pipelined client."""
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from typing import Any, List, Tuple
+
+from cognihub_pygotemplate import Blob, RemoteTemplateEngine, RenderClient, RenderLimitError, RenderLimits
+from cognihub_pygotemplate.client import (_HEADER, _LENGTH, _OP_CANCEL, _OP_RENDER, _STATUS_OK, server_binary,
+                                          start_server)
+
+EXPLOSIVE = "{{range .L}}{{range $.L}}{{range $.L}}x{{end}}{{end}}{{end}}"
+ITEMS = {"L": list(range(300))}
+
+
+def render_frame(req_id: int, template: str, options: dict, data: dict) -> bytes:
+    # 直接按 renderd.go 的格式编码一帧渲染请求
+    tmpl, opts, body = template.encode(), json.dumps(options).encode(), json.dumps(data).encode()
+    payload = _LENGTH.pack(len(tmpl)) + tmpl + _LENGTH.pack(len(opts)) + opts + body
+    return _HEADER.pack(_HEADER.size - _LENGTH.size + len(payload), req_id, _OP_RENDER) + payload
+
+
+def cancel_frame(req_id: int) -> bytes:
+    return _HEADER.pack(_HEADER.size - _LENGTH.size, req_id, _OP_CANCEL)
+
+
+def read_response(reader: Any) -> Tuple[int, int, bytes]:
+    length, req_id, status = _HEADER.unpack(reader.read(_HEADER.size))
+    return req_id, status, reader.read(length - (_HEADER.size - _LENGTH.size))
+
+
+def server_available() -> bool:
+    return hasattr(socket, "AF_UNIX") and os.path.exists(server_binary())
+
+
+@unittest.skipUnless(server_available(), "renderd not built - run 'python setup.py build_py' first")
+class RenderdTestCase(unittest.TestCase):
+    """Starts a private renderd for every test."""
+
+    server_args: List[str] = []
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, "renderd.sock")
+        self.server = start_server(self.socket_path, *self.server_args)
+        self.client = RenderClient(self.socket_path, max_connections=2)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.terminate()
+        self.server.wait(5)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def engine(self, template: str, **kwargs: Any) -> RemoteTemplateEngine:
+        return RemoteTemplateEngine(template, client=self.client, **kwargs)
+
+
+class TestRemoteRender(RenderdTestCase):
+
+    def test_render(self) -> None:
+        engine = self.engine("Hello {{.name}}! {{range .items}}[{{.}}]{{end}}")
+        self.assertEqual(engine.render({"name": "世界", "items": [1, 2]}), "Hello 世界! [1][2]")
+
+    def test_blobs_are_sent_inline(self) -> None:
+        engine = self.engine("{{.a}}|{{.b}}")
+        self.assertEqual(engine.render({"a": Blob("text"), "b": Blob(b"bytes")}), "text|bytes")
+
+    def test_errors_match_local_engine(self) -> None:
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            self.engine("{{.name").render({})
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_EXECUTE_ERROR"):
+            self.engine("{{template \"missing\"}}").render({})
+
+    def test_limits(self) -> None:
+        engine = self.engine(EXPLOSIVE, limits=RenderLimits(max_range_iterations=1000))
+        with self.assertRaises(RenderLimitError) as ctx:
+            engine.render(ITEMS)
+        self.assertEqual(ctx.exception.kind, "range")
+
+    def test_batch_is_ordered(self) -> None:
+        engine = self.engine("{{.i}}:{{range .pad}}.{{end}}")
+        items = [{"i": i, "pad": list(range(i % 50))} for i in range(500)]
+        expected = [f"{i}:" + "." * (i % 50) for i in range(500)]
+        self.assertEqual(engine.render_batch(items), expected)
+
+    def test_batch_raises_first_error(self) -> None:
+        engine = self.engine("{{index .L 1}}")
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_EXECUTE_ERROR"):
+            engine.render_batch([{"L": [1, 2]}, {"L": [1]}])
+
+    def test_concurrent_threads_share_connections(self) -> None:
+        engine = self.engine("{{.n}}")
+        results: List[str] = []
+        lock = threading.Lock()
+
+        def worker(base: int) -> None:
+            for n in range(base, base + 50):
+                out = engine.render({"n": n})
+                with lock:
+                    results.append(out)
+
+        threads = [threading.Thread(target=worker, args=(i * 50,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results, key=int), [str(n) for n in range(400)])
+        self.assertLessEqual(len(self.client._connections), 2)
+
+    def test_render_async(self) -> None:
+        engine = self.engine("{{.n}}")
+
+        async def main() -> List[str]:
+            return await asyncio.gather(*(engine.render_async({"n": n}) for n in range(20)))
+
+        self.assertEqual(asyncio.run(main()), [str(n) for n in range(20)])
+
+    def test_reconnects_after_server_restart(self) -> None:
+        engine = self.engine("{{.n}}")
+        self.assertEqual(engine.render({"n": 1}), "1")
+        self.server.terminate()
+        self.server.wait(5)
+        self.server = start_server(self.socket_path)
+        self.assertEqual(engine.render({"n": 2}), "2")
+
+
+class TestServerIsolation(RenderdTestCase):
+    """Server-side ceilings and cancellation protect the shared process."""
+
+    server_args = ["-workers", "1", "-max-range-iterations", "5000"]
+
+    def test_server_ceiling_applies_to_unlimited_requests(self) -> None:
+        with self.assertRaises(RenderLimitError) as ctx:
+            self.engine(EXPLOSIVE).render(ITEMS)
+        self.assertEqual(ctx.exception.kind, "range")
+
+    def test_request_cannot_raise_ceiling(self) -> None:
+        engine = self.engine(EXPLOSIVE, limits=RenderLimits(max_range_iterations=10 ** 9))
+        with self.assertRaises(RenderLimitError):
+            engine.render(ITEMS)
+
+    def test_pipelined_flood_with_parallel_option(self) -> None:
+        # 一次写入大量请求, 服务端只有一个槽位且 parallel 被限制到 -workers
+        requests = 200
+        data = {"Rows": list(range(200))}
+        frames = b"".join(render_frame(i, "{{range .Rows}}{{.}},{{end}}", {"parallel": 64}, data)
+                          for i in range(requests))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10)
+            sock.connect(self.socket_path)
+            sock.sendall(frames)
+            reader = sock.makefile("rb")
+            expected = "".join(f"{i}," for i in range(200)).encode()
+            seen = set()
+            for _ in range(requests):
+                req_id, status, output = read_response(reader)
+                self.assertEqual((status, output), (_STATUS_OK, expected))
+                seen.add(req_id)
+        self.assertEqual(seen, set(range(requests)))
+
+
+class TestAsyncCancellation(RenderdTestCase):
+
+    server_args = ["-workers", "1"]
+
+    def test_cancelling_task_frees_the_server(self) -> None:
+        slow = self.engine(EXPLOSIVE)
+        fast = self.engine("{{.n}}")
+
+        async def main() -> float:
+            task = asyncio.ensure_future(slow.render_async(ITEMS))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            started = time.perf_counter()
+            self.assertEqual(await fast.render_async({"n": 1}), "1")
+            return time.perf_counter() - started
+
+        # 只有一个渲染槽位: 被取消的渲染若仍在运行, 后续渲染要等待数秒
+        self.assertLess(asyncio.run(main()), 1.0)
+
+    def test_cancel_is_read_while_workers_are_busy(self) -> None:
+        # 唯一的槽位被占用, 后面还排着渲染请求时, 取消帧仍要被读到
+        slow = render_frame(1, EXPLOSIVE, {"cancellable": True}, ITEMS)
+        queued = render_frame(2, EXPLOSIVE, {"cancellable": True}, ITEMS)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10)
+            sock.connect(self.socket_path)
+            sock.sendall(slow + queued)
+            time.sleep(0.1)
+            started = time.perf_counter()
+            sock.sendall(cancel_frame(1) + cancel_frame(2) + render_frame(3, "{{.n}}", {}, {"n": 1}))
+            reader = sock.makefile("rb")
+            responses = {req_id: (status, output) for req_id, status, output in
+                         (read_response(reader) for _ in range(3))}
+            elapsed = time.perf_counter() - started
+        self.assertEqual(responses[3], (_STATUS_OK, b"1"))
+        for req_id in (1, 2):
+            self.assertNotEqual(responses[req_id][0], _STATUS_OK)
+            self.assertIn(b"cancelled", responses[req_id][1])
+        self.assertLess(elapsed, 1.0)
+
+    def test_server_exit_fails_pending_requests(self) -> None:
+        slow = self.engine(EXPLOSIVE)
+        result: List[BaseException] = []
+
+        def call() -> None:
+            try:
+                slow.render(ITEMS)
+            except BaseException as e:
+                result.append(e)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        time.sleep(0.1)
+        self.server.kill()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsInstance(result[0], ConnectionError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -56,8 +56,9 @@ Hello, {{.Name}}!
 
         # Verify function signatures are set
         self.assertEqual(mock_lib.RenderTemplate.argtypes, [ctypes.c_char_p, ctypes.c_char_p])
-        self.assertEqual(mock_lib.RenderTemplate.restype, ctypes.c_char_p)
-        self.assertEqual(mock_lib.FreeString.argtypes, [ctypes.c_char_p])
+        # 结果以原始指针返回, 才能原样交给 FreeString 释放
+        self.assertEqual(mock_lib.RenderTemplate.restype, ctypes.c_void_p)
+        self.assertEqual(mock_lib.FreeString.argtypes, [ctypes.c_void_p])
         self.assertEqual(mock_lib.FreeString.restype, None)
 
     @patch('os.path.exists')
@@ -0,0 +1,129 @@
+"""Tests for budget-aware rendering that trims a list field inside Go."""
+import math
+import random
+
+from cognihub_pygotemplate import Blob, CancelToken, FitResult, GoTemplateEngine, RenderLimitError, RenderLimits
+from tests.support import RealLibraryTestCase
+
+CHAT = "{{.System}}|{{range .Messages}}[{{.role}}:{{.content}}]{{end}}"
+
+
+def conversation(n: int, rng: random.Random) -> dict:
+    return {"System": "sys", "Messages": [{"role": "user", "content": "x" * rng.randint(0, 30)}
+                                          for _ in range(n)]}
+
+
+class TestRenderFit(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.engine = GoTemplateEngine(CHAT)
+
+    def brute_force(self, data: dict, budget: int, keep_first: int, keep_last: int) -> int:
+        """Fewest dropped items whose rendering fits, by rendering every candidate."""
+        messages = data["Messages"]
+        for dropped in range(max(0, len(messages) - keep_first - keep_last) + 1):
+            kept = messages[:keep_first] + messages[keep_first + dropped:]
+            if len(self.engine.render(dict(data, Messages=kept)).encode("utf-8")) <= budget:
+                return dropped
+        return -1
+
+    def test_matches_brute_force(self) -> None:
+        rng = random.Random(43)
+        for _ in range(40):
+            data = conversation(rng.randint(0, 40), rng)
+            keep_first, keep_last = rng.randint(0, 2), rng.randint(0, 2)
+            budget = rng.randint(0, 600)
+            expected = self.brute_force(data, budget, keep_first, keep_last)
+            if expected < 0:
+                with self.assertRaises(RenderLimitError) as cm:
+                    self.engine.render_fit(data, budget, keep_first=keep_first, keep_last=keep_last)
+                self.assertEqual(cm.exception.kind, "budget")
+                continue
+            result = self.engine.render_fit(data, budget, keep_first=keep_first, keep_last=keep_last)
+            messages = data["Messages"]
+            kept = messages[:keep_first] + messages[keep_first + expected:]
+            self.assertEqual(result.output, self.engine.render(dict(data, Messages=kept)))
+            self.assertEqual((result.kept, result.dropped), (len(kept), expected))
+            self.assertEqual(result.length, len(result.output.encode("utf-8")))
+            self.assertLessEqual(result.renders, math.ceil(math.log2(len(messages) + 1)) + 3)
+
+    def test_fits_without_trimming_in_one_render(self) -> None:
+        data = conversation(50, random.Random(1))
+        self.assertEqual(self.engine.render_fit(data, 1 << 20),
+                         FitResult(output=self.engine.render(data), kept=50, dropped=0,
+                                   length=len(self.engine.render(data)), renders=1))
+
+    def test_keeps_system_and_latest_messages(self) -> None:
+        data = {"System": "", "Messages": [{"role": r, "content": str(i)} for i, r in
+                                           enumerate(["system"] + ["user", "assistant"] * 10 + ["user"])]}
+        result = self.engine.render_fit(data, 45, keep_first=1, keep_last=1)
+        self.assertEqual(result.output, "|[system:0][user:19][assistant:20][user:21]")
+        self.assertEqual((result.kept, result.dropped), (4, 18))
+
+    def test_length_function(self) -> None:
+        data = conversation(30, random.Random(2))
+        tokens = []
+
+        def count(text: str) -> int:
+            tokens.append(text)
+            return len(text.split(":"))
+
+        result = self.engine.render_fit(data, 10, length=count)
+        self.assertEqual((result.kept, result.length), (9, 10))
+        self.assertEqual(result.renders, len(tokens))
+        self.assertIn(result.output, tokens)
+
+    def test_length_function_errors_propagate(self) -> None:
+        def broken(text: str) -> int:
+            raise KeyError("tokenizer")
+
+        with self.assertRaises(KeyError):
+            self.engine.render_fit(conversation(5, random.Random(3)), 10, length=broken)
+        with self.assertRaisesRegex(ValueError, "negative"):
+            self.engine.render_fit(conversation(5, random.Random(3)), 10, length=lambda text: -1)
+
+    def test_precomputed_item_lengths(self) -> None:
+        data = conversation(10, random.Random(4))
+        result = self.engine.render_fit(data, 25, length=[i + 1 for i in range(10)], overhead=3, keep_first=1)
+        # 3 + 1 + (8 + 9 + 10) 超出预算, 3 + 1 + (9 + 10) = 23
+        self.assertEqual((result.kept, result.dropped, result.length, result.renders), (3, 7, 23, 1))
+        kept = data["Messages"][:1] + data["Messages"][8:]
+        self.assertEqual(result.output, self.engine.render(dict(data, Messages=kept)))
+        with self.assertRaisesRegex(ValueError, "2 weights for 10 items"):
+            self.engine.render_fit(data, 25, length=[1, 2])
+
+    def test_nested_and_missing_fields(self) -> None:
+        engine = GoTemplateEngine("{{range .chat.turns}}{{.}};{{end}}")
+        result = engine.render_fit({"chat": {"turns": ["aaa", "bbb", "ccc"]}}, 8, "chat.turns")
+        self.assertEqual((result.output, result.kept), ("bbb;ccc;", 2))
+        self.assertEqual(engine.render_fit({}, 0, "chat.turns").kept, 0)
+        with self.assertRaisesRegex(ValueError, "not a list"):
+            engine.render_fit({"chat": {"turns": "abc"}}, 10, "chat.turns")
+
+    def test_blobs_limits_and_cancel(self) -> None:
+        data = {"System": Blob("s" * 1000), "Messages": [{"role": "u", "content": "c"}] * 5}
+        result = self.engine.render_fit(data, 1010)
+        self.assertEqual((result.kept, result.output[:3]), (1, "sss"))
+        with self.assertRaises(RenderLimitError) as cm:
+            self.engine.render_fit(data, 1010, limits=RenderLimits(max_range_iterations=1))
+        self.assertEqual(cm.exception.kind, "range")
+        token = CancelToken()
+        token.cancel()
+        with self.assertRaises(RenderLimitError) as cm:
+            self.engine.render_fit(conversation(5, random.Random(5)), 100, cancel=token)
+        self.assertEqual(cm.exception.kind, "cancelled")
+
+    def test_budget_error_reports_the_real_length(self) -> None:
+        engine = GoTemplateEngine("{{.System}}{{range .Messages}}{{.}}{{end}}")
+        # 最后一条消息始终保留
+        with self.assertRaisesRegex(RenderLimitError, "output length 11 exceeds the budget of 3"):
+            engine.render_fit({"System": "0123456789", "Messages": ["a", "b"]}, 3)
+        with self.assertRaisesRegex(RenderLimitError, "output length 10 exceeds the budget of 3"):
+            engine.render_fit({"System": "0123456789"}, 3)
+
+    def test_invalid_arguments(self) -> None:
+        with self.assertRaises(ValueError):
+            self.engine.render_fit({}, -1)
+        with self.assertRaises(ValueError):
+            self.engine.render_fit({}, 10, keep_last=-1)
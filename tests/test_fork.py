@@ -0,0 +1,99 @@
+"""Fork-safety tests; each scenario runs in a fresh interpreter."""
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+from tests.support import RealLibraryTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+class TestForkSafety(RealLibraryTestCase):
+    """Loading behaviour across fork() against the real library."""
+
+    def run_script(self, body: str) -> str:
+        script = textwrap.dedent("""
+            import os, sys
+            from cognihub_pygotemplate import GoTemplateEngine, StaleLibraryError
+
+            def in_child(fn):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        print(fn(), flush=True)
+                    except BaseException as e:
+                        print(type(e).__name__, e, flush=True)
+                    os._exit(0)
+                os.waitpid(pid, 0)
+        """) + textwrap.dedent(body)
+        proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True,
+                              text=True, timeout=60)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        return proc.stdout
+
+    def test_lazy_engines_render_in_forked_workers(self) -> None:
+        out = self.run_script("""
+            engines = [GoTemplateEngine("{{.N}}-" + str(i), lazy=True) for i in range(3)]
+            assert GoTemplateEngine._go_lib is None
+            for _ in range(2):
+                in_child(lambda: ",".join(e.render({"N": os.getpid() > 0}) for e in engines))
+            print("parent loaded:", GoTemplateEngine._go_lib is not None)
+        """)
+        self.assertEqual(out.splitlines(), ["true-0,true-1,true-2"] * 2 + ["parent loaded: False"])
+
+    def test_stale_handle_raises_instead_of_deadlocking(self) -> None:
+        out = self.run_script("""
+            engine = GoTemplateEngine("{{.N}}")
+            engine.render({"N": 1})
+            in_child(lambda: engine.render({"N": 2}))
+            in_child(lambda: GoTemplateEngine("x"))
+            print(engine.render({"N": 3}))
+        """)
+        lines = out.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("StaleLibraryError"), lines[0])
+        self.assertIn("before it forked", lines[0])
+        self.assertTrue(lines[1].startswith("StaleLibraryError"), lines[1])
+        self.assertEqual(lines[2], "3")
+
+    def test_stale_handle_loaded_through_subclass(self) -> None:
+        out = self.run_script("""
+            import tempfile
+            from cognihub_pygotemplate import FileTemplateEngine
+            with tempfile.NamedTemporaryFile("w", suffix=".gotmpl", delete=False) as f:
+                f.write("{{.N}}")
+            engine = FileTemplateEngine(f.name, watch=False)
+            print(engine.render({"N": 1}))
+            in_child(lambda: engine.render({"N": 2}))
+            in_child(lambda: GoTemplateEngine("x").render({}))
+            os.unlink(f.name)
+        """)
+        lines = out.splitlines()
+        self.assertEqual(lines[0], "1")
+        self.assertTrue(lines[1].startswith("StaleLibraryError"), lines[1])
+        self.assertTrue(lines[2].startswith("StaleLibraryError"), lines[2])
+
+    def test_lazy_engine_in_unforked_process(self) -> None:
+        out = self.run_script("""
+            engine = GoTemplateEngine("Hello, {{.Name}}!", lazy=True)
+            print(engine.render({"Name": "World"}))
+        """)
+        self.assertEqual(out.strip(), "Hello, World!")
+
+
+class TestPrecompile(RealLibraryTestCase):
+    """Bulk template parsing."""
+
+    def test_precompile_reports_parse_errors(self) -> None:
+        from cognihub_pygotemplate import GoTemplateEngine
+        errors = GoTemplateEngine.precompile(["{{.A}}", "{{.B", "plain"])
+        self.assertIsNone(errors[0])
+        self.assertIn("unclosed action", errors[1] or "")
+        self.assertIsNone(errors[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Tests for render deadlines, output caps, range caps and cancellation."""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from cognihub_pygotemplate import CancelToken, GoTemplateEngine, RenderLimitError, RenderLimits
+from tests.support import RealLibraryTestCase
+
+# 三层嵌套 range, 300 个元素时共 2700 万次迭代
+EXPLOSIVE = "{{range .L}}{{range $.L}}{{range $.L}}x{{end}}{{end}}{{end}}"
+ITEMS = {"L": list(range(300))}
+
+
+class TestRenderLimits(unittest.TestCase):
+    """RenderLimits value semantics."""
+
+    def test_merged_overrides_set_fields_only(self) -> None:
+        base = RenderLimits(timeout=1.0, max_output_bytes=100)
+        merged = base.merged(RenderLimits(max_output_bytes=10, max_range_iterations=5))
+        self.assertEqual(merged, RenderLimits(timeout=1.0, max_output_bytes=10, max_range_iterations=5))
+        self.assertIs(base.merged(None), base)
+
+    def test_to_options_rounds_timeout_up(self) -> None:
+        self.assertEqual(RenderLimits(timeout=0.0001).to_options(), {"timeout_ms": 1})
+        self.assertEqual(RenderLimits(timeout=0.25, max_output_bytes=7).to_options(),
+                         {"timeout_ms": 250, "max_output_bytes": 7})
+
+    def test_rejects_non_positive_values(self) -> None:
+        with self.assertRaises(ValueError):
+            RenderLimits(timeout=0)
+        with self.assertRaises(ValueError):
+            RenderLimits(max_range_iterations=-1)
+
+    def test_cancel_token(self) -> None:
+        token = CancelToken()
+        self.assertFalse(token.cancelled)
+        token.cancel()
+        self.assertTrue(token.cancelled)
+
+
+class TestRealRenderLimits(RealLibraryTestCase):
+    """Limits enforced by the real library."""
+
+    def assertLimit(self, kind: str, fn: object, *args: object, **kwargs: object) -> float:
+        start = time.perf_counter()
+        with self.assertRaises(RenderLimitError) as cm:
+            fn(*args, **kwargs)  # type: ignore[operator]
+        self.assertEqual(cm.exception.kind, kind)
+        self.assertIsInstance(cm.exception, ValueError)
+        return time.perf_counter() - start
+
+    def test_deadline(self) -> None:
+        engine = GoTemplateEngine(EXPLOSIVE)
+        elapsed = self.assertLimit("deadline", engine.render, ITEMS, limits=RenderLimits(timeout=0.05))
+        self.assertLess(elapsed, 1.0)
+
+    def test_deadline_stops_unbounded_recursion(self) -> None:
+        engine = GoTemplateEngine('{{define "a"}}{{template "a" .}}{{template "a" .}}{{end}}{{template "a" .}}')
+        self.assertLimit("deadline", engine.render, {}, limits=RenderLimits(timeout=0.05))
+
+    def test_output_cap(self) -> None:
+        engine = GoTemplateEngine(EXPLOSIVE)
+        self.assertLimit("output", engine.render, ITEMS, limits=RenderLimits(max_output_bytes=1000))
+
+    def test_range_iteration_cap(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{end}}")
+        self.assertEqual(engine.render({"L": [1] * 10}, limits=RenderLimits(max_range_iterations=10)), "")
+        self.assertLimit("range", engine.render, {"L": [1] * 11}, limits=RenderLimits(max_range_iterations=10))
+
+    def test_engine_limits_and_per_call_override(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{.}}{{end}}", limits=RenderLimits(max_output_bytes=3))
+        self.assertEqual(engine.render({"L": [1, 2, 3]}), "123")
+        self.assertLimit("output", engine.render, {"L": [1, 2, 3, 4]})
+        self.assertEqual(engine.render({"L": [1, 2, 3, 4]}, limits=RenderLimits(max_output_bytes=4)), "1234")
+
+    def test_output_identical_within_limits(self) -> None:
+        template = ('{{- range $i, $m := .Messages}}{{if $i}}\n{{end}}{{if eq $m.role "skip"}}{{continue}}{{end}}'
+                    '{{$m.role}}: {{$m.content}}{{if eq $m.role "stop"}}{{break}}{{end}}{{end}}'
+                    '{{define "t"}}[{{.}}]{{end}}{{template "t" .Name}}{{with .Missing}}x{{else}}none{{end}}')
+        data = {"Name": "n", "Messages": [{"role": r, "content": str(i)} for i, r in
+                                          enumerate(["user", "skip", "assistant", "stop", "user"])]}
+        engine = GoTemplateEngine(template)
+        limits = RenderLimits(timeout=5, max_output_bytes=1 << 20, max_range_iterations=1000)
+        self.assertEqual(engine.render(data, limits=limits), engine.render(data))
+
+    def test_execute_errors_keep_their_category(self) -> None:
+        engine = GoTemplateEngine("{{.X.Y}}")
+        with self.assertRaises(ValueError) as cm:
+            engine.render({"X": "string"}, limits=RenderLimits(timeout=1))
+        self.assertNotIsInstance(cm.exception, RenderLimitError)
+        self.assertIn("TEMPLATE_EXECUTE_ERROR", str(cm.exception))
+
+    def test_cancel_from_another_thread(self) -> None:
+        engine = GoTemplateEngine(EXPLOSIVE)
+        token = CancelToken()
+        threading.Timer(0.05, token.cancel).start()
+        elapsed = self.assertLimit("cancelled", engine.render, ITEMS, cancel=token)
+        self.assertLess(elapsed, 2.0)
+        # 已取消的令牌对后续渲染立即生效
+        self.assertLimit("cancelled", engine.render, {"L": [1]}, cancel=token)
+
+    def test_async_task_cancellation_aborts_go_render(self) -> None:
+        engine = GoTemplateEngine(EXPLOSIVE, limits=RenderLimits(timeout=30))
+        token = CancelToken()
+
+        async def run() -> None:
+            task = asyncio.ensure_future(engine.render_async(ITEMS, cancel=token))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertTrue(token.cancelled)
+
+    def test_render_to_honours_limits(self) -> None:
+        engine = GoTemplateEngine(EXPLOSIVE)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "out.txt")
+            self.assertLimit("output", engine.render_to, path, ITEMS, limits=RenderLimits(max_output_bytes=10))
+            self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
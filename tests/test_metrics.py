@@ -0,0 +1,205 @@
+"""Tests for render telemetry and its Prometheus and OpenTelemetry sinks."""
+import sys
+import threading
+import types
+import unittest
+from unittest.mock import patch
+
+from cognihub_pygotemplate import (Blob, GoTemplateEngine, OpenTelemetryMetrics, PrometheusMetrics, RenderLimits,
+                                   TelemetrySink, disable_telemetry, enable_telemetry)
+from cognihub_pygotemplate.metrics import RenderSample, default_label, error_category
+from tests.support import RealLibraryTestCase
+
+
+class TestErrorCategory(unittest.TestCase):
+
+    def test_categories(self) -> None:
+        self.assertEqual(error_category(ValueError("Error from Go renderer: JSON_ERROR: x")), "json")
+        self.assertEqual(error_category(ValueError("Error from Go renderer: TEMPLATE_PARSE_ERROR: x")), "parse")
+        self.assertEqual(error_category(ValueError("Error from Go renderer: TEMPLATE_EXECUTE_ERROR: x")), "execute")
+        self.assertEqual(error_category(ValueError("Error from Go renderer: RENDER_LIMIT_ERROR: deadline")), "limit")
+        self.assertEqual(error_category(TypeError("not JSON serializable")), "json")
+        self.assertEqual(error_category(RuntimeError("boom")), "other")
+
+
+class TestPrometheusExposition(unittest.TestCase):
+
+    def test_exposition_format(self) -> None:
+        metrics = PrometheusMetrics(buckets=(0.01, 0.1))
+        for duration, error in ((0.005, None), (0.05, "parse"), (1.0, None)):
+            sample = RenderSample('a"b')
+            sample.duration, sample.error, sample.input_bytes, sample.output_bytes = duration, error, 10, 3
+            metrics.finish(sample, metrics.start(sample))
+        text = metrics.exposition()
+        self.assertIn("# TYPE cognihub_template_render_duration_seconds histogram\n", text)
+        self.assertIn('cognihub_template_renders_total{template="a\\"b"} 3.0\n', text)
+        self.assertIn('cognihub_template_render_errors_total{template="a\\"b",category="parse"} 1.0\n', text)
+        self.assertIn('cognihub_template_render_duration_seconds_bucket{template="a\\"b",le="0.01"} 1.0\n', text)
+        self.assertIn('cognihub_template_render_duration_seconds_bucket{template="a\\"b",le="0.1"} 2.0\n', text)
+        self.assertIn('cognihub_template_render_duration_seconds_bucket{template="a\\"b",le="+Inf"} 3.0\n', text)
+        self.assertIn('cognihub_template_render_duration_seconds_count{template="a\\"b"} 3.0\n', text)
+        self.assertIn('cognihub_template_renders_in_flight{template="a\\"b"} 0.0\n', text)
+        self.assertIn('cognihub_template_render_input_bytes_total{template="a\\"b"} 30.0\n', text)
+        self.assertIn('cognihub_template_render_output_bytes_total{template="a\\"b"} 9.0\n', text)
+
+    def test_rejects_unsorted_buckets(self) -> None:
+        with self.assertRaises(ValueError):
+            PrometheusMetrics(buckets=(1.0, 0.1))
+
+
+class TestTelemetry(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.addCleanup(disable_telemetry)
+
+    def series(self, metrics: PrometheusMetrics) -> dict:
+        values = {}
+        for line in metrics.exposition().splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                values[name] = float(value)
+        return values
+
+    def test_disabled_by_default(self) -> None:
+        self.assertIsNone(GoTemplateEngine._telemetry)
+        self.assertEqual(GoTemplateEngine("{{.x}}").render({"x": 1}), "1")
+
+    def test_render_counts_bytes_and_errors(self) -> None:
+        metrics = PrometheusMetrics()
+        enable_telemetry(metrics, label=lambda engine: "chat")
+        engine = GoTemplateEngine("{{.x}}é{{.y.z}}")
+        self.assertEqual(engine.render({"x": "ab", "y": {"z": Blob("cd")}}), "abécd")
+        with self.assertRaises(ValueError):
+            engine.render({"x": 1, "y": 2})
+        with self.assertRaises(TypeError):
+            engine.render({"x": object()})
+        with self.assertRaises(ValueError):
+            GoTemplateEngine("{{.x").render({})
+
+        series = self.series(metrics)
+        self.assertEqual(series['cognihub_template_renders_total{template="chat"}'], 4)
+        self.assertEqual(series['cognihub_template_render_errors_total{template="chat",category="execute"}'], 1)
+        self.assertEqual(series['cognihub_template_render_errors_total{template="chat",category="json"}'], 1)
+        self.assertEqual(series['cognihub_template_render_errors_total{template="chat",category="parse"}'], 1)
+        self.assertEqual(series['cognihub_template_render_duration_seconds_count{template="chat"}'], 4)
+        # 输出按 UTF-8 字节计数, 只有成功的渲染有输出
+        self.assertEqual(series['cognihub_template_render_output_bytes_total{template="chat"}'], 6)
+        self.assertGreater(series['cognihub_template_render_input_bytes_total{template="chat"}'], 0)
+
+    def test_limit_errors_and_cache_hits(self) -> None:
+        from cognihub_pygotemplate import RenderCache
+        metrics = PrometheusMetrics()
+        enable_telemetry(metrics, label=lambda engine: "t")
+        engine = GoTemplateEngine("{{range .L}}x{{end}}", cache=RenderCache())
+        with self.assertRaises(ValueError):
+            engine.render({"L": list(range(10))}, limits=RenderLimits(max_range_iterations=5))
+        engine.render({"L": [1]})
+        engine.render({"L": [1]})
+        series = self.series(metrics)
+        self.assertEqual(series['cognihub_template_render_errors_total{template="t",category="limit"}'], 1)
+        self.assertEqual(series['cognihub_template_renders_total{template="t"}'], 3)
+        self.assertEqual(series['cognihub_template_render_output_bytes_total{template="t"}'], 2)
+
+    def test_default_label_and_in_flight(self) -> None:
+        seen = []
+        entered = threading.Event()
+        release = threading.Event()
+
+        class Gate(TelemetrySink):
+            def start(self, sample: RenderSample) -> None:
+                entered.set()
+                release.wait(5)
+
+            def finish(self, sample: RenderSample, token: object) -> None:
+                seen.append(sample.template)
+
+        metrics = PrometheusMetrics()
+        enable_telemetry(metrics, Gate())
+        engine = GoTemplateEngine("{{.x}}")
+        thread = threading.Thread(target=engine.render, args=({"x": 1},))
+        thread.start()
+        self.assertTrue(entered.wait(5))
+        label = default_label(engine)
+        self.assertTrue(label.startswith("sha1:"))
+        self.assertEqual(self.series(metrics)[f'cognihub_template_renders_in_flight{{template="{label}"}}'], 1)
+        release.set()
+        thread.join()
+        self.assertEqual(seen, [label])
+        self.assertEqual(self.series(metrics)[f'cognihub_template_renders_in_flight{{template="{label}"}}'], 0)
+
+    def test_enable_requires_a_sink(self) -> None:
+        with self.assertRaises(ValueError):
+            enable_telemetry()
+
+
+class _Recorder:
+    """Stands in for both the OpenTelemetry meter and its instruments."""
+
+    def __init__(self, log: list, name: str = ""):
+        self.log = log
+        self.name = name
+
+    def __getattr__(self, method: str):
+        if method.startswith("create_"):
+            return lambda name, **kwargs: _Recorder(self.log, name)
+        return lambda *args, **kwargs: self.log.append((self.name, method) + args)
+
+
+class TestOpenTelemetry(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.addCleanup(disable_telemetry)
+
+    def test_requires_opentelemetry(self) -> None:
+        with patch.dict(sys.modules, {"opentelemetry": None}):
+            with self.assertRaisesRegex(ImportError, "opentelemetry-api"):
+                OpenTelemetryMetrics()
+
+    def test_records_instruments_and_spans(self) -> None:
+        log: list = []
+        spans = []
+
+        class Span:
+            def __init__(self, name: str, attributes: dict):
+                self.name, self.attributes, self.status, self.ended = name, dict(attributes), None, False
+                spans.append(self)
+
+            def set_attribute(self, key: str, value: object) -> None:
+                self.attributes[key] = value
+
+            def set_status(self, status: object) -> None:
+                self.status = status
+
+            def end(self) -> None:
+                self.ended = True
+
+        metrics_api = types.SimpleNamespace(get_meter=lambda name, meter_provider=None: _Recorder(log))
+        trace_api = types.SimpleNamespace(
+            get_tracer=lambda name, tracer_provider=None: types.SimpleNamespace(
+                start_span=lambda name, attributes: Span(name, attributes)),
+            Status=lambda code: ("status", code), StatusCode=types.SimpleNamespace(ERROR="ERROR"))
+        package = types.SimpleNamespace(metrics=metrics_api, trace=trace_api)
+        with patch.dict(sys.modules, {"opentelemetry": package}):
+            sink = OpenTelemetryMetrics()
+        enable_telemetry(sink, label=lambda engine: "t")
+
+        engine = GoTemplateEngine("{{.x.y}}")
+        engine.render({"x": {"y": "ok"}})
+        with self.assertRaises(ValueError):
+            engine.render({"x": 1})
+
+        recorded = {(name, method) for name, method, *_ in log}
+        for instrument in ("renders", "render.duration", "renders.in_flight", "render.input_bytes",
+                           "render.output_bytes", "render.errors"):
+            self.assertTrue(any(name == f"cognihub.template.{instrument}" for name, _ in recorded), instrument)
+        self.assertIn(("cognihub.template.render.errors", "add", 1, {"template": "t", "category": "execute"}), log)
+        in_flight = [args[0] for name, method, *args in log if name == "cognihub.template.renders.in_flight"]
+        self.assertEqual(sum(in_flight), 0)
+
+        self.assertEqual([span.ended for span in spans], [True, True])
+        self.assertEqual(spans[0].attributes["output_bytes"], 2)
+        self.assertIsNone(spans[0].status)
+        self.assertEqual(spans[1].attributes["error.type"], "execute")
+        self.assertEqual(spans[1].status, ("status", "ERROR"))
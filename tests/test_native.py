@@ -0,0 +1,84 @@
+"""Tests for the optional C extension fast path and its ctypes fallback."""
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+from cognihub_pygotemplate import GoTemplateEngine
+from cognihub_pygotemplate import engine as engine_module
+from tests.support import RealLibraryTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = [
+    ("Hello {{.name}}!", {"name": "世界 🌍"}),
+    ("{{range .Messages}}<|{{.role}}|>{{.content}}\n{{end}}", {"Messages": [{"role": "user", "content": "hi"}] * 3}),
+    ("", {}),
+    ("{{.missing}}", {}),
+]
+
+
+@unittest.skipIf(engine_module._native is None, "C extension not built - run 'python setup.py build_ext --inplace'")
+class TestNativeFastPath(RealLibraryTestCase):
+
+    def test_matches_the_ctypes_path(self) -> None:
+        self.assertTrue(GoTemplateEngine.native_available())
+        native = GoTemplateEngine._native_render
+        for source, data in CASES:
+            engine = GoTemplateEngine(source)
+            fast = engine.render(data)
+            GoTemplateEngine._native_render = None
+            try:
+                self.assertEqual(engine.render(data), fast)
+            finally:
+                GoTemplateEngine._native_render = native
+
+    def test_errors_and_leaks(self) -> None:
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            GoTemplateEngine("{{.x").render({})
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_EXECUTE_ERROR"):
+            GoTemplateEngine("{{index .x 5}}").render({"x": [1]})
+        engine = GoTemplateEngine("{{.n}}")
+        for n in range(1000):
+            engine.render({"n": n})
+        self.assertEqual(GoTemplateEngine.memory_stats()["outstanding_strings"], 0)
+
+    def test_arguments(self) -> None:
+        GoTemplateEngine.ensure_loaded()
+        native = engine_module._native
+        self.assertEqual(native.render("{{.a}}", '{"a": 1}'), "1")
+        self.assertEqual(native.render(b"{{.a}}", b'{"a": 2}'), "2")
+        with self.assertRaises(TypeError):
+            native.render(1, b"{}")
+        with self.assertRaises(TypeError):
+            native.render(b"x")
+        with self.assertRaises(ValueError):
+            native.bind(0, 0)
+
+    def test_renders_from_many_threads(self) -> None:
+        engine = GoTemplateEngine("{{.t}}-{{.i}}")
+        failures = []
+
+        def worker(t: int) -> None:
+            for i in range(300):
+                if engine.render({"t": t, "i": i}) != f"{t}-{i}":
+                    failures.append((t, i))
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+
+class TestCtypesFallback(RealLibraryTestCase):
+
+    def test_disabled_by_environment(self) -> None:
+        code = ("from cognihub_pygotemplate import GoTemplateEngine, engine\n"
+                "print(engine._native is None, GoTemplateEngine.native_available(), "
+                "GoTemplateEngine('{{.a}}').render({'a': 'ok'}))\n")
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                timeout=60, env=dict(os.environ, PYTHONPATH=ROOT, COGNIHUB_NATIVE="0"))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ["True", "False", "ok"])
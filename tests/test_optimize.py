@@ -0,0 +1,145 @@
+"""Differential tests for the parse-tree optimizer.
+
+Every template is rendered through the optimized and the stock (``optimize=False``)
+variants, which must produce byte-identical output or the same error.
+"""
+import glob
+import os
+import random
+
+from cognihub_pygotemplate import GoTemplateEngine, RenderLimits
+from tests.support import RealLibraryTestCase
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "ollama_templates")
+
+TOOLS = [
+    {"type": "function", "function": {"name": "get_weather", "description": "Current weather for a city"}},
+    {"type": "function", "function": {"name": "search", "description": "Search the \"web\""}},
+]
+
+
+def random_conversation(rng: random.Random) -> dict:
+    messages = []
+    for _ in range(rng.randint(0, 8)):
+        role = rng.choice(["system", "user", "user", "assistant", "assistant", "tool"])
+        message = {"Role": role, "Content": rng.choice(["", "hi", "What's 2+2?", "<b>&amp;</b>", "多语言 ✓"])}
+        if role == "assistant" and rng.random() < 0.3:
+            message["Content"] = ""
+            message["ToolCalls"] = [{"Function": {"Name": "get_weather", "Arguments": {"city": "Paris"}}}]
+        messages.append(message)
+    data = {"Messages": messages}
+    for key, value in (("System", "Be brief."), ("Tools", TOOLS), ("Prompt", "Tell me a joke"),
+                       ("Response", "Sure."), ("Name", "Atlas"), ("Signature", "A.")):
+        if rng.random() < 0.5:
+            data[key] = value
+    return data
+
+
+class TestOptimizerDifferential(RealLibraryTestCase):
+
+    def assertSameRender(self, template: str, data) -> None:
+        expected = actual = None
+        try:
+            expected = GoTemplateEngine(template, optimize=False).render(data)
+        except ValueError as e:
+            expected = e
+        try:
+            actual = GoTemplateEngine(template).render(data)
+        except ValueError as e:
+            actual = e
+        if isinstance(expected, Exception) or isinstance(actual, Exception):
+            self.assertEqual(type(actual), type(expected), (template, data))
+            self.assertEqual(str(actual), str(expected), (template, data))
+        else:
+            self.assertEqual(actual, expected, (template, data))
+
+    def test_ollama_corpus(self) -> None:
+        paths = sorted(glob.glob(os.path.join(CORPUS_DIR, "*.gotmpl")))
+        self.assertGreater(len(paths), 5)
+        rng = random.Random(34)
+        fixtures = [{}, {"Messages": []}] + [random_conversation(rng) for _ in range(60)]
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                template = f.read()
+            for data in fixtures:
+                with self.subTest(template=os.path.basename(path)):
+                    self.assertSameRender(template, data)
+
+    def test_constant_folding(self) -> None:
+        for template in [
+            '{{"a"}}{{print 1 2}}{{printf "%05.1f|%q" 3.14159 "x"}}{{len "héllo"}}',
+            '{{html "<a>"}}{{js "\'"}}{{urlquery "a b"}}{{index "abc" 1}}{{slice "abcdef" 1 3}}',
+            "{{if true}}T{{else}}F{{end}}{{if 0}}T{{else if \"\"}}E{{else}}F{{end}}",
+            "{{if and 1 (or 0 \"x\") (not false)}}yes{{end}}{{if lt 1 2.5}}lt{{end}}",
+            "{{if eq 1 1 2}}a{{end}}{{- /* comment */ -}} b {{- \"c\" -}} d",
+            "{{with \"w\"}}{{.}}{{end}}{{if (print \"\")}}no{{end}}{{nil}}",
+        ]:
+            self.assertSameRender(template, {"x": 1})
+
+    def test_errors_are_preserved(self) -> None:
+        # 常量求值出错的节点保持原样, 错误仍在渲染时以相同的信息出现
+        for template in ['a{{index "abc" 9}}', "{{len 3}}", '{{if eq 1 "a"}}x{{end}}', "{{.missing.field}}",
+                         "{{range .L}}{{$.N.x}}{{end}}", "{{range .L}}{{len $.Missing}}{{end}}",
+                         "{{range .L}}{{index $.M 5}}{{end}}", "{{range .L}}{{eq $.M 1}}{{end}}",
+                         "{{range .L}}{{range $.N}}x{{end}}{{end}}", "{{range .L}}{{($.N).x}}{{end}}",
+                         "{{range .L}}{{print (len $.N)}}{{end}}", "{{range .L}}{{$.N | len}}{{end}}"]:
+            self.assertSameRender(template, {"L": [1], "N": 5, "M": {"a": 1}})
+
+    def test_variable_scopes(self) -> None:
+        for template in [
+            "{{$x := 1}}{{if true}}{{$x := 2}}{{$x}}{{end}}{{$x}}",
+            "{{$x := 1}}{{if true}}{{$x = 2}}{{end}}{{$x}}",
+            "{{if false}}{{else}}{{$y := 3}}{{$y}}{{end}}",
+            "{{$ := .L}}{{range .}}{{$}}{{end}}",
+            "{{$y := 1}}{{if true}}{{print ($y := 2)}}{{end}}{{$y}}",
+        ]:
+            self.assertSameRender(template, {"L": [1, 2]})
+
+    def test_hoisting(self) -> None:
+        template = ("{{range $i, $m := .L}}{{$.P}}{{$m}}{{range .}}{{$.P}}{{$.Q}}{{.}}{{end}}{{else}}{{$.P}}{{end}}"
+                    "{{if .L}}{{range .L}}{{len $.L}}{{template \"t\" $.P}}{{end}}{{end}}"
+                    "{{define \"t\"}}{{range $.L}}{{.}}{{end}}{{end}}")
+        for data in [{"L": [[1, 2], [3]], "P": "p", "Q": {"a": 1}}, {"L": [], "P": "p"}, {"L": [[]]}]:
+            self.assertSameRender(template, data)
+
+    def test_hoisting_keeps_errors_and_user_variables(self) -> None:
+        self.assertSameRender("{{range .L}}{{$.X 1}}{{end}}", {"L": [1], "X": 2})
+        template = "{{$__hoist0 := .N}}{{range .L}}{{.}}{{$.S}}{{$__hoist0}}{{$__hoist0 = .}}{{end}}"
+        self.assertSameRender(template, {"L": [1, 2], "N": 5, "S": "n"})
+        self.assertEqual(GoTemplateEngine(template).render({"L": [1, 2], "N": 5, "S": "n"}), "1n52n1")
+
+    def test_non_map_root_falls_back(self) -> None:
+        for data in [[1, 2], "s", 3, None]:
+            self.assertSameRender("{{range .}}{{$.X}}{{end}}", data)
+            self.assertSameRender("{{range $.}}{{.}}{{$}}{{end}}", data)
+
+    def test_break_and_continue(self) -> None:
+        template = ('{{range .L}}{{if eq . 3}}{{break}}{{end}}{{if eq . 1}}{{continue}}{{end}}'
+                    '{{if true}}{{.}}{{$.S}}{{end}}{{end}}')
+        self.assertSameRender(template, {"L": [0, 1, 2, 3, 4], "S": ","})
+
+    def test_large_constant_is_left_alone(self) -> None:
+        template = '{{printf "%100000s" "x"}}{{if true}}{{printf "%70000d" 1}}{{end}}'
+        self.assertSameRender(template, {})
+
+    def test_with_limits(self) -> None:
+        template = '{{range .L}}{{"abc"}}{{$.S}}{{end}}'
+        data = {"L": list(range(50)), "S": "-"}
+        limits = RenderLimits(max_output_bytes=90)
+        for engine in (GoTemplateEngine(template), GoTemplateEngine(template, optimize=False)):
+            with self.assertRaisesRegex(ValueError, "output"):
+                engine.render(data, limits=limits)
+            self.assertEqual(engine.render(data, limits=RenderLimits(timeout=5)), "abc-" * 50)
+
+    def test_render_to_and_precompile(self) -> None:
+        template = '{{if true}}{{"x"}}{{end}}{{range .L}}{{$.S}}{{end}}'
+        self.assertEqual(GoTemplateEngine.precompile([template]), [None])
+        for optimize in (True, False):
+            read, write = os.pipe()
+            try:
+                written = GoTemplateEngine(template, optimize=optimize).render_to(write, {"L": [1, 2], "S": "s"})
+                self.assertEqual(os.read(read, 100), b"xss")
+                self.assertEqual(written, 3)
+            finally:
+                os.close(read)
+                os.close(write)
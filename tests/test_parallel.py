@@ -0,0 +1,66 @@
+"""Tests for parallel execution of range bodies (GoTemplateEngine(parallel=...))."""
+from cognihub_pygotemplate import GoTemplateEngine, RenderLimitError, RenderLimits
+from tests.support import RealLibraryTestCase
+
+ROWS = 300
+DATA = {
+    "Rows": [{"id": i, "name": f"行{i}", "tags": [f"t{j}" for j in range(i % 4)]} for i in range(ROWS)],
+    "M": {f"k{i:04d}": i for i in range(ROWS)},
+    "Title": "T",
+    "Empty": [],
+}
+TEMPLATES = [
+    "{{range .Rows}}{{.id}}:{{.name}};{{end}}",
+    "{{range $i, $r := .Rows}}{{$i}}={{$r.name}}/{{$.Title}}{{end}}",
+    "{{$t := .Title}}{{range .Rows}}{{$t}}{{.id}}{{range .tags}}<{{.}}>{{end}}{{end}}",
+    "{{range $k, $v := .M}}{{$k}}{{$v}},{{end}}",
+    "{{range $v := .M}}{{$v}},{{end}}",
+    "{{range .Rows}}{{if eq .id 3.0}}{{continue}}{{end}}{{.id}}{{end}}",
+    '{{define "row"}}[{{.name}}]{{end}}{{range .Rows}}{{template "row" .}}{{end}}',
+    "{{range .Empty}}x{{else}}empty{{end}}{{range .Rows}}{{range .tags}}{{.}}{{else}}-{{end}}{{end}}",
+    "{{with .Rows}}{{range .}}{{.id}}{{end}}{{end}}",
+    # 不满足条件的range按顺序执行
+    "{{range .Rows}}{{if eq .id 250.0}}{{break}}{{end}}{{.id}}{{end}}",
+    "{{$n := 0.0}}{{range .Rows}}{{$n = .id}}{{end}}{{$n}}",
+    "{{$x := 0.0}}{{range .Rows}}{{$x}},{{print ($x = .id)}};{{end}}",
+]
+
+
+class TestParallelRange(RealLibraryTestCase):
+
+    def test_output_matches_sequential_render(self) -> None:
+        for template in TEMPLATES:
+            for optimize in (True, False):
+                with self.subTest(template=template, optimize=optimize):
+                    expected = GoTemplateEngine(template, optimize=optimize).render(DATA)
+                    engine = GoTemplateEngine(template, optimize=optimize, parallel=4)
+                    self.assertEqual(engine.render(DATA), expected)
+                    # 列表太短时不拆分
+                    self.assertEqual(engine.render({**DATA, "Rows": DATA["Rows"][:5]}),
+                                     GoTemplateEngine(template).render({**DATA, "Rows": DATA["Rows"][:5]}))
+        self.assertEqual(GoTemplateEngine(TEMPLATES[0], parallel=True).render(DATA),
+                         GoTemplateEngine(TEMPLATES[0]).render(DATA))
+
+    def test_errors_and_limits(self) -> None:
+        template = "{{range .Rows}}{{index .tags 2}}{{end}}"
+        with self.assertRaises(ValueError) as sequential:
+            GoTemplateEngine(template).render(DATA)
+        with self.assertRaises(ValueError) as parallel:
+            GoTemplateEngine(template, parallel=4).render(DATA)
+        self.assertEqual(str(parallel.exception), str(sequential.exception))
+
+        engine = GoTemplateEngine(TEMPLATES[0], parallel=4)
+        with self.assertRaises(RenderLimitError) as caught:
+            engine.render(DATA, limits=RenderLimits(max_range_iterations=100))
+        self.assertEqual(caught.exception.kind, "range")
+        with self.assertRaises(RenderLimitError) as caught:
+            engine.render(DATA, limits=RenderLimits(max_output_bytes=100))
+        self.assertEqual(caught.exception.kind, "output")
+        self.assertEqual(engine.render(DATA, limits=RenderLimits(max_range_iterations=ROWS, max_output_bytes=1 << 20)),
+                         GoTemplateEngine(TEMPLATES[0]).render(DATA))
+
+    def test_rejects_invalid_worker_counts(self) -> None:
+        for parallel in (1, -2):
+            with self.assertRaises(ValueError):
+                GoTemplateEngine("{{.a}}", parallel=parallel)
+        self.assertEqual(GoTemplateEngine("{{.a}}", parallel=False).render({"a": 1}), "1")
@@ -0,0 +1,134 @@
+"""Tests for values pinned in Go and referenced from render data by ID."""
+import gc
+import json
+import threading
+import unittest
+
+from cognihub_pygotemplate import Blob, CancelToken, GoTemplateEngine, Pinned, RenderLimitError, RenderLimits
+from cognihub_pygotemplate.client import _encode_data as encode_remote
+from cognihub_pygotemplate.refs import PIN_KEY, RefCollector, pinned_default
+from tests.support import RealLibraryTestCase
+
+TOOLS = [{"name": "search", "parameters": {"q": "string"}}, {"name": "calc", "parameters": {}}]
+TEMPLATE = "{{range .Tools}}{{.name}}({{range $k, $v := .parameters}}{{$k}}:{{$v}}{{end}});{{end}}|{{.q}}"
+
+
+class TestPinnedSerialization(unittest.TestCase):
+    """Serialization-side behaviour that does not need the Go library."""
+
+    def test_handles_serialize_as_references(self) -> None:
+        released = []
+        handle = Pinned(7, 10, None, released.append)
+        self.assertEqual(json.loads(json.dumps({"a": [handle]}, default=pinned_default)), {"a": [{PIN_KEY: 7}]})
+        self.assertEqual(RefCollector().default(handle), {PIN_KEY: 7})
+        handle.release()
+        handle.release()
+        self.assertEqual(released, [7])
+        self.assertTrue(handle.released)
+        with self.assertRaisesRegex(ValueError, "released"):
+            pinned_default(handle)
+
+    def test_garbage_collected_handles_release(self) -> None:
+        released = []
+        Pinned(3, 1, "k", released.append)
+        gc.collect()
+        self.assertEqual(released, [3])
+
+    def test_remote_engines_refuse_pinned_values(self) -> None:
+        with self.assertRaisesRegex(TypeError, "local process"):
+            encode_remote({"t": Pinned(1, 1, None, lambda _: None)})
+
+
+class TestPinnedValues(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.engine = GoTemplateEngine(TEMPLATE)
+        self.addCleanup(GoTemplateEngine.set_pinned_limit, 256 << 20)
+
+    def test_renders_like_the_inline_value(self) -> None:
+        tools = GoTemplateEngine.pin(TOOLS)
+        expected = self.engine.render({"Tools": TOOLS, "q": "x"})
+        self.assertEqual(self.engine.render({"Tools": tools, "q": "x"}), expected)
+        self.assertEqual(self.engine.render({"Tools": tools, "q": Blob("x")}), expected)
+        self.assertEqual(self.engine.render({"Tools": tools, "q": "x"}, cancel=CancelToken()), expected)
+        self.assertEqual(self.engine.render_fit({"Tools": tools, "q": "x"}, 1000, "Tools").output, expected)
+        self.assertEqual(self.engine.profile({"Tools": tools, "q": "x"}).output, expected)
+        # 裁剪常驻列表不能改动共享的值
+        self.assertEqual(self.engine.render_fit({"Tools": tools, "q": "x"}, 12, "Tools").kept, 1)
+        self.assertEqual(self.engine.render({"Tools": tools, "q": "x"}), expected)
+        self.assertEqual(tools.nbytes, len(json.dumps(TOOLS)))
+
+    def test_pinned_values_can_reference_each_other(self) -> None:
+        tools = GoTemplateEngine.pin(TOOLS)
+        context = GoTemplateEngine.pin({"Tools": tools, "q": "nested"})
+        tools.release()
+        self.assertEqual(GoTemplateEngine("{{.c.q}} {{len .c.Tools}}").render({"c": context}), "nested 2")
+
+    def test_cost_estimates_see_pinned_values(self) -> None:
+        tools = [{"name": f"tool-{i}", "parameters": {"q": "x" * 100}} for i in range(500)]
+        data = {"Tools": tools, "q": "x"}
+        pinned = {"Tools": GoTemplateEngine.pin(tools), "q": "x"}
+        self.assertEqual(self.engine.estimate_cost(pinned), self.engine.estimate_cost(data))
+        self.assertEqual(self.engine.estimate_cost(pinned).iterations, 1000)
+        with self.assertRaises(RenderLimitError):
+            self.engine.check_cost(pinned, RenderLimits(max_range_iterations=100))
+        # 常驻值之间的引用同样展开
+        nested = GoTemplateEngine.pin({"Tools": pinned["Tools"], "q": "x"})
+        self.assertEqual(GoTemplateEngine("{{range .c.Tools}}{{.name}}{{end}}").estimate_cost({"c": nested}).iterations,
+                         500)
+        nested.release()
+        pinned["Tools"].release()
+
+    def test_release_and_reference_counts(self) -> None:
+        before = GoTemplateEngine.pinned_stats()
+        first = GoTemplateEngine.pin(TOOLS, key="tools-v1")
+        second = GoTemplateEngine.pin(object(), key="tools-v1")  # 键已存在, 不会序列化该值
+        self.assertEqual(first.id, second.id)
+        stats = GoTemplateEngine.pinned_stats()
+        self.assertEqual((stats["values"], stats["refs"]), (before["values"] + 1, before["refs"] + 2))
+        first.release()
+        self.assertEqual(self.engine.render({"Tools": second, "q": ""}), self.engine.render({"Tools": TOOLS, "q": ""}))
+        del second
+        gc.collect()
+        self.assertEqual(GoTemplateEngine.pinned_stats(), before)
+        with self.assertRaisesRegex(ValueError, "released"):
+            self.engine.render({"Tools": first})
+        stale = {"Tools": {PIN_KEY: first.id}}
+        with self.assertRaisesRegex(ValueError, "JSON_ERROR: pinned value .* was released"):
+            self.engine.render(stale)
+
+    def test_memory_is_bounded(self) -> None:
+        in_use = GoTemplateEngine.pinned_stats()["bytes"]
+        GoTemplateEngine.set_pinned_limit(in_use + 100)
+        small = GoTemplateEngine.pin("x" * 50)
+        with self.assertRaisesRegex(MemoryError, "PIN_LIMIT_ERROR"):
+            GoTemplateEngine.pin("y" * 60)
+        small.release()
+        GoTemplateEngine.pin("y" * 60).release()
+        self.assertEqual(GoTemplateEngine.pinned_stats()["max_bytes"], in_use + 100)
+
+    def test_unserializable_values(self) -> None:
+        with self.assertRaisesRegex(TypeError, "Blob"):
+            GoTemplateEngine.pin({"a": Blob("x")})
+
+    def test_concurrent_pin_render_release(self) -> None:
+        errors = []
+
+        def worker(n: int) -> None:
+            try:
+                for i in range(50):
+                    handle = GoTemplateEngine.pin(TOOLS, key=f"shared-{i % 3}")
+                    self.assertTrue(self.engine.render({"Tools": handle, "q": n}).endswith(f"|{n}"))
+                    handle.release()
+            except BaseException as e:
+                errors.append(e)
+
+        before = GoTemplateEngine.pinned_stats()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(GoTemplateEngine.pinned_stats(), before)
@@ -0,0 +1,197 @@
+"""Tests for the bounded render pool and GIL release during renders."""
+import asyncio
+import os
+import threading
+import time
+import unittest
+from typing import Any, Dict, List, Optional
+
+from cognihub_pygotemplate import GoTemplateEngine, PoolOverloadedError, RenderPool
+from tests.support import RealLibraryTestCase
+
+
+class GatedEngine:
+    """Stand-in engine whose renders block until the gate is opened."""
+
+    def __init__(self) -> None:
+        self.gate = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.order: List[Any] = []
+
+    def render(self, data: Dict[str, Any], limits: Optional[Any] = None) -> str:
+        self.started.release()
+        self.gate.wait(5)
+        if data.get("fail"):
+            raise ValueError("boom")
+        self.order.append(data["id"])
+        return f"out-{data['id']}"
+
+
+class TestRenderPool(unittest.TestCase):
+    """Queueing, backpressure and metrics, without the Go library."""
+
+    def setUp(self) -> None:
+        self.engine = GatedEngine()
+
+    def _occupy_worker(self, pool: RenderPool) -> Any:
+        future = pool.submit(self.engine, {"id": "busy"})
+        self.assertTrue(self.engine.started.acquire(timeout=5))
+        return future
+
+    def test_reject_policy_raises_when_full(self) -> None:
+        with RenderPool(workers=1, max_queue=2, policy="reject") as pool:
+            busy = self._occupy_worker(pool)
+            pool.submit(self.engine, {"id": 1})
+            pool.submit(self.engine, {"id": 2})
+            with self.assertRaises(PoolOverloadedError):
+                pool.submit(self.engine, {"id": 3})
+            self.assertEqual(pool.stats().rejected, 1)
+            self.assertEqual(pool.stats().queued, 2)
+            self.engine.gate.set()
+            self.assertEqual(busy.result(5), "out-busy")
+
+    def test_block_policy_times_out(self) -> None:
+        with RenderPool(workers=1, max_queue=1, policy="block", block_timeout=0.05) as pool:
+            self._occupy_worker(pool)
+            pool.submit(self.engine, {"id": 1})
+            started = time.monotonic()
+            with self.assertRaises(PoolOverloadedError):
+                pool.submit(self.engine, {"id": 2})
+            self.assertGreaterEqual(time.monotonic() - started, 0.04)
+            self.engine.gate.set()
+
+    def test_block_policy_waits_for_space(self) -> None:
+        with RenderPool(workers=1, max_queue=1, policy="block") as pool:
+            self._occupy_worker(pool)
+            pool.submit(self.engine, {"id": 1})
+            threading.Timer(0.05, self.engine.gate.set).start()
+            self.assertEqual(pool.submit(self.engine, {"id": 2}).result(5), "out-2")
+
+    def test_priority_lanes_are_served_first(self) -> None:
+        with RenderPool(workers=1, max_queue=10, priorities=3) as pool:
+            self._occupy_worker(pool)
+            futures = [pool.submit(self.engine, {"id": i}, priority=p)
+                       for i, p in enumerate([2, 1, 0, 2, 0])]
+            self.engine.gate.set()
+            for future in futures:
+                future.result(5)
+        self.assertEqual(self.engine.order, ["busy", 2, 4, 1, 0, 3])
+
+    def test_stats_count_failures_and_latencies(self) -> None:
+        self.engine.gate.set()
+        with RenderPool(workers=2) as pool:
+            ok = pool.submit(self.engine, {"id": 1})
+            bad = pool.submit(self.engine, {"id": 2, "fail": True})
+            self.assertEqual(ok.result(5), "out-1")
+            with self.assertRaises(ValueError):
+                bad.result(5)
+        stats = pool.stats()
+        self.assertEqual((stats.submitted, stats.completed, stats.failed), (2, 1, 1))
+        self.assertEqual(stats.service_time.samples, 2)
+        self.assertEqual(stats.queue_wait.samples, 2)
+        self.assertLessEqual(stats.service_time.p50, stats.service_time.max)
+
+    def test_shutdown_cancels_pending(self) -> None:
+        pool = RenderPool(workers=1)
+        busy = self._occupy_worker(pool)
+        pending = pool.submit(self.engine, {"id": 1})
+        self.engine.gate.set()
+        pool.shutdown(cancel_pending=True)
+        self.assertEqual(busy.result(5), "out-busy")
+        self.assertTrue(pending.cancelled() or pending.result(5) == "out-1")
+        with self.assertRaises(RuntimeError):
+            pool.submit(self.engine, {"id": 2})
+
+    def test_render_async_rejects_without_blocking_loop(self) -> None:
+        async def main() -> None:
+            with RenderPool(workers=1, max_queue=1, policy="reject") as pool:
+                self._occupy_worker(pool)
+                pending = pool.submit(self.engine, {"id": 1})
+                with self.assertRaises(PoolOverloadedError):
+                    await pool.render_async(self.engine, {"id": 2})
+                self.engine.gate.set()
+                await asyncio.wrap_future(pending)
+                self.assertEqual(await pool.render_async(self.engine, {"id": 3}), "out-3")
+
+        asyncio.run(main())
+
+    def test_render_async_after_shutdown_raises(self) -> None:
+        pool = RenderPool(workers=1, max_queue=1)
+        pool.shutdown()
+
+        async def main() -> None:
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(pool.render_async(self.engine, {"id": 1}), 5)
+
+        asyncio.run(main())
+        self.assertEqual(pool.stats().submitted, 0)
+        self.assertTrue(pool._slots.acquire(blocking=False))
+
+    def test_invalid_arguments(self) -> None:
+        with self.assertRaises(ValueError):
+            RenderPool(policy="drop")
+        with self.assertRaises(ValueError):
+            RenderPool(workers=0)
+        with RenderPool(workers=1, priorities=2) as pool:
+            with self.assertRaises(ValueError):
+                pool.submit(self.engine, {}, priority=2)
+
+
+# 两层嵌套 range, 单次渲染约数十毫秒的纯Go计算
+HEAVY = "{{range .L}}{{range $.L}}x{{end}}{{end}}"
+HEAVY_DATA = {"L": list(range(1500))}
+
+
+class TestRenderPoolRealLibrary(RealLibraryTestCase):
+    """GIL release and throughput scaling against the compiled library."""
+
+    def test_gil_released_during_render(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{range $.L}}{{range $.L}}x{{end}}{{end}}{{end}}")
+        data = {"L": list(range(150))}
+        engine.render({"L": [1]})
+        counter = [0]
+        stop = threading.Event()
+
+        def spin() -> None:
+            while not stop.is_set():
+                counter[0] += 1
+
+        spinner = threading.Thread(target=spin)
+        spinner.start()
+        try:
+            time.sleep(0.01)
+            before, started = counter[0], time.perf_counter()
+            time.sleep(0.1)
+            baseline_rate = (counter[0] - before) / (time.perf_counter() - started)
+            before, started = counter[0], time.perf_counter()
+            engine.render(data)
+            elapsed = time.perf_counter() - started
+            rate = (counter[0] - before) / elapsed
+        finally:
+            stop.set()
+            spinner.join()
+        # 调用期间若持有GIL, 计数线程最多只能跑一个切换间隔; 单核时两者分时共享CPU
+        self.assertGreater(elapsed, 0.1)
+        self.assertGreater(rate, 0.2 * baseline_rate)
+
+    @unittest.skipIf((os.cpu_count() or 1) < 2, "throughput scaling needs at least 2 CPUs")
+    def test_throughput_scales_with_workers(self) -> None:
+        engine = GoTemplateEngine(HEAVY)
+        engine.render(HEAVY_DATA)
+        jobs = 16
+
+        def throughput(workers: int) -> float:
+            with RenderPool(workers=workers) as pool:
+                started = time.perf_counter()
+                for future in [pool.submit(engine, HEAVY_DATA) for _ in range(jobs)]:
+                    future.result()
+                return jobs / (time.perf_counter() - started)
+
+        workers = min(4, os.cpu_count() or 1)
+        single = throughput(1)
+        parallel = throughput(workers)
+        self.assertGreater(parallel / single, 0.6 * workers)
+
+
+if __name__ == "__main__":
+    unittest.main()
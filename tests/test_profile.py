@@ -0,0 +1,118 @@
+"""Tests for the template execution profiler."""
+import io
+import os
+import tempfile
+
+from cognihub_pygotemplate import GoTemplateEngine, ProfileReport, RenderLimits
+from tests.support import RealLibraryTestCase
+
+CHAT = """{{- range $i, $m := .Messages}}
+{{- if eq $m.role "user"}}User: {{$m.content}}
+{{else}}{{template "assistant" $m}}{{end}}
+{{- end}}{{define "assistant"}}Assistant: {{.content}}{{range .tools}}[{{.}}]{{end}}
+{{end}}"""
+MESSAGES = {"Messages": [
+    {"role": "user", "content": "hi"},
+    {"role": "assistant", "content": "hello", "tools": ["a", "b", "c"]},
+] * 2}
+
+
+class TestProfile(RealLibraryTestCase):
+
+    def node(self, report: ProfileReport, source: str):
+        [node] = [n for n in report.nodes if n.source == source]
+        return node
+
+    def test_output_matches_render(self) -> None:
+        engine = GoTemplateEngine(CHAT)
+        report = engine.profile(MESSAGES)
+        self.assertIsNone(report.error)
+        self.assertEqual(report.output, engine.render(MESSAGES))
+        self.assertEqual(report.bytes, len(report.output.encode()))
+
+    def test_counts_iterations_bytes_and_locations(self) -> None:
+        report = GoTemplateEngine(CHAT).profile(MESSAGES)
+        outer = self.node(report, "{{range $i, $m := .Messages}}")
+        self.assertEqual((outer.kind, outer.count, outer.iterations), ("range", 1, 4))
+        self.assertEqual((outer.template, outer.line, outer.col), ("ollama", 1, 10))
+        self.assertEqual(outer.bytes, report.bytes)
+
+        tools = self.node(report, "{{range .tools}}")
+        self.assertEqual((tools.template, tools.line), ("assistant", 4))
+        self.assertEqual((tools.count, tools.iterations, tools.bytes), (2, 6, 18))
+
+        call = self.node(report, '{{template "assistant" $m}}')
+        self.assertEqual((call.kind, call.count), ("template", 2))
+        condition = self.node(report, '{{if eq $m.role "user"}}')
+        self.assertEqual(condition.parent, outer.id)
+        self.assertLessEqual(condition.total_time, outer.total_time)
+        self.assertGreaterEqual(outer.total_time, outer.self_time)
+
+    def test_break_and_continue_close_frames(self) -> None:
+        engine = GoTemplateEngine('{{range .L}}{{if eq . "d"}}{{break}}{{end}}'
+                                  '{{if eq . "b"}}{{continue}}{{end}}{{.}}{{end}}')
+        report = engine.profile({"L": list("abcde")})
+        self.assertEqual(report.output, "ac")
+        self.assertEqual(self.node(report, "{{range .L}}").iterations, 4)
+        self.assertEqual(self.node(report, "{{.}}").count, 2)
+        # 每条栈路径都必须是静态嵌套关系的一部分
+        parents = {n.id: n.parent for n in report.nodes}
+        for path in report.stacks:
+            for outer, inner in zip(path, path[1:]):
+                self.assertEqual(parents[inner], outer)
+
+    def test_recursive_template_counted_once_in_totals(self) -> None:
+        engine = GoTemplateEngine('{{define "t"}}{{if .c}}<{{template "t" .c}}>{{end}}{{end}}{{template "t" .}}')
+        data = {"c": {}}
+        for _ in range(30):
+            data = {"c": data}
+        report = engine.profile(data)
+        self.assertEqual(report.output, "<" * 30 + ">" * 30)
+        call = self.node(report, '{{template "t" .c}}')
+        self.assertEqual(call.count, 30)
+        # 若递归的每一层都累加, 总耗时会远超整个渲染的耗时
+        self.assertLessEqual(call.total_time, report.total_time)
+
+    def test_execution_error_returns_partial_profile(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{range $.L}}{{range $.L}}x{{end}}{{end}}{{end}}")
+        report = engine.profile({"L": list(range(300))}, limits=RenderLimits(timeout=0.05))
+        self.assertIn("RENDER_LIMIT_ERROR: deadline", report.error)
+        self.assertEqual(report.hottest(1)[0].col, 33)
+        self.assertGreater(report.bytes, 0)
+
+    def test_parse_error_raises(self) -> None:
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            GoTemplateEngine("{{.x").profile({})
+
+    def test_plain_render_is_not_instrumented(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}{{.}}{{end}}")
+        engine.profile({"L": [1, 2]})
+        self.assertEqual(engine.render({"L": [1, 2]}), "12")
+
+    def test_folded_export(self) -> None:
+        report = GoTemplateEngine(CHAT).profile(MESSAGES)
+        lines = report.folded().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, value = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("render"))
+            self.assertGreater(int(value), 0)
+        self.assertTrue(any("{{range .tools}} (assistant:4:" in line for line in lines))
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines),
+                         sum(ns for ns in report.stacks.values() if ns > 0))
+
+        buffer = io.StringIO()
+        report.write_folded(buffer)
+        self.assertEqual(buffer.getvalue(), report.folded())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "render.folded")
+            report.write_folded(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), report.folded())
+
+    def test_to_dict_and_format(self) -> None:
+        report = GoTemplateEngine(CHAT).profile(MESSAGES)
+        data = report.to_dict()
+        self.assertEqual(len(data["nodes"]), len(report.nodes))
+        self.assertEqual(data["nodes"][0]["location"], report.nodes[0].location)
+        self.assertIn("{{range .tools}}", report.format())
@@ -0,0 +1,86 @@
+"""Tests for out-of-band blob references."""
+import unittest
+
+from cognihub_pygotemplate import Blob, GoTemplateEngine
+from cognihub_pygotemplate.refs import BLOB_KEY, RefCollector
+from tests.support import RealLibraryTestCase
+
+
+class TestRefCollector(unittest.TestCase):
+    """Serialization-side behaviour that does not need the Go library."""
+
+    def test_blob_rejects_unsupported_types(self) -> None:
+        with self.assertRaises(TypeError):
+            Blob(123)  # type: ignore[arg-type]
+
+    def test_placeholders_index_collected_buffers(self) -> None:
+        refs = RefCollector()
+        try:
+            self.assertEqual(refs.default(Blob("abc")), {BLOB_KEY: 0})
+            self.assertEqual(refs.default(Blob(b"de")), {BLOB_KEY: 1})
+            self.assertEqual(len(refs), 2)
+            ptrs, lens = refs.arrays()
+            self.assertEqual(list(lens), [3, 2])
+            self.assertTrue(all(ptrs))
+        finally:
+            refs.release()
+
+    def test_non_utf8_str_length_is_utf8_bytes(self) -> None:
+        refs = RefCollector()
+        try:
+            refs.default(Blob("你好"))
+            _, lens = refs.arrays()
+            self.assertEqual(list(lens), [6])
+        finally:
+            refs.release()
+
+    def test_unknown_objects_still_raise(self) -> None:
+        with self.assertRaises(TypeError):
+            RefCollector().default(object())
+
+    def test_non_contiguous_memoryview_rejected(self) -> None:
+        refs = RefCollector()
+        try:
+            with self.assertRaises(BufferError):
+                refs.default(Blob(memoryview(b"abcdef")[::2]))
+        finally:
+            refs.release()
+
+
+class TestRealBlobRendering(RealLibraryTestCase):
+    """Blob rendering against the real library."""
+
+    def test_blob_types_render_as_strings(self) -> None:
+        engine = GoTemplateEngine("{{.A}}|{{.B}}|{{.C}}|{{.D}}")
+        result = engine.render({
+            "A": Blob("héllo 世界"),
+            "B": Blob(b"raw bytes"),
+            "C": Blob(memoryview(bytearray(b"view"))),
+            "D": Blob(""),
+        })
+        self.assertEqual(result, "héllo 世界|raw bytes|view|")
+
+    def test_blobs_nested_in_lists_and_maps(self) -> None:
+        engine = GoTemplateEngine("{{range .Messages}}{{.role}}={{.content}};{{end}}")
+        data = {"Messages": [
+            {"role": "system", "content": Blob("be brief")},
+            {"role": "user", "content": "plain"},
+        ]}
+        self.assertEqual(engine.render(data), "system=be brief;user=plain;")
+
+    def test_blob_output_matches_json_path(self) -> None:
+        document = 'quotes " backslash \\ tab \t newline \n 世界 ' * 1000
+        engine = GoTemplateEngine("<{{.Doc}}>{{len .Doc}}")
+        self.assertEqual(engine.render({"Doc": Blob(document)}), engine.render({"Doc": document}))
+
+    def test_blob_with_template_functions(self) -> None:
+        engine = GoTemplateEngine('{{if eq .Doc "x"}}same{{end}}{{printf "%q" .Doc}}')
+        self.assertEqual(engine.render({"Doc": Blob(b"x")}), 'same"x"')
+
+    def test_forged_placeholder_without_blobs_is_plain_data(self) -> None:
+        engine = GoTemplateEngine("{{range $k, $v := .X}}{{$v}}{{end}}")
+        self.assertEqual(engine.render({"X": {BLOB_KEY: 0}}), "0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""Tests for file-backed templates with hot reloading."""
+import gc
+import os
+import platform
+import tempfile
+import threading
+import time
+import unittest
+
+from cognihub_pygotemplate import FileTemplateEngine
+from tests.support import RealLibraryTestCase
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestFileTemplateEngine(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "chat.gotmpl")
+        self.write("v1 {{.Name}}")
+
+    def write(self, source: str, atomic: bool = False) -> None:
+        target = self.path + ".tmp" if atomic else self.path
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(source)
+        if atomic:
+            os.replace(target, self.path)
+        # 保证修改时间变化, 不依赖文件系统的时间精度
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    def engine(self, **kwargs) -> FileTemplateEngine:
+        engine = FileTemplateEngine(self.path, **kwargs)
+        self.addCleanup(engine.close)
+        return engine
+
+    def test_manual_reload(self) -> None:
+        reloaded = []
+        engine = self.engine(watch=False, on_reload=reloaded.append)
+        self.assertIsNone(engine.watch_mode)
+        self.assertEqual(engine.render({"Name": "a"}), "v1 a")
+        self.assertFalse(engine.reload())
+
+        self.write("v2 {{.Name}}")
+        self.assertTrue(engine.reload())
+        self.assertEqual((engine.render({"Name": "a"}), engine.version), ("v2 a", 2))
+        self.assertEqual(reloaded, [engine])
+
+    def test_parse_error_keeps_last_good_version(self) -> None:
+        errors = []
+        engine = self.engine(watch=False, on_error=lambda e, error: errors.append(error))
+        self.write("v2 {{.Name")
+        self.assertFalse(engine.reload())
+        self.assertEqual(engine.render({"Name": "a"}), "v1 a")
+        self.assertIn("TEMPLATE_PARSE_ERROR", str(engine.last_error))
+        self.assertEqual(len(errors), 1)
+        # 文件未再变化时不会重复报告
+        self.assertFalse(engine.reload())
+        self.assertEqual(len(errors), 1)
+
+        self.write("v3 {{.Name}}")
+        self.assertTrue(engine.reload())
+        self.assertIsNone(engine.last_error)
+        self.assertEqual((engine.render({"Name": "a"}), engine.version), ("v3 a", 2))
+
+    def test_missing_file_is_reported(self) -> None:
+        errors = []
+        engine = self.engine(watch=False, on_error=lambda e, error: errors.append(error))
+        os.remove(self.path)
+        self.assertFalse(engine.reload())
+        self.assertIsInstance(errors[0], FileNotFoundError)
+        self.assertEqual(engine.render({"Name": "a"}), "v1 a")
+        self.write("v2 {{.Name}}")
+        self.assertTrue(engine.reload())
+
+    def test_invalid_initial_template_raises(self) -> None:
+        self.write("{{.Name")
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            FileTemplateEngine(self.path, watch=False)
+
+    def test_polling_picks_up_changes(self) -> None:
+        engine = self.engine(poll_interval=0.02, use_inotify=False)
+        self.assertEqual(engine.watch_mode, "poll")
+        self.write("v2 {{.Name}}")
+        self.assertTrue(wait_for(lambda: engine.render({"Name": "a"}) == "v2 a"))
+        self.write("v3 {{.Name}}", atomic=True)
+        self.assertTrue(wait_for(lambda: engine.render({"Name": "a"}) == "v3 a"))
+
+    @unittest.skipUnless(platform.system() == "Linux", "inotify is Linux only")
+    def test_inotify_picks_up_changes(self) -> None:
+        # 轮询间隔足够长, 只有 inotify 能及时发现变化
+        engine = self.engine(poll_interval=60)
+        self.assertEqual(engine.watch_mode, "inotify")
+        self.write("v2 {{.Name}}")
+        self.assertTrue(wait_for(lambda: engine.version == 2))
+        self.write("v3 {{.Name}}", atomic=True)
+        self.assertTrue(wait_for(lambda: engine.version == 3))
+        self.assertEqual(engine.render({"Name": "a"}), "v3 a")
+
+    def test_renders_see_whole_versions_during_swaps(self) -> None:
+        engine = self.engine(poll_interval=0.01, use_inotify=False)
+        stop = threading.Event()
+        seen = set()
+        failures = []
+
+        def render() -> None:
+            while not stop.is_set():
+                try:
+                    seen.add(engine.render({"L": list(range(50))}))
+                except Exception as e:  # pragma: no cover - reported below
+                    failures.append(e)
+
+        threads = [threading.Thread(target=render) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for version in range(2, 6):
+            self.write(f"{{{{range .L}}}}{version}{{{{end}}}}")
+            self.assertTrue(wait_for(lambda: engine.version >= version))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        allowed = {"v1 <no value>"} | {str(v) * 50 for v in range(2, 6)}
+        self.assertLessEqual(seen, allowed)
+
+    def test_close_stops_watcher(self) -> None:
+        engine = self.engine(poll_interval=0.02, use_inotify=False)
+        watcher = engine._watcher
+        engine.close()
+        self.assertFalse(watcher.is_alive())
+        self.write("v2 {{.Name}}")
+        time.sleep(0.1)
+        self.assertEqual(engine.render({"Name": "a"}), "v1 a")
+
+    def test_watcher_does_not_keep_engine_alive(self) -> None:
+        engine = FileTemplateEngine(self.path, poll_interval=0.02, use_inotify=False)
+        watcher = engine._watcher
+        del engine
+        gc.collect()
+        watcher.join(2)
+        self.assertFalse(watcher.is_alive())
+
+    def test_lazy_engine_starts_watching_on_first_render(self) -> None:
+        engine = self.engine(lazy=True, poll_interval=0.02, use_inotify=False)
+        self.assertIsNone(engine.watch_mode)
+        self.write("v2 {{.Name}}")
+        # 首次渲染前的修改在开始监听时即生效
+        self.assertEqual(engine.render({"Name": "a"}), "v2 a")
+        self.assertEqual(engine.watch_mode, "poll")
+
+    def test_lazy_engine_starts_watching_on_spans_and_fit(self) -> None:
+        for render in (lambda e: e.render_spans({"Name": "a"}).output,
+                       lambda e: e.render_fit({"Name": "a", "Messages": []}, 100).output):
+            self.write("v1 {{.Name}}")
+            engine = self.engine(lazy=True, poll_interval=0.02, use_inotify=False)
+            self.write("v2 {{.Name}}")
+            self.assertEqual(render(engine), "v2 a")
+            self.assertEqual(engine.watch_mode, "poll")
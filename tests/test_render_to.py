@@ -0,0 +1,88 @@
+"""Tests for rendering directly to files and file descriptors."""
+import json
+import os
+import tempfile
+import unittest
+
+from cognihub_pygotemplate import Blob, GoTemplateEngine
+from tests.support import RealLibraryTestCase
+
+
+class TestRealRenderTo(RealLibraryTestCase):
+    """render_to against the real library."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.txt")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def read(self) -> str:
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_path_truncates_by_default(self) -> None:
+        engine = GoTemplateEngine("Hello, {{.Name}}!")
+        engine.render_to(self.path, {"Name": "first-long-name"})
+        written = engine.render_to(self.path, {"Name": "World"})
+        self.assertEqual(self.read(), "Hello, World!")
+        self.assertEqual(written, len("Hello, World!"))
+
+    def test_path_append(self) -> None:
+        engine = GoTemplateEngine("{{.N}}\n")
+        for i in range(3):
+            engine.render_to(self.path, {"N": i}, append=True)
+        self.assertEqual(self.read(), "0\n1\n2\n")
+
+    def test_file_descriptor(self) -> None:
+        engine = GoTemplateEngine("你好, {{.Name}}")
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            engine.render_to(fd, {"Name": "世界"})
+            engine.render_to(fd, {"Name": "!"})
+        finally:
+            os.close(fd)
+        self.assertEqual(self.read(), "你好, 世界你好, !")
+
+    def test_file_object_is_flushed_first(self) -> None:
+        engine = GoTemplateEngine("{{.X}}")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("before|")
+            engine.render_to(f, {"X": "rendered"})
+        self.assertEqual(self.read(), "before|rendered")
+
+    def test_jsonl_escapes_output_in_go(self) -> None:
+        template = '<|im_start|>user\n{{.Prompt}} & "quoted"\t\\<|im_end|>'
+        engine = GoTemplateEngine(template)
+        prompts = ["a", "ü 🚀", Blob("blob\nvalue")]
+        for prompt in prompts:
+            engine.render_to(self.path, {"Prompt": prompt}, append=True, jsonl_key="text")
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("<|im_start|>", lines[0])  # 不做HTML转义
+        expected = [engine.render({"Prompt": "a"}), engine.render({"Prompt": "ü 🚀"}),
+                    engine.render({"Prompt": "blob\nvalue"})]
+        self.assertEqual([json.loads(line)["text"] for line in lines], expected)
+
+    def test_render_error_leaves_target_untouched(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("keep")
+        engine = GoTemplateEngine("partial {{.X.Y.Z}}")
+        with self.assertRaises(ValueError) as cm:
+            engine.render_to(self.path, {"X": "not a map"}, append=True)
+        self.assertIn("TEMPLATE_EXECUTE_ERROR", str(cm.exception))
+        self.assertEqual(self.read(), "keep")
+
+    def test_unwritable_path_raises_oserror(self) -> None:
+        engine = GoTemplateEngine("x")
+        with self.assertRaises(OSError) as cm:
+            engine.render_to(os.path.join(self.path, "missing", "out.txt"), {})
+        self.assertIn("OUTPUT_ERROR", str(cm.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
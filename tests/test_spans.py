@@ -0,0 +1,85 @@
+"""Tests for the output span map of GoTemplateEngine.render_spans."""
+from cognihub_pygotemplate import Blob, GoTemplateEngine, RenderLimitError, RenderLimits, SpanMap
+from tests.support import RealLibraryTestCase
+
+CHAT = ("{{- range .Messages}}<|{{.role}}|>\n{{.content}}<|end|>\n{{end}}"
+        "{{- if .Tools}}{{range $i, $t := .Tools}}{{$i}}:{{$t.name}} {{end}}{{end}}")
+MESSAGES = [{"role": "user", "content": "你好 👋"}, {"role": "assistant", "content": "你好 👋"},
+            {"role": "user", "content": "你好 👋"}]
+
+
+class TestRenderSpans(RealLibraryTestCase):
+
+    def test_items_and_fields_of_repeated_content(self) -> None:
+        engine = GoTemplateEngine(CHAT)
+        data = {"Messages": MESSAGES, "Tools": [{"name": "search"}]}
+        spans = engine.render_spans(data)
+        self.assertIsInstance(spans, SpanMap)
+        self.assertEqual(spans.output, engine.render(data))
+
+        items = spans.items("Messages")
+        self.assertEqual([s.key for s in items], [0, 1, 2])
+        self.assertEqual([spans.text(s) for s in items],
+                         [f"<|{m['role']}|>\n{m['content']}<|end|>\n" for m in MESSAGES])
+        encoded = spans.output.encode("utf-8")
+        for i in range(3):
+            content, = spans.find(("Messages", i, "content"))
+            self.assertEqual(spans.text(content), "你好 👋")
+            self.assertEqual(encoded[content.start:content.end].decode("utf-8"), "你好 👋")
+            self.assertEqual(spans.spans[content.parent], items[i])
+            self.assertGreater(content.start_char, items[i].start_char)
+        # 三条消息内容相同, 区间仍然各不相同
+        self.assertEqual(len({s.start for s in spans.find(("Messages", 1, "content"))
+                              + spans.find(("Messages", 2, "content"))}), 2)
+
+        tool, = spans.find(("Tools", 0, "name"))
+        self.assertEqual((spans.text(tool), tool.source), ("search", "{{$t.name}}"))
+        loop, = spans.find("Tools", kind="range")
+        self.assertEqual(spans.children(loop), spans.items("Tools"))
+        self.assertTrue(loop.location.startswith("ollama:3:"))
+
+    def test_scopes_and_unlocatable_values(self) -> None:
+        template = ('{{define "msg"}}{{.content}}{{end}}'
+                    "{{with .Meta}}{{.a}}{{end}}"
+                    "{{range $k, $v := .M}}{{$k}}={{$v}};{{end}}{{index .M \"a\"}}"
+                    "{{range $m := slice .Messages 1}}{{template \"msg\" $m}}{{$m.role}}{{end}}"
+                    "{{range .Messages}}{{if eq .role \"user\"}}{{break}}{{end}}x{{end}}")
+        engine = GoTemplateEngine(template)
+        data = {"Meta": {"a": 1}, "M": {"b": 2, "a": 1}, "Messages": MESSAGES[1:]}
+        spans = engine.render_spans(data)
+        self.assertEqual(spans.output, engine.render(data))
+        self.assertEqual(spans.text(spans.find(("Meta", "a"))[0]), "1")
+        self.assertEqual([(s.key, spans.text(s)) for s in spans.items("M")], [("a", "a=1;"), ("b", "b=2;")])
+        self.assertEqual(spans.text(spans.find(("M", "b"), kind="field")[0]), "2")
+        self.assertEqual([s.path for s in spans.spans if s.source.startswith("{{index")], [None])
+
+        # slice 改变了下标, 路径未知; define 模板中的数据由调用方传入
+        sliced = [s for s in spans.spans if s.source == "{{range $m := slice .Messages 1}}"]
+        self.assertEqual([(s.kind, s.path, s.key) for s in sliced], [("range", None, None), ("item", None, 0)])
+        self.assertEqual([(s.path, spans.text(s)) for s in spans.spans if s.source == "{{.content}}"],
+                         [(None, "你好 👋")])
+
+        # break 结束当前迭代和整个range
+        broken = spans.items("Messages")
+        self.assertEqual([spans.text(s) for s in broken], ["x", ""])
+        loop = spans.spans[broken[0].parent]
+        self.assertEqual(loop.end, len(spans.output.encode("utf-8")))
+
+    def test_references_limits_and_errors(self) -> None:
+        engine = GoTemplateEngine(CHAT)
+        tools = GoTemplateEngine.pin([{"name": "calc"}])
+        spans = engine.render_spans({"Messages": [{"role": "user", "content": Blob("blob")}], "Tools": tools})
+        self.assertEqual(spans.text(spans.find(("Messages", 0, "content"))[0]), "blob")
+        self.assertEqual(spans.text(spans.find(("Tools", 0, "name"))[0]), "calc")
+
+        with self.assertRaises(RenderLimitError) as caught:
+            engine.render_spans({"Messages": MESSAGES}, limits=RenderLimits(max_range_iterations=2))
+        self.assertEqual(caught.exception.kind, "range")
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_EXECUTE_ERROR"):
+            GoTemplateEngine("{{range .x}}{{index .y 3}}{{end}}").render_spans({"x": [{"y": [1]}]})
+        with self.assertRaisesRegex(ValueError, "TEMPLATE_PARSE_ERROR"):
+            GoTemplateEngine("{{range .x}}").render_spans({})
+
+        # 插桩的模板变体不影响普通渲染
+        self.assertEqual(engine.render({"Messages": MESSAGES[:1]}), "<|user|>\n你好 👋<|end|>\n")
+        self.assertEqual(GoTemplateEngine("{{.a}}").render_spans({"a": 1}).spans[0].path, ("a",))
@@ -0,0 +1,95 @@
+"""Tests for warm-up, background preloading and the startup timing report."""
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+from cognihub_pygotemplate import GoTemplateEngine, RenderLimits, preload, startup, warmup
+from tests.support import RealLibraryTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestWarmup(RealLibraryTestCase):
+
+    def test_cold_warmup_reports_every_step(self) -> None:
+        report = warmup(["{{.x}}", "{{.x.y}}", "{{.x"], data={"x": "a"}, renders=2)
+        self.assertFalse(report.already_loaded)
+        self.assertEqual([s for s in report.steps if s != "import"],
+                         ["load_library", "runtime_ready", "first_render", "precompile", "renders"])
+        self.assertTrue(all(seconds >= 0 for seconds in report.steps.values()))
+        self.assertEqual(report.templates, 3)
+        self.assertEqual([bool(e) for e in report.parse_errors], [False, False, True])
+        self.assertEqual((report.renders, report.render_errors), (4, 2))
+        self.assertIsNotNone(GoTemplateEngine._go_lib)
+        text = str(report)
+        for step in report.steps:
+            self.assertIn(step, text)
+        self.assertIn("3 templates (1 failed to parse)", text)
+
+    def test_warm_library_skips_cold_steps(self) -> None:
+        GoTemplateEngine.ensure_loaded()
+        report = GoTemplateEngine.warmup()
+        self.assertTrue(report.already_loaded)
+        self.assertFalse({"load_library", "runtime_ready", "first_render", "precompile"} & set(report.steps))
+        self.assertIn("already loaded", str(report))
+
+    def test_engines_render_with_their_own_limits(self) -> None:
+        engine = GoTemplateEngine("{{range .L}}x{{end}}", lazy=True, limits=RenderLimits(max_range_iterations=1))
+        report = warmup([engine], data={"L": [1, 2]})
+        self.assertEqual(report.render_errors, 1)
+
+    def test_preload_runs_in_the_background(self) -> None:
+        future = preload(["{{.x}}"])
+        report = future.result(10)
+        self.assertEqual(report.templates, 1)
+        self.assertEqual(GoTemplateEngine("{{.x}}").render({"x": 1}), "1")
+
+
+class TestPreloadFromEnvironment(RealLibraryTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        patcher = patch.object(startup, "_preload_future", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_by_default(self) -> None:
+        self.assertIsNone(startup.preload_from_environment({}))
+        self.assertIsNone(startup.preload_from_environment({"COGNIHUB_PRELOAD": "0"}))
+        self.assertIsNone(startup.preload_report())
+
+    def test_reads_template_files_and_directories(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "dir"))
+            for name, source in (("a.gotmpl", "{{.a}}"), (os.path.join("dir", "b.gotmpl"), "{{.b}}"),
+                                 (os.path.join("dir", "c.gotmpl"), "{{.c")):
+                with open(os.path.join(tmp, name), "w") as f:
+                    f.write(source)
+            env = {"COGNIHUB_PRELOAD": "1",
+                   "COGNIHUB_PRELOAD_TEMPLATES": os.pathsep.join([os.path.join(tmp, "a.gotmpl"),
+                                                                  os.path.join(tmp, "dir")])}
+            future = startup.preload_from_environment(env)
+            self.assertIs(startup.preload_from_environment(env), future)
+            report = startup.preload_report(10)
+        self.assertEqual(report.templates, 3)
+        self.assertEqual([bool(e) for e in report.parse_errors], [False, False, True])
+
+    def test_unreadable_templates_do_not_fail(self) -> None:
+        env = {"COGNIHUB_PRELOAD": "true", "COGNIHUB_PRELOAD_TEMPLATES": "/nonexistent/template.gotmpl"}
+        with self.assertLogs("cognihub_pygotemplate.startup", "ERROR"):
+            future = startup.preload_from_environment(env)
+        self.assertEqual(future.result(10).templates, 0)
+
+    def test_preload_on_import(self) -> None:
+        code = ("import cognihub_pygotemplate as c\n"
+                "report = c.startup.preload_report(30)\n"
+                "print(report.templates, 'import' in report.steps, 'load_library' in report.steps)\n")
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60,
+            env=dict(os.environ, PYTHONPATH=ROOT, COGNIHUB_PRELOAD="1",
+                     COGNIHUB_PRELOAD_TEMPLATES=os.path.join(ROOT, "tests", "ollama_templates")))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        count = len(os.listdir(os.path.join(ROOT, "tests", "ollama_templates")))
+        self.assertEqual(result.stdout.split(), [str(count), "True", "True"])
@@ -0,0 +1,175 @@
+"""Thread-safety tests: one-time library load, concurrent renders and subinterpreters."""
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from cognihub_pygotemplate import GoTemplateEngine, RenderLimits
+from tests.support import RealLibraryTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gil_disabled() -> bool:
+    """True on a free-threaded build running without the GIL."""
+    return hasattr(sys, "_is_gil_enabled") and not sys._is_gil_enabled()
+
+
+class TestOneTimeLoad(RealLibraryTestCase):
+
+    def test_concurrent_first_load_opens_the_library_once(self) -> None:
+        real_cdll = ctypes.CDLL
+        opened = []
+
+        def slow_cdll(path: str) -> ctypes.CDLL:
+            opened.append(path)
+            # 放大检查与设置之间的窗口
+            time.sleep(0.05)
+            return real_cdll(path)
+
+        threads = 8
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+
+        def worker(i: int) -> None:
+            barrier.wait()
+            GoTemplateEngine.ensure_loaded()
+            # 看到库的线程必须同时看到已声明的签名和释放函数
+            lib = GoTemplateEngine._go_lib
+            results[i] = (lib.RenderTemplateOptions.restype, GoTemplateEngine._free_func is not None,
+                          GoTemplateEngine("{{.i}}").render({"i": i}))
+
+        with patch("ctypes.CDLL", slow_cdll):
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(results, [(ctypes.c_void_p, True, str(i)) for i in range(threads)])
+
+    def test_lazy_engines_registered_concurrently_are_precompiled(self) -> None:
+        barrier = threading.Barrier(4)
+        engines = []
+
+        def worker(i: int) -> None:
+            barrier.wait()
+            for j in range(50):
+                engines.append(GoTemplateEngine(f"{{{{.x}}}}-{i}-{j}", lazy=True))
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        GoTemplateEngine.ensure_loaded()
+        self.assertEqual({e.render({"x": "a"}) for e in engines},
+                         {f"a-{i}-{j}" for i in range(4) for j in range(50)})
+
+
+class TestConcurrentRenders(RealLibraryTestCase):
+
+    def test_mixed_renders_from_many_threads(self) -> None:
+        chat = GoTemplateEngine("{{range .Messages}}{{.role}}: {{.content}}\n{{end}}")
+        broken = GoTemplateEngine("{{.a.b.c}}")
+        limited = GoTemplateEngine("{{range .L}}x{{end}}", limits=RenderLimits(max_range_iterations=5))
+        errors = []
+
+        def worker(seed: int) -> None:
+            try:
+                for i in range(200):
+                    messages = [{"role": "user", "content": f"{seed}-{i}-{k}"} for k in range(i % 7)]
+                    expected = "".join(f"user: {m['content']}\n" for m in messages)
+                    if chat.render({"Messages": messages}) != expected:
+                        errors.append(f"wrong output in thread {seed}")
+                    with self.assertRaises(ValueError):
+                        broken.render({"a": 1})
+                    if i % 2:
+                        with self.assertRaises(ValueError):
+                            limited.render({"L": list(range(10))})
+                    else:
+                        self.assertEqual(limited.render({"L": [1, 2]}), "xx")
+            except Exception as e:  # 断言失败在子线程中不会传回 unittest
+                errors.append(repr(e))
+
+        before = GoTemplateEngine.memory_stats()["outstanding_strings"]
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(GoTemplateEngine.memory_stats()["outstanding_strings"], before)
+
+
+class TestScaling(RealLibraryTestCase):
+
+    @unittest.skipUnless(gil_disabled(), "needs a free-threaded build running without the GIL")
+    @unittest.skipUnless((os.cpu_count() or 1) >= 4, "needs at least 4 CPUs")
+    def test_throughput_scales_without_the_gil(self) -> None:
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "bench_threads.py"), "--threads", "1,4",
+             "--duration", "1", "--json"],
+            cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        import json
+        rates = {row["threads"]: row["renders_per_second"] for row in json.loads(result.stdout)["results"]}
+        # 4线程至少达到单线程的2倍, 留出调度与测量噪声的余量
+        self.assertGreater(rates[4], 2 * rates[1])
+
+
+def _subinterpreter_runner():
+    """Returns a function running source code in a fresh subinterpreter, or None."""
+    try:
+        import _interpreters  # Python 3.13+
+
+        def run(code: str) -> None:
+            interp = _interpreters.create()
+            try:
+                if _interpreters.exec(interp, code) is not None:
+                    raise RuntimeError("subinterpreter raised an exception")
+            finally:
+                _interpreters.destroy(interp)
+        return run
+    except ImportError:
+        pass
+    try:
+        import _xxsubinterpreters
+    except ImportError:
+        return None
+
+    def run(code: str) -> None:
+        interp = _xxsubinterpreters.create()
+        try:
+            _xxsubinterpreters.run_string(interp, code)
+        finally:
+            _xxsubinterpreters.destroy(interp)
+    return run
+
+
+class TestSubinterpreters(RealLibraryTestCase):
+
+    def test_each_interpreter_loads_its_own_engine_state(self) -> None:
+        run = _subinterpreter_runner()
+        if run is None:
+            self.skipTest("subinterpreters are not available")
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "out")
+            # 子解释器里导入的是独立的模块副本, 状态不与主解释器共享
+            run(f"import sys\nsys.path.insert(0, {ROOT!r})\n"
+                "from cognihub_pygotemplate import GoTemplateEngine\n"
+                f"with open({out!r}, 'w') as f:\n"
+                "    f.write(GoTemplateEngine('{{.x}}').render({'x': 'sub'}))\n")
+            with open(out) as f:
+                self.assertEqual(f.read(), "sub")
+        self.assertIsNone(GoTemplateEngine._go_lib)
+        self.assertEqual(GoTemplateEngine("{{.x}}").render({"x": "main"}), "main")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Tests for the bundled render workload and CPU profiling used by PGO builds."""
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from cognihub_pygotemplate import GoTemplateEngine
+from cognihub_pygotemplate import workload
+from tests.support import RealLibraryTestCase
+
+
+class TestWorkload(RealLibraryTestCase):
+
+    def test_calls_are_deterministic_and_render(self) -> None:
+        first = workload.build_calls(seed=3, count=8)
+        second = workload.build_calls(seed=3, count=8)
+        self.assertEqual([engine.render(data, limits) for engine, data, limits in first],
+                         [engine.render(data, limits) for engine, data, limits in second])
+
+    def test_run_counts_renders(self) -> None:
+        result = workload.run(renders=50)
+        self.assertEqual(result["renders"], 50)
+        self.assertGreater(result["output_chars"], 0)
+
+    def test_profile_is_recorded(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cpu.pgo")
+            out = io.StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(workload.main(["--renders", "200", "--profile", path]), 0)
+            self.assertEqual(json.loads(out.getvalue())["renders"], 200)
+            # pprof 输出为 gzip 压缩的 protobuf
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(2), b"\x1f\x8b")
+
+    def test_profile_errors(self) -> None:
+        with self.assertRaisesRegex(RuntimeError, "PROFILE_ERROR: no CPU profile"):
+            GoTemplateEngine.stop_cpu_profile()
+        with self.assertRaisesRegex(RuntimeError, "PROFILE_ERROR"):
+            GoTemplateEngine.start_cpu_profile(os.path.join(tempfile.gettempdir(), "missing-dir", "cpu.pgo"))
+        with tempfile.TemporaryDirectory() as tmp:
+            GoTemplateEngine.start_cpu_profile(os.path.join(tmp, "a.pgo"))
+            try:
+                with self.assertRaisesRegex(RuntimeError, "already being recorded"):
+                    GoTemplateEngine.start_cpu_profile(os.path.join(tmp, "b.pgo"))
+            finally:
+                GoTemplateEngine.stop_cpu_profile()